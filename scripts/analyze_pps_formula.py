@@ -3,36 +3,30 @@
 
 import os
 import re
-import time
-import json
+import sys
 import argparse
-import requests
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
-from dotenv import load_dotenv
+from typing import List, Dict, Any
+from pathlib import Path
 
-# Load environment variables
-load_dotenv()
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
 
-# Setup Entrez config
-NCBI_EMAIL = os.getenv("NCBI_EMAIL", "tool@example.com")
-NCBI_API_KEY = os.getenv("NCBI_API_KEY")
-
-API_DELAY = 0.34  # Seconds between requests
+from scripts.eutils import (  # noqa: E402
+    EutilsError,
+    get_client,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+)
 
 class PPSFormulaAnalyzer:
     def __init__(self, formula_path: str):
         self.formula_path = formula_path
         self.terms: List[str] = []
         self.total_block_query = ""
-        self.last_request_time = 0
-
-    def _wait_for_api(self):
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < API_DELAY:
-            time.sleep(API_DELAY - time_since_last)
-        self.last_request_time = time.time()
 
     def parse_formula(self) -> bool:
         """Parses the specific format of seach_formula_2.md"""
@@ -77,32 +71,10 @@ class PPSFormulaAnalyzer:
         return True
 
     def get_count(self, query: str) -> int:
-        """Executes a PubMed count query using requests"""
-        self._wait_for_api()
-        
-        base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        params = {
-            "db": "pubmed",
-            "term": query,
-            "retmode": "json",
-            "retmax": 0,
-            "email": NCBI_EMAIL
-        }
-        if NCBI_API_KEY:
-            params["api_key"] = NCBI_API_KEY
-            
+        """Executes a PubMed count query through the shared E-utilities client"""
         try:
-            response = requests.get(base_url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            if "esearchresult" in data and "count" in data["esearchresult"]:
-                return int(data["esearchresult"]["count"])
-            else:
-                print(f"Unexpected response format for '{query}': {data}")
-                return -1
-                
-        except Exception as e:
+            return get_client().count(query)
+        except EutilsError as e:
             print(f"Error querying '{query}': {e}")
             return -1
 
@@ -174,7 +146,11 @@ def main():
     parser.add_argument("formula_file", help="Path to the search formula markdown file")
     parser.add_argument("--output", "-o", help="Output report file path", default="analysis_report.md")
     
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
     
     analyzer = PPSFormulaAnalyzer(args.formula_file)
     if analyzer.parse_formula():
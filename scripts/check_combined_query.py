@@ -3,32 +3,40 @@
 Check combined query hit count: P-Block (corrected) AND Concept Block (Narrative).
 """
 
-import time
-import requests
+import sys
+from pathlib import Path
 from typing import Dict
 
-ENTREZ_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, HistoryEngine, HistoryNode, get_client  # noqa: E402
 
 def count_pubmed_hits(term: str, label: str = "") -> int:
     """Query PubMed and return hit count."""
     try:
-        params = {
-            "db": "pubmed",
-            "term": term,
-            "retmax": 0,
-            "retmode": "json"
-        }
-        response = requests.get(ENTREZ_BASE_URL, params=params, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        count = int(data["esearchresult"]["count"])
+        count = get_client().count(term)
+        if label:
+            print(f"{label}: {count:,} hits")
+        return count
+    except EutilsError as e:
+        print(f"Error querying: {e}")
+        return -1
+
+
+def count_history_hits(engine: HistoryEngine, node: HistoryNode, label: str = "") -> int:
+    """Count a history node (``#1 AND #2`` style references); -1 on error."""
+    try:
+        count = engine.count(node)
         if label:
             print(f"{label}: {count:,} hits")
         return count
-    except Exception as e:
+    except (EutilsError, ValueError) as e:
         print(f"Error querying: {e}")
         return -1
 
+
 def main():
     print("# Combined Query Analysis: P-Block (Corrected) AND Concept Block\n")
 
@@ -89,27 +97,29 @@ def main():
         '"family medicine"[tiab] OR "general practitioner*"[tiab]'
     )
 
+    # Each block is searched once with usehistory=y; combinations reuse the query_keys.
+    engine = HistoryEngine(get_client())
+    p_node = engine.term(p_block)
+    concept_node = engine.term(concept_block)
+    context_node = engine.term(context_block)
+
     print("## Individual Block Counts\n")
 
-    p_count = count_pubmed_hits(p_block, "**P-Block (Corrected PPS)**")
-    time.sleep(0.34)
+    p_count = count_history_hits(engine, p_node, "**P-Block (Corrected PPS)**")
 
-    concept_count = count_pubmed_hits(concept_block, "**Concept Block (Narrative)**")
-    time.sleep(0.34)
+    concept_count = count_history_hits(engine, concept_node, "**Concept Block (Narrative)**")
 
-    context_count = count_pubmed_hits(context_block, "**Context Block (Primary Care)**")
-    time.sleep(0.34)
+    context_count = count_history_hits(engine, context_node, "**Context Block (Primary Care)**")
 
     print("\n## Combined Query Counts\n")
 
     # P AND Concept
-    p_and_concept = f"({p_block}) AND ({concept_block})"
-    p_concept_count = count_pubmed_hits(p_and_concept, "**P AND Concept**")
-    time.sleep(0.34)
+    p_concept_count = count_history_hits(engine, p_node & concept_node, "**P AND Concept**")
 
     # P AND Concept AND Context
-    p_and_concept_and_context = f"({p_block}) AND ({concept_block}) AND ({context_block})"
-    final_count = count_pubmed_hits(p_and_concept_and_context, "**P AND Concept AND Context (Final)**")
+    final_count = count_history_hits(
+        engine, p_node & concept_node & context_node, "**P AND Concept AND Context (Final)**"
+    )
 
     print("\n## Summary\n")
     print(f"| Query | Hit Count |")
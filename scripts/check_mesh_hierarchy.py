@@ -3,37 +3,24 @@
 
 import os
 import re
-import time
-import json
+import sys
 import argparse
-import requests
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from typing import List, Dict, Any, Set
-from dotenv import load_dotenv
+from typing import List, Dict, Any
+from pathlib import Path
 
-# Load environment variables
-load_dotenv()
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
 
-# Setup Entrez config
-NCBI_EMAIL = os.getenv("NCBI_EMAIL", "tool@example.com")
-NCBI_API_KEY = os.getenv("NCBI_API_KEY")
-
-API_DELAY = 0.34
+from scripts.eutils import EutilsError, get_client  # noqa: E402
 
 class MeshHierarchyAnalyzer:
     def __init__(self, formula_path: str):
         self.formula_path = formula_path
         self.mesh_terms: List[str] = []
         self.tree_numbers: Dict[str, List[str]] = {}
-        self.last_request_time = 0
-
-    def _wait_for_api(self):
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < API_DELAY:
-            time.sleep(API_DELAY - time_since_last)
-        self.last_request_time = time.time()
 
     def parse_mesh_terms(self) -> bool:
         """Parses MeSH terms from the first line of the formula file."""
@@ -75,25 +62,13 @@ class MeshHierarchyAnalyzer:
 
     def fetch_tree_numbers(self, term: str) -> List[str]:
         """Fetches tree numbers for a single MeSH term."""
-        self._wait_for_api()
-        
         # 1. Search for the term to get UI (Descriptor UI)
-        esearch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        params = {
-            "db": "mesh",
-            "term": f"{term}[MeSH Terms]", # Use exact match restriction if possible, or just term
-            "retmode": "json",
-            "email": NCBI_EMAIL
-        }
-        if NCBI_API_KEY:
-            params["api_key"] = NCBI_API_KEY
-
+        client = get_client()
         try:
-            resp = requests.get(esearch_url, params=params, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
+            # Use exact match restriction if possible, or just term
+            result = client.esearch(f"{term}[MeSH Terms]", db="mesh", retmax=20, strict=False)
             
-            id_list = data.get("esearchresult", {}).get("idlist", [])
+            id_list = result.get("idlist", [])
             if not id_list:
                 print(f"Warning: No MeSH ID found for '{term}'")
                 return []
@@ -102,22 +77,10 @@ class MeshHierarchyAnalyzer:
             mesh_id = id_list[0]
             
             # 2. Fetch details (Tree Numbers) using efetch
-            self._wait_for_api()
-            efetch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-            fetch_params = {
-                "db": "mesh",
-                "id": mesh_id,
-                "retmode": "xml",
-                "email": NCBI_EMAIL
-            }
-            if NCBI_API_KEY:
-                fetch_params["api_key"] = NCBI_API_KEY
-                
-            fetch_resp = requests.get(efetch_url, params=fetch_params, timeout=30)
-            fetch_resp.raise_for_status()
+            content = client.efetch_bytes(db="mesh", ids=[mesh_id], retmode="xml")
             
             # Parse XML
-            root = ET.fromstring(fetch_resp.content)
+            root = ET.fromstring(content)
             
             trees = []
             for tree_num in root.findall(".//TreeNumber"):
@@ -125,7 +88,7 @@ class MeshHierarchyAnalyzer:
                 
             return trees
             
-        except Exception as e:
+        except (EutilsError, ET.ParseError) as e:
             print(f"Error fetching tree numbers for '{term}': {e}")
             return []
 
@@ -1,8 +1,15 @@
 import re
+from pathlib import Path
 from typing import List, Dict, Tuple
 import os
 import sys
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.query import parse  # noqa: E402
+
 class ClinicalTrialsConverter:
     """PubMed検索式をClinicalTrials.gov形式に変換するクラス"""
     
@@ -158,30 +165,8 @@ class ClinicalTrialsConverter:
         return result
 
     def _split_or_terms(self, line: str) -> List[str]:
-        """トップレベルのOR演算子で用語を分割する。括弧内のORは分割しない。"""
-        terms = []
-        depth = 0
-        current = []
-        i = 0
-        while i < len(line):
-            ch = line[i]
-            if ch == '(':
-                depth += 1
-                current.append(ch)
-            elif ch == ')':
-                depth -= 1
-                current.append(ch)
-            elif depth == 0 and line[i:i+4].upper() == ' OR ' and i > 0:
-                terms.append(''.join(current).strip())
-                current = []
-                i += 4
-                continue
-            else:
-                current.append(ch)
-            i += 1
-        if current:
-            terms.append(''.join(current).strip())
-        return terms
+        """トップレベルのOR演算子で用語を分割する。括弧・引用符内のORは分割しない。"""
+        return parse(line).split("OR")
     
     def convert(self, pubmed_query: str) -> Dict[str, str]:
         """PubMed検索式をClinicalTrials.gov形式に変換
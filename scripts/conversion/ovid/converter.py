@@ -6,6 +6,8 @@ from dataclasses import dataclass
 import re
 from typing import Callable, List, Match, Optional, Tuple
 
+from scripts.query import split_boolean
+
 __all__ = [
     "FIELD_MAP",
     "ConvertResult",
@@ -234,60 +236,12 @@ def _apply_field(atom: str, label: str, warnings: List[str]) -> str:
     stripped = atom.strip()
     boolean_pattern = re.compile(r"\b(AND|OR|NOT)\b", re.IGNORECASE)
     
-    def has_top_level_boolean(text: str) -> bool:
-        depth = 0
-        for i, char in enumerate(text):
-            if char == '(':
-                depth += 1
-            elif char == ')':
-                depth -= 1
-            elif depth == 0:
-                match = boolean_pattern.match(text, i)
-                if match:
-                    return True
-        return False
-    
-    def split_on_boolean_respecting_parens(text: str) -> List[str]:
-        result: List[str] = []
-        current: List[str] = []
-        depth = 0
-        i = 0
-        
-        while i < len(text):
-            if text[i] == '(':
-                depth += 1
-                current.append(text[i])
-                i += 1
-            elif text[i] == ')':
-                depth -= 1
-                current.append(text[i])
-                i += 1
-            elif depth == 0:
-                match = boolean_pattern.match(text, i)
-                if match:
-                    if current:
-                        result.append(''.join(current))
-                        current = []
-                    result.append(match.group(0))
-                    i = match.end()
-                else:
-                    current.append(text[i])
-                    i += 1
-            else:
-                current.append(text[i])
-                i += 1
-        
-        if current:
-            result.append(''.join(current))
-        
-        return result
-    
     if re.search(_ADJ_RE, stripped):
-        if not has_top_level_boolean(stripped):
+        if len(split_boolean(stripped)) == 1:
             return _convert_adjacent(stripped, label)
     
     if boolean_pattern.search(stripped):
-        segments = split_on_boolean_respecting_parens(stripped)
+        segments = split_boolean(stripped)
         rebuilt: List[str] = []
         
         for segment in segments:
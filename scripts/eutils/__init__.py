@@ -0,0 +1,233 @@
+"""NCBI E-utilities 共通クライアント."""
+
+from .articles import (
+    DEFAULT_ARTICLE_CHUNK_SIZE,
+    ArticleRecord,
+    fetch_article_xml,
+    iter_article_xml,
+    iter_summaries,
+)
+from .batch import CountResult, count_many, count_many_async, count_mapping
+from .capture import (
+    CaptureMatrix,
+    blocks_from_formulas,
+    build_capture_matrix,
+    format_capture_summary,
+    split_or_terms,
+)
+from .cassette import (
+    CASSETTE_MODES,
+    Cassette,
+    CassetteMissError,
+    add_cassette_arguments,
+    apply_cassette_arguments,
+    configure_cassette,
+    create_session,
+    get_cassette,
+    set_cassette,
+)
+from .compact_set import PMID_DTYPE, PmidSet
+from .coalesce import RequestCoalescer, get_coalescer, set_coalescer
+from .client import (
+    EUTILS_BASE_URL,
+    EutilsClient,
+    EutilsError,
+    HistoryExpiredError,
+    get_client,
+    get_pubmed_count,
+    set_client,
+)
+from .count_cache import (
+    CACHE_MODES,
+    CountCache,
+    add_cache_argument,
+    apply_cache_argument,
+    configure_count_cache,
+    get_count_cache,
+    set_count_cache,
+)
+from .filter_matrix import (
+    POPULATION_ONLY,
+    FilterMatrixResult,
+    FilterMatrixSpec,
+    FilterStage,
+    MatrixCell,
+    Period,
+    load_previous_counts,
+    run_filter_matrix,
+)
+from .history import DEFAULT_MAX_HISTORY_KEYS, HistoryEngine, HistoryNode, combine
+from .medline_download import DEFAULT_BATCH_SIZE, MedlineDownload, count_medline_records, fetch_batches
+from .medline_ris import (
+    convert_medline_file,
+    convert_medline_to_ris,
+    iter_medline_records,
+    iter_ris_entries,
+    medline_record_to_ris,
+    write_ris,
+)
+from .metadata_store import (
+    DEFAULT_CROSS_CHECK_SAMPLE,
+    DEFAULT_METADATA_DIR,
+    CrossCheck,
+    MetadataRecord,
+    PmidMetadataStore,
+    UnsupportedFilterError,
+    cross_check_counts,
+    parse_metadata_xml,
+)
+from .pubmed_xml import MeshHeading, MeshQualifier, PubmedRecord, iter_pubmed_records, parse_pubmed_record
+from .seeds import DEFAULT_SEED_CHUNK_SIZE, SeedInclusion, check_seed_inclusion
+from .pmid_sets import (
+    DEFAULT_PAGE_SIZE,
+    ESEARCH_ID_CAP,
+    DateSlice,
+    PartitionedPmidSet,
+    PmidSetResult,
+    SearchResult,
+    fetch_pmid_set,
+    fetch_pmid_set_partitioned,
+    fetch_pmid_sets,
+    pdat_clause,
+    search_pmids,
+)
+from .set_analysis import (
+    DEFAULT_TARGET_RECALL,
+    OVERLAP_METRICS,
+    CoverageIndex,
+    GreedyStep,
+    OverlapMatrix,
+    TermRecommendation,
+    greedy_order,
+    leave_one_out,
+    recommend_terms,
+    removable_together,
+)
+from .year_histogram import (
+    DEFAULT_YEAR_INDEX_DIR,
+    YearIndex,
+    YearIndexStore,
+    fetch_year_index,
+    parse_pdat_window,
+)
+from .rate_limiter import (
+    AdaptiveTokenBucket,
+    TokenBucket,
+    get_rate_limiter,
+    resolve_rate_limit,
+    set_rate_limiter,
+)
+
+__all__ = [
+    "DEFAULT_ARTICLE_CHUNK_SIZE",
+    "ArticleRecord",
+    "fetch_article_xml",
+    "iter_article_xml",
+    "iter_summaries",
+    "CountResult",
+    "count_many",
+    "count_many_async",
+    "count_mapping",
+    "CaptureMatrix",
+    "blocks_from_formulas",
+    "build_capture_matrix",
+    "format_capture_summary",
+    "split_or_terms",
+    "CASSETTE_MODES",
+    "Cassette",
+    "CassetteMissError",
+    "add_cassette_arguments",
+    "apply_cassette_arguments",
+    "configure_cassette",
+    "create_session",
+    "get_cassette",
+    "set_cassette",
+    "PMID_DTYPE",
+    "PmidSet",
+    "RequestCoalescer",
+    "get_coalescer",
+    "set_coalescer",
+    "EUTILS_BASE_URL",
+    "EutilsClient",
+    "EutilsError",
+    "HistoryExpiredError",
+    "get_client",
+    "get_pubmed_count",
+    "set_client",
+    "CACHE_MODES",
+    "CountCache",
+    "add_cache_argument",
+    "apply_cache_argument",
+    "configure_count_cache",
+    "get_count_cache",
+    "set_count_cache",
+    "POPULATION_ONLY",
+    "FilterMatrixResult",
+    "FilterMatrixSpec",
+    "FilterStage",
+    "MatrixCell",
+    "Period",
+    "load_previous_counts",
+    "run_filter_matrix",
+    "DEFAULT_MAX_HISTORY_KEYS",
+    "HistoryEngine",
+    "HistoryNode",
+    "combine",
+    "DEFAULT_BATCH_SIZE",
+    "MedlineDownload",
+    "count_medline_records",
+    "fetch_batches",
+    "convert_medline_file",
+    "convert_medline_to_ris",
+    "iter_medline_records",
+    "iter_ris_entries",
+    "medline_record_to_ris",
+    "write_ris",
+    "DEFAULT_CROSS_CHECK_SAMPLE",
+    "DEFAULT_METADATA_DIR",
+    "CrossCheck",
+    "MetadataRecord",
+    "PmidMetadataStore",
+    "UnsupportedFilterError",
+    "cross_check_counts",
+    "parse_metadata_xml",
+    "DEFAULT_PAGE_SIZE",
+    "ESEARCH_ID_CAP",
+    "DateSlice",
+    "PartitionedPmidSet",
+    "PmidSetResult",
+    "SearchResult",
+    "fetch_pmid_set",
+    "fetch_pmid_set_partitioned",
+    "fetch_pmid_sets",
+    "pdat_clause",
+    "search_pmids",
+    "MeshHeading",
+    "MeshQualifier",
+    "PubmedRecord",
+    "iter_pubmed_records",
+    "parse_pubmed_record",
+    "DEFAULT_SEED_CHUNK_SIZE",
+    "SeedInclusion",
+    "check_seed_inclusion",
+    "DEFAULT_TARGET_RECALL",
+    "OVERLAP_METRICS",
+    "CoverageIndex",
+    "GreedyStep",
+    "OverlapMatrix",
+    "TermRecommendation",
+    "greedy_order",
+    "leave_one_out",
+    "recommend_terms",
+    "removable_together",
+    "DEFAULT_YEAR_INDEX_DIR",
+    "YearIndex",
+    "YearIndexStore",
+    "fetch_year_index",
+    "parse_pdat_window",
+    "AdaptiveTokenBucket",
+    "TokenBucket",
+    "get_rate_limiter",
+    "resolve_rate_limit",
+    "set_rate_limiter",
+]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+任意のPMIDリストの書誌情報をまとめて取得する（efetch XML / esummary JSON）
+
+シード論文の分析などで1件ずつ efetch / esummary を呼ぶ代わりに、PMIDを最大500件ずつに
+区切って1回で取得する。長いIDリストはクライアントが自動でPOSTに切り替えるため、
+300件のシード論文でも数回のリクエストで済む。
+
+efetch の応答は ``pubmed_xml.iter_pubmed_records()`` で1回だけ走査し、論文ごとの
+書誌情報（``PubmedRecord``）として返す。論文ごとのXML文字列は作らない。
+
+Usage:
+    from scripts.eutils.articles import iter_article_xml
+
+    for article in iter_article_xml(["21258094", "35803707"]):
+        if article.ok:
+            print(article.pmid, article.record.title)
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from .client import EutilsClient, EutilsError, get_client
+from .pubmed_xml import PubmedRecord, iter_pubmed_records
+
+# 1回の efetch / esummary で取得するPMID数
+DEFAULT_ARTICLE_CHUNK_SIZE = 500
+
+_MISSING = "PMID not returned by efetch"
+
+
+@dataclass(frozen=True)
+class ArticleRecord:
+    """1件分の efetch（XML）の結果"""
+
+    pmid: str
+    # 論文の書誌情報（取得できなかった場合は None）
+    record: Optional[PubmedRecord] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.record is not None
+
+
+def _unique_pmids(pmids: Iterable[Any]) -> List[str]:
+    return list(dict.fromkeys(str(pmid).strip() for pmid in pmids if str(pmid).strip()))
+
+
+def _chunks(pmids: List[str], chunk_size: int) -> Iterator[List[str]]:
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    for start in range(0, len(pmids), chunk_size):
+        yield pmids[start:start + chunk_size]
+
+
+def iter_article_xml(
+    pmids: Iterable[Any],
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    chunk_size: int = DEFAULT_ARTICLE_CHUNK_SIZE,
+) -> Iterator[ArticleRecord]:
+    """
+    PMIDごとの efetch（XML）の結果を、入力の順に（重複を除いて）返す
+
+    ``chunk_size`` 件ずつ1回の efetch で取得し、取得したチャンクから順に返す。
+    チャンクの取得に失敗した場合や応答に含まれないPMIDは ``error`` を持つ結果になる。
+    """
+    client = client or get_client()
+    for chunk in _chunks(_unique_pmids(pmids), chunk_size):
+        try:
+            data = client.efetch_bytes(db=db, ids=chunk, retmode="xml")
+            found = {record.pmid: record for record in iter_pubmed_records(data)}
+        except EutilsError as exc:
+            for pmid in chunk:
+                yield ArticleRecord(pmid=pmid, error=str(exc))
+            continue
+        except etree.XMLSyntaxError as exc:
+            for pmid in chunk:
+                yield ArticleRecord(pmid=pmid, error=f"Invalid XML: {exc}")
+            continue
+        for pmid in chunk:
+            if pmid in found:
+                yield ArticleRecord(pmid=pmid, record=found.pop(pmid))
+            else:
+                yield ArticleRecord(pmid=pmid, error=_MISSING)
+
+
+def fetch_article_xml(
+    pmids: Iterable[Any],
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    chunk_size: int = DEFAULT_ARTICLE_CHUNK_SIZE,
+) -> Dict[str, ArticleRecord]:
+    """``iter_article_xml()`` の結果をPMIDごとの辞書にまとめる"""
+    return {article.pmid: article for article in iter_article_xml(pmids, client=client, db=db, chunk_size=chunk_size)}
+
+
+def iter_summaries(
+    pmids: Iterable[Any],
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    chunk_size: int = DEFAULT_ARTICLE_CHUNK_SIZE,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    PMIDごとの esummary（JSON）を、入力の順に（重複を除いて）(PMID, 要約) で返す
+
+    取得できなかったPMIDの要約は ``{"error": ...}`` になる。
+    """
+    client = client or get_client()
+    for chunk in _chunks(_unique_pmids(pmids), chunk_size):
+        try:
+            result = client.esummary(db=db, ids=chunk)
+        except EutilsError as exc:
+            for pmid in chunk:
+                yield pmid, {"error": str(exc)}
+            continue
+        for pmid in chunk:
+            summary = result.get(pmid)
+            if not isinstance(summary, dict):
+                summary = {"error": "PMID not returned by esummary"}
+            yield pmid, summary
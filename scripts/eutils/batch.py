@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+esearch件数の並列バッチ実行
+
+互いに依存しない検索式（ブロック内の各行、フィルターの組み合わせなど）を
+asyncio で同時に最大 N 件まで投げ、件数をまとめて返す。
+HTTP呼び出し自体は共通クライアント（requests）をワーカースレッドで実行するため、
+レート制御・リトライ・件数キャッシュはそのまま適用される。
+
+同時実行数の決定順:
+    1. 引数 max_in_flight
+    2. 環境変数 NCBI_MAX_IN_FLIGHT
+    3. リミッターのレート（rps）の切り上げ
+
+Usage:
+    from scripts.eutils.batch import count_many
+
+    results = count_many(['ikigai[tiab]', '"work engagement"[tiab]'])
+    for r in results:
+        print(r.query, r.count if r.success else r.error)
+"""
+
+import asyncio
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, TypeVar
+
+from .client import EutilsClient, get_client
+
+K = TypeVar("K", bound=Hashable)
+
+
+@dataclass(frozen=True)
+class CountResult:
+    """1件の検索式に対する件数取得結果（失敗時は error にメッセージ）"""
+
+    query: str
+    count: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and self.count is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """``get_pubmed_count`` と同じ辞書形式に変換する"""
+        return {
+            "count": self.count,
+            "query": self.query,
+            "message": "Success" if self.success else self.error,
+            "success": self.success,
+        }
+
+
+ProgressCallback = Callable[[int, int, CountResult], None]
+
+
+def resolve_max_in_flight(client: EutilsClient, max_in_flight: Optional[int] = None) -> int:
+    """同時実行数を決定する"""
+    if max_in_flight is None:
+        raw = os.getenv("NCBI_MAX_IN_FLIGHT")
+        if raw:
+            try:
+                max_in_flight = int(raw)
+            except ValueError:
+                max_in_flight = None
+    if max_in_flight is None:
+        max_in_flight = math.ceil(client.rate_limiter.rate)
+    return max(1, max_in_flight)
+
+
+async def count_many_async(
+    queries: Sequence[str],
+    max_in_flight: Optional[int] = None,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    strict: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> List[CountResult]:
+    """
+    複数の検索式の件数を並列に取得する
+
+    Args:
+        queries: 検索式のリスト
+        max_in_flight: 同時に実行するリクエスト数の上限
+        client: 使用するクライアント（省略時は共有クライアント）
+        db: データベース名
+        strict: errorlist を失敗として扱うか
+        progress: 1件完了するごとに (完了数, 総数, 結果) で呼ばれる関数
+
+    Returns:
+        ``queries`` と同じ順序の結果リスト。個々の失敗は例外にせず CountResult.error に残す
+    """
+    client = client or get_client()
+    limit = resolve_max_in_flight(client, max_in_flight)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(limit)
+    total = len(queries)
+    completed = 0
+
+    with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="eutils-count") as executor:
+
+        async def run_one(query: str) -> CountResult:
+            nonlocal completed
+            async with semaphore:
+                try:
+                    count = await loop.run_in_executor(
+                        executor, lambda: client.count(query, db=db, strict=strict)
+                    )
+                    result = CountResult(query=query, count=count)
+                except Exception as exc:  # 1件の失敗で他の結果を失わない
+                    result = CountResult(query=query, error=str(exc) or type(exc).__name__)
+            completed += 1
+            if progress:
+                progress(completed, total, result)
+            return result
+
+        return list(await asyncio.gather(*(run_one(query) for query in queries)))
+
+
+def count_many(
+    queries: Sequence[str],
+    max_in_flight: Optional[int] = None,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    strict: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> List[CountResult]:
+    """
+    ``count_many_async`` の同期版
+
+    イベントループ実行中（Jupyter など）は ``count_many_async`` を await すること。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("count_many() cannot be called from a running event loop; await count_many_async()")
+    return asyncio.run(
+        count_many_async(
+            queries,
+            max_in_flight=max_in_flight,
+            client=client,
+            db=db,
+            strict=strict,
+            progress=progress,
+        )
+    )
+
+
+def count_mapping(
+    queries: Mapping[K, str],
+    max_in_flight: Optional[int] = None,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    strict: bool = True,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[K, CountResult]:
+    """名前付きの検索式をまとめて実行し、同じキーで結果を返す"""
+    keys = list(queries.keys())
+    results = count_many(
+        [queries[key] for key in keys],
+        max_in_flight=max_in_flight,
+        client=client,
+        db=db,
+        strict=strict,
+        progress=progress,
+    )
+    return dict(zip(keys, results))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+検索語 × シード論文の捕捉行列
+
+各ブロックのOR項ごとに ``(検索語) AND (シードPMIDのuid列)`` を1回ずつ検索し、
+どのシード論文を捕捉するかを NumPy の真偽値行列（検索語 × シード）にまとめる。
+通信回数は (検索語, シード) の組ではなく検索語の数に比例する。
+
+検索式は「ブロック同士の AND、ブロック内は OR」とみなして、行列だけから
+- 検索されないシードと、満たしていないブロック（非包含の原因）
+- ブロックごとの感度（シードのうち捕捉できる割合）
+- ブロックごとに同じシードを捕捉する最小の検索語の組（貪欲法）
+を計算する。
+
+Usage:
+    from scripts.eutils.capture import build_capture_matrix
+
+    matrix = build_capture_matrix(
+        {"Population": ['"Physicians"[Mesh]', "physician*[tiab]"], "Concept": ["ikigai[tiab]"]},
+        seeds=["12345678", "23456789"],
+    )
+    print(matrix.to_markdown())
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from scripts.query import parse
+
+from .batch import resolve_max_in_flight
+from .client import EutilsClient, get_client
+from .seeds import DEFAULT_SEED_CHUNK_SIZE, check_seed_inclusion, normalize_pmids
+
+
+def split_or_terms(block: str) -> List[str]:
+    """ブロックをトップレベルの OR で検索語に分割する（括弧・引用符の中は分割しない）"""
+    return parse(block).split("OR")
+
+
+@dataclass
+class CaptureMatrix:
+    """検索語 × シード論文の捕捉行列"""
+
+    seeds: List[str]
+    terms: List[str]
+    blocks: List[str]
+    # 各検索語が属するブロックの番号（blocks のインデックス）
+    term_blocks: np.ndarray
+    # matrix[i, j]: 検索語 i がシード j を捕捉する
+    matrix: np.ndarray
+    # 検索に失敗した検索語とエラーメッセージ（その行はすべて False）
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def block_terms(self, block: str) -> List[str]:
+        """ブロックに属する検索語"""
+        index = self.blocks.index(block)
+        return [term for term, b in zip(self.terms, self.term_blocks) if b == index]
+
+    def term_matrix(self, block: str) -> np.ndarray:
+        """ブロック内の検索語 × シードの捕捉行列（block_terms と同じ順）"""
+        return self.matrix[self.term_blocks == self.blocks.index(block)]
+
+    def block_matrix(self) -> np.ndarray:
+        """ブロック × シードの捕捉行列（ブロック内の検索語の OR）"""
+        result = np.zeros((len(self.blocks), len(self.seeds)), dtype=bool)
+        for index in range(len(self.blocks)):
+            rows = self.matrix[self.term_blocks == index]
+            if len(rows):
+                result[index] = rows.any(axis=0)
+        return result
+
+    def formula_capture(self) -> np.ndarray:
+        """検索式全体（ブロックの AND）でシードが捕捉されるか"""
+        if not self.blocks:
+            return np.zeros(len(self.seeds), dtype=bool)
+        return self.block_matrix().all(axis=0)
+
+    def captured_seeds(self) -> List[str]:
+        return [seed for seed, hit in zip(self.seeds, self.formula_capture()) if hit]
+
+    def missed_seeds(self) -> List[str]:
+        return [seed for seed, hit in zip(self.seeds, self.formula_capture()) if not hit]
+
+    def block_sensitivity(self) -> Dict[str, float]:
+        """ブロックごとの感度（捕捉できるシードの割合）"""
+        if not self.seeds:
+            return {block: 0.0 for block in self.blocks}
+        rates = self.block_matrix().mean(axis=1)
+        return {block: float(rate) for block, rate in zip(self.blocks, rates)}
+
+    def seed_terms(self, seed: str) -> List[str]:
+        """シードを捕捉する検索語"""
+        column = self.matrix[:, self.seeds.index(seed)]
+        return [term for term, hit in zip(self.terms, column) if hit]
+
+    def miss_analysis(self) -> Dict[str, List[str]]:
+        """検索されないシード → 満たしていないブロック"""
+        blocks = self.block_matrix()
+        return {
+            seed: [block for block, hit in zip(self.blocks, blocks[:, j]) if not hit]
+            for j, seed in enumerate(self.seeds)
+            if not blocks[:, j].all()
+        }
+
+    def minimal_terms(self, block: str) -> List[str]:
+        """ブロックが捕捉するシードをすべて捕捉できる検索語の組（貪欲法による近似最小解）"""
+        index = self.blocks.index(block)
+        rows = np.flatnonzero(self.term_blocks == index)
+        uncovered = self.matrix[rows].any(axis=0) if len(rows) else np.zeros(len(self.seeds), dtype=bool)
+        chosen = []
+        while uncovered.any():
+            gains = (self.matrix[rows] & uncovered).sum(axis=1)
+            best = int(np.argmax(gains))
+            chosen.append(self.terms[rows[best]])
+            uncovered &= ~self.matrix[rows[best]]
+        return chosen
+
+    def summary(self) -> Dict[str, Any]:
+        """レポート用の集計（JSONに保存できる形式）"""
+        capture_counts = self.matrix.sum(axis=1)
+        # ブロック内でその検索語だけが捕捉するシードの数
+        block_hits = np.zeros_like(self.matrix, dtype=int)
+        for index in range(len(self.blocks)):
+            rows = self.term_blocks == index
+            block_hits[rows] = self.matrix[rows].sum(axis=0)
+        unique_counts = (self.matrix & (block_hits == 1)).sum(axis=1)
+        return {
+            "seeds": list(self.seeds),
+            "captured": self.captured_seeds(),
+            "missed": self.miss_analysis(),
+            "block_sensitivity": self.block_sensitivity(),
+            "minimal_terms": {block: self.minimal_terms(block) for block in self.blocks},
+            "terms": [
+                {
+                    "term": term,
+                    "block": self.blocks[self.term_blocks[i]],
+                    "captured": int(capture_counts[i]),
+                    "unique": int(unique_counts[i]),
+                }
+                for i, term in enumerate(self.terms)
+            ],
+            "errors": dict(self.errors),
+        }
+
+    def to_markdown(self) -> str:
+        return format_capture_summary(self.summary())
+
+
+def format_capture_summary(summary: Mapping[str, Any]) -> str:
+    """``CaptureMatrix.summary()`` をMarkdownの節にする"""
+    total = len(summary["seeds"])
+    lines = ["## Seed Capture Matrix", ""]
+    lines.append(f"- **Seeds captured by the whole formula**: {len(summary['captured'])}/{total}")
+    lines.append("")
+    lines.append("| Block | Sensitivity | Minimal terms |")
+    lines.append("|-------|-------------|---------------|")
+    for block, rate in summary["block_sensitivity"].items():
+        minimal = summary["minimal_terms"].get(block, [])
+        lines.append(f"| {block} | {rate * 100:.1f}% | {len(minimal)} |")
+    lines.append("")
+
+    lines.append("| Term | Block | Seeds captured | Unique in block |")
+    lines.append("|------|-------|----------------|-----------------|")
+    for row in summary["terms"]:
+        term = row["term"] if len(row["term"]) <= 80 else row["term"][:80] + "..."
+        lines.append(f"| `{term}` | {row['block']} | {row['captured']} | {row['unique']} |")
+    lines.append("")
+
+    if summary["missed"]:
+        lines.append("### Missed seeds")
+        lines.append("")
+        for seed, blocks in summary["missed"].items():
+            lines.append(f"- PMID {seed}: not matched by {', '.join(blocks)}")
+        lines.append("")
+
+    for block, terms in summary["minimal_terms"].items():
+        lines.append(f"### Minimal term set - {block}")
+        lines.append("")
+        lines.extend(f"- `{term}`" for term in terms)
+        lines.append("")
+
+    if summary["errors"]:
+        lines.append("### Errors")
+        lines.append("")
+        lines.extend(f"- `{term}`: {error}" for term, error in summary["errors"].items())
+        lines.append("")
+    return "\n".join(lines)
+
+
+def build_capture_matrix(
+    blocks: Mapping[str, Iterable[str]],
+    seeds: Iterable[str],
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    max_in_flight: Optional[int] = None,
+    chunk_size: int = DEFAULT_SEED_CHUNK_SIZE,
+    strict: bool = True,
+) -> CaptureMatrix:
+    """
+    各ブロックの検索語ごとに、どのシード論文を捕捉するかを調べる
+
+    Args:
+        blocks: ブロック名 → 検索語（OR項）のリスト
+        seeds: シード論文のPMID
+        client: 使用するクライアント（省略時は共有クライアント）
+        db: データベース名
+        max_in_flight: 同時に実行するリクエスト数（省略時はレート上限に合わせる）
+        chunk_size: 1回の esearch に含めるPMIDの数
+        strict: errorlist（phrasesnotfound など）を失敗として扱うか
+    """
+    client = client or get_client()
+    seeds = normalize_pmids(seeds)
+    names = list(blocks)
+    terms: List[str] = []
+    term_blocks: List[int] = []
+    for index, name in enumerate(names):
+        for term in blocks[name]:
+            terms.append(term)
+            term_blocks.append(index)
+
+    def run(term: str):
+        return check_seed_inclusion(term, seeds, client=client, db=db, chunk_size=chunk_size, strict=strict)
+
+    workers = min(resolve_max_in_flight(client, max_in_flight), max(1, len(terms)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        inclusions = list(pool.map(run, terms))
+
+    matrix = np.zeros((len(terms), len(seeds)), dtype=bool)
+    errors: Dict[str, str] = {}
+    position = {seed: j for j, seed in enumerate(seeds)}
+    for i, (term, inclusion) in enumerate(zip(terms, inclusions)):
+        matrix[i, [position[seed] for seed in inclusion.captured]] = True
+        if inclusion.errors:
+            errors[term] = next(iter(inclusion.errors.values()))
+
+    return CaptureMatrix(
+        seeds=seeds,
+        terms=terms,
+        blocks=names,
+        term_blocks=np.asarray(term_blocks, dtype=int),
+        matrix=matrix,
+        errors=errors,
+    )
+
+
+def blocks_from_formulas(blocks: Mapping[str, str]) -> Dict[str, List[str]]:
+    """ブロック名 → ブロックの検索式 を ブロック名 → OR項のリスト に変換する"""
+    return {name: split_or_terms(text) for name, text in blocks.items() if text and text.strip()}
+
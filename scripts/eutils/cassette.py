@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+HTTP通信の記録・再生（カセット）
+
+共通HTTP層（``create_session()`` が返す ``requests.Session``）に差し込む
+トランスポートアダプター。E-utilities（esearch JSON / efetch XML・MEDLINE）、
+ERIC API（JSON）、AIO（HTML・RIS）の通信を区別なく扱う。
+
+- record: 実際に通信し、リクエスト→レスポンスを保存する
+- replay: 保存済みのレスポンスだけを返す（通信しない・レート制御の待機もしない）
+
+保存形式（コンテンツアドレス方式）:
+    DIR/requests/<先頭2文字>/<リクエストのSHA-256>.json   メタデータ（状態コード・ヘッダー・本文のハッシュ）
+    DIR/bodies/<先頭2文字>/<本文のSHA-256>.gz              gzip圧縮した本文（同一本文は1ファイル）
+
+リクエストのキーには api_key / tool / email / CSRFトークン（_token）を含めないため、
+APIキーの有無やセッションが違っても同じ記録を再生できる。
+
+有効化:
+    1. CLIの ``--record DIR`` / ``--replay DIR``（``add_cassette_arguments`` を使うスクリプト）
+    2. 環境変数 HTTP_CASSETTE_RECORD / HTTP_CASSETTE_REPLAY（引数を持たないスクリプト向け）
+
+Usage:
+    python scripts/search/validation/recount_with_5years.py --record .cache/cassettes/recount
+    python scripts/search/validation/recount_with_5years.py --replay .cache/cassettes/recount
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_MODES = ("record", "replay")
+# 結果に影響しない・実行ごとに変わるパラメータ
+VOLATILE_PARAMS = frozenset({"api_key", "tool", "email", "_token"})
+# 再生時に復元するレスポンスヘッダー
+_KEPT_HEADERS = ("Content-Type", "Location", "Retry-After")
+
+
+class CassetteMissError(RuntimeError):
+    """再生モードで、記録にないリクエストが発行された"""
+
+
+def _request_params(request: requests.PreparedRequest) -> List[Tuple[str, str]]:
+    """URLのクエリとフォーム本文をまとめたパラメータのリスト"""
+    params = parse_qsl(urlsplit(request.url).query, keep_blank_values=True)
+    body = request.body
+    content_type = request.headers.get("Content-Type", "")
+    if body and "application/x-www-form-urlencoded" in content_type:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        params.extend(parse_qsl(body, keep_blank_values=True))
+    elif body:
+        raw = body if isinstance(body, bytes) else str(body).encode("utf-8")
+        params.append(("__body_sha256__", hashlib.sha256(raw).hexdigest()))
+    return params
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    """リクエストの正規化キー（SHA-256）"""
+    parts = urlsplit(request.url)
+    canonical = {
+        "method": request.method,
+        "url": urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")),
+        "params": sorted(
+            (key, value) for key, value in _request_params(request) if key not in VOLATILE_PARAMS
+        ),
+    }
+    payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """1つの記録ディレクトリ"""
+
+    def __init__(self, directory: Path, mode: str):
+        """
+        Args:
+            directory: 記録ディレクトリ
+            mode: "record" または "replay"
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode} (expected one of {CASSETTE_MODES})")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.hits = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / "requests" / key[:2] / f"{key}.json"
+
+    def _body_path(self, digest: str) -> Path:
+        return self.directory / "bodies" / digest[:2] / f"{digest}.gz"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def save(self, request: requests.PreparedRequest, response: requests.Response) -> None:
+        """レスポンスを記録する（同じリクエストは最新のもので上書き）"""
+        body = response.content or b""
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = self._body_path(digest)
+        if not body_path.exists():
+            self._write_atomic(body_path, gzip.compress(body, mtime=0))
+
+        entry = {
+            "method": request.method,
+            "url": request.url,
+            "status_code": response.status_code,
+            "reason": response.reason,
+            "headers": {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers},
+            "encoding": response.encoding,
+            "body_sha256": digest,
+        }
+        data = json.dumps(entry, ensure_ascii=False, indent=2).encode("utf-8")
+        self._write_atomic(self._entry_path(request_key(request)), data)
+        with self._lock:
+            self.recorded += 1
+
+    def load(self, request: requests.PreparedRequest) -> requests.Response:
+        """記録済みのレスポンスを返す"""
+        path = self._entry_path(request_key(request))
+        if not path.exists():
+            raise CassetteMissError(f"No recorded response for {request.method} {request.url} in {self.directory}")
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        body = gzip.decompress(self._body_path(entry["body_sha256"]).read_bytes())
+
+        response = requests.Response()
+        response.status_code = entry["status_code"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        response.encoding = entry.get("encoding")
+        response.url = request.url
+        response.request = request
+        response._content = body
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def __len__(self) -> int:
+        return sum(1 for _ in (self.directory / "requests").glob("*/*.json"))
+
+
+_ACTIVE: Optional[Cassette] = None
+_ACTIVE_CONFIGURED = False
+_ACTIVE_LOCK = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """有効なカセットを返す（未設定なら環境変数から決定、無効なら None）"""
+    global _ACTIVE, _ACTIVE_CONFIGURED
+    with _ACTIVE_LOCK:
+        if not _ACTIVE_CONFIGURED:
+            record = os.getenv("HTTP_CASSETTE_RECORD")
+            replay = os.getenv("HTTP_CASSETTE_REPLAY")
+            if record and replay:
+                raise ValueError("HTTP_CASSETTE_RECORD and HTTP_CASSETTE_REPLAY cannot both be set")
+            if record:
+                _ACTIVE = Cassette(Path(record), "record")
+            elif replay:
+                _ACTIVE = Cassette(Path(replay), "replay")
+            _ACTIVE_CONFIGURED = True
+        return _ACTIVE
+
+
+def set_cassette(cassette: Optional[Cassette]) -> None:
+    """カセットを差し替える（None で次回呼び出し時に環境変数から再設定）"""
+    global _ACTIVE, _ACTIVE_CONFIGURED
+    with _ACTIVE_LOCK:
+        _ACTIVE = cassette
+        _ACTIVE_CONFIGURED = cassette is not None
+
+
+def configure_cassette(record: Optional[Path] = None, replay: Optional[Path] = None) -> Optional[Cassette]:
+    """記録・再生のどちらかを有効にする（両方 None なら環境変数の設定を使う）"""
+    if record and replay:
+        raise ValueError("--record and --replay cannot be used together")
+    if record:
+        set_cassette(Cassette(Path(record), "record"))
+    elif replay:
+        set_cassette(Cassette(Path(replay), "replay"))
+    return get_cassette()
+
+
+def is_replaying() -> bool:
+    """再生モードなら True（レート制御の待機を省略するために使う）"""
+    cassette = get_cassette()
+    return cassette is not None and cassette.mode == "replay"
+
+
+class CassetteAdapter(HTTPAdapter):
+    """有効なカセットに応じて記録・再生する ``HTTPAdapter``"""
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        cassette = get_cassette()
+        if cassette is None:
+            return super().send(request, **kwargs)
+        if cassette.mode == "replay":
+            return cassette.load(request)
+        response = super().send(request, **kwargs)
+        cassette.save(request, response)
+        return response
+
+
+def create_session() -> requests.Session:
+    """記録・再生に対応した ``requests.Session`` を作る"""
+    session = requests.Session()
+    adapter = CassetteAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def add_cassette_arguments(parser: Any) -> None:
+    """argparse に ``--record DIR`` / ``--replay DIR`` を追加する"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record",
+        type=Path,
+        metavar="DIR",
+        default=None,
+        help="HTTP通信をDIRに記録する（HTTP_CASSETTE_RECORD でも指定可）",
+    )
+    group.add_argument(
+        "--replay",
+        type=Path,
+        metavar="DIR",
+        default=None,
+        help="DIRに記録した通信を再生し、ネットワークに接続しない（HTTP_CASSETTE_REPLAY でも指定可）",
+    )
+
+
+def apply_cassette_arguments(args: Any) -> Optional[Cassette]:
+    """``add_cassette_arguments`` で追加した引数を反映する"""
+    return configure_cassette(record=getattr(args, "record", None), replay=getattr(args, "replay", None))
+
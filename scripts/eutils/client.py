@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+NCBI E-utilities 共通クライアント
+
+各スクリプトに散在していた ``get_pubmed_count`` / ``get_pubmed_results`` の
+実装を1か所にまとめたもの。
+
+- ``requests.Session`` による接続プール
+- プロセス共有のトークンバケットによるレート制御（固定sleepなし、429で自動減速するAIMD）
+- 429 / 5xx / 通信エラー / API側エラーに対する指数バックオフ付きリトライ
+- URLが長すぎる場合の自動POST切り替え
+- 件数取得（``count``）のSQLiteキャッシュ（``count_cache`` 参照）
+- 同一リクエストの合流（``coalesce`` 参照）
+- 通信の記録・再生（``cassette`` 参照。再生時はレート制御の待機なし）
+
+Usage:
+    from scripts.eutils import get_client, get_pubmed_count
+
+    count = get_client().count('"Physicians"[Mesh]')
+    result = get_pubmed_count('"Physicians"[Mesh]')  # {'count', 'query', 'message', 'success'}
+"""
+
+import os
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import requests
+
+from .cassette import create_session, is_replaying
+from .coalesce import RequestCoalescer, get_coalescer
+from .count_cache import CountCache, get_count_cache, normalize_query
+from .rate_limiter import TokenBucket, get_rate_limiter
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # Optional dependency
+    load_dotenv = None
+
+if load_dotenv:
+    load_dotenv()
+
+EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 2.0
+# E-utilities starts rejecting >~2000 char URLs with HTTP 414
+MAX_GET_URL_LENGTH = 1900
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class EutilsError(Exception):
+    """E-utilities呼び出しの失敗（リトライ上限到達を含む）"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class HistoryExpiredError(EutilsError):
+    """WebEnv / query_key が失効している（履歴の作り直しが必要）"""
+
+
+_HISTORY_ERROR_RE = re.compile(r"query\s*#|query_key|webenv", re.IGNORECASE)
+
+
+def _parse_retry_after(response: requests.Response) -> Optional[float]:
+    """Retry-After ヘッダー（秒数）を解釈する"""
+    raw = response.headers.get("Retry-After")
+    if not raw:
+        return None
+    try:
+        return max(float(raw), 0.0)
+    except ValueError:
+        return None
+
+
+def _check_esearch_result(data: Any, strict: bool = True) -> Dict[str, Any]:
+    """
+    esearch のJSONを検証し ``esearchresult`` 部分を返す
+
+    ``strict`` が True の場合、errorlist（phrasesnotfound など）も失敗として扱う。
+    """
+    if not isinstance(data, dict):
+        raise EutilsError("Unexpected esearch response", retryable=True)
+    if data.get("error"):
+        raise EutilsError(f"API error: {data['error']}", retryable=True)
+
+    result = data.get("esearchresult")
+    if not isinstance(result, dict):
+        raise EutilsError("API response missing 'esearchresult'", retryable=True)
+    if result.get("ERROR"):
+        if _HISTORY_ERROR_RE.search(str(result["ERROR"])):
+            # 失効した履歴は再試行しても復活しないため呼び出し側で作り直す
+            raise HistoryExpiredError(f"API error: {result['ERROR']}")
+        raise EutilsError(f"API error: {result['ERROR']}", retryable=True)
+
+    # phrasesnotfound などは再試行しても結果が変わらないため即座に失敗とする
+    error_list = result.get("errorlist") or {}
+    if strict and any(error_list.values()):
+        raise EutilsError(f"API error: {error_list}")
+
+    count_str = result.get("count")
+    if count_str is None:
+        raise EutilsError("API response missing 'count'", retryable=True)
+    try:
+        int(count_str)
+    except (TypeError, ValueError):
+        raise EutilsError(f"Invalid count value: {count_str}", retryable=True)
+    return result
+
+
+class EutilsClient:
+    """
+    E-utilities クライアント
+
+    Example:
+        >>> client = EutilsClient()
+        >>> client.count('ikigai[tiab]')
+        412
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        tool: Optional[str] = None,
+        email: Optional[str] = None,
+        base_url: Optional[str] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        session: Optional[requests.Session] = None,
+        timeout: float = REQUEST_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+        count_cache: Optional[CountCache] = None,
+        coalescer: Optional[RequestCoalescer] = None,
+    ):
+        """
+        Args:
+            api_key: NCBI APIキー（省略時は NCBI_API_KEY）
+            tool: NCBIに登録したツール名（省略時は NCBI_TOOL）
+            email: 連絡先メールアドレス（省略時は NCBI_EMAIL）
+            base_url: E-utilities のベースURL（省略時は NCBI_EUTILS_BASE_URL または本番URL）
+            rate_limiter: 使用するリミッター（省略時はプロセス共有のもの）
+            session: 使用する requests.Session（省略時は記録・再生対応のものを新規作成）
+            timeout: 1リクエストのタイムアウト秒数
+            max_retries: 最大試行回数
+            backoff_seconds: 指数バックオフの基準秒数
+            count_cache: ``count()`` で使う件数キャッシュ（省略時はキャッシュなし）
+            coalescer: 同一リクエストを合流させる仕組み（省略時は合流なし）
+        """
+        self.api_key = api_key or os.getenv("NCBI_API_KEY") or None
+        self.tool = tool or os.getenv("NCBI_TOOL") or None
+        self.email = email or os.getenv("NCBI_EMAIL") or None
+        self.base_url = (base_url or os.getenv("NCBI_EUTILS_BASE_URL") or EUTILS_BASE_URL).rstrip("/")
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.session = session or create_session()
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.backoff_seconds = backoff_seconds
+        self.count_cache = count_cache
+        self.coalescer = coalescer
+
+    @property
+    def common_params(self) -> Dict[str, str]:
+        """すべてのリクエストに付与する api_key / tool / email"""
+        params: Dict[str, str] = {}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        if self.tool:
+            params["tool"] = self.tool
+        if self.email:
+            params["email"] = self.email
+        return params
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/{endpoint}"
+
+    def _should_use_post(self, url: str, params: Dict[str, Any]) -> bool:
+        """Return True when the GET URL would exceed common length limits."""
+        prepared = requests.Request("GET", url, params=params).prepare()
+        return len(prepared.url) >= MAX_GET_URL_LENGTH
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> None:
+        delay = self.backoff_seconds * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        time.sleep(delay)
+
+    def _coalesce_key(self, endpoint: str, params: Dict[str, Any], variant: str) -> Hashable:
+        """
+        合流用のキーを作る
+
+        api_key / tool / email は結果に影響しないため含めない。
+        検索式は件数キャッシュと同じ規則で正規化する。
+        """
+        canonical = []
+        for key, value in sorted(params.items()):
+            value = str(value)
+            if key == "term":
+                value = normalize_query(value)
+            canonical.append((key, value))
+        return (self.base_url, endpoint, variant, tuple(canonical))
+
+    def call(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        parse: Callable[[requests.Response], Any] = lambda response: response,
+        method: Optional[str] = None,
+        coalesce: Optional[str] = None,
+        retain: bool = True,
+    ) -> Any:
+        """
+        E-utilities エンドポイントを呼び出し、``parse`` の結果を返す
+
+        ``parse`` が ``EutilsError(retryable=True)`` や ``ValueError`` を送出した場合も
+        HTTPエラーと同じくバックオフしてリトライする。
+
+        Args:
+            endpoint: "esearch.fcgi" などのエンドポイント名
+            params: クエリパラメータ（共通パラメータは自動付与）
+            parse: レスポンスを解釈する関数
+            method: "GET" / "POST"（省略時はURL長で自動判定）
+            coalesce: 合流を許可する場合に ``parse`` の種類を表す文字列。
+                ``coalescer`` が設定されていれば、同じパラメータ・同じ種類の
+                呼び出しはHTTP呼び出しと解析結果を共有する
+            retain: False なら合流は実行中のみとし、完了した結果を合流器に残さない
+                （efetch 本文のような大きな結果をメモリに溜めないため）
+
+        Raises:
+            EutilsError: リトライ上限に達した、またはリトライ不能なエラー
+        """
+        if coalesce is not None and self.coalescer is not None:
+            key = self._coalesce_key(endpoint, params, coalesce)
+            return self.coalescer.run(
+                key, lambda: self._request(endpoint, params, parse, method), retain=retain
+            )
+        return self._request(endpoint, params, parse, method)
+
+    def _request(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        parse: Callable[[requests.Response], Any],
+        method: Optional[str],
+    ) -> Any:
+        """リトライ付きで1回分の呼び出しを行う（``call`` の本体）"""
+        url = self._url(endpoint)
+        payload = dict(params)
+        payload.update(self.common_params)
+        if method is None:
+            method = "POST" if self._should_use_post(url, payload) else "GET"
+
+        last_error = "Unknown error"
+        for attempt in range(1, self.max_retries + 1):
+            retry_after = None
+            try:
+                if not is_replaying():
+                    self.rate_limiter.acquire()
+                if method == "POST":
+                    response = self.session.post(url, data=payload, timeout=self.timeout)
+                else:
+                    response = self.session.get(url, params=payload, timeout=self.timeout)
+
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    retry_after = _parse_retry_after(response)
+                    if response.status_code == 429:
+                        last_error = "HTTP 429: API rate limit exceeded"
+                    else:
+                        last_error = f"HTTP {response.status_code}"
+                    if response.status_code == 429 or retry_after is not None:
+                        self.rate_limiter.on_throttle(retry_after)
+                else:
+                    response.raise_for_status()
+                    result = parse(response)
+                    self.rate_limiter.on_success()
+                    return result
+
+            except EutilsError as exc:
+                if not exc.retryable:
+                    raise
+                last_error = str(exc)
+            except (requests.exceptions.RequestException, ValueError) as exc:
+                last_error = str(exc)
+
+            if attempt < self.max_retries:
+                self._backoff(attempt, retry_after)
+
+        raise EutilsError(f"Error after {self.max_retries} attempts: {last_error}")
+
+    def esearch(
+        self,
+        term: str,
+        db: str = "pubmed",
+        retmax: int = 0,
+        retstart: int = 0,
+        strict: bool = True,
+        **extra: Any,
+    ) -> Dict[str, Any]:
+        """
+        esearch を実行し ``esearchresult`` を返す
+
+        Args:
+            term: 検索式
+            db: データベース名
+            retmax: 返すIDの最大数（0なら件数のみ）
+            retstart: 先頭からのオフセット
+            strict: errorlist を失敗として扱うか（MeSH照合などでは False）
+            **extra: usehistory, WebEnv, sort などの追加パラメータ
+        """
+        params: Dict[str, Any] = {
+            "db": db,
+            "term": term,
+            "retmode": "json",
+            "retmax": str(retmax),
+        }
+        if retstart:
+            params["retstart"] = str(retstart)
+        params.update({key: value for key, value in extra.items() if value is not None})
+        return self.call(
+            "esearch.fcgi",
+            params,
+            parse=lambda response: _check_esearch_result(response.json(), strict),
+            # usehistory はサーバー側の履歴を変更するため共有しない
+            coalesce=None if params.get("usehistory") else ("strict" if strict else "lenient"),
+        )
+
+    def count(self, term: str, db: str = "pubmed", strict: bool = True) -> int:
+        """
+        検索式のヒット件数を返す
+
+        ``count_cache`` が設定されていればキャッシュを参照・更新する。
+        errorlist 付きの結果はキャッシュしない。NCBI以外のサーバー（スタブなど）の件数は
+        サーバーごとに別に保存する。
+        """
+        cache = self.count_cache
+        server = None if self.base_url == EUTILS_BASE_URL else self.base_url
+        if cache is not None:
+            cached = cache.get(db, term, base_url=server)
+            if cached is not None:
+                return cached
+
+        result = self.esearch(term, db=db, strict=strict)
+        count = int(result["count"])
+        if cache is not None and not any((result.get("errorlist") or {}).values()):
+            cache.put(db, term, count, base_url=server)
+        return count
+
+    def search_ids(self, term: str, db: str = "pubmed", retmax: int = 10000) -> Tuple[int, List[str]]:
+        """検索式のヒット件数とIDリスト（最大 ``retmax`` 件）を返す"""
+        result = self.esearch(term, db=db, retmax=retmax)
+        return int(result["count"]), list(result.get("idlist", []))
+
+    def efetch(
+        self,
+        db: str = "pubmed",
+        ids: Optional[Iterable[str]] = None,
+        **params: Any,
+    ) -> str:
+        """
+        efetch を実行し本文テキストを返す
+
+        Args:
+            db: データベース名
+            ids: 取得するIDのリスト（WebEnv/query_key を使う場合は省略）
+            **params: rettype, retmode, WebEnv, query_key, retstart, retmax など
+        """
+        payload: Dict[str, Any] = {"db": db}
+        if ids is not None:
+            payload["id"] = ",".join(str(i) for i in ids)
+        payload.update({key: value for key, value in params.items() if value is not None})
+        return self.call(
+            "efetch.fcgi", payload, parse=lambda response: response.text, coalesce="text", retain=False
+        )
+
+    def efetch_bytes(
+        self,
+        db: str = "pubmed",
+        ids: Optional[Iterable[str]] = None,
+        **params: Any,
+    ) -> bytes:
+        """efetch を実行し本文をバイト列で返す（XMLパーサー向け）"""
+        payload: Dict[str, Any] = {"db": db}
+        if ids is not None:
+            payload["id"] = ",".join(str(i) for i in ids)
+        payload.update({key: value for key, value in params.items() if value is not None})
+        return self.call(
+            "efetch.fcgi", payload, parse=lambda response: response.content, coalesce="bytes", retain=False
+        )
+
+    def esummary(
+        self,
+        db: str = "pubmed",
+        ids: Optional[Iterable[str]] = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """esummary をJSONで実行し ``result`` 部分を返す"""
+        payload: Dict[str, Any] = {"db": db, "retmode": "json"}
+        if ids is not None:
+            payload["id"] = ",".join(str(i) for i in ids)
+        payload.update({key: value for key, value in params.items() if value is not None})
+        return self.call(
+            "esummary.fcgi",
+            payload,
+            parse=lambda response: response.json().get("result", {}),
+            coalesce="json",
+        )
+
+    def epost(self, ids: Iterable[str], db: str = "pubmed", webenv: Optional[str] = None) -> Tuple[str, str]:
+        """
+        IDリストを履歴サーバーに登録する
+
+        Returns:
+            (WebEnv, query_key)
+        """
+        payload: Dict[str, Any] = {"db": db, "id": ",".join(str(i) for i in ids)}
+        if webenv:
+            payload["WebEnv"] = webenv
+
+        def parse(response: requests.Response) -> Tuple[str, str]:
+            root = ET.fromstring(response.content)
+            error = root.findtext("ERROR")
+            if error:
+                raise EutilsError(f"API error: {error}")
+            return root.findtext("WebEnv") or "", root.findtext("QueryKey") or ""
+
+        return self.call("epost.fcgi", payload, parse=parse, method="POST")
+
+    def elink(
+        self,
+        ids: Iterable[str],
+        dbfrom: str = "pubmed",
+        db: str = "pubmed",
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """elink をJSONで実行しレスポンス全体を返す"""
+        payload: Dict[str, Any] = {
+            "dbfrom": dbfrom,
+            "db": db,
+            "retmode": "json",
+            "id": ",".join(str(i) for i in ids),
+        }
+        payload.update({key: value for key, value in params.items() if value is not None})
+        return self.call("elink.fcgi", payload, parse=lambda response: response.json(), coalesce="json")
+
+
+_DEFAULT_CLIENT: Optional[EutilsClient] = None
+_DEFAULT_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> EutilsClient:
+    """プロセス全体で共有されるクライアントを返す"""
+    global _DEFAULT_CLIENT
+    with _DEFAULT_CLIENT_LOCK:
+        if _DEFAULT_CLIENT is None:
+            _DEFAULT_CLIENT = EutilsClient(count_cache=get_count_cache(), coalescer=get_coalescer())
+        return _DEFAULT_CLIENT
+
+
+def set_client(client: Optional[EutilsClient]) -> None:
+    """共有クライアントを差し替える（None で次回呼び出し時に再生成）"""
+    global _DEFAULT_CLIENT
+    with _DEFAULT_CLIENT_LOCK:
+        _DEFAULT_CLIENT = client
+
+
+def get_pubmed_count(query: str, db: str = "pubmed") -> Dict[str, Any]:
+    """
+    検索式のヒット件数を取得する（従来の各スクリプトと互換の辞書形式）
+
+    Returns:
+        Dict: {
+            'count': int（失敗時は None）,
+            'query': str,
+            'message': str,
+            'success': bool
+        }
+    """
+    try:
+        count = get_client().count(query, db=db)
+    except EutilsError as exc:
+        return {
+            "count": None,
+            "query": query,
+            "message": str(exc),
+            "success": False,
+        }
+    return {
+        "count": count,
+        "query": query,
+        "message": "Success",
+        "success": True,
+    }
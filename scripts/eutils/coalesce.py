@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+同一リクエストの合流（in-flight coalescing）
+
+同じプロセス内で同じ正規化済みリクエストが同時に、あるいは短時間に繰り返し
+発行された場合に、HTTP呼び出しと解析結果を1回分で共有する。
+
+- 実行中のリクエストと同じキーが来たら、その完了を待って同じ結果を返す
+- 完了した結果は ``ttl_seconds`` の間だけメモリに保持する（0 なら実行中のみ合流）
+- 失敗は保持しない（待っていた呼び出し側には同じ例外を送出する）
+- ``retain=False`` で呼ばれたもの（efetch 本文など大きな結果）は実行中のみ合流し、完了後は保持しない
+
+SQLiteの件数キャッシュ（``count_cache``）とは独立しており、
+キャッシュが off でもプロセス内の重複リクエストは削減される。
+
+設定（環境変数）:
+    NCBI_COALESCE_TTL_SECONDS  完了結果の保持秒数（既定 300、0 で実行中のみ）
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class RequestCoalescer:
+    """キー単位でリクエストを合流させるスレッドセーフな仕組み"""
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            ttl_seconds: 完了結果を再利用する秒数（省略時は NCBI_COALESCE_TTL_SECONDS または 300）
+            max_entries: 保持する完了結果の最大数（古いものから破棄）
+            clock: 単調増加する時刻関数（テスト用に差し替え可能）
+        """
+        if ttl_seconds is None:
+            try:
+                ttl_seconds = float(os.getenv("NCBI_COALESCE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+            except ValueError:
+                ttl_seconds = DEFAULT_TTL_SECONDS
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._completed: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.calls = 0
+        self.shared = 0
+
+    def run(self, key: Hashable, fn: Callable[[], Any], retain: bool = True) -> Any:
+        """
+        ``key`` に対応する結果を返す。必要な場合だけ ``fn`` を実行する
+
+        返り値は呼び出しごとにコピーされるため、呼び出し側で変更しても共有結果は壊れない。
+
+        Args:
+            key: 合流のキー
+            fn: 結果を得る関数
+            retain: False なら完了結果を ``ttl_seconds`` の間保持せず、実行中の合流だけ行う
+        """
+        with self._lock:
+            now = self._clock()
+            entry = self._completed.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at < self.ttl_seconds:
+                    self._completed.move_to_end(key)
+                    self.shared += 1
+                    return copy.deepcopy(value)
+                del self._completed[key]
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            value = fn()
+        except BaseException as exc:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if retain and self.ttl_seconds > 0:
+                self._completed[key] = (self._clock(), value)
+                self._completed.move_to_end(key)
+                while len(self._completed) > self.max_entries:
+                    self._completed.popitem(last=False)
+        future.set_result(value)
+        return copy.deepcopy(value)
+
+    def clear(self) -> None:
+        """保持している完了結果を破棄する（実行中のものは影響を受けない）"""
+        with self._lock:
+            self._completed.clear()
+
+
+_DEFAULT_COALESCER: Optional[RequestCoalescer] = None
+_DEFAULT_COALESCER_LOCK = threading.Lock()
+
+
+def get_coalescer() -> RequestCoalescer:
+    """プロセス全体で共有される合流器を返す"""
+    global _DEFAULT_COALESCER
+    with _DEFAULT_COALESCER_LOCK:
+        if _DEFAULT_COALESCER is None:
+            _DEFAULT_COALESCER = RequestCoalescer()
+        return _DEFAULT_COALESCER
+
+
+def set_coalescer(coalescer: Optional[RequestCoalescer]) -> None:
+    """共有合流器を差し替える（None で次回呼び出し時に再生成）"""
+    global _DEFAULT_COALESCER
+    with _DEFAULT_COALESCER_LOCK:
+        _DEFAULT_COALESCER = coalescer
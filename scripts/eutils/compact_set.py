@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+省メモリのPMID集合
+
+Python の ``set[str]`` はPMID1件あたり70バイト以上を使うため、数百万件の
+ブロックでは重複分析やフィルター分析を手元で行えない。``PmidSet`` は
+ソート済み・重複なしの NumPy uint32 配列（1件4バイト）でPMIDを保持し、
+和・積・差をベクトル演算で求める。
+
+- 不変（演算は常に新しい ``PmidSet`` を返す）
+- ``save()`` / ``load(mmap=True)`` で .npy ファイルに保存し、メモリマップで読み込める
+- PMIDは uint32 の範囲（0〜4,294,967,295）に収まる前提
+
+Usage:
+    from scripts.eutils.compact_set import PmidSet
+
+    a = PmidSet(["31452104", "29345678"])
+    b = PmidSet.load("cache/block2.npy")
+    print(len(a & b), (a | b).nbytes)
+"""
+
+from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+PMID_DTYPE = np.uint32
+
+
+class PmidSet:
+    """ソート済み uint32 配列によるPMID集合"""
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, pmids: Union[Iterable[Union[int, str]], np.ndarray] = ()):
+        """
+        Args:
+            pmids: PMID（int / 数字の文字列 / 配列）。順序・重複は問わない
+        """
+        if isinstance(pmids, PmidSet):
+            self._ids = pmids._ids
+            return
+        if isinstance(pmids, np.ndarray):
+            array = pmids.astype(np.int64) if pmids.dtype.kind in "USO" else pmids
+        else:
+            array = np.fromiter((int(pmid) for pmid in pmids), dtype=np.int64)
+        if array.size and (array.min() < 0 or array.max() > np.iinfo(PMID_DTYPE).max):
+            raise ValueError("PMID out of uint32 range")
+        self._ids = self._freeze(np.unique(array.astype(PMID_DTYPE, copy=False)))
+
+    @staticmethod
+    def _freeze(array: np.ndarray) -> np.ndarray:
+        if array.flags.writeable:
+            array.setflags(write=False)
+        return array
+
+    @classmethod
+    def from_sorted(cls, array: np.ndarray) -> "PmidSet":
+        """ソート済み・重複なしの配列から作る（検証・コピーを行わない）"""
+        result = cls.__new__(cls)
+        result._ids = cls._freeze(np.asanyarray(array, dtype=PMID_DTYPE))
+        return result
+
+    @classmethod
+    def union_all(cls, sets: Iterable["PmidSet"]) -> "PmidSet":
+        """複数の集合の和（まとめて1回でソートする）"""
+        arrays = [s._ids for s in sets]
+        if not arrays:
+            return cls()
+        return cls.from_sorted(np.unique(np.concatenate(arrays)))
+
+    @classmethod
+    def coverage(cls, sets: Sequence["PmidSet"]) -> Tuple["PmidSet", np.ndarray]:
+        """
+        各PMIDがいくつの集合に含まれるか
+
+        Returns:
+            (和集合, 和集合の各PMIDを含む集合の数)
+        """
+        if not sets:
+            return cls(), np.zeros(0, dtype=np.int64)
+        ids, counts = np.unique(np.concatenate([s._ids for s in sets]), return_counts=True)
+        return cls.from_sorted(ids), counts
+
+    # ---- 参照 ----
+
+    @property
+    def array(self) -> np.ndarray:
+        """読み取り専用のソート済み配列"""
+        return self._ids
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._ids.nbytes)
+
+    def __len__(self) -> int:
+        return int(self._ids.size)
+
+    def __bool__(self) -> bool:
+        return bool(self._ids.size)
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(pmid) for pmid in self._ids)
+
+    def __contains__(self, pmid: object) -> bool:
+        try:
+            value = int(pmid)  # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            return False
+        index = int(np.searchsorted(self._ids, value))
+        return index < self._ids.size and int(self._ids[index]) == value
+
+    def contains_many(self, pmids: Iterable[Union[int, str]]) -> np.ndarray:
+        """各PMIDが含まれるかの真偽値配列"""
+        values = np.fromiter((int(pmid) for pmid in pmids), dtype=np.int64)
+        index = np.searchsorted(self._ids, values)
+        found = np.zeros(values.size, dtype=bool)
+        inside = index < self._ids.size
+        found[inside] = self._ids[index[inside]] == values[inside]
+        return found
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PmidSet):
+            return NotImplemented
+        return bool(np.array_equal(self._ids, other._ids))
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        preview = ", ".join(str(pmid) for pmid in self._ids[:5])
+        more = ", ..." if self._ids.size > 5 else ""
+        return f"PmidSet([{preview}{more}], size={len(self)})"
+
+    def to_strings(self) -> List[str]:
+        """PMIDの文字列リスト（昇順）"""
+        return [str(pmid) for pmid in self._ids.tolist()]
+
+    # ---- 集合演算 ----
+
+    def __or__(self, other: "PmidSet") -> "PmidSet":
+        return PmidSet.from_sorted(np.union1d(self._ids, other._ids))
+
+    def __and__(self, other: "PmidSet") -> "PmidSet":
+        return PmidSet.from_sorted(np.intersect1d(self._ids, other._ids, assume_unique=True))
+
+    def __sub__(self, other: "PmidSet") -> "PmidSet":
+        return PmidSet.from_sorted(np.setdiff1d(self._ids, other._ids, assume_unique=True))
+
+    def __xor__(self, other: "PmidSet") -> "PmidSet":
+        return PmidSet.from_sorted(np.setxor1d(self._ids, other._ids, assume_unique=True))
+
+    union = __or__
+    intersection = __and__
+    difference = __sub__
+
+    def intersection_size(self, other: "PmidSet") -> int:
+        """積集合の件数（積集合の配列は作らない）"""
+        small, large = (self._ids, other._ids) if len(self) <= len(other) else (other._ids, self._ids)
+        if not small.size or not large.size:
+            return 0
+        index = np.searchsorted(large, small)
+        inside = index < large.size
+        return int(np.count_nonzero(large[index[inside]] == small[inside]))
+
+    def issubset(self, other: "PmidSet") -> bool:
+        return self.intersection_size(other) == len(self)
+
+    # ---- 永続化 ----
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """.npy ファイルに保存する（拡張子がなければ .npy を付ける）"""
+        path = Path(path)
+        if path.suffix != ".npy":
+            path = path.with_suffix(path.suffix + ".npy")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, self._ids, allow_pickle=False)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "PmidSet":
+        """``save()`` したファイルを読み込む（mmap=True ならメモリマップで読み込む）"""
+        array = np.load(Path(path), mmap_mode="r" if mmap else None, allow_pickle=False)
+        if array.dtype != PMID_DTYPE:
+            raise ValueError(f"Unexpected dtype in {path}: {array.dtype}")
+        return cls.from_sorted(array)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+esearch ヒット件数のSQLiteキャッシュ
+
+同じ検索式を何度も投げるブロック分析・フィルター分析・再集計スクリプト向けに、
+(db, 正規化した検索式, 日付バケット) をキーとして件数をディスクに保存する。
+NCBI以外のサーバー（``NCBI_EUTILS_BASE_URL`` で指定したスタブなど）の件数は、
+db にサーバーのURLを添えた別のキーで保存し、NCBIの件数と混ざらないようにする。
+
+キャッシュモード:
+    off      キャッシュを読み書きしない
+    read     新鮮なキャッシュがあれば使い、なければ取得して保存する（既定）
+    refresh  キャッシュを無視して再取得し、結果で上書きする
+
+設定（環境変数）:
+    NCBI_COUNT_CACHE              既定モード（off / read / refresh）
+    NCBI_COUNT_CACHE_PATH         SQLiteファイルのパス
+    NCBI_COUNT_CACHE_TTL_HOURS    有効期限（時間、既定 24）
+    NCBI_COUNT_CACHE_BUCKET       日付バケット（day / week / month / none、既定 day）
+    NCBI_COUNT_CACHE_MAX_ENTRIES  最大件数。超えると最終参照の古いものから削除（既定 200000）
+
+Usage:
+    parser = argparse.ArgumentParser()
+    add_cache_argument(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)  # 以降の get_client().count() がキャッシュを使う
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+CACHE_MODES = ("off", "read", "refresh")
+DATE_BUCKETS = ("day", "week", "month", "none")
+
+DEFAULT_CACHE_MODE = "read"
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[2] / ".cache" / "eutils" / "esearch_counts.sqlite3"
+DEFAULT_TTL_HOURS = 24.0
+DEFAULT_DATE_BUCKET = "day"
+DEFAULT_MAX_ENTRIES = 200_000
+
+# 件数チェックは毎回行わず、この回数の書き込みごとに行う
+_EVICTION_CHECK_INTERVAL = 64
+# 上限を超えたときはこの割合まで減らす（毎回の削除を避ける）
+_EVICTION_TARGET_RATIO = 0.9
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_OPEN_PAREN_SPACE_RE = re.compile(r"\(\s+")
+_CLOSE_PAREN_SPACE_RE = re.compile(r"\s+\)")
+
+
+def normalize_query(query: str) -> str:
+    """
+    キャッシュキー用に検索式を正規化する
+
+    PubMed上で意味の変わらない空白の違い（改行・連続空白・括弧内側の空白）を吸収する。
+    """
+    normalized = _WHITESPACE_RE.sub(" ", query.strip())
+    normalized = _OPEN_PAREN_SPACE_RE.sub("(", normalized)
+    return _CLOSE_PAREN_SPACE_RE.sub(")", normalized)
+
+
+def date_bucket(granularity: str = DEFAULT_DATE_BUCKET, now: Optional[float] = None) -> str:
+    """
+    現在時刻（UTC）が属する日付バケットの文字列を返す
+
+    PubMedは日次で更新されるため、バケットが変わると過去の件数は使われなくなる。
+    """
+    if granularity not in DATE_BUCKETS:
+        raise ValueError(f"Unknown date bucket: {granularity}")
+    if granularity == "none":
+        return "-"
+    moment = datetime.fromtimestamp(time.time() if now is None else now, tz=timezone.utc)
+    if granularity == "day":
+        return moment.strftime("%Y-%m-%d")
+    if granularity == "week":
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    return moment.strftime("%Y-%m")
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+class CountCache:
+    """
+    esearch件数のSQLiteキャッシュ
+
+    接続はスレッド間で共有し、読み書きはロックで直列化する。
+    モードが off の間はファイルを開かない。
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        mode: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        bucket: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            path: SQLiteファイルのパス（省略時は NCBI_COUNT_CACHE_PATH または既定パス）
+            mode: off / read / refresh（省略時は NCBI_COUNT_CACHE または read）
+            ttl_seconds: 有効期限（秒）。0以下で無期限
+            max_entries: 保持する最大件数
+            bucket: 日付バケットの粒度（day / week / month / none）
+            clock: 現在時刻関数（テスト用に差し替え可能）
+        """
+        env_path = os.getenv("NCBI_COUNT_CACHE_PATH")
+        self.path = Path(path or env_path or DEFAULT_CACHE_PATH)
+        if ttl_seconds is None:
+            ttl_seconds = _env_float("NCBI_COUNT_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS) * 3600
+        self.ttl_seconds = ttl_seconds
+        if max_entries is None:
+            max_entries = _env_int("NCBI_COUNT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        self.max_entries = max(1, max_entries)
+        bucket = bucket or os.getenv("NCBI_COUNT_CACHE_BUCKET") or DEFAULT_DATE_BUCKET
+        if bucket not in DATE_BUCKETS:
+            raise ValueError(f"Unknown date bucket: {bucket}")
+        self.bucket = bucket
+        self._clock = clock
+        self._mode = DEFAULT_CACHE_MODE
+        self.set_mode(mode or os.getenv("NCBI_COUNT_CACHE") or DEFAULT_CACHE_MODE)
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_check = _EVICTION_CHECK_INTERVAL
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def mode(self) -> str:
+        """現在のキャッシュモード"""
+        return self._mode
+
+    @property
+    def enabled(self) -> bool:
+        return self._mode != "off"
+
+    def set_mode(self, mode: str) -> None:
+        """キャッシュモードを変更する"""
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (choose from {', '.join(CACHE_MODES)})")
+        self._mode = mode
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS esearch_counts (
+                    db TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (db, query, bucket)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_esearch_counts_accessed ON esearch_counts (accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _key(self, db: str, query: str, base_url: Optional[str] = None) -> tuple:
+        scope = f"{db} @ {base_url}" if base_url else db
+        return scope, normalize_query(query), date_bucket(self.bucket, self._clock())
+
+    def _is_fresh(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds <= 0 or now - created_at < self.ttl_seconds
+
+    def get(self, db: str, query: str, base_url: Optional[str] = None) -> Optional[int]:
+        """
+        キャッシュ済みの件数を返す
+
+        モードが read 以外、未登録、期限切れの場合は None。
+
+        Args:
+            base_url: NCBI以外のサーバーのURL（NCBIの件数は None）
+        """
+        if self._mode != "read":
+            return None
+        key = self._key(db, query, base_url)
+        now = self._clock()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT count, created_at FROM esearch_counts WHERE db = ? AND query = ? AND bucket = ?",
+                key,
+            ).fetchone()
+            if row is None or not self._is_fresh(row[1], now):
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE esearch_counts SET accessed_at = ? WHERE db = ? AND query = ? AND bucket = ?",
+                (now, *key),
+            )
+            conn.commit()
+            self.hits += 1
+            return int(row[0])
+
+    def put(self, db: str, query: str, count: int, base_url: Optional[str] = None) -> None:
+        """件数を保存する（モードが off の場合は何もしない。``base_url`` は ``get`` と同じ）"""
+        if not self.enabled:
+            return
+        key = self._key(db, query, base_url)
+        now = self._clock()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO esearch_counts (db, query, bucket, count, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (*key, int(count), now, now),
+            )
+            conn.commit()
+            self._writes_since_check += 1
+            if self._writes_since_check >= _EVICTION_CHECK_INTERVAL:
+                self._writes_since_check = 0
+                self._evict_locked(conn, now)
+
+    def _evict_locked(self, conn: sqlite3.Connection, now: float) -> int:
+        removed = 0
+        if self.ttl_seconds > 0:
+            cursor = conn.execute(
+                "DELETE FROM esearch_counts WHERE created_at <= ?", (now - self.ttl_seconds,)
+            )
+            removed += cursor.rowcount
+        (total,) = conn.execute("SELECT COUNT(*) FROM esearch_counts").fetchone()
+        if total > self.max_entries:
+            keep = int(self.max_entries * _EVICTION_TARGET_RATIO)
+            cursor = conn.execute(
+                """
+                DELETE FROM esearch_counts WHERE rowid IN (
+                    SELECT rowid FROM esearch_counts ORDER BY accessed_at ASC LIMIT ?
+                )
+                """,
+                (total - keep,),
+            )
+            removed += cursor.rowcount
+        conn.commit()
+        return removed
+
+    def evict(self) -> int:
+        """期限切れと上限超過分を削除し、削除件数を返す"""
+        with self._lock:
+            return self._evict_locked(self._connect(), self._clock())
+
+    def clear(self) -> None:
+        """すべてのエントリを削除する"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM esearch_counts")
+            conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (total,) = self._connect().execute("SELECT COUNT(*) FROM esearch_counts").fetchone()
+            return int(total)
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット数・ミス数などの統計"""
+        return {
+            "mode": self._mode,
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_DEFAULT_CACHE: Optional[CountCache] = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_count_cache() -> CountCache:
+    """プロセス全体で共有される件数キャッシュを返す"""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = CountCache()
+        return _DEFAULT_CACHE
+
+
+def set_count_cache(cache: Optional[CountCache]) -> None:
+    """共有キャッシュを差し替える（None で次回呼び出し時に再生成）"""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        _DEFAULT_CACHE = cache
+
+
+def configure_count_cache(mode: Optional[str] = None) -> CountCache:
+    """共有キャッシュのモードを設定して返す（None なら変更しない）"""
+    cache = get_count_cache()
+    if mode is not None:
+        cache.set_mode(mode)
+    return cache
+
+
+def add_cache_argument(parser: argparse.ArgumentParser) -> None:
+    """CLIに ``--cache=off|read|refresh`` オプションを追加する"""
+    parser.add_argument(
+        "--cache",
+        choices=CACHE_MODES,
+        default=None,
+        help=(
+            "esearch件数キャッシュのモード: off=使わない, read=新鮮なキャッシュを再利用, "
+            "refresh=再取得して上書き（既定: 環境変数 NCBI_COUNT_CACHE または read）"
+        ),
+    )
+
+
+def apply_cache_argument(args: argparse.Namespace) -> CountCache:
+    """``add_cache_argument`` で追加したオプションを共有キャッシュに反映する"""
+    return configure_count_cache(getattr(args, "cache", None))
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+設定ファイル（YAML / JSON）で定義するフィルター行列の件数集計
+
+Population × ブロック × フィルター段階 × 期間 の各セルの検索式を組み立て、
+共通クライアント（レート制御・件数キャッシュ）で並列に件数を取得する。
+前回の結果（JSON）にある検索式はそのまま再利用し、変更したセルだけを検索する。
+新しい分析は、スクリプトを書く代わりに設定ファイルを1つ追加すればよい。
+
+設定ファイルの例（YAML）:
+
+    name: フィルター効果分析
+    populations:                 # 省略可（population: "..." で1つだけ指定してもよい）
+      physicians: '"Physicians"[Mesh] OR physician*[tiab]'
+    include_population_only: true  # Population単独の行を加える
+    blocks:
+      "#2B Meaningful Work": '"meaningful work"[tiab] OR "work meaningfulness"[tiab]'
+      "#2H Japanese": 'ikigai[tiab]'
+    clauses:                     # フィルターから名前で参照できる条件
+      animal: 'NOT (animals[Mesh] NOT humans[Mesh])'
+    filters:                     # 表の列（上から順に）
+      - name: base
+      - name: no_animal
+        apply: [animal]
+      - name: with_humans
+        extends: no_animal       # no_animal の条件に続けて適用
+        apply: ['Humans[Mesh]']  # AND / OR / NOT で始まらない条件は AND で結合
+        reference: base          # 削減率の比較対象（省略時は直前の列）
+    periods:                     # 省略時は期間の指定なし
+      all: null
+      10y: {from: "2015/01/01", to: "3000"}
+      5y: '("2021"[Date - Publication] : "3000"[Date - Publication])'
+
+検索式は ``(Population) AND (ブロック) AND (期間) <フィルターの条件...>`` の形になる。
+``year_store``（``YearIndexStore``）を渡すと、年単位の期間のセルは ``(Population) AND (ブロック)``
+ごとに出版年インデックスを1回だけ取得して手元で数える（期間の列を追加しても再検索しない）。
+条件のあるフィルター段階は ``metadata_store``（``PmidMetadataStore``）も渡した場合に限り
+そのPMID集合に手元で適用し、渡さない場合や手元で評価できない条件は通常の検索に戻す
+（フィルター段階ごとにインデックスを取得し直すことはない）。
+
+Usage:
+    from scripts.eutils.filter_matrix import FilterMatrixSpec, run_filter_matrix
+
+    spec = FilterMatrixSpec.load("specs/filter_impact.yaml")
+    result = run_filter_matrix(spec, previous=load_previous_counts("out/filter_impact.json"))
+    print(result.to_markdown())
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from .batch import CountResult, ProgressCallback, count_mapping
+from .client import EutilsClient, EutilsError
+from .metadata_store import PmidMetadataStore, UnsupportedFilterError
+from .year_histogram import YearIndexStore, parse_pdat_window
+
+try:
+    import yaml
+except ImportError:  # Optional dependency（JSON の設定ファイルだけなら不要）
+    yaml = None
+
+# Population単独の行のブロック名
+POPULATION_ONLY = "(population only)"
+
+_OPERATORS = ("AND ", "OR ", "NOT ")
+
+
+def _clause(text: str) -> str:
+    """条件を検索式に続けられる形にする（演算子がなければ AND で結合）"""
+    text = text.strip()
+    if text.upper().startswith(_OPERATORS):
+        return text
+    return f"AND ({text})"
+
+
+@dataclass(frozen=True)
+class FilterStage:
+    """フィルター段階（表の列）"""
+
+    name: str
+    clauses: Tuple[str, ...] = ()
+    # 削減率の比較対象の段階名（None なら比較しない）
+    reference: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Period:
+    """期間（None は期間の指定なし）"""
+
+    name: str
+    clause: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class MatrixCell:
+    """行列の1セル"""
+
+    population: str
+    block: str
+    filter: str
+    period: str
+    query: str
+
+
+@dataclass
+class FilterMatrixSpec:
+    """フィルター行列の定義"""
+
+    name: str
+    blocks: Dict[str, str]
+    populations: Dict[str, str] = field(default_factory=lambda: {"": ""})
+    filters: List[FilterStage] = field(default_factory=lambda: [FilterStage("base")])
+    periods: List[Period] = field(default_factory=lambda: [Period("all")])
+    include_population_only: bool = False
+    description: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "FilterMatrixSpec":
+        """設定（辞書）から作る。不正な設定は ValueError"""
+        if not data.get("blocks") and not data.get("include_population_only"):
+            raise ValueError("Spec needs 'blocks' (or include_population_only: true)")
+
+        if "populations" in data and "population" in data:
+            raise ValueError("Use either 'population' or 'populations', not both")
+        if "populations" in data:
+            populations = {str(name): str(query or "") for name, query in data["populations"].items()}
+        else:
+            populations = {"": str(data.get("population") or "")}
+        if not populations:
+            raise ValueError("'populations' must not be empty")
+
+        clauses = {str(name): str(text) for name, text in (data.get("clauses") or {}).items()}
+        filters: List[FilterStage] = []
+        by_name: Dict[str, FilterStage] = {}
+        for index, entry in enumerate(data.get("filters") or [{"name": "base"}]):
+            if isinstance(entry, str):
+                entry = {"name": entry}
+            name = str(entry.get("name") or "")
+            if not name or name in by_name:
+                raise ValueError(f"Filter #{index + 1} needs a unique name")
+            inherited: Tuple[str, ...] = ()
+            if entry.get("extends"):
+                if entry["extends"] not in by_name:
+                    raise ValueError(f"Filter '{name}' extends unknown filter '{entry['extends']}'")
+                inherited = by_name[entry["extends"]].clauses
+            applied = tuple(_clause(clauses.get(item, item)) for item in entry.get("apply") or [])
+            reference = entry.get("reference", filters[-1].name if filters else None)
+            if reference is not None and reference not in by_name:
+                raise ValueError(f"Filter '{name}' references unknown filter '{reference}'")
+            stage = FilterStage(name=name, clauses=inherited + applied, reference=reference)
+            filters.append(stage)
+            by_name[name] = stage
+
+        periods = []
+        raw_periods = data.get("periods") or {"all": None}
+        for name, value in raw_periods.items():
+            if value is None:
+                periods.append(Period(str(name)))
+            elif isinstance(value, Mapping):
+                if "from" not in value:
+                    raise ValueError(f"Period '{name}' needs 'from'")
+                periods.append(Period(str(name), f'("{value["from"]}"[PDAT] : "{value.get("to", "3000")}"[PDAT])'))
+            else:
+                periods.append(Period(str(name), str(value)))
+
+        return cls(
+            name=str(data.get("name") or "Filter matrix"),
+            blocks={str(name): str(query) for name, query in (data.get("blocks") or {}).items()},
+            populations=populations,
+            filters=filters,
+            periods=periods,
+            include_population_only=bool(data.get("include_population_only", False)),
+            description=str(data.get("description") or ""),
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "FilterMatrixSpec":
+        """YAML（.yaml / .yml、PyYAML が必要）または JSON の設定ファイルを読み込む"""
+        path = Path(path)
+        text = path.read_text(encoding="utf-8")
+        if path.suffix.lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise ImportError("PyYAML is required for YAML specs (pip install pyyaml), or use a JSON spec")
+            data = yaml.safe_load(text)
+        else:
+            data = json.loads(text)
+        if not isinstance(data, Mapping):
+            raise ValueError(f"Spec must be a mapping: {path}")
+        return cls.from_dict(data)
+
+    @property
+    def row_blocks(self) -> Dict[str, str]:
+        """表の行（Population単独の行を含む）"""
+        rows = {POPULATION_ONLY: ""} if self.include_population_only else {}
+        rows.update(self.blocks)
+        return rows
+
+    def build_query(self, population: str, block: str, stage: FilterStage, period: Period) -> str:
+        parts = [f"({part})" for part in (population, block) if part]
+        query = " AND ".join(parts)
+        if period.clause:
+            query = f"{query} AND {period.clause}" if query else period.clause
+        for clause in stage.clauses:
+            query = f"{query} {clause}"
+        return query
+
+    def cells(self) -> List[MatrixCell]:
+        """全セル（Population → 期間 → ブロック → フィルターの順）"""
+        cells = []
+        for population_name, population in self.populations.items():
+            for period in self.periods:
+                for block_name, block in self.row_blocks.items():
+                    if not population and not block:
+                        continue
+                    for stage in self.filters:
+                        cells.append(MatrixCell(
+                            population=population_name,
+                            block=block_name,
+                            filter=stage.name,
+                            period=period.name,
+                            query=self.build_query(population, block, stage, period),
+                        ))
+        return cells
+
+
+@dataclass
+class FilterMatrixResult:
+    """フィルター行列の集計結果"""
+
+    spec: FilterMatrixSpec
+    cells: List[MatrixCell]
+    results: Dict[MatrixCell, CountResult]
+    # 前回の結果から再利用したセルの数
+    reused: int = 0
+    # 出版年インデックスから手元で数えたセルの数
+    local: int = 0
+    generated_at: str = field(default_factory=lambda: time.strftime("%Y-%m-%d %H:%M:%S"))
+
+    def __post_init__(self):
+        self._index = {(c.population, c.block, c.filter, c.period): c for c in self.cells}
+
+    def count(self, block: str, filter: str, period: Optional[str] = None, population: Optional[str] = None) -> Optional[int]:
+        """セルの件数（失敗したセルは None）"""
+        period = period if period is not None else self.spec.periods[0].name
+        population = population if population is not None else next(iter(self.spec.populations))
+        return self.results[self._index[(population, block, filter, period)]].count
+
+    @property
+    def errors(self) -> List[Tuple[MatrixCell, str]]:
+        return [(cell, self.results[cell].error) for cell in self.cells if not self.results[cell].success]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON に保存する形式（次回の実行で再利用できる）"""
+        return {
+            "name": self.spec.name,
+            "generated_at": self.generated_at,
+            "populations": self.spec.populations,
+            "filters": [{"name": s.name, "clauses": list(s.clauses), "reference": s.reference} for s in self.spec.filters],
+            "periods": [{"name": p.name, "clause": p.clause} for p in self.spec.periods],
+            "cells": [
+                {
+                    "population": cell.population,
+                    "block": cell.block,
+                    "filter": cell.filter,
+                    "period": cell.period,
+                    "query": cell.query,
+                    "count": self.results[cell].count,
+                    "error": self.results[cell].error,
+                }
+                for cell in self.cells
+            ],
+        }
+
+    def to_markdown(self) -> str:
+        spec = self.spec
+        lines = [f"# {spec.name}", "", f"生成日時: {self.generated_at}", ""]
+        if spec.description:
+            lines += [spec.description, ""]
+
+        lines += ["## 設定", ""]
+        for name, population in spec.populations.items():
+            if population:
+                label = f"Population ({name})" if name else "Population"
+                lines.append(f"- **{label}**: `{population}`")
+        for period in spec.periods:
+            lines.append(f"- **期間 {period.name}**: {f'`{period.clause}`' if period.clause else '指定なし'}")
+        for stage in spec.filters:
+            clauses = f"`{' '.join(stage.clauses)}`" if stage.clauses else "フィルターなし"
+            reference = f"（削減率は {stage.reference} と比較）" if stage.reference else ""
+            lines.append(f"- **{stage.name}**: {clauses}{reference}")
+        lines.append("")
+
+        for population in spec.populations:
+            for period in spec.periods:
+                heading = " / ".join(part for part in (population, period.name) if part)
+                lines += [f"## {heading}", ""]
+                lines.append("| Block | " + " | ".join(stage.name for stage in spec.filters) + " |")
+                lines.append("|-------|" + "|".join("-" * (len(stage.name) + 2) for stage in spec.filters) + "|")
+                for block in spec.row_blocks:
+                    if not spec.populations[population] and not spec.row_blocks[block]:
+                        continue
+                    counts = {stage.name: self.count(block, stage.name, period.name, population) for stage in spec.filters}
+                    row = [_format_cell(counts[stage.name], counts.get(stage.reference)) for stage in spec.filters]
+                    lines.append(f"| {block} | " + " | ".join(row) + " |")
+                lines.append("")
+
+        if self.errors:
+            lines += ["## エラー", ""]
+            for cell, error in self.errors:
+                lines.append(f"- {cell.block} / {cell.filter} / {cell.period}: {error}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def save(self, output: Union[str, Path]) -> Tuple[Path, Path]:
+        """``<output>.md`` と ``<output>.json`` に保存する"""
+        output = Path(output)
+        if output.suffix in (".md", ".json"):
+            output = output.with_suffix("")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        markdown_path = output.with_name(output.name + ".md")
+        json_path = output.with_name(output.name + ".json")
+        markdown_path.write_text(self.to_markdown(), encoding="utf-8")
+        json_path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return markdown_path, json_path
+
+
+def _format_cell(count: Optional[int], reference: Optional[int]) -> str:
+    if count is None:
+        return "ERROR"
+    if reference is None or reference <= 0:
+        return f"{count:,}"
+    return f"{count:,} ({(count - reference) / reference * 100:+.1f}%)"
+
+
+def load_previous_counts(path: Union[str, Path]) -> Dict[str, int]:
+    """前回の結果（JSON）から 検索式 → 件数 を読み込む（ファイルがなければ空）"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {
+        cell["query"]: int(cell["count"])
+        for cell in data.get("cells", [])
+        if cell.get("count") is not None and not cell.get("error")
+    }
+
+
+def run_filter_matrix(
+    spec: FilterMatrixSpec,
+    previous: Optional[Mapping[str, int]] = None,
+    client: Optional[EutilsClient] = None,
+    max_in_flight: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+    year_store: Optional[YearIndexStore] = None,
+    metadata_store: Optional[PmidMetadataStore] = None,
+) -> FilterMatrixResult:
+    """
+    全セルの件数を取得する
+
+    Args:
+        spec: 行列の定義
+        previous: 検索式 → 件数（前回の結果。ここにある検索式は検索しない）
+        client: 使用するクライアント（省略時は共有クライアント）
+        max_in_flight: 同時に実行するリクエスト数
+        progress: 1件完了するごとに (完了数, 総数, 結果) で呼ばれる関数
+        year_store: 出版年インデックスの保存先（指定すると年単位の期間は手元で数える）
+        metadata_store: フィルター段階の条件を手元で評価するメタデータストア（``year_store`` と併用）
+    """
+    previous = previous or {}
+    cells = spec.cells()
+    results: Dict[MatrixCell, CountResult] = {}
+    pending: Dict[str, List[MatrixCell]] = {}
+    # (Population) AND (ブロック) → (セル, 年の範囲)
+    by_year: Dict[str, List[Tuple[MatrixCell, Tuple[Optional[int], Optional[int]]]]] = {}
+    periods = {period.name: period for period in spec.periods}
+    stages = {stage.name: stage for stage in spec.filters}
+    for cell in cells:
+        window = parse_pdat_window(periods[cell.period].clause) if year_store is not None else None
+        if cell.query in previous:
+            results[cell] = CountResult(query=cell.query, count=previous[cell.query])
+        elif window is not None and (metadata_store is not None or not stages[cell.filter].clauses):
+            by_year.setdefault(_block_query(spec, cell), []).append((cell, window))
+        else:
+            # 同じ検索式のセル（ブロックとPopulationが同じ式など）は1回だけ検索する
+            pending.setdefault(cell.query, []).append(cell)
+
+    local = 0
+    if by_year:
+        indexes = year_store.get_many(list(by_year), max_in_flight=max_in_flight)
+        for base, entries in by_year.items():
+            index = indexes[base]
+            populated = False
+            for cell, window in entries:
+                if isinstance(index, Exception):
+                    results[cell] = CountResult(query=cell.query, error=str(index))
+                    continue
+                mask = index.mask(*window)
+                clauses = stages[cell.filter].clauses
+                if clauses:
+                    # フィルター段階の条件はブロックのPMID集合にメタデータで適用する
+                    try:
+                        if not populated:
+                            metadata_store.populate(index.pmids)
+                            populated = True
+                        mask = mask & metadata_store.mask(index.pmids, clauses)
+                    except UnsupportedFilterError:
+                        pending.setdefault(cell.query, []).append(cell)
+                        continue
+                    except EutilsError as exc:
+                        results[cell] = CountResult(query=cell.query, error=str(exc))
+                        continue
+                results[cell] = CountResult(query=cell.query, count=int(np.count_nonzero(mask)))
+                local += 1
+
+    fetched = count_mapping(
+        {query: query for query in pending},
+        max_in_flight=max_in_flight,
+        client=client,
+        progress=progress,
+    ) if pending else {}
+    for query, result in fetched.items():
+        for cell in pending[query]:
+            results[cell] = result
+
+    reused = sum(1 for cell in cells if cell.query in previous)
+    return FilterMatrixResult(spec=spec, cells=cells, results=results, reused=reused, local=local)
+
+
+def _block_query(spec: FilterMatrixSpec, cell: MatrixCell) -> str:
+    """セルの Population とブロックだけの検索式（出版年インデックスのキー）"""
+    population = spec.populations[cell.population]
+    return spec.build_query(population, spec.row_blocks[cell.block], FilterStage("base"), Period(cell.period))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+履歴サーバー（WebEnv / query_key）を使ったブロックの組み合わせ
+
+累積OR・ブロック間のANDなどで長大な検索式を毎回送り直す代わりに、
+各検索行を ``usehistory=y`` で1回だけ実行して query_key を保持し、
+組み合わせは ``#1 AND #2`` のような履歴参照で問い合わせる。
+送信する検索式は短くなり、NCBI側で長いOR連鎖を再解析させずに済む。
+
+- 同じ検索行・同じ組み合わせは1つの query_key を使い回す（件数もキャッシュ）
+- 保持する query_key が ``max_keys`` に達したら新しい WebEnv で作り直す
+- WebEnv が失効していたら（``HistoryExpiredError``）自動で作り直して再実行する
+
+Usage:
+    from scripts.eutils.history import HistoryEngine
+
+    engine = HistoryEngine()
+    p = engine.term('"Physicians"[Mesh] OR physician*[tiab]')
+    c = engine.term('"work engagement"[tiab]')
+    print(engine.count(p), engine.count(c), engine.count(p & c))
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from .batch import CountResult
+from .client import EutilsClient, EutilsError, HistoryExpiredError, get_client
+from .count_cache import normalize_query
+
+DEFAULT_MAX_HISTORY_KEYS = 100
+_OPERATORS = ("AND", "OR", "NOT")
+
+
+@dataclass(frozen=True)
+class HistoryNode:
+    """
+    履歴上の集合を表すノード（検索行、または他のノードの組み合わせ）
+
+    ``&`` / ``|`` / ``-`` で AND / OR / NOT を組み立てられる。
+    ノードを作るだけでは通信しない。
+    """
+
+    op: str
+    query: str = ""
+    children: Tuple["HistoryNode", ...] = ()
+
+    def _combine(self, op: str, other: "HistoryNode") -> "HistoryNode":
+        left = self.children if self.op == op and op != "NOT" else (self,)
+        right = other.children if other.op == op and op != "NOT" else (other,)
+        return HistoryNode(op, children=left + right)
+
+    def __and__(self, other: "HistoryNode") -> "HistoryNode":
+        return self._combine("AND", other)
+
+    def __or__(self, other: "HistoryNode") -> "HistoryNode":
+        return self._combine("OR", other)
+
+    def __sub__(self, other: "HistoryNode") -> "HistoryNode":
+        return HistoryNode("NOT", children=(self, other))
+
+
+def combine(op: str, nodes: Iterable[HistoryNode]) -> HistoryNode:
+    """複数のノードを1つの演算子で結合する"""
+    op = op.upper()
+    if op not in _OPERATORS:
+        raise ValueError(f"Unknown operator: {op}")
+    nodes = list(nodes)
+    if not nodes:
+        raise ValueError("combine() needs at least one node")
+    if len(nodes) == 1:
+        return nodes[0]
+    return HistoryNode(op, children=tuple(nodes))
+
+
+class HistoryEngine:
+    """1つの WebEnv 上で検索行と組み合わせを管理する"""
+
+    def __init__(
+        self,
+        client: Optional[EutilsClient] = None,
+        db: str = "pubmed",
+        max_keys: int = DEFAULT_MAX_HISTORY_KEYS,
+    ):
+        """
+        Args:
+            client: 使用するクライアント（省略時は共有クライアント）
+            db: データベース名
+            max_keys: 1つの WebEnv に保持する query_key の上限
+        """
+        self.client = client or get_client()
+        self.db = db
+        self.max_keys = max(2, max_keys)
+        self.webenv: Optional[str] = None
+        self.generation = 0
+        self.requests = 0
+        self._keys: "OrderedDict[HistoryNode, str]" = OrderedDict()
+        self._counts: Dict[HistoryNode, int] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def term(query: str) -> HistoryNode:
+        """検索行のノードを作る（空白の違いは同じノードとみなす）"""
+        return HistoryNode("TERM", query=normalize_query(query))
+
+    def reset(self) -> None:
+        """WebEnv を捨てて新しく作り直す（件数のキャッシュは保持）"""
+        with self._lock:
+            self.webenv = None
+            self._keys.clear()
+            self.generation += 1
+
+    def count(self, node: HistoryNode) -> int:
+        """ノードの件数を返す（必要なら履歴に登録する）"""
+        with self._lock:
+            if node in self._counts:
+                return self._counts[node]
+            self.key(node)
+            return self._counts[node]
+
+    def count_result(self, node: HistoryNode, query: Optional[str] = None) -> CountResult:
+        """``count`` の結果を ``CountResult`` で返す（失敗しても例外にしない）"""
+        label = query if query is not None else (node.query or self.expression(node))
+        try:
+            return CountResult(query=label, count=self.count(node))
+        except (EutilsError, ValueError) as exc:
+            return CountResult(query=label, error=str(exc))
+
+    def expression(self, node: HistoryNode) -> str:
+        """ノードを展開した検索式（レポート表示用、通信しない）"""
+        if node.op == "TERM":
+            return node.query
+        return f" {node.op} ".join(f"({self.expression(child)})" for child in node.children)
+
+    def key(self, node: HistoryNode) -> str:
+        """
+        現在の WebEnv 上でのノードの query_key を返す
+
+        Raises:
+            ValueError: 1つのノードに必要な query_key が ``max_keys`` を超える
+            EutilsError: 検索に失敗した
+        """
+        with self._lock:
+            for attempt in range(2):
+                if len(self._keys) + self._missing(node) > self.max_keys:
+                    self.reset()
+                    needed = self._missing(node)
+                    if needed > self.max_keys:
+                        raise ValueError(f"Combination needs {needed} history keys (max_keys={self.max_keys})")
+                try:
+                    return self._materialize(node)
+                except HistoryExpiredError:
+                    if attempt:
+                        raise
+                    self.reset()
+        raise AssertionError("unreachable")
+
+    def _missing(self, node: HistoryNode) -> int:
+        """現在の WebEnv で新たに必要になる query_key の数"""
+        seen = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current in seen or current in self._keys:
+                continue
+            seen.add(current)
+            stack.extend(current.children)
+        return len(seen)
+
+    def _materialize(self, node: HistoryNode) -> str:
+        key = self._keys.get(node)
+        if key is not None:
+            self._keys.move_to_end(node)
+            return key
+
+        if node.op == "TERM":
+            expression = node.query
+        else:
+            refs = [f"#{self._materialize(child)}" for child in node.children]
+            expression = f" {node.op} ".join(refs)
+
+        result = self.client.esearch(
+            expression,
+            db=self.db,
+            usehistory="y",
+            WebEnv=self.webenv,
+        )
+        self.requests += 1
+        webenv = result.get("webenv")
+        key = result.get("querykey")
+        if not webenv or not key:
+            raise HistoryExpiredError("esearch did not return WebEnv/query_key")
+        if self.webenv is not None and webenv != self.webenv:
+            # 失効した WebEnv の代わりに新しいものが割り当てられた（それまでのキーは使えない）
+            raise HistoryExpiredError(f"WebEnv {self.webenv} was replaced by {webenv}")
+        self.webenv = webenv
+        self._keys[node] = key
+        self._counts[node] = int(result["count"])
+        return key
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+再開できる efetch（MEDLINE形式）の逐次ダウンロード
+
+全レコードを1つの文字列に溜めてから書き出す代わりに、``retstart`` ごとのバッチを
+取得した順にファイルへ書き、チェックポイント（manifest.json）に記録する。
+途中で止まっても同じ検索を実行し直せば、取得済みのバッチを飛ばして続きから取得し、
+失敗した範囲だけを再取得する。メモリに載るのは1バッチ分だけ。
+
+``[0, total)`` を ``retstart`` の範囲に区切り、同じ WebEnv から複数の範囲を並列に取得する
+（間隔はクライアントのレート制限に任せる）。範囲ごとに別のファイルへ書くため、
+取得できた順序に関係なく読み出しは常に ``retstart`` の順になる。
+
+保存形式（``<directory>/<key の先頭16文字>/``）:
+    manifest.json        キー・件数・バッチサイズ、取得済みバッチ（retstart → 件数）、失敗したバッチ
+    000000000.medline    retstart ごとのバッチ（書き終えてから置き換えるので途中のファイルは残らない）
+
+キーは検索式と件数（PMIDリストの場合はリスト全体）から決まる。件数やバッチサイズが
+変わった場合は範囲が合わないため、保存済みのバッチを捨てて最初から取得する。
+
+Usage:
+    from scripts.eutils.medline_download import MedlineDownload
+
+    download = MedlineDownload.for_query("checkpoints", '("Physicians"[Mesh]) AND (ikigai[tiab])')
+    if download.run():
+        download.write_medline("results.txt")
+        download.cleanup()
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from .batch import resolve_max_in_flight
+from .client import _HISTORY_ERROR_RE, EutilsClient, EutilsError, HistoryExpiredError, get_client
+from .count_cache import normalize_query
+
+# efetch 1回あたりのレコード数
+DEFAULT_BATCH_SIZE = 200
+# 失敗したバッチを取り直す回数（クライアント側のリトライとは別）
+DEFAULT_MAX_ATTEMPTS = 3
+MANIFEST_NAME = "manifest.json"
+
+_RECORD_RE = re.compile(r"^PMID- ", re.MULTILINE)
+
+# (retstart, retmax) を受け取り MEDLINE テキストを返す関数
+BatchFetcher = Callable[[int, int], str]
+
+
+def count_medline_records(text: str) -> int:
+    """MEDLINEテキストに含まれるレコード数"""
+    return len(_RECORD_RE.findall(text))
+
+
+def fetch_batches(
+    fetch: BatchFetcher,
+    starts: Sequence[int],
+    total: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_in_flight: Optional[int] = None,
+    client: Optional[EutilsClient] = None,
+    require_full: bool = True,
+) -> Iterator[Tuple[int, Union[str, EutilsError]]]:
+    """
+    ``[0, total)`` を ``batch_size`` ごとに区切ったバッチを並列に取得する
+
+    リクエストの間隔はクライアントのレート制限に任せる。取得できた順に
+    (retstart, MEDLINEテキスト) を返し、失敗したバッチはテキストの代わりに例外を返す
+    （レコードが ``retmax`` 件に満たないバッチは途中で切れた応答として、再取得できる失敗にする）。
+
+    Args:
+        fetch: (retstart, retmax) のバッチを取得する関数
+        starts: 取得するバッチの retstart
+        total: 全件数（最後のバッチの retmax を決める）
+        batch_size: バッチあたりのレコード数
+        max_in_flight: 同時に取得するバッチ数（省略時はレート上限から決める）
+        client: 同時実行数の決定に使うクライアント（省略時は共有クライアント）
+        require_full: False なら ``retmax`` 件に満たないバッチも受け入れる（存在しないPMIDを
+            含みうるPMIDリストの取得用。レコードが1件もなければ失敗）
+    """
+
+    def run(start: int) -> Tuple[int, Union[str, EutilsError]]:
+        retmax = min(batch_size, total - start)
+        try:
+            text = fetch(start, retmax)
+        except EutilsError as exc:
+            return start, exc
+        records = count_medline_records(text)
+        if records < (retmax if require_full else 1):
+            return start, EutilsError(
+                f"Only {records} of {retmax} records returned for {start + 1}-{start + retmax}", retryable=True
+            )
+        return start, text
+
+    if not starts:
+        return
+    workers = min(resolve_max_in_flight(client or get_client(), max_in_flight), len(starts))
+    if workers == 1:
+        for start in starts:
+            yield run(start)
+        return
+    # 同時に抱える Future は workers 個まで。1件終わるごとに次の範囲を投入し、
+    # 返し終えた Future（とその本文）は手放す
+    remaining = iter(starts)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending: Set[Future] = set()
+    try:
+        pending = {pool.submit(run, start) for start in itertools.islice(remaining, workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for start in itertools.islice(remaining, len(done)):
+                pending.add(pool.submit(run, start))
+            while done:
+                yield done.pop().result()
+    finally:
+        # 途中で打ち切られた場合は未実行の範囲を取り消す（cancel_futures は Python 3.9 以降のため手で行う）
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+class _HistoryFetcher:
+    """WebEnv / query_key からバッチを取得する（失効したら検索し直す）"""
+
+    def __init__(
+        self,
+        client: EutilsClient,
+        db: str,
+        webenv: str,
+        query_key: str,
+        query: Optional[str] = None,
+        total: Optional[int] = None,
+    ):
+        self.client = client
+        self.db = db
+        self.webenv = webenv
+        self.query_key = query_key
+        self.query = query
+        self.total = total
+
+    def __call__(self, retstart: int, retmax: int) -> str:
+        text = self.client.efetch(
+            db=self.db,
+            WebEnv=self.webenv,
+            query_key=self.query_key,
+            retstart=retstart,
+            retmax=retmax,
+            rettype="medline",
+            retmode="text",
+        )
+        # 失効した履歴への efetch はレコードの代わりにエラー文を返す
+        if not count_medline_records(text) and _HISTORY_ERROR_RE.search(text):
+            raise HistoryExpiredError(f"History expired: {text.strip()[:200]}")
+        return text
+
+    def refresh(self) -> None:
+        """検索し直して新しい WebEnv を得る。件数が変わっていれば範囲が合わないので EutilsError"""
+        if self.query is None:
+            raise HistoryExpiredError("WebEnv expired and no query is available to rebuild it")
+        result = self.client.esearch(self.query, db=self.db, retmax=0, usehistory="y")
+        count = int(result["count"])
+        if self.total is not None and count != self.total:
+            raise EutilsError(f"Result count changed from {self.total:,} to {count:,}; restart the download")
+        self.webenv = result.get("webenv", "")
+        self.query_key = result.get("querykey", "")
+
+
+class MedlineDownload:
+    """チェックポイント付きの MEDLINE ダウンロード（1つの検索結果またはPMIDリスト）"""
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        key: str,
+        total: int,
+        fetch: BatchFetcher,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        refresh: Optional[Callable[[], None]] = None,
+        client: Optional[EutilsClient] = None,
+        require_full: bool = True,
+    ):
+        """
+        Args:
+            directory: チェックポイントを置くディレクトリ（キーごとのサブディレクトリを作る）
+            key: 取得対象を識別する文字列（再開時に同じ対象か確かめる）
+            total: 取得するレコード数
+            fetch: (retstart, retmax) のバッチを取得する関数
+            batch_size: efetch 1回あたりのレコード数
+            refresh: WebEnv が失効したときに呼ぶ関数（省略時は失効をそのまま送出）
+            client: 同時実行数の決定に使うクライアント（省略時は共有クライアント）
+            require_full: バッチごとに ``retmax`` 件が揃うことを求める（``fetch_batches`` を参照）
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.key = key
+        self.total = total
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.refresh = refresh
+        self.client = client
+        self.require_full = require_full
+        self.directory = Path(directory) / key[:16]
+        # retstart → 取得したレコード数
+        self.completed: Dict[int, int] = {}
+        # retstart → 最後のエラー
+        self.failed: Dict[int, str] = {}
+        self._refresh_lock = threading.Lock()
+        self._generation = 0
+        self._load_manifest()
+
+    # ---- 作成 ----
+
+    @classmethod
+    def for_history(
+        cls,
+        directory: Union[str, Path],
+        webenv: str,
+        query_key: str,
+        total: int,
+        query: Optional[str] = None,
+        client: Optional[EutilsClient] = None,
+        db: str = "pubmed",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> "MedlineDownload":
+        """
+        WebEnv / query_key の検索結果をダウンロードする
+
+        ``query`` を渡すと、キーが検索式と件数から決まるため別の実行（別の WebEnv）からも
+        再開でき、WebEnv が失効した場合は検索し直して続ける。
+        """
+        fetcher = _HistoryFetcher(client or get_client(), db, webenv, query_key, query=query, total=total)
+        if query is not None:
+            source = f"query:{db}:{normalize_query(query)}:{total}"
+        else:
+            source = f"history:{db}:{webenv}:{query_key}:{total}"
+        key = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return cls(
+            directory, key, total, fetcher, batch_size=batch_size, refresh=fetcher.refresh, client=fetcher.client
+        )
+
+    @classmethod
+    def for_query(
+        cls,
+        directory: Union[str, Path],
+        query: str,
+        client: Optional[EutilsClient] = None,
+        db: str = "pubmed",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> "MedlineDownload":
+        """検索式を usehistory=y で実行し、その結果をダウンロードする"""
+        client = client or get_client()
+        result = client.esearch(query, db=db, retmax=0, usehistory="y")
+        return cls.for_history(
+            directory,
+            result.get("webenv", ""),
+            result.get("querykey", ""),
+            int(result["count"]),
+            query=query,
+            client=client,
+            db=db,
+            batch_size=batch_size,
+        )
+
+    @classmethod
+    def for_pmids(
+        cls,
+        directory: Union[str, Path],
+        pmids: Sequence[str],
+        client: Optional[EutilsClient] = None,
+        db: str = "pubmed",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> "MedlineDownload":
+        """
+        PMIDリストをバッチごとに efetch（長いIDリストは自動でPOST）でダウンロードする
+
+        存在しないPMIDは返らないため、``retmax`` 件に満たないバッチも取得済みとする。
+        """
+        client = client or get_client()
+        ids = [str(pmid) for pmid in pmids]
+
+        def fetch(retstart: int, retmax: int) -> str:
+            return client.efetch(db=db, ids=ids[retstart:retstart + retmax], rettype="medline", retmode="text")
+
+        key = hashlib.sha1(f"pmids:{db}:{','.join(ids)}".encode("utf-8")).hexdigest()
+        return cls(directory, key, len(ids), fetch, batch_size=batch_size, client=client, require_full=False)
+
+    # ---- 状態 ----
+
+    @property
+    def starts(self) -> List[int]:
+        """すべてのバッチの retstart"""
+        return list(range(0, self.total, self.batch_size))
+
+    @property
+    def pending(self) -> List[int]:
+        """まだ取得していないバッチの retstart"""
+        return [start for start in self.starts if start not in self.completed]
+
+    @property
+    def complete(self) -> bool:
+        return not self.pending
+
+    @property
+    def records(self) -> int:
+        """取得済みのレコード数"""
+        return sum(self.completed.values())
+
+    def batch_path(self, start: int) -> Path:
+        return self.directory / f"{start:09d}.medline"
+
+    def _load_manifest(self) -> None:
+        path = self.directory / MANIFEST_NAME
+        if not path.exists():
+            return
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            manifest = {}
+        if (manifest.get("key"), manifest.get("total"), manifest.get("batch_size")) != (
+            self.key, self.total, self.batch_size,
+        ):
+            # 範囲が合わないので最初から取得し直す
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        self.completed = {
+            int(start): int(count)
+            for start, count in manifest.get("completed", {}).items()
+            if self.batch_path(int(start)).exists()
+        }
+        self.failed = {int(start): str(error) for start, error in manifest.get("failed", {}).items()}
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "key": self.key,
+            "total": self.total,
+            "batch_size": self.batch_size,
+            "completed": {str(start): count for start, count in sorted(self.completed.items())},
+            "failed": {str(start): error for start, error in sorted(self.failed.items())},
+            "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.directory / f"{MANIFEST_NAME}.tmp"
+        temporary.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(temporary, self.directory / MANIFEST_NAME)
+
+    # ---- 取得 ----
+
+    def _fetch_batch(self, start: int, retmax: int) -> str:
+        generation = self._generation
+        try:
+            return self.fetch(start, retmax)
+        except HistoryExpiredError:
+            if self.refresh is None:
+                raise
+            # 並列に失効を検知しても検索し直すのは1回だけ
+            with self._refresh_lock:
+                if self._generation == generation:
+                    self.refresh()
+                    self._generation += 1
+            return self.fetch(start, retmax)
+
+    def _store_batch(self, start: int, text: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.batch_path(start)
+        temporary = path.with_suffix(".medline.tmp")
+        temporary.write_text(text, encoding="utf-8")
+        os.replace(temporary, path)
+        self.completed[start] = count_medline_records(text)
+        self.failed.pop(start, None)
+        self._save_manifest()
+
+    def run(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        progress: Optional[Callable[[int, int], None]] = None,
+        max_in_flight: Optional[int] = None,
+    ) -> bool:
+        """
+        未取得のバッチを並列に取得して保存する（失敗したバッチは最大 ``max_attempts`` 回まで取り直す）
+
+        バッチは取得できた順にファイルへ書くが、読み出し（``iter_batches()``）は常に
+        retstart の順になる。チェックポイントの更新は呼び出し元のスレッドだけで行う。
+
+        Args:
+            max_attempts: 各バッチを試す回数
+            progress: バッチを保存するごとに (取得済み件数, 全件数) で呼ばれる関数
+            max_in_flight: 同時に取得するバッチ数（省略時はレート上限から決める。1 なら順に取得）
+
+        Returns:
+            すべてのバッチを取得できたら True（失敗した範囲は ``failed`` に残る）
+        """
+        for _ in range(max_attempts):
+            pending = self.pending
+            if not pending:
+                break
+            batches = fetch_batches(
+                self._fetch_batch, pending, self.total, self.batch_size,
+                max_in_flight=max_in_flight, client=self.client, require_full=self.require_full,
+            )
+            for start, text in batches:
+                if isinstance(text, EutilsError):
+                    self.failed[start] = str(text)
+                    self._save_manifest()
+                    continue
+                self._store_batch(start, text)
+                if progress is not None:
+                    progress(self.records, self.total)
+        return self.complete
+
+    # ---- 読み出し ----
+
+    def iter_batches(self) -> Iterator[str]:
+        """取得済みのバッチを retstart の順に1つずつ返す"""
+        for start in self.starts:
+            if start in self.completed:
+                yield self.batch_path(start).read_text(encoding="utf-8")
+
+    def write_medline(self, path: Union[str, Path]) -> Path:
+        """取得済みのバッチを順につないで1つのファイルに書き出す"""
+        path = Path(path)
+        with open(path, "w", encoding="utf-8") as out:
+            for index, text in enumerate(self.iter_batches()):
+                if index:
+                    out.write("\n")
+                out.write(text.rstrip("\n") + "\n")
+        return path
+
+    def cleanup(self) -> None:
+        """チェックポイントを削除する"""
+        shutil.rmtree(self.directory, ignore_errors=True)
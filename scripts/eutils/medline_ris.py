@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+MEDLINE形式（efetch rettype=medline）からRIS形式への逐次変換
+
+ファイルや行のイテレーターからMEDLINEを1レコードずつ読み、変換したRISのエントリを
+順に返す（書き出す）。全件の文字列を作らないため、10万件規模のファイルでも
+メモリ使用量は1レコード分にとどまる。
+
+タグごとの変換は読み込み時に組み立てた対応表（``_DISPATCH``）を1回引くだけで、
+行ごとに正規表現を評価しない。継続行（先頭6文字が空白）は直前のフィールドに
+空白でつなぐ。
+
+``download_pubmed_results.py``・``execute_pps_search.py``・``check_final_query.py``・
+``export_with_abstracts.py`` のRIS出力はこの変換を使う。
+
+Usage:
+    python scripts/eutils/medline_ris.py records.medline -o records.ris
+    python scripts/eutils/medline_ris.py --benchmark 100000
+
+    from scripts.eutils.medline_ris import convert_medline_file, iter_ris_entries
+
+    convert_medline_file("records.medline", "records.ris")
+    for entry in iter_ris_entries(open("records.medline", encoding="utf-8")):
+        ...
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+# MEDLINEのタグ → RISのタグ
+RIS_TAGS: Dict[str, str] = {
+    "PMID": "ID",
+    "TI": "T1",
+    "AB": "AB",   # 抄録
+    "AU": "A1",   # 著者（FAU は同じ著者のため出力しない）
+    "JT": "JF",   # ジャーナル名
+    "TA": "JA",   # 略誌名
+    "DP": "Y1",   # 発行日
+    "VI": "VL",   # 巻
+    "IP": "IS",   # 号
+    "PG": "SP",   # ページ
+    "LID": "DO",  # DOI（[doi] の付いた値のみ）
+    "AID": "DO",
+    "MH": "KW",   # MeSH用語
+    "OT": "KW",   # その他のキーワード
+    "PT": "M3",   # 出版タイプ
+    "LA": "LA",   # 言語
+}
+
+_DOI_SUFFIX = " [doi]"
+_ENTRY_START = "TY  - JOUR\n"
+_ENTRY_END = "ER  -\n\n"
+
+MedlineSource = Union[str, Path, Iterable[str]]
+
+
+def _doi(prefix: str) -> Callable[[str], Optional[str]]:
+    def convert(value: str) -> Optional[str]:
+        if value.endswith(_DOI_SUFFIX):
+            return prefix + value[:-len(_DOI_SUFFIX)].strip() + "\n"
+        return None
+    return convert
+
+
+def _plain(prefix: str) -> Callable[[str], Optional[str]]:
+    def convert(value: str) -> Optional[str]:
+        return prefix + value + "\n"
+    return convert
+
+
+# タグ → 値を受け取りRISの1行（変換しない値は None）を返す関数
+_DISPATCH: Dict[str, Callable[[str], Optional[str]]] = {
+    tag: (_doi if ris == "DO" else _plain)(f"{ris}  - ") for tag, ris in RIS_TAGS.items()
+}
+_DOI_TAGS = frozenset(tag for tag, ris in RIS_TAGS.items() if ris == "DO")
+
+
+def _lines(source: MedlineSource) -> Iterator[str]:
+    """MEDLINEの文字列・ファイルパス・行のイテレーターを行ごとに返す"""
+    if isinstance(source, Path):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from f
+    elif isinstance(source, str):
+        yield from source.splitlines()
+    else:
+        yield from source
+
+
+def iter_medline_records(source: MedlineSource) -> Iterator[List[Tuple[str, str]]]:
+    """
+    MEDLINEを1レコードずつ [(タグ, 値), ...] で返す
+
+    レコードの区切りは空行または ``PMID-`` 行。継続行は直前のフィールドの値に空白でつなぐ。
+
+    Args:
+        source: MEDLINEの文字列、ファイルパス（``Path``）、または行のイテレーター（ファイルオブジェクトなど）
+    """
+    fields: List[Tuple[str, str]] = []
+    tag: Optional[str] = None
+    parts: List[str] = []
+    for line in _lines(source):
+        line = line.rstrip()
+        if not line:
+            if tag is not None:
+                fields.append((tag, " ".join(parts)))
+                tag = None
+            if fields:
+                yield fields
+                fields = []
+            continue
+        if line[0] == " ":
+            # 継続行（6つの空白で始まる）
+            if tag is not None:
+                parts.append(line.lstrip())
+            continue
+        dash = line.find("-", 0, 6)
+        if dash < 0:
+            # タグのない行は前のフィールドの続きとみなす
+            if tag is not None:
+                parts.append(line)
+            continue
+        if tag is not None:
+            fields.append((tag, " ".join(parts)))
+        new_tag = line[:dash].rstrip()
+        if new_tag == "PMID" and fields:
+            yield fields
+            fields = []
+        tag = new_tag
+        parts = [line[dash + 1:].lstrip()]
+    if tag is not None:
+        fields.append((tag, " ".join(parts)))
+    if fields:
+        yield fields
+
+
+def medline_record_to_ris(fields: Iterable[Tuple[str, str]]) -> str:
+    """1レコード分の [(タグ, 値), ...] をRISの1エントリ（末尾は空行）にする"""
+    lines = [_ENTRY_START]
+    has_doi = False
+    dispatch = _DISPATCH
+    for tag, value in fields:
+        convert = dispatch.get(tag)
+        if convert is None:
+            continue
+        line = convert(value)
+        if line is None:
+            continue
+        if tag in _DOI_TAGS:
+            # LID と AID の同じDOIは1回だけ
+            if has_doi:
+                continue
+            has_doi = True
+        lines.append(line)
+    lines.append(_ENTRY_END)
+    return "".join(lines)
+
+
+def iter_ris_entries(source: MedlineSource) -> Iterator[str]:
+    """MEDLINEを読みながら、レコードごとのRISエントリを順に返す"""
+    for fields in iter_medline_records(source):
+        yield medline_record_to_ris(fields)
+
+
+def write_ris(source: MedlineSource, output: IO[str]) -> int:
+    """MEDLINEをRISに変換しながら ``output`` に書き出し、書き出したエントリ数を返す"""
+    count = 0
+    for entry in iter_ris_entries(source):
+        output.write(entry)
+        count += 1
+    return count
+
+
+def convert_medline_file(
+    source: Union[str, Path, Iterable[str]],
+    destination: Union[str, Path],
+) -> int:
+    """
+    MEDLINEのファイル（またはその行）をRISファイルに変換し、エントリ数を返す
+
+    ``source`` が文字列の場合はファイルパスとして扱う。
+    """
+    if isinstance(source, str):
+        source = Path(source)
+    with open(destination, "w", encoding="utf-8") as output:
+        return write_ris(source, output)
+
+
+def convert_medline_to_ris(medline_data: str) -> str:
+    """MEDLINEの文字列をRISの文字列に変換する"""
+    return "".join(iter_ris_entries(medline_data))
+
+
+def write_synthetic_medline(path: Union[str, Path], records: int, seed: int = 0) -> int:
+    """
+    ベンチマーク用の合成MEDLINEファイルを書き、バイト数を返す
+
+    書誌情報はスタブサーバーの合成コーパスから作り、抄録は実際のMEDLINEと同じく
+    継続行に折り返す。
+    """
+    from scripts.eutils.stub_server import SyntheticCorpus
+
+    corpus = SyntheticCorpus(size=records, seed=seed, auto_terms=False)
+    filler = textwrap.wrap(" ".join(["Background methods results and conclusions of the synthetic study."] * 12), 82)
+    with open(path, "w", encoding="utf-8") as f:
+        for pmid in corpus.all_pmids():
+            record = corpus.record(pmid)
+            lines = [f"PMID- {record.pmid}", "OWN - NLM", "STAT- MEDLINE", f"DP  - {record.year}",
+                     f"TI  - {record.title}", f"PG  - {pmid % 900 + 1}-{pmid % 900 + 9}",
+                     f"LID - {record.doi} [doi]", f"AB  - {record.abstract}"]
+            lines.extend(f"      {line}" for line in filler)
+            lines.extend(f"FAU - {name}" for name in record.authors)
+            lines.extend(f"AU  - {name}" for name in record.authors)
+            lines.extend(f"LA  - {lang}" for lang in record.languages)
+            lines.extend(f"PT  - {pt}" for pt in record.publication_types)
+            lines.extend([f"TA  - {record.journal}", f"JT  - {record.journal}", f"AID - {record.doi} [doi]"])
+            f.write("\n".join(lines) + "\n\n")
+    return os.path.getsize(path)
+
+
+def benchmark(records: int = 100_000, directory: Optional[Union[str, Path]] = None) -> Dict[str, float]:
+    """合成MEDLINEファイル（``records`` 件）の変換にかかる時間とスループットを測る"""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        source = Path(tmp) / "benchmark.medline"
+        size = write_synthetic_medline(source, records)
+        started = time.perf_counter()
+        converted = convert_medline_file(source, Path(tmp) / "benchmark.ris")
+        elapsed = time.perf_counter() - started
+    return {
+        "records": converted,
+        "megabytes": size / 1_000_000,
+        "seconds": elapsed,
+        "records_per_second": converted / elapsed if elapsed else 0.0,
+        "megabytes_per_second": size / 1_000_000 / elapsed if elapsed else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="MEDLINE形式のファイルをRIS形式に変換する")
+    parser.add_argument("input", nargs="?", help="MEDLINE形式のファイル")
+    parser.add_argument("-o", "--output", help="出力するRISファイル（既定: 入力の拡張子を .ris に変更）")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="N件の合成ファイルで変換速度を測る")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark(args.benchmark)
+        print(f"{int(result['records']):,} records ({result['megabytes']:.1f} MB) in {result['seconds']:.2f}s: "
+              f"{result['records_per_second']:,.0f} records/s, {result['megabytes_per_second']:.1f} MB/s")
+        return 0
+    if not args.input:
+        parser.error("input is required unless --benchmark is given")
+
+    output = args.output or str(Path(args.input).with_suffix(".ris"))
+    count = convert_medline_file(args.input, output)
+    print(f"{count:,} records → {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""
+PMIDの書誌メタデータの列指向ストア（よく使うフィルターを手元で評価する）
+
+Humans / Animals、言語、出版タイプ、出版年のフィルターを各ブロックに付けて検索し直す
+代わりに、ブロックのPMID集合と各PMIDのメタデータを一度だけ取得して保存し、
+フィルターの段階をベクトル演算のマスクで評価する。
+
+保存形式（ディレクトリ、列ごとの .npy。``load()`` はメモリマップで読み込む）:
+    pmids.npy                ソート済み uint32
+    pub_year.npy             印刷版の出版年（uint16、不明は 0）
+    epub_year.npy            電子版の出版年（uint16、不明は 0）
+    humans.npy / animals.npy MeSH の Humans / Animals（チェックタグ）の有無
+    lang_offsets.npy         言語（CSR形式: PMID i の言語は lang_values[offsets[i]:offsets[i+1]]）
+    lang_values.npy          言語の語彙番号（uint16）
+    pt_offsets.npy           出版タイプ（CSR形式）
+    pt_values.npy            出版タイプの語彙番号（uint16）
+    vocab.json               言語・出版タイプの語彙と更新日時
+    sets/<sha1>.npy          検索式ごとのPMID集合（``cached_set()``）
+
+メタデータは不足分だけを epost（POST）+ efetch（XML、ページ単位）で取得して追記する。
+
+手元で評価できる条件（それ以外は ``UnsupportedFilterError``。呼び出し側で通常の検索に戻す）:
+    - AND / OR / NOT と括弧（PubMedと同じく左から順に評価）。ただし括弧の外の OR は
+      ブロックのPMID集合の外に広がるため評価できない
+    - ``English[lang]`` / ``jpn[la]`` などの言語
+    - ``Editorial[PT]`` / ``"Randomized Controlled Trial"[Publication Type]`` などの出版タイプ
+    - ``Humans[Mesh]`` / ``Animals[Mesh]``（Animals は展開され Humans を含む。``:noexp`` なら含まない）
+    - 年単位の ``[PDAT]`` の範囲（``parse_pdat_window()`` の書式）
+
+MeSH はチェックタグとしての Humans / Animals だけを見るため、Animals のない「Mice」だけの
+索引などではPubMedの件数とずれうる。``cross_check_counts()`` で一部のセルを実際の件数と照合する。
+
+Usage:
+    from scripts.eutils.metadata_store import PmidMetadataStore
+
+    store = PmidMetadataStore.load()
+    pmids = store.cached_set('("Physicians"[Mesh]) AND (ikigai[tiab])')
+    store.populate(pmids)
+    print(store.count(pmids, ['AND Humans[Mesh]', 'AND (English[lang] OR Japanese[lang])']))
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from scripts.query import DateRange, Group, LineRef, Node, Term, iter_nodes, parse
+
+from .batch import count_mapping
+from .client import EutilsClient, EutilsError, get_client
+from .compact_set import PMID_DTYPE, PmidSet
+from .count_cache import normalize_query
+from .pmid_sets import fetch_pmid_set
+from .year_histogram import UNKNOWN_YEAR, YEAR_DTYPE, parse_pdat_window
+
+DEFAULT_METADATA_DIR = Path(__file__).resolve().parents[2] / ".cache" / "eutils" / "metadata"
+# efetch（XML）1回あたりのPMID数
+DEFAULT_FETCH_PAGE_SIZE = 500
+# epost 1回あたりのPMID数
+DEFAULT_POST_CHUNK_SIZE = 10000
+# 照合する既定のセル数
+DEFAULT_CROSS_CHECK_SAMPLE = 3
+
+_VOCAB_DTYPE = np.uint16
+_OFFSET_DTYPE = np.int64
+
+# [lang] に書かれる言語名 → MEDLINE の言語コード（3文字のコードはそのまま使える）
+LANGUAGE_CODES = {
+    "english": "eng",
+    "japanese": "jpn",
+    "french": "fre",
+    "german": "ger",
+    "spanish": "spa",
+    "italian": "ita",
+    "portuguese": "por",
+    "russian": "rus",
+    "chinese": "chi",
+    "korean": "kor",
+    "dutch": "dut",
+    "polish": "pol",
+    "turkish": "tur",
+}
+
+_LANGUAGE_FIELDS = frozenset({"lang", "la", "language"})
+_PUBLICATION_TYPE_FIELDS = frozenset({"pt", "publication type"})
+_MESH_FIELDS = frozenset({"mesh", "mh", "mesh terms"})
+_DATE_FIELDS = frozenset({"pdat", "dp", "date - publication"})
+
+_YEAR_RE = re.compile(r"(\d{4})")
+
+
+class UnsupportedFilterError(ValueError):
+    """手元のメタデータでは評価できない条件"""
+
+
+@dataclass(frozen=True)
+class MetadataRecord:
+    """1件分のメタデータ"""
+
+    pmid: int
+    pub_year: int = UNKNOWN_YEAR
+    epub_year: int = UNKNOWN_YEAR
+    languages: Tuple[str, ...] = ()
+    publication_types: Tuple[str, ...] = ()
+    humans: bool = False
+    animals: bool = False
+
+
+def _year(text: Optional[str]) -> int:
+    match = _YEAR_RE.search(text or "")
+    return int(match.group(1)) if match else UNKNOWN_YEAR
+
+
+def parse_metadata_xml(content: Union[bytes, str]) -> List[MetadataRecord]:
+    """efetch（retmode=xml）の応答からメタデータを読み取る（PubmedArticle と PubmedBookArticle）"""
+    root = ET.fromstring(content)
+    records = []
+    for article in root:
+        pmid = article.findtext("MedlineCitation/PMID") or article.findtext("BookDocument/PMID")
+        if not pmid:
+            continue
+        pub_date = article.find(".//PubDate")
+        pub_year = UNKNOWN_YEAR
+        if pub_date is not None:
+            pub_year = _year(pub_date.findtext("Year") or pub_date.findtext("MedlineDate"))
+        descriptors = {
+            (element.text or "").strip().lower()
+            for element in article.iterfind(".//MeshHeading/DescriptorName")
+        }
+        records.append(MetadataRecord(
+            pmid=int(pmid),
+            pub_year=pub_year,
+            epub_year=_year(article.findtext(".//ArticleDate[@DateType='Electronic']/Year")),
+            languages=tuple(dict.fromkeys((el.text or "").strip().lower() for el in article.iterfind(".//Language"))),
+            publication_types=tuple(dict.fromkeys(
+                (el.text or "").strip() for el in article.iterfind(".//PublicationType")
+            )),
+            humans="humans" in descriptors,
+            animals="animals" in descriptors,
+        ))
+    return records
+
+
+def _gather(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR形式の列から ``rows`` の値をまとめて取り出す（(行の番号, 値)）"""
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    owners = np.repeat(np.arange(len(rows)), lengths)
+    base = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return owners, values[base + np.arange(total)]
+
+
+class PmidMetadataStore:
+    """PMID → 出版年・言語・出版タイプ・Humans / Animals の列指向ストア"""
+
+    _COLUMNS = ("pmids", "pub_year", "epub_year", "humans", "animals",
+                "lang_offsets", "lang_values", "pt_offsets", "pt_values")
+
+    def __init__(self, directory: Union[str, Path] = DEFAULT_METADATA_DIR, client: Optional[EutilsClient] = None):
+        """
+        空のストアを作る（保存済みのストアは ``load()`` で読み込む）
+
+        Args:
+            directory: 保存先ディレクトリ
+            client: 使用するクライアント（省略時は共有クライアント）
+        """
+        self.directory = Path(directory)
+        self.client = client
+        self.languages: List[str] = []
+        self.publication_types: List[str] = []
+        self.updated_at = ""
+        self.pmids = np.zeros(0, dtype=PMID_DTYPE)
+        self.pub_year = np.zeros(0, dtype=YEAR_DTYPE)
+        self.epub_year = np.zeros(0, dtype=YEAR_DTYPE)
+        self.humans = np.zeros(0, dtype=bool)
+        self.animals = np.zeros(0, dtype=bool)
+        self.lang_offsets = np.zeros(1, dtype=_OFFSET_DTYPE)
+        self.lang_values = np.zeros(0, dtype=_VOCAB_DTYPE)
+        self.pt_offsets = np.zeros(1, dtype=_OFFSET_DTYPE)
+        self.pt_values = np.zeros(0, dtype=_VOCAB_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.pmids)
+
+    # ---- 保存と読み込み ----
+
+    @classmethod
+    def load(
+        cls,
+        directory: Union[str, Path] = DEFAULT_METADATA_DIR,
+        client: Optional[EutilsClient] = None,
+        mmap: bool = True,
+    ) -> "PmidMetadataStore":
+        """保存済みのストアを読み込む（なければ空のストア）"""
+        store = cls(directory, client=client)
+        vocab_path = store.directory / "vocab.json"
+        if not vocab_path.exists():
+            return store
+        vocab = json.loads(vocab_path.read_text(encoding="utf-8"))
+        store.languages = list(vocab["languages"])
+        store.publication_types = list(vocab["publication_types"])
+        store.updated_at = vocab.get("updated_at", "")
+        for name in cls._COLUMNS:
+            array = np.load(store.directory / f"{name}.npy", mmap_mode="r" if mmap else None, allow_pickle=False)
+            setattr(store, name, array)
+        return store
+
+    def save(self) -> Path:
+        """列ごとの .npy と vocab.json を保存する（読み込み中のメモリマップを壊さないよう置き換えで書く）"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name in self._COLUMNS:
+            path = self.directory / f"{name}.npy"
+            temporary = path.with_suffix(".npy.tmp")
+            with open(temporary, "wb") as f:
+                np.save(f, np.asarray(getattr(self, name)), allow_pickle=False)
+            os.replace(temporary, path)
+        vocab = {
+            "languages": self.languages,
+            "publication_types": self.publication_types,
+            "updated_at": self.updated_at,
+            "records": len(self),
+        }
+        temporary = self.directory / "vocab.json.tmp"
+        temporary.write_text(json.dumps(vocab, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(temporary, self.directory / "vocab.json")
+        return self.directory
+
+    # ---- 追加 ----
+
+    def add(self, records: Iterable[MetadataRecord]) -> int:
+        """
+        メタデータを追加する（同じPMIDは新しいもので置き換える）
+
+        Returns:
+            追加・更新した件数
+        """
+        new = {record.pmid: record for record in records}
+        if not new:
+            return 0
+        language_index = {code: i for i, code in enumerate(self.languages)}
+        type_index = {name: i for i, name in enumerate(self.publication_types)}
+
+        def encode(items: Tuple[str, ...], index: Dict[str, int], vocab: List[str]) -> List[int]:
+            for item in items:
+                if item not in index:
+                    index[item] = len(vocab)
+                    vocab.append(item)
+            return [index[item] for item in items]
+
+        ordered = [new[pmid] for pmid in sorted(new)]
+        added_pmids = np.asarray([r.pmid for r in ordered], dtype=PMID_DTYPE)
+        added_languages = [encode(r.languages, language_index, self.languages) for r in ordered]
+        added_types = [encode(r.publication_types, type_index, self.publication_types) for r in ordered]
+
+        keep = ~np.isin(self.pmids, added_pmids)
+        kept_rows = np.flatnonzero(keep)
+        pmids = np.concatenate([np.asarray(self.pmids)[keep], added_pmids])
+        order = np.argsort(pmids, kind="stable")
+
+        def merged(column: np.ndarray, values: List[Any], dtype) -> np.ndarray:
+            return np.concatenate([np.asarray(column)[keep], np.asarray(values, dtype=dtype)])[order]
+
+        def merged_csr(offsets: np.ndarray, values: np.ndarray, added: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+            lengths = np.concatenate([
+                np.diff(np.asarray(offsets))[keep],
+                np.asarray([len(items) for items in added], dtype=_OFFSET_DTYPE),
+            ])
+            _, old_values = _gather(np.asarray(offsets), np.asarray(values), kept_rows)
+            flat = np.concatenate([old_values, np.asarray([v for items in added for v in items], dtype=_VOCAB_DTYPE)])
+            starts = np.concatenate([[0], np.cumsum(lengths)])[:-1]
+            lengths = lengths[order]
+            new_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(_OFFSET_DTYPE)
+            gather = np.repeat(starts[order] - new_offsets[:-1], lengths) + np.arange(int(lengths.sum()))
+            return new_offsets, flat[gather].astype(_VOCAB_DTYPE)
+
+        self.lang_offsets, self.lang_values = merged_csr(self.lang_offsets, self.lang_values, added_languages)
+        self.pt_offsets, self.pt_values = merged_csr(self.pt_offsets, self.pt_values, added_types)
+        self.pub_year = merged(self.pub_year, [r.pub_year for r in ordered], YEAR_DTYPE)
+        self.epub_year = merged(self.epub_year, [r.epub_year for r in ordered], YEAR_DTYPE)
+        self.humans = merged(self.humans, [r.humans for r in ordered], bool)
+        self.animals = merged(self.animals, [r.animals for r in ordered], bool)
+        self.pmids = pmids[order]
+        self.updated_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        return len(ordered)
+
+    def missing(self, pmids: PmidSet) -> PmidSet:
+        """ストアにないPMID"""
+        return pmids - PmidSet.from_sorted(self.pmids)
+
+    def populate(
+        self,
+        pmids: PmidSet,
+        db: str = "pubmed",
+        page_size: int = DEFAULT_FETCH_PAGE_SIZE,
+        chunk_size: int = DEFAULT_POST_CHUNK_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        ストアにないPMIDのメタデータを取得して追加・保存する
+
+        Args:
+            pmids: 必要なPMID
+            page_size: efetch 1回あたりのPMID数
+            chunk_size: epost 1回あたりのPMID数
+            progress: ページを取得するごとに (取得済み件数, 取得する件数) で呼ばれる関数
+
+        Returns:
+            取得した件数
+
+        Raises:
+            EutilsError: 取得に失敗した、または一部のPMIDのメタデータが返らなかった
+                （取得できた分は保存される）
+        """
+        client = self.client or get_client()
+        missing = self.missing(pmids).to_strings()
+        fetched: List[MetadataRecord] = []
+        try:
+            for chunk_start in range(0, len(missing), chunk_size):
+                chunk = missing[chunk_start:chunk_start + chunk_size]
+                webenv, query_key = client.epost(chunk, db=db)
+                for retstart in range(0, len(chunk), page_size):
+                    content = client.efetch_bytes(
+                        db=db,
+                        WebEnv=webenv,
+                        query_key=query_key,
+                        retmode="xml",
+                        retstart=str(retstart),
+                        retmax=str(page_size),
+                    )
+                    fetched.extend(parse_metadata_xml(content))
+                    if progress is not None:
+                        progress(min(chunk_start + retstart + page_size, len(missing)), len(missing))
+        finally:
+            if fetched:
+                self.add(fetched)
+                self.save()
+        still_missing = len(self.missing(pmids))
+        if still_missing:
+            raise EutilsError(f"No metadata returned for {still_missing:,} of {len(missing):,} PMIDs")
+        return len(fetched)
+
+    def cached_set(self, query: str, refresh: bool = False) -> PmidSet:
+        """検索式のPMID集合（``sets/`` に保存したものがあれば再利用する）"""
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+        path = self.directory / "sets" / f"{digest}.npy"
+        if path.exists() and not refresh:
+            return PmidSet.load(path)
+        pmids = fetch_pmid_set(query, client=self.client or get_client())
+        pmids.save(path)
+        return pmids
+
+    # ---- フィルターの評価 ----
+
+    def rows(self, pmids: PmidSet) -> np.ndarray:
+        """PMIDのストア上の行番号。ストアにないPMIDがあれば KeyError"""
+        rows = np.searchsorted(self.pmids, pmids.array)
+        found = rows < len(self.pmids)
+        found[found] = np.asarray(self.pmids)[rows[found]] == pmids.array[found]
+        if not found.all():
+            raise KeyError(f"{int((~found).sum()):,} PMIDs are not in the metadata store (call populate())")
+        return rows
+
+    def mask(self, pmids: PmidSet, clauses: Sequence[str]) -> np.ndarray:
+        """
+        ``pmids`` に条件を左から順に適用した結果の真偽配列（``pmids`` の順）
+
+        Args:
+            clauses: ``AND Humans[Mesh]`` のように演算子で始まる条件（検索式に続けて書く形）
+
+        Raises:
+            UnsupportedFilterError: 手元で評価できない条件がある
+        """
+        rows = self.rows(pmids)
+        return _FilterEvaluator(self, rows).evaluate(" ".join(clauses))
+
+    def count(self, pmids: PmidSet, clauses: Sequence[str] = ()) -> int:
+        """``pmids`` に条件を適用した件数"""
+        if not clauses:
+            return len(pmids)
+        return int(np.count_nonzero(self.mask(pmids, clauses)))
+
+    def select(self, pmids: PmidSet, clauses: Sequence[str]) -> PmidSet:
+        """``pmids`` に条件を適用したPMID集合"""
+        return PmidSet.from_sorted(pmids.array[self.mask(pmids, clauses)])
+
+
+def _contains_base(node: Node) -> bool:
+    return any(isinstance(child, LineRef) and child.number == _FilterEvaluator._BASE for child in iter_nodes(node))
+
+
+class _FilterEvaluator:
+    """フィルター条件を ``parse()`` のASTとして ``rows`` 上の真偽配列に評価する"""
+
+    # 条件を続ける元の検索式（``#0 AND Humans[Mesh]`` の ``#0``）
+    _BASE = 0
+
+    def __init__(self, store: PmidMetadataStore, rows: np.ndarray):
+        self.store = store
+        self.rows = rows
+
+    def evaluate(self, clauses: str) -> np.ndarray:
+        prefix = f"#{self._BASE} "
+        self.parsed = parse(prefix + clauses)
+        if self.parsed.errors:
+            issue = self.parsed.errors[0]
+            raise UnsupportedFilterError(f"{issue.message} (position {issue.position - len(prefix)})")
+        return self._node(self.parsed.root)
+
+    def _node(self, node: Node) -> np.ndarray:
+        if isinstance(node, Group):
+            return self._node(node.child)
+        if isinstance(node, LineRef):
+            if node.number != self._BASE:
+                raise UnsupportedFilterError(f"Search line references are not supported: #{node.number}")
+            return np.ones(len(self.rows), dtype=bool)
+        if isinstance(node, Term):
+            return self._atom(node)
+        if isinstance(node, DateRange):
+            return self._date(self.parsed.text(node))
+        if node.op == "OR" and any(_contains_base(operand) for operand in node.operands):
+            raise UnsupportedFilterError("A top-level OR reaches beyond the cached PMID set")
+        return self._combine(node.op, [self._node(operand) for operand in node.operands])
+
+    @staticmethod
+    def _combine(op: str, values: List[np.ndarray]) -> np.ndarray:
+        result = values[0]
+        for right in values[1:]:
+            if op == "AND":
+                result = result & right
+            elif op == "OR":
+                result = result | right
+            else:
+                result = result & ~right
+        return result
+
+    def _atom(self, term: Term) -> np.ndarray:
+        token = self.parsed.text(term)
+        if term.field is None:
+            raise UnsupportedFilterError(f"Filter term needs a field tag: {token}")
+        text = term.value.strip().lower()
+        tag = " ".join(term.field.split()).lower()
+        noexp = tag.endswith(":noexp")
+        tag = tag.split(":")[0]
+        store = self.store
+
+        if tag in _LANGUAGE_FIELDS:
+            code = LANGUAGE_CODES.get(text, text)
+            if len(code) != 3:
+                raise UnsupportedFilterError(f"Unknown language: {token}")
+            return self._any_of(store.lang_offsets, store.lang_values, store.languages, {code})
+        if tag in _PUBLICATION_TYPE_FIELDS:
+            return self._any_of(store.pt_offsets, store.pt_values, [v.lower() for v in store.publication_types], {text})
+        if tag in _MESH_FIELDS and text == "humans":
+            return np.asarray(store.humans)[self.rows]
+        if tag in _MESH_FIELDS and text == "animals":
+            # Animals の下位に Humans があるため、展開すると Humans の論文も含む
+            animals = np.asarray(store.animals)[self.rows]
+            return animals if noexp else animals | np.asarray(store.humans)[self.rows]
+        if tag in _DATE_FIELDS:
+            return self._date(token)
+        raise UnsupportedFilterError(f"Not available in the metadata store: {token}")
+
+    def _any_of(self, offsets: np.ndarray, values: np.ndarray, vocab: Sequence[str], wanted: set) -> np.ndarray:
+        codes = [i for i, item in enumerate(vocab) if item in wanted]
+        result = np.zeros(len(self.rows), dtype=bool)
+        if not codes:
+            return result
+        owners, items = _gather(np.asarray(offsets), np.asarray(values), self.rows)
+        result[owners[np.isin(items, codes)]] = True
+        return result
+
+    def _date(self, token: str) -> np.ndarray:
+        window = parse_pdat_window(token)
+        if window is None or window == (None, None):
+            raise UnsupportedFilterError(f"Not a year-aligned [PDAT] window: {token}")
+        start, end = window
+        result = np.zeros(len(self.rows), dtype=bool)
+        for column in (self.store.pub_year, self.store.epub_year):
+            years = np.asarray(column)[self.rows]
+            inside = years != UNKNOWN_YEAR
+            if start is not None:
+                inside &= years >= start
+            if end is not None:
+                inside &= years <= end
+            result |= inside
+        return result
+
+
+@dataclass(frozen=True)
+class CrossCheck:
+    """手元で数えた件数と実際の件数の照合結果"""
+
+    key: Hashable
+    query: str
+    local: int
+    live: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def matches(self) -> bool:
+        return self.error is None and self.live == self.local
+
+
+def cross_check_counts(
+    cells: Mapping[Hashable, Tuple[str, int]],
+    sample: int = DEFAULT_CROSS_CHECK_SAMPLE,
+    client: Optional[EutilsClient] = None,
+    max_in_flight: Optional[int] = None,
+    seed: int = 0,
+) -> List[CrossCheck]:
+    """
+    手元で数えたセルから ``sample`` 件を選び、実際の件数と照合する
+
+    Args:
+        cells: キー → (検索式, 手元で数えた件数)
+        sample: 照合するセルの数（0 なら照合しない）
+        seed: セルを選ぶ擬似乱数のシード
+    """
+    keys = list(cells)
+    if sample <= 0 or not keys:
+        return []
+    chosen = random.Random(seed).sample(keys, min(sample, len(keys)))
+    live = count_mapping({key: cells[key][0] for key in chosen}, max_in_flight=max_in_flight, client=client)
+    return [
+        CrossCheck(key=key, query=cells[key][0], local=cells[key][1], live=live[key].count, error=live[key].error)
+        for key in chosen
+    ]
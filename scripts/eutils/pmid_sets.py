@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+検索式ごとのPMID集合の取得
+
+ブロック内の各行のPMID集合を1回ずつ取得しておけば、累積OR・追加件数・
+その行だけが捕捉する件数（固有件数）は手元の集合演算で求められる。
+累積ORの長い検索式を何度も投げる必要がなくなる。
+
+取得方法:
+    1. esearch（usehistory=y, retmax=page_size）で件数と先頭ページのIDを取得
+    2. 残りは同じ WebEnv / query_key から efetch（rettype=uilist）でページ単位に取得
+    3. 取得したIDの数が件数と一致しなければ失敗として扱う
+
+PubMedの esearch は1つの検索式につき先頭 9,999 件までしかIDを返さない。
+``fetch_pmid_set_partitioned()`` は件数が上限を超える検索式を ``[PDAT]`` の期間で
+再帰的に二分し（年単位、1年に収まらなければ日単位）、上限以下になった期間ごとの
+IDを並列に取得して和集合を作る。和集合の件数は元の検索式の件数と照合する。
+
+``search_pmids()`` は検索結果の順に必要な件数だけPMIDを返す（上限を超える分は
+esearch の WebEnv から取得し、取得できなかった場合だけ期間で分割する）。
+
+Usage:
+    from scripts.eutils.pmid_sets import fetch_pmid_sets
+
+    for result in fetch_pmid_sets(['ikigai[tiab]', '"work engagement"[tiab]']):
+        print(result.query, len(result.pmids) if result.success else result.error)
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .batch import resolve_max_in_flight
+from .client import _HISTORY_ERROR_RE, EutilsClient, EutilsError, HistoryExpiredError, get_client
+from .compact_set import PmidSet
+
+# esearch / efetch（uilist）の1ページあたりのID数
+DEFAULT_PAGE_SIZE = 10000
+# PubMedの esearch で1つの検索式から取得できるIDの上限
+ESEARCH_ID_CAP = 9999
+# 期間で分割するときの全体の範囲
+PARTITION_START = date(1700, 1, 1)
+PARTITION_END = date(3000, 12, 31)
+
+
+@dataclass(frozen=True)
+class PmidSetResult:
+    """1件の検索式に対するPMID集合の取得結果（失敗時は error にメッセージ）"""
+
+    query: str
+    pmids: Optional[PmidSet] = None
+    count: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and self.pmids is not None
+
+
+def _history_pages(
+    client: EutilsClient,
+    db: str,
+    result: Dict[str, Any],
+    retstart: int,
+    stop: int,
+    page_size: int,
+) -> Iterator[np.ndarray]:
+    """esearch の WebEnv / query_key から ``[retstart, stop)`` のIDを efetch（uilist）でページ単位に返す"""
+    while retstart < stop:
+        text = client.efetch(
+            db=db,
+            WebEnv=result.get("webenv"),
+            query_key=result.get("querykey"),
+            rettype="uilist",
+            retmode="text",
+            retstart=str(retstart),
+            retmax=str(min(page_size, stop - retstart)),
+        )
+        # 失効した履歴への efetch はIDの代わりにエラー文を返す
+        if _HISTORY_ERROR_RE.search(text):
+            raise HistoryExpiredError(f"History expired: {text.strip()[:200]}")
+        try:
+            page = np.array(text.split(), dtype=np.int64)
+        except ValueError:
+            # <ERROR>Search Backend failed</ERROR> など、IDの代わりに返るエラー本文
+            raise EutilsError(f"Unexpected efetch response: {text.strip()[:200]}", retryable=True) from None
+        if not page.size:
+            return
+        yield page
+        retstart += len(page)
+
+
+def fetch_pmid_set(
+    query: str,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    strict: bool = True,
+) -> PmidSet:
+    """
+    検索式にヒットするPMIDをすべて取得する（ソート済み uint32 配列の ``PmidSet``）
+
+    Raises:
+        EutilsError: 検索に失敗した、または件数分のIDを取得できなかった
+    """
+    client = client or get_client()
+    result = client.esearch(query, db=db, retmax=page_size, strict=strict, usehistory="y")
+    count = int(result["count"])
+    pages = [np.asarray(result.get("idlist", []), dtype=np.int64)]
+
+    pages.extend(_history_pages(client, db, result, len(pages[0]), count, page_size))
+
+    pmids = PmidSet(np.concatenate(pages))
+    if len(pmids) != count:
+        raise EutilsError(f"Retrieved {len(pmids):,} of {count:,} PMIDs for query: {query[:100]}")
+    return pmids
+
+
+def fetch_pmid_sets(
+    queries: Sequence[str],
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    max_in_flight: Optional[int] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    strict: bool = True,
+) -> List[PmidSetResult]:
+    """
+    複数の検索式のPMID集合を並列に取得する（結果は入力順、失敗は error に記録）
+
+    Args:
+        queries: 検索式のリスト
+        client: 使用するクライアント（省略時は共有クライアント）
+        db: データベース名
+        max_in_flight: 同時に取得する検索式の数（省略時はレート上限に合わせる）
+        page_size: 1ページあたりのID数
+        strict: errorlist（phrasesnotfound など）を失敗として扱うか
+    """
+    client = client or get_client()
+
+    def run(query: str) -> PmidSetResult:
+        try:
+            pmids = fetch_pmid_set(query, client=client, db=db, page_size=page_size, strict=strict)
+        except EutilsError as exc:
+            return PmidSetResult(query=query, error=str(exc))
+        return PmidSetResult(query=query, pmids=pmids, count=len(pmids))
+
+    if not queries:
+        return []
+    workers = min(resolve_max_in_flight(client, max_in_flight), len(queries))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, queries))
+
+
+def pdat_clause(start: date, end: date) -> str:
+    """期間の検索式（``("2020/01/01"[PDAT] : "2020/12/31"[PDAT])``）"""
+    return f'("{start:%Y/%m/%d}"[PDAT] : "{end:%Y/%m/%d}"[PDAT])'
+
+
+def _split_window(start: date, end: date) -> List[Tuple[date, date]]:
+    """期間を二分する（複数年なら年の境目で、1年以内なら日数の中央で。1日なら分割できない）"""
+    if start.year < end.year:
+        middle = (start.year + end.year) // 2
+        return [(start, date(middle, 12, 31)), (date(middle + 1, 1, 1), end)]
+    if start >= end:
+        return []
+    middle = start + (end - start) // 2
+    return [(start, middle), (middle + timedelta(days=1), end)]
+
+
+@dataclass(frozen=True)
+class DateSlice:
+    """期間で分割した検索式の1区間"""
+
+    start: date
+    end: date
+    count: int
+
+    @property
+    def clause(self) -> str:
+        return pdat_clause(self.start, self.end)
+
+
+@dataclass(frozen=True)
+class PartitionedPmidSet:
+    """期間で分割して取得したPMID集合"""
+
+    query: str
+    pmids: PmidSet
+    # 元の検索式の件数
+    count: int
+    # IDを取得した区間（分割しなかった場合は空）
+    slices: Tuple[DateSlice, ...] = ()
+
+    @property
+    def complete(self) -> bool:
+        """和集合の件数が元の検索式の件数と一致したか"""
+        return len(self.pmids) == self.count
+
+
+def fetch_pmid_set_partitioned(
+    query: str,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    max_in_flight: Optional[int] = None,
+    cap: int = ESEARCH_ID_CAP,
+    strict: bool = True,
+    total: Optional[int] = None,
+    start: date = PARTITION_START,
+    end: date = PARTITION_END,
+) -> PartitionedPmidSet:
+    """
+    esearch の取得上限を超える検索式のPMIDを、``[PDAT]`` の期間で分割してすべて取得する
+
+    件数が ``cap`` 以下なら分割せず1回の esearch で取得する。上限を超える区間は
+    二分して並列に検索し直す。和集合の件数が元の件数と一致しない場合（出版日のない
+    レコードなど）は ``complete`` が False になる。
+
+    Args:
+        query: 検索式
+        client: 使用するクライアント（省略時は共有クライアント）
+        db: データベース名
+        max_in_flight: 同時に検索する区間の数（省略時はレート上限に合わせる）
+        cap: 1回の esearch で取得するIDの上限
+        strict: errorlist（phrasesnotfound など）を失敗として扱うか
+        total: 元の検索式の件数（既知なら最初の検索を省略する）
+        start: 分割する全体の範囲の開始日
+        end: 分割する全体の範囲の終了日
+
+    Raises:
+        EutilsError: 検索に失敗した、または1日の区間でも上限を超えた
+    """
+    client = client or get_client()
+
+    def search(window: Optional[Tuple[date, date]]) -> Tuple[Optional[Tuple[date, date]], int, List[str]]:
+        sliced = query if window is None else f"({query}) AND {pdat_clause(*window)}"
+        result = client.esearch(sliced, db=db, retmax=cap, strict=strict)
+        return window, int(result["count"]), list(result.get("idlist", []))
+
+    if total is None:
+        _, total, ids = search(None)
+        if total <= cap:
+            return PartitionedPmidSet(query=query, pmids=PmidSet(np.asarray(ids, dtype=np.int64)), count=total)
+
+    pages: List[np.ndarray] = []
+    slices: List[DateSlice] = []
+    workers = resolve_max_in_flight(client, max_in_flight)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending: Set[Future] = set()
+    try:
+        pending = {pool.submit(search, window) for window in _split_window(start, end)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window, count, ids = future.result()
+                if count > cap:
+                    children = _split_window(*window)
+                    if not children:
+                        raise EutilsError(
+                            f"{count:,} records share the publication date {window[0]:%Y/%m/%d}; "
+                            f"cannot partition below {cap:,}: {query[:100]}"
+                        )
+                    pending.update(pool.submit(search, child) for child in children)
+                elif count:
+                    pages.append(np.asarray(ids, dtype=np.int64))
+                    slices.append(DateSlice(start=window[0], end=window[1], count=count))
+    finally:
+        # 失敗時は未実行の区間を取り消す（cancel_futures は Python 3.9 以降のため手で行う）
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+    pmids = PmidSet(np.concatenate(pages)) if pages else PmidSet()
+    return PartitionedPmidSet(
+        query=query,
+        pmids=pmids,
+        count=total,
+        slices=tuple(sorted(slices, key=lambda item: item.start)),
+    )
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """検索式の件数と、検索結果の順（新しいものから）のPMID"""
+
+    query: str
+    count: int
+    pmids: List[str]
+    # 検索結果全体を保持する履歴（efetch の WebEnv / query_key にそのまま使える）
+    webenv: str = ""
+    query_key: str = ""
+
+
+def search_pmids(
+    query: str,
+    retmax: int,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    strict: bool = True,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cap: int = ESEARCH_ID_CAP,
+) -> SearchResult:
+    """
+    検索式の件数と、検索結果の順に最大 ``retmax`` 件のPMIDを取得する
+
+    esearch（usehistory=y）の idlist は ``cap`` 件までだが、返される WebEnv / query_key には
+    検索結果全体が保持される。上限を超える分は同じ履歴から efetch（uilist）でページ単位に取得し、
+    それでも足りない場合（履歴の失効など）に限り ``fetch_pmid_set_partitioned()`` で
+    ``[PDAT]`` の期間に分割して取得する。
+
+    Args:
+        query: 検索式
+        retmax: 取得するPMIDの最大数（0 なら件数と履歴だけ）
+        client: 使用するクライアント（省略時は共有クライアント）
+        db: データベース名
+        strict: errorlist（phrasesnotfound など）を失敗として扱うか
+        page_size: efetch（uilist）1回あたりのID数
+        cap: 1回の esearch で取得するIDの上限
+
+    Raises:
+        EutilsError: 検索に失敗した
+    """
+    client = client or get_client()
+    result = client.esearch(query, db=db, retmax=min(retmax, cap), strict=strict, usehistory="y")
+    count = int(result.get("count", 0))
+    pmids = list(result.get("idlist", []))
+    wanted = min(retmax, count)
+    if len(pmids) < wanted:
+        try:
+            for page in _history_pages(client, db, result, len(pmids), wanted, page_size):
+                pmids.extend(str(pmid) for pmid in page.tolist())
+        except HistoryExpiredError:
+            pass
+    if len(pmids) < wanted:
+        partitioned = fetch_pmid_set_partitioned(query, client=client, db=db, cap=cap, strict=strict, total=count)
+        # esearch と同じく新しいものから
+        pmids = partitioned.pmids.to_strings()[::-1][:wanted]
+    return SearchResult(
+        query=query,
+        count=count,
+        pmids=pmids,
+        webenv=result.get("webenv", ""),
+        query_key=result.get("querykey", ""),
+    )
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+PubMed XML（efetch retmode=xml）の逐次パーサー
+
+MeSH用語、タイトルと抄録、出版情報、DOI、出版タイプを論文（PubmedArticle）ごとに
+1回の走査で取り出す。``lxml.etree.iterparse`` で論文の終わりを待って読み、
+読み終えた要素とそれまでの兄弟要素を解放するため、数百MBの efetch の出力でも
+メモリ使用量は論文1件分にとどまる。
+
+抽出関数ごとに文書全体を解析し直す代わりに、``parse_pubmed_record()`` の結果から
+必要な項目を取り出す。
+
+Usage:
+    from scripts.eutils.pubmed_xml import iter_pubmed_records
+
+    with open("efetch_dump.xml", "rb") as f:
+        for record in iter_pubmed_records(f):
+            print(record.pmid, record.year, record.doi, [heading.descriptor for heading in record.mesh])
+"""
+
+import io
+import re
+from dataclasses import dataclass
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+
+_ARTICLE_TAGS = ("PubmedArticle", "PubmedBookArticle")
+_YEAR_RE = re.compile(r"\b(\d{4})\b")
+
+
+@dataclass(frozen=True)
+class MeshQualifier:
+    """MeSHの副標目"""
+
+    name: str
+    ui: str = ""
+    major_topic: bool = False
+
+
+@dataclass(frozen=True)
+class MeshHeading:
+    """MeSHの見出し（主標目と副標目）"""
+
+    descriptor: str
+    ui: str = ""
+    major_topic: bool = False
+    qualifiers: Tuple[MeshQualifier, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """``extract_mesh_terms()`` と同じ形式の辞書"""
+        return {
+            "descriptor": self.descriptor,
+            "ui": self.ui,
+            "major_topic": self.major_topic,
+            "qualifiers": [
+                {"name": qualifier.name, "ui": qualifier.ui, "major_topic": qualifier.major_topic}
+                for qualifier in self.qualifiers
+            ],
+        }
+
+
+@dataclass(frozen=True)
+class PubmedRecord:
+    """1件の論文から取り出した書誌情報"""
+
+    pmid: str
+    title: str = ""
+    abstract: str = ""
+    journal: str = ""
+    journal_abbreviation: str = ""
+    year: str = ""
+    volume: str = ""
+    issue: str = ""
+    pages: str = ""
+    # "LastName ForeName"（ForeName がなければ LastName、団体著者は団体名）
+    authors: Tuple[str, ...] = ()
+    doi: str = ""
+    publication_types: Tuple[str, ...] = ()
+    languages: Tuple[str, ...] = ()
+    mesh: Tuple[MeshHeading, ...] = ()
+    keywords: Tuple[str, ...] = ()
+
+    @property
+    def mesh_terms(self) -> List[Dict[str, Any]]:
+        """MeSH用語（``MeshHeading.to_dict()`` のリスト）"""
+        return [heading.to_dict() for heading in self.mesh]
+
+    def citation(self) -> str:
+        """「著者. タイトル. ジャーナル. 年;巻(号):ページ. PMID: n」形式の引用"""
+        authors = ", ".join(self.authors) if self.authors else "著者不明"
+        citation = (
+            f"{authors}. {self.title or 'タイトル不明'}. {self.journal or 'ジャーナル不明'}. {self.year or '年不明'}"
+        )
+        if self.volume:
+            citation += f";{self.volume}"
+        if self.issue:
+            citation += f"({self.issue})"
+        if self.pages:
+            citation += f":{self.pages}"
+        return citation + f". PMID: {self.pmid}"
+
+
+def _text(element: Optional[Any]) -> str:
+    """子要素（<i> など）の文字列も含めた本文"""
+    if element is None:
+        return ""
+    return "".join(element.itertext()).strip()
+
+
+def _find_text(element: Any, path: str) -> str:
+    return _text(element.find(path))
+
+
+def _year(pub_date: Optional[Any]) -> str:
+    if pub_date is None:
+        return ""
+    year = _find_text(pub_date, "Year")
+    if year:
+        return year
+    # "2019 Nov-Dec" などの MedlineDate
+    match = _YEAR_RE.search(_find_text(pub_date, "MedlineDate"))
+    return match.group(1) if match else ""
+
+
+def _author(author: Any) -> str:
+    last_name = _find_text(author, "LastName")
+    fore_name = _find_text(author, "ForeName")
+    if last_name and fore_name:
+        return f"{last_name} {fore_name}"
+    return last_name or _find_text(author, "CollectiveName")
+
+
+def _mesh_heading(heading: Any) -> Optional[MeshHeading]:
+    descriptor = heading.find("DescriptorName")
+    if descriptor is None:
+        return None
+    return MeshHeading(
+        descriptor=_text(descriptor),
+        ui=descriptor.get("UI", ""),
+        major_topic=descriptor.get("MajorTopicYN", "N") == "Y",
+        qualifiers=tuple(
+            MeshQualifier(
+                name=_text(qualifier),
+                ui=qualifier.get("UI", ""),
+                major_topic=qualifier.get("MajorTopicYN", "N") == "Y",
+            )
+            for qualifier in heading.iterfind("QualifierName")
+        ),
+    )
+
+
+def _record(element: Any) -> Optional[PubmedRecord]:
+    """PubmedArticle / PubmedBookArticle 要素から書誌情報を取り出す"""
+    citation = element.find("MedlineCitation")
+    if citation is None:
+        citation = element.find("BookDocument")
+    if citation is None:
+        return None
+    pmid = _find_text(citation, "PMID")
+    if not pmid:
+        return None
+
+    article = citation.find("Article")
+    if article is None:
+        # 書籍（BookDocument）はタイトルと抄録の位置が異なる
+        article = citation
+        title = _find_text(citation, "ArticleTitle") or _find_text(citation, "Book/BookTitle")
+        journal = _find_text(citation, "Book/BookTitle")
+        journal_abbreviation = ""
+        pub_date = citation.find("Book/PubDate")
+        volume = issue = ""
+    else:
+        title = _find_text(article, "ArticleTitle")
+        journal = _find_text(article, "Journal/Title")
+        journal_abbreviation = _find_text(article, "Journal/ISOAbbreviation") or _find_text(
+            citation, "MedlineJournalInfo/MedlineTA"
+        )
+        pub_date = article.find("Journal/JournalIssue/PubDate")
+        volume = _find_text(article, "Journal/JournalIssue/Volume")
+        issue = _find_text(article, "Journal/JournalIssue/Issue")
+
+    # 参考文献（ReferenceList）の ArticleIdList は見ない
+    doi = ""
+    for article_id in element.iterfind("PubmedData/ArticleIdList/ArticleId"):
+        if article_id.get("IdType") == "doi":
+            doi = _text(article_id)
+            break
+    if not doi:
+        for location in article.iterfind("ELocationID"):
+            if location.get("EIdType") == "doi":
+                doi = _text(location)
+                break
+
+    pages = _find_text(article, "Pagination/MedlinePgn")
+    if not pages:
+        pages = _find_text(article, "Pagination")
+
+    headings = (_mesh_heading(heading) for heading in citation.iterfind("MeshHeadingList/MeshHeading"))
+    return PubmedRecord(
+        pmid=pmid,
+        title=title,
+        abstract=" ".join(_text(text) for text in article.iterfind("Abstract/AbstractText")),
+        journal=journal,
+        journal_abbreviation=journal_abbreviation,
+        year=_year(pub_date),
+        volume=volume,
+        issue=issue,
+        pages=pages,
+        authors=tuple(filter(None, (_author(author) for author in article.iterfind("AuthorList/Author")))),
+        doi=doi,
+        publication_types=tuple(_text(pt) for pt in article.iterfind("PublicationTypeList/PublicationType")),
+        languages=tuple(_text(language) for language in article.iterfind("Language")),
+        mesh=tuple(heading for heading in headings if heading is not None),
+        keywords=tuple(_text(keyword) for keyword in citation.iterfind("KeywordList/Keyword")),
+    )
+
+
+def iter_pubmed_records(source: Union[str, bytes, IO[bytes]]) -> Iterator[PubmedRecord]:
+    """
+    PubMed XMLから論文ごとの書誌情報を順に返す
+
+    Args:
+        source: XMLのバイト列・文字列、ファイルパス、またはバイナリのファイルオブジェクト
+
+    Raises:
+        lxml.etree.XMLSyntaxError: XMLとして読めない
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif isinstance(source, str) and source.lstrip().startswith("<"):
+        source = io.BytesIO(source.encode("utf-8"))
+    # DTD の取得や実体の展開はしない
+    context = etree.iterparse(
+        source, events=("end",), tag=_ARTICLE_TAGS, resolve_entities=False, no_network=True, huge_tree=True
+    )
+    for _, element in context:
+        record = _record(element)
+        # 読み終えた論文と、それより前の兄弟要素を解放する
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+        if record is not None:
+            yield record
+
+
+def parse_pubmed_record(xml_data: Union[str, bytes, None]) -> Optional[PubmedRecord]:
+    """1件分のXMLの書誌情報（論文が含まれない、またはXMLとして読めなければ None）"""
+    if not xml_data:
+        return None
+    try:
+        return next(iter_pubmed_records(xml_data), None)
+    except etree.XMLSyntaxError:
+        return None
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+NCBI E-utilities 用トークンバケット・レートリミッター
+
+プロセス内のすべてのE-utilities呼び出しで1つのバケットを共有し、
+固定sleepではなく許可されたレートの上限まで処理を進める。
+
+レートの決定順:
+    1. 環境変数 NCBI_RATE_LIMIT_RPS（正の数）
+    2. NCBI_API_KEY が設定されていれば 10 rps
+    3. 匿名アクセスは 3 rps
+
+共有リミッターは AIMD（加算増加・乗算減少）で自動調整される。
+成功が続く間は NCBI_RATE_LIMIT_MAX_RPS（既定は上記の初期レート）まで少しずつ上げ、
+429 や Retry-After を受けたら半減して指定秒数だけ送信を止める。
+NCBI_ADAPTIVE_RATE=off で固定レートに戻せる。
+
+Usage:
+    from scripts.eutils.rate_limiter import get_rate_limiter
+
+    limiter = get_rate_limiter()
+    limiter.acquire()  # 次のリクエストが許可されるまで待機
+    limiter.on_success()  # または limiter.on_throttle(retry_after)
+    print(limiter.rate)  # 現在のレート
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+ANONYMOUS_RATE_LIMIT_RPS = 3.0
+API_KEY_RATE_LIMIT_RPS = 10.0
+MIN_ADAPTIVE_RATE_RPS = 0.5
+
+
+def resolve_rate_limit(api_key: Optional[str] = None) -> float:
+    """
+    環境変数とAPIキーの有無から1秒あたりの最大リクエスト数を決定する
+
+    Args:
+        api_key: NCBI APIキー（省略時は環境変数 NCBI_API_KEY を参照）
+
+    Returns:
+        1秒あたりの最大リクエスト数
+    """
+    raw_rate = os.getenv("NCBI_RATE_LIMIT_RPS")
+    if raw_rate:
+        try:
+            rate = float(raw_rate)
+            if rate > 0:
+                return rate
+        except ValueError:
+            pass
+
+    if api_key is None:
+        api_key = os.getenv("NCBI_API_KEY") or None
+    return API_KEY_RATE_LIMIT_RPS if api_key else ANONYMOUS_RATE_LIMIT_RPS
+
+
+class TokenBucket:
+    """
+    スレッドセーフなトークンバケット
+
+    トークンは ``rate`` 個/秒で補充され、最大 ``capacity`` 個まで貯まる。
+    ``reserve()`` はトークンを先取りして必要な待機時間を返すため、
+    待機はロックの外で行われ、複数スレッドでも到着順に間隔が空けられる。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            rate: 1秒あたりの補充トークン数（> 0）
+            capacity: バケット容量。1.0 ならバーストなしの等間隔
+            clock: 単調増加する時刻関数（テスト用に差し替え可能）
+            sleep: 待機関数（テスト用に差し替え可能）
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self._rate = float(rate)
+        self._capacity = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self._capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """現在の補充レート（リクエスト/秒）"""
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        """バケット容量"""
+        return self._capacity
+
+    def set_rate(self, rate: float) -> None:
+        """補充レートを変更する（既存のトークンは保持）"""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        with self._lock:
+            self._refill()
+            self._rate = float(rate)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        トークンを予約し、使用可能になるまでの待機秒数を返す
+
+        残高が足りない場合も予約は成立し（残高はマイナスになる）、
+        呼び出し側は返された秒数だけ待ってからリクエストを送る。
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """トークンが残っていれば消費して True、足りなければ何もせず False を返す"""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        トークンが使用可能になるまでブロックする
+
+        Returns:
+            実際に待機した秒数
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def on_success(self) -> None:
+        """リクエスト成功の通知（固定レートでは何もしない）"""
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """429 / Retry-After の通知（固定レートでは何もしない）"""
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    AIMD でレートを自動調整するトークンバケット
+
+    - 成功ごとに ``increase / rate`` rps 加算（送信し続ければ約 ``increase`` rps/秒で上昇）
+    - 429 / Retry-After で ``rate * decrease`` に減少。同時に届いた429で何度も
+      下げないよう、``cooldown`` 秒以内の再通知では下げない
+    - Retry-After があれば、その秒数はトークンを払い出さない
+
+    状態はバケット自体が持つため、共有すればすべてのスレッド・タスクで共通になる。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        min_rate: float = MIN_ADAPTIVE_RATE_RPS,
+        max_rate: Optional[float] = None,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            rate: 初期レート（リクエスト/秒）
+            capacity: バケット容量
+            min_rate: 下限レート
+            max_rate: 上限レート（省略時は初期レート）
+            increase: 加算増加の大きさ（rps/秒）
+            decrease: 乗算減少の係数（0 < decrease < 1）
+            cooldown: 減少を連続で適用しない秒数
+            clock: 単調増加する時刻関数（テスト用に差し替え可能）
+            sleep: 待機関数（テスト用に差し替え可能）
+        """
+        super().__init__(rate, capacity=capacity, clock=clock, sleep=sleep)
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        self.max_rate = float(max_rate) if max_rate else float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.successes = 0
+        self.throttles = 0
+        self._last_cut: Optional[float] = None
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            if self._rate < self.max_rate:
+                self._refill()
+                self._rate = min(self.max_rate, self._rate + self.increase / self._rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.throttles += 1
+            self._refill()
+            now = self._clock()
+            if self._last_cut is None or now - self._last_cut >= self.cooldown:
+                self._rate = max(self.min_rate, self._rate * self.decrease)
+                self._last_cut = now
+            if retry_after:
+                # Retry-After の間は誰にもトークンを払い出さない
+                self._tokens = min(self._tokens, -retry_after * self._rate)
+
+    def snapshot(self) -> Dict[str, float]:
+        """現在のレートと統計（ログ・進捗表示用）"""
+        with self._lock:
+            return {
+                "rate": self._rate,
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+                "successes": self.successes,
+                "throttles": self.throttles,
+            }
+
+
+def resolve_max_rate(rate: float) -> float:
+    """AIMD の上限レート（NCBI_RATE_LIMIT_MAX_RPS、未設定なら ``rate``）"""
+    raw = os.getenv("NCBI_RATE_LIMIT_MAX_RPS")
+    if raw:
+        try:
+            value = float(raw)
+            if value > 0:
+                return max(value, rate)
+        except ValueError:
+            pass
+    return rate
+
+
+_DEFAULT_LIMITER: Optional[TokenBucket] = None
+_DEFAULT_LIMITER_LOCK = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucket:
+    """プロセス全体で共有されるE-utilities用リミッターを返す"""
+    global _DEFAULT_LIMITER
+    with _DEFAULT_LIMITER_LOCK:
+        if _DEFAULT_LIMITER is None:
+            rate = resolve_rate_limit()
+            if os.getenv("NCBI_ADAPTIVE_RATE", "on").strip().lower() in ("0", "off", "false", "no"):
+                _DEFAULT_LIMITER = TokenBucket(rate)
+            else:
+                _DEFAULT_LIMITER = AdaptiveTokenBucket(rate, max_rate=resolve_max_rate(rate))
+        return _DEFAULT_LIMITER
+
+
+def set_rate_limiter(limiter: Optional[TokenBucket]) -> None:
+    """共有リミッターを差し替える（None で次回呼び出し時に再生成）"""
+    global _DEFAULT_LIMITER
+    with _DEFAULT_LIMITER_LOCK:
+        _DEFAULT_LIMITER = limiter
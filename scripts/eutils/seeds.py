@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+シード論文（組入論文）の包含確認をまとめて行う
+
+PMIDごとに ``(検索式) AND 123[uid]`` を投げる代わりに、
+``(検索式) AND (1[uid] OR 2[uid] OR ...)`` を ``retmax`` = PMID数で1回検索し、
+返ってきたIDを「検索される」、それ以外を「検索されない」とする。
+数百件のシード論文でも1〜2回の esearch で済む（長い検索式はクライアントが自動でPOSTにする）。
+
+Usage:
+    from scripts.eutils.seeds import check_seed_inclusion
+
+    inclusion = check_seed_inclusion(formula, ["12345678", "23456789"])
+    print(inclusion.captured, inclusion.missed)
+    if inclusion.included["12345678"]:
+        ...
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from .client import EutilsClient, EutilsError, get_client
+
+# 1回の esearch に含めるPMIDの数（POSTで送るためURL長の制限は受けない）
+DEFAULT_SEED_CHUNK_SIZE = 500
+
+
+@dataclass
+class SeedInclusion:
+    """シード論文の包含確認の結果（リストは入力順）"""
+
+    query: str
+    captured: List[str] = field(default_factory=list)
+    missed: List[str] = field(default_factory=list)
+    # check_existence=True のとき、PubMedに存在しないPMID
+    not_found: List[str] = field(default_factory=list)
+    # 検索に失敗したPMIDとエラーメッセージ
+    errors: Dict[str, str] = field(default_factory=dict)
+    requests: int = 0
+
+    @property
+    def included(self) -> Dict[str, bool]:
+        """PMID → 検索されるか（存在しない・失敗したPMIDは False）"""
+        status = {pmid: False for pmid in self.missed + self.not_found + list(self.errors)}
+        status.update({pmid: True for pmid in self.captured})
+        return status
+
+    @property
+    def recall(self) -> Optional[float]:
+        """確認できたPMIDのうち検索される割合（確認できたPMIDがなければ None）"""
+        checked = len(self.captured) + len(self.missed)
+        return len(self.captured) / checked if checked else None
+
+
+def normalize_pmids(pmids: Iterable[str]) -> List[str]:
+    """PMIDの前後の空白を除き、重複を除いて入力順に並べる"""
+    seen: Set[str] = set()
+    result = []
+    for pmid in pmids:
+        pmid = str(pmid).strip()
+        if pmid and pmid not in seen:
+            seen.add(pmid)
+            result.append(pmid)
+    return result
+
+
+def uid_clause(pmids: Sequence[str]) -> str:
+    """``1[uid] OR 2[uid] ...`` 形式のPMID指定"""
+    return " OR ".join(f"{pmid}[uid]" for pmid in pmids)
+
+
+def _matching_ids(client: EutilsClient, query: str, pmids: Sequence[str], db: str, strict: bool) -> Set[str]:
+    clause = uid_clause(pmids)
+    term = f"({query}) AND ({clause})" if query else clause
+    result = client.esearch(term, db=db, retmax=len(pmids), strict=strict)
+    return {str(pmid) for pmid in result.get("idlist", [])}
+
+
+def check_seed_inclusion(
+    query: str,
+    pmids: Iterable[str],
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    chunk_size: int = DEFAULT_SEED_CHUNK_SIZE,
+    check_existence: bool = False,
+    strict: bool = True,
+) -> SeedInclusion:
+    """
+    検索式にシード論文が含まれるかをまとめて確認する
+
+    Args:
+        query: 検索式
+        pmids: 確認するPMID
+        client: 使用するクライアント（省略時は共有クライアント）
+        db: データベース名
+        chunk_size: 1回の esearch に含めるPMIDの数
+        check_existence: PubMedに存在するかも確認する（存在しないPMIDは not_found）
+        strict: errorlist（phrasesnotfound など）を失敗として扱うか
+
+    Returns:
+        SeedInclusion（チャンク単位の失敗は例外にせず errors に記録）
+    """
+    client = client or get_client()
+    pmids = normalize_pmids(pmids)
+    inclusion = SeedInclusion(query=query)
+    chunk_size = max(1, chunk_size)
+
+    for start in range(0, len(pmids), chunk_size):
+        chunk = [pmid for pmid in pmids[start:start + chunk_size] if pmid.isdigit()]
+        inclusion.errors.update({
+            pmid: f"Invalid PMID: {pmid}"
+            for pmid in pmids[start:start + chunk_size] if not pmid.isdigit()
+        })
+        if not chunk:
+            continue
+        try:
+            existing = set(chunk)
+            if check_existence:
+                existing = _matching_ids(client, "", chunk, db, strict=False)
+                inclusion.requests += 1
+            candidates = [pmid for pmid in chunk if pmid in existing]
+            matched = _matching_ids(client, query, candidates, db, strict) if candidates else set()
+            inclusion.requests += 1 if candidates else 0
+        except EutilsError as exc:
+            inclusion.errors.update({pmid: str(exc) for pmid in chunk})
+            continue
+        for pmid in chunk:
+            if pmid not in existing:
+                inclusion.not_found.append(pmid)
+            elif pmid in matched:
+                inclusion.captured.append(pmid)
+            else:
+                inclusion.missed.append(pmid)
+    return inclusion
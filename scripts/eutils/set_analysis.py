@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+ブロック内の検索語（OR項）のPMID集合に対する分析
+
+検索語ごとの ``PmidSet`` から、追加の検索なしで次を求める。
+
+- leave-one-out: その検索語だけを外したときに失われる件数
+  （和集合の各PMIDが何個の検索語に含まれるか＝被覆数から一括で計算、ほぼ線形時間）
+- 同時に外せる検索語の組: 被覆数を更新しながら、外しても1件も失わない検索語を順に外す
+- 貪欲法による並べ替え: 追加件数（限界寄与）が最大の検索語を順に選ぶ。
+  限界寄与は選ぶほど減る（劣モジュラ）ため、優先度付きキューに前回の値を
+  上限として積み、先頭だけを再計算する遅延評価で数百語のブロックも即座に終わる
+- 推奨する検索語の組: シード論文をすべて捕捉したうえで、ブロック全体の
+  X% に届くまで貪欲順に選んだ組（最小の組の近似）
+- 検索語どうしの重複行列: 和集合上のビットマップの AND とビット数から、
+  全組の積集合の件数・Jaccard係数・包含率をまとめて求める
+
+Usage:
+    from scripts.eutils.set_analysis import leave_one_out, recommend_terms
+
+    sets = [result.pmids for result in fetch_pmid_sets(terms)]
+    losses = leave_one_out(sets)
+    print(recommend_terms(terms, sets, target_recall=0.95, seeds=seed_pmids).to_markdown())
+"""
+
+import csv
+import heapq
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .compact_set import PmidSet
+
+# 推奨する検索語の組が届くべきブロック全体に対する割合
+DEFAULT_TARGET_RECALL = 0.95
+
+# 重複行列の指標
+OVERLAP_METRICS = ("intersection", "jaccard", "containment")
+
+# 1バイトあたりのビット数（np.bitwise_count がない NumPy 用）
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+@dataclass
+class CoverageIndex:
+    """検索語の集合の和と、各PMIDの被覆数"""
+
+    union: PmidSet
+    # counts[k]: union の k 番目のPMIDを含む検索語の数
+    counts: np.ndarray
+    # positions[i]: 検索語 i のPMIDが union の何番目か
+    positions: List[np.ndarray]
+
+    @classmethod
+    def build(cls, sets: Sequence[PmidSet]) -> "CoverageIndex":
+        union, counts = PmidSet.coverage(sets)
+        positions = [np.searchsorted(union.array, s.array) for s in sets]
+        return cls(union=union, counts=counts, positions=positions)
+
+
+def leave_one_out(sets: Sequence[PmidSet], index: Optional[CoverageIndex] = None) -> np.ndarray:
+    """各検索語だけを外したときに失われる件数（その検索語だけが捕捉する件数）"""
+    index = index or CoverageIndex.build(sets)
+    return np.array(
+        [int(np.count_nonzero(index.counts[positions] == 1)) for positions in index.positions],
+        dtype=np.int64,
+    )
+
+
+def removable_together(
+    sets: Sequence[PmidSet],
+    order: Optional[Sequence[int]] = None,
+    index: Optional[CoverageIndex] = None,
+) -> List[int]:
+    """
+    同時に外しても和集合が変わらない検索語の組（番号のリスト）
+
+    order の順（省略時は件数の少ない順）に、外しても1件も失わない検索語を外していく。
+    leave-one-out で 0 件の検索語どうしが互いを補っている場合、両方は外せない。
+    """
+    index = index or CoverageIndex.build(sets)
+    counts = index.counts.copy()
+    if order is None:
+        order = sorted(range(len(sets)), key=lambda i: (len(sets[i]), i))
+    removed = []
+    for i in order:
+        positions = index.positions[i]
+        if positions.size and np.all(counts[positions] >= 2):
+            counts[positions] -= 1
+            removed.append(i)
+        elif not positions.size:
+            removed.append(i)
+    return sorted(removed)
+
+
+@dataclass(frozen=True)
+class GreedyStep:
+    """貪欲法で選んだ1語"""
+
+    index: int
+    # その時点で新たに捕捉する件数（限界寄与）
+    gain: int
+    # その時点で新たに捕捉するシードの数
+    seed_gain: int
+    # 選んだ検索語までの累積件数と、ブロック全体に対する割合
+    cumulative: int
+    recall: float
+
+
+@dataclass
+class TermRecommendation:
+    """貪欲法による並べ替えと、推奨する検索語の組"""
+
+    terms: List[str]
+    # 限界寄与（追加件数）の大きい順
+    order: List[GreedyStep]
+    # 推奨する検索語の番号（選んだ順）
+    selected: List[int]
+    selected_recall: float
+    target_recall: float
+    total: int
+    # ブロックのいずれかの検索語が捕捉するシードの数（推奨する組はすべて捕捉する）
+    seeds_covered: Optional[int] = None
+
+    @property
+    def selected_terms(self) -> List[str]:
+        return [self.terms[i] for i in self.selected]
+
+    @property
+    def dropped_terms(self) -> List[str]:
+        chosen = set(self.selected)
+        return [term for i, term in enumerate(self.terms) if i not in chosen]
+
+    def summary(self) -> Dict[str, Any]:
+        """レポート用の集計（JSONに保存できる形式）"""
+        return {
+            "target_recall": self.target_recall,
+            "total": self.total,
+            "seeds_covered": self.seeds_covered,
+            "order": [
+                {
+                    "term": self.terms[step.index],
+                    "gain": step.gain,
+                    "cumulative": step.cumulative,
+                    "recall": step.recall,
+                }
+                for step in self.order
+            ],
+            "selected": self.selected_terms,
+            "selected_recall": self.selected_recall,
+            "dropped": self.dropped_terms,
+        }
+
+    def to_markdown(self) -> str:
+        chosen = set(self.selected)
+        lines = [
+            "| Rank | Term | Gain | Cumulative | Recall | Recommended |",
+            "|------|------|------|------------|--------|-------------|",
+        ]
+        for rank, step in enumerate(self.order, 1):
+            term = self.terms[step.index]
+            term_display = term[:80] + "..." if len(term) > 80 else term
+            marker = "✓" if step.index in chosen else ""
+            lines.append(
+                f"| {rank} | `{term_display}` | {step.gain:,} | {step.cumulative:,} | "
+                f"{step.recall * 100:.2f}% | {marker} |"
+            )
+        lines.append("")
+        condition = f"≥{self.target_recall * 100:g}% of {self.total:,} records"
+        if self.seeds_covered is not None:
+            condition += f", all {self.seeds_covered} seeds captured by the block"
+        lines.append(
+            f"- **Recommended terms** ({condition}): {len(self.selected)} of {len(self.terms)}, "
+            f"recall {self.selected_recall * 100:.2f}%"
+        )
+        if self.dropped_terms:
+            lines.append("- **Candidates to drop**: " + ", ".join(f"`{term}`" for term in self.dropped_terms))
+        return "\n".join(lines) + "\n"
+
+
+def greedy_order(
+    sets: Sequence[PmidSet],
+    seed_matrix: Optional[np.ndarray] = None,
+    index: Optional[CoverageIndex] = None,
+) -> List[GreedyStep]:
+    """
+    限界寄与の大きい順に検索語を並べる（遅延評価の貪欲法）
+
+    Args:
+        sets: 検索語ごとのPMID集合
+        seed_matrix: 検索語 × シードの捕捉行列（bool）。指定するとまだ捕捉していない
+            シードの数を優先し、同数なら追加件数で選ぶ
+        index: 作成済みの ``CoverageIndex``（省略時は作る）
+
+    寄与が0になった残りの検索語は、元の順で末尾に並ぶ。
+    """
+    index = index or CoverageIndex.build(sets)
+    total = len(index.union)
+    covered = np.zeros(total, dtype=bool)
+    seeds = np.zeros((len(sets), 0), dtype=bool) if seed_matrix is None else np.asarray(seed_matrix, dtype=bool)
+    if seeds.shape[0] != len(sets):
+        raise ValueError(f"seed_matrix has {seeds.shape[0]} rows for {len(sets)} terms")
+    seeds_covered = np.zeros(seeds.shape[1], dtype=bool)
+
+    def gains(i: int):
+        seed_gain = int(np.count_nonzero(seeds[i] & ~seeds_covered))
+        gain = int(np.count_nonzero(~covered[index.positions[i]]))
+        return seed_gain, gain
+
+    # (-シード寄与, -件数寄与, 番号): 積んだ時点の値は現在の寄与の上限
+    heap = []
+    for i in range(len(sets)):
+        seed_gain, gain = gains(i)
+        heap.append((-seed_gain, -gain, i))
+    heapq.heapify(heap)
+
+    order = []
+    cumulative = 0
+    while heap:
+        _, _, i = heapq.heappop(heap)
+        seed_gain, gain = gains(i)
+        if heap and (-seed_gain, -gain, i) > heap[0]:
+            # 上限より下がった: 積み直して次の候補を再計算する
+            heapq.heappush(heap, (-seed_gain, -gain, i))
+            continue
+        if not seed_gain and not gain:
+            heap.append((0, 0, i))
+            break
+        covered[index.positions[i]] = True
+        seeds_covered |= seeds[i]
+        cumulative += gain
+        order.append(GreedyStep(i, gain, seed_gain, cumulative, cumulative / total if total else 0.0))
+
+    # 寄与のない検索語
+    for i in sorted(entry[2] for entry in heap):
+        order.append(GreedyStep(i, 0, 0, cumulative, cumulative / total if total else 0.0))
+    return order
+
+
+def recommend_terms(
+    terms: Sequence[str],
+    sets: Sequence[PmidSet],
+    target_recall: float = DEFAULT_TARGET_RECALL,
+    seeds: Optional[Sequence[str]] = None,
+    seed_matrix: Optional[np.ndarray] = None,
+) -> TermRecommendation:
+    """
+    ブロックの X% に届き、シードをすべて捕捉する検索語の組を推奨する
+
+    並べ替え（order）は件数の限界寄与だけで決める。推奨する組はシードの捕捉を
+    優先した貪欲順で、目標の割合とシードの条件を満たすまで選ぶ（最小の組の近似）。
+
+    Args:
+        terms: 検索語（sets と同じ順）
+        sets: 検索語ごとのPMID集合
+        target_recall: ブロック全体（全検索語の OR）に対する目標の割合（0〜1）
+        seeds: シード論文のPMID。seed_matrix がなければPMID集合から捕捉行列を作る
+        seed_matrix: 検索語 × シードの捕捉行列（``CaptureMatrix.term_matrix()`` など）
+    """
+    if not 0 <= target_recall <= 1:
+        raise ValueError("target_recall must be between 0 and 1")
+    if len(terms) != len(sets):
+        raise ValueError(f"{len(terms)} terms for {len(sets)} PMID sets")
+    if seed_matrix is None and seeds:
+        seed_matrix = np.stack([s.contains_many(seeds) for s in sets]) if sets else np.zeros((0, len(seeds)), bool)
+
+    index = CoverageIndex.build(sets)
+    order = greedy_order(sets, index=index)
+    plan = order if seed_matrix is None else greedy_order(sets, seed_matrix=seed_matrix, index=index)
+    seeds_covered = None if seed_matrix is None else int(np.asarray(seed_matrix, dtype=bool).any(axis=0).sum())
+
+    selected = []
+    recall = 0.0
+    captured = 0
+    for step in plan:
+        if recall >= target_recall and captured >= (seeds_covered or 0):
+            break
+        if not step.gain and not step.seed_gain:
+            break
+        selected.append(step.index)
+        recall = step.recall
+        captured += step.seed_gain
+    return TermRecommendation(
+        terms=list(terms),
+        order=order,
+        selected=selected,
+        selected_recall=recall,
+        target_recall=target_recall,
+        total=len(index.union),
+        seeds_covered=seeds_covered,
+    )
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    """最後の軸に沿った1のビット数"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT[bits].sum(axis=-1, dtype=np.int64)
+
+
+@dataclass
+class OverlapMatrix:
+    """検索語どうしの重複行列"""
+
+    terms: List[str]
+    # sizes[i]: 検索語 i の件数
+    sizes: np.ndarray
+    # intersections[i, j]: 検索語 i と j の積集合の件数（対角は件数）
+    intersections: np.ndarray
+
+    @classmethod
+    def build(
+        cls,
+        terms: Sequence[str],
+        sets: Sequence[PmidSet],
+        index: Optional[CoverageIndex] = None,
+        chunk_rows: int = 64,
+    ) -> "OverlapMatrix":
+        """
+        全組の積集合の件数を求める
+
+        各検索語を和集合上のビットマップ（1件1ビット）にし、行ごとに残りの行との
+        AND のビット数を数える。組ごとに検索する方法（1組3リクエスト）と違い、
+        通信は検索語ごとの集合の取得だけで済む。
+        """
+        if len(terms) != len(sets):
+            raise ValueError(f"{len(terms)} terms for {len(sets)} PMID sets")
+        index = index or CoverageIndex.build(sets)
+        size = len(index.union)
+        bitmaps = np.zeros((len(sets), (size + 7) // 8), dtype=np.uint8)
+        for row, positions in enumerate(index.positions):
+            flags = np.zeros(size, dtype=bool)
+            flags[positions] = True
+            bitmaps[row] = np.packbits(flags)
+
+        intersections = np.zeros((len(sets), len(sets)), dtype=np.int64)
+        for i in range(len(sets)):
+            for start in range(i, len(sets), chunk_rows):
+                stop = min(start + chunk_rows, len(sets))
+                intersections[i, start:stop] = _popcount(bitmaps[i] & bitmaps[start:stop])
+        intersections = np.triu(intersections) + np.triu(intersections, 1).T
+        sizes = np.array([len(s) for s in sets], dtype=np.int64)
+        return cls(terms=list(terms), sizes=sizes, intersections=intersections)
+
+    @property
+    def unions(self) -> np.ndarray:
+        return self.sizes[:, None] + self.sizes[None, :] - self.intersections
+
+    @property
+    def jaccard(self) -> np.ndarray:
+        """Jaccard係数（積集合 / 和集合、どちらも0件なら0）"""
+        unions = self.unions
+        return np.where(unions > 0, self.intersections / np.maximum(unions, 1), 0.0)
+
+    @property
+    def containment(self) -> np.ndarray:
+        """包含率 containment[i, j]: 検索語 i の件数のうち j にも含まれる割合"""
+        return self.intersections / np.maximum(self.sizes, 1)[:, None]
+
+    def metric(self, name: str) -> np.ndarray:
+        if name not in OVERLAP_METRICS:
+            raise ValueError(f"Unknown metric: {name} (choose from {', '.join(OVERLAP_METRICS)})")
+        return self.intersections if name == "intersection" else getattr(self, name)
+
+    def pairs(self) -> List[Dict[str, Any]]:
+        """全組（i < j）の行"""
+        jaccard = self.jaccard
+        containment = self.containment
+        rows = []
+        for i in range(len(self.terms)):
+            for j in range(i + 1, len(self.terms)):
+                rows.append({
+                    "term_a": self.terms[i],
+                    "term_b": self.terms[j],
+                    "count_a": int(self.sizes[i]),
+                    "count_b": int(self.sizes[j]),
+                    "intersection": int(self.intersections[i, j]),
+                    "jaccard": float(jaccard[i, j]),
+                    "a_in_b": float(containment[i, j]),
+                    "b_in_a": float(containment[j, i]),
+                })
+        return rows
+
+    def contained_pairs(self, threshold: float = 0.9) -> List[Dict[str, Any]]:
+        """一方がもう一方にほぼ包含される組（包含率の高い順）"""
+        rows = [row for row in self.pairs() if max(row["a_in_b"], row["b_in_a"]) >= threshold]
+        return sorted(rows, key=lambda row: -max(row["a_in_b"], row["b_in_a"]))
+
+    def to_csv(self, path: Union[str, Path], metric: str = "jaccard") -> Path:
+        """検索語 × 検索語の正方行列をCSVに保存する（ヒートマップ用）"""
+        values = self.metric(metric)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["term"] + self.terms)
+            for term, row in zip(self.terms, values):
+                writer.writerow([term] + [_format_value(value) for value in row])
+        return path
+
+    def pairs_to_csv(self, path: Union[str, Path]) -> Path:
+        """全組の件数・Jaccard係数・包含率を縦長のCSVに保存する"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = self.pairs()
+        fields = ["term_a", "term_b", "count_a", "count_b", "intersection", "jaccard", "a_in_b", "b_in_a"]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({key: _format_value(value) for key, value in row.items()})
+        return path
+
+
+def _format_value(value: Any) -> Any:
+    if isinstance(value, (float, np.floating)):
+        return f"{float(value):.4f}"
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
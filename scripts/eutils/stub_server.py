@@ -0,0 +1,769 @@
+#!/usr/bin/env python3
+"""
+オフライン用 E-utilities スタブサーバー
+
+NCBIにアクセスせずに、件数取得・efetch・シード論文チェックなどのツールを
+ベンチマークしたり、リトライ処理を決定的にテストしたりするためのローカルHTTPサーバー。
+
+- esearch / efetch / esummary / epost / elink を合成PubMedコーパスに対して実装
+- コーパスは「検索語 → PMID集合」の対応から構築し、未知の検索語には
+  検索語から決まる擬似乱数のPMID集合を割り当てる（``auto_terms``）
+- 応答遅延、429 / 5xx の注入、サーバー側レート制限を設定可能
+- WebEnv / query_key の履歴と ``#1 AND #2`` 形式の参照に対応
+
+共通クライアントは環境変数 ``NCBI_EUTILS_BASE_URL`` でこのサーバーに向けられる。
+
+Usage:
+    # 起動（別ターミナル）
+    python scripts/eutils/stub_server.py --port 8765 --latency 0.05 --error-rate-429 0.02 --rate-limit 10
+
+    # ツール側
+    export NCBI_EUTILS_BASE_URL=http://127.0.0.1:8765/entrez/eutils
+    python scripts/search/term_validator/check_block_overlap.py ...
+
+    # テストから
+    with StubEutilsServer(SyntheticCorpus(size=10000)) as server:
+        client = EutilsClient(base_url=server.base_url)
+
+コーパスファイル（JSON）:
+    {
+      "size": 100000,
+      "seed": 0,
+      "auto_terms": true,
+      "terms": {"\\"Physicians\\"[Mesh]": [30000001, 30000002]},
+      "records": {"30000001": {"year": 2021, "title": "..."}}
+    }
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils.rate_limiter import TokenBucket  # noqa: E402
+from scripts.query import DateRange, Group, LineRef, Node, Term, parse  # noqa: E402
+
+DEFAULT_CORPUS_SIZE = 100_000
+DEFAULT_FIRST_PMID = 30_000_000
+DEFAULT_RETMAX = 20
+MAX_RETMAX = 10_000
+
+_DATE_FIELDS = frozenset({
+    "dp", "pdat", "date - publication", "edat", "date - entry",
+    "crdt", "date - create", "mhda", "date - mesh",
+})
+_UID_FIELDS = frozenset({"uid", "pmid"})
+_FIELD_ALIASES = {
+    "mh": "mesh",
+    "mesh terms": "mesh",
+    "title/abstract": "tiab",
+    "title": "ti",
+    "publication type": "pt",
+    "language": "la",
+    "mesh major topic": "majr",
+}
+_JOURNALS = (
+    "BMJ Open", "PLoS One", "J Occup Health", "Med Educ", "BMC Med Educ",
+    "Int J Environ Res Public Health", "JAMA Netw Open", "Lancet",
+)
+_PUBLICATION_TYPES = (
+    ("Journal Article",),
+    ("Journal Article", "Review"),
+    ("Journal Article", "Randomized Controlled Trial"),
+    ("Journal Article", "Systematic Review"),
+)
+
+
+def _mix(value: int, seed: int) -> int:
+    """PMIDから決定的な擬似乱数を作る（32bit）"""
+    return ((value * 2654435761) ^ (seed * 40503)) & 0xFFFFFFFF
+
+
+def split_term(token: str) -> Tuple[str, str]:
+    """``"Physicians"[Mesh]`` を ("physicians", "mesh") に分解して正規化する"""
+    match = re.match(r"^(.*?)(?:\[([^\]]*)\])?$", token.strip(), re.DOTALL)
+    text, tag = match.group(1), (match.group(2) or "")
+    text = " ".join(text.replace('"', " ").split()).lower()
+    tag = " ".join(tag.split()).lower()
+    if tag.endswith(":noexp"):
+        tag = tag[: -len(":noexp")]
+    return text, _FIELD_ALIASES.get(tag, tag)
+
+
+def term_key(token: str) -> str:
+    """検索語のコーパス上のキー（小文字・引用符なし・フィールド正規化）"""
+    text, tag = split_term(token)
+    return f"{text}[{tag}]" if tag else text
+
+
+def _year_of(value: str) -> int:
+    digits = re.match(r"\s*(\d{4})", value.replace('"', ""))
+    if not digits:
+        raise ValueError(f"invalid date: {value}")
+    return int(digits.group(1))
+
+
+@dataclass
+class StubRecord:
+    """合成論文1件分の書誌情報"""
+
+    pmid: int
+    year: int
+    title: str
+    abstract: str
+    journal: str
+    authors: List[str]
+    languages: List[str]
+    publication_types: List[str]
+    mesh: List[str]
+    doi: str
+
+
+class SyntheticCorpus:
+    """
+    PMID集合から構成する合成PubMedコーパス
+
+    PMIDの範囲 ``first_pmid`` から ``size`` 件に加え、``terms`` に含まれる
+    PMIDもコーパスに含まれる。書誌情報は PMID から決定的に生成され、
+    ``records`` で個別に上書きできる。
+    """
+
+    def __init__(
+        self,
+        terms: Optional[Mapping[str, Iterable[int]]] = None,
+        records: Optional[Mapping[int, Mapping[str, Any]]] = None,
+        size: int = DEFAULT_CORPUS_SIZE,
+        first_pmid: int = DEFAULT_FIRST_PMID,
+        seed: int = 0,
+        auto_terms: bool = True,
+    ):
+        """
+        Args:
+            terms: 検索語 → PMIDの集合（キーは ``term_key`` で正規化される）
+            records: PMID → 書誌情報の上書き（year, title, abstract, journal など）
+            size: 自動生成するPMIDの件数
+            first_pmid: 自動生成するPMIDの先頭
+            seed: 擬似乱数のシード
+            auto_terms: 未知の検索語に擬似乱数のPMID集合を割り当てるか
+                （False の場合は 0 件で errorlist.phrasesnotfound に載る）
+        """
+        self.size = max(0, int(size))
+        self.first_pmid = int(first_pmid)
+        self.seed = int(seed)
+        self.auto_terms = auto_terms
+        self._overrides = {int(pmid): dict(values) for pmid, values in (records or {}).items()}
+        self._terms: Dict[str, Set[int]] = {}
+        self._mesh_index: Dict[int, List[str]] = {}
+        for token, pmids in (terms or {}).items():
+            key = term_key(token)
+            self._terms[key] = {int(pmid) for pmid in pmids}
+            text = re.sub(r"\[[^\]]*\]$", "", token).replace('"', "").strip()
+            if split_term(token)[1] in ("mesh", "majr"):
+                for pmid in self._terms[key]:
+                    self._mesh_index.setdefault(pmid, []).append(text)
+        extra = set().union(*self._terms.values()) if self._terms else set()
+        extra.update(self._overrides)
+        self._extra = sorted(pmid for pmid in extra if not self._in_range(pmid))
+        self._extra_set = frozenset(self._extra)
+        self._auto_cache: Dict[str, Set[int]] = {}
+        self._year_index: Optional[Dict[int, List[int]]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Path) -> "SyntheticCorpus":
+        """コーパス定義のJSONファイルを読み込む"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            terms=data.get("terms"),
+            records={int(pmid): values for pmid, values in (data.get("records") or {}).items()},
+            size=data.get("size", DEFAULT_CORPUS_SIZE),
+            first_pmid=data.get("first_pmid", DEFAULT_FIRST_PMID),
+            seed=data.get("seed", 0),
+            auto_terms=data.get("auto_terms", True),
+        )
+
+    def _in_range(self, pmid: int) -> bool:
+        return self.first_pmid <= pmid < self.first_pmid + self.size
+
+    def __contains__(self, pmid: int) -> bool:
+        return self._in_range(pmid) or pmid in self._extra_set
+
+    def __len__(self) -> int:
+        return self.size + len(self._extra)
+
+    def all_pmids(self) -> Iterable[int]:
+        yield from range(self.first_pmid, self.first_pmid + self.size)
+        yield from self._extra
+
+    def year(self, pmid: int) -> int:
+        override = self._overrides.get(pmid, {})
+        if "year" in override:
+            return int(override["year"])
+        return 1975 + _mix(pmid, self.seed) % 51
+
+    def record(self, pmid: int) -> StubRecord:
+        """PMIDの書誌情報を返す（上書きがなければ決定的に生成）"""
+        h = _mix(pmid, self.seed)
+        override = self._overrides.get(pmid, {})
+        values = {
+            "pmid": pmid,
+            "year": self.year(pmid),
+            "title": f"Synthetic record {pmid}",
+            "abstract": f"Abstract of synthetic record {pmid}.",
+            "journal": _JOURNALS[h % len(_JOURNALS)],
+            "authors": [f"Author{(h >> 3) % 97} A", f"Author{(h >> 9) % 89} B"],
+            "languages": ["eng"] if h % 10 else ["jpn"],
+            "publication_types": list(_PUBLICATION_TYPES[(h >> 5) % len(_PUBLICATION_TYPES)]),
+            "mesh": list(self._mesh_index.get(pmid, [])),
+            "doi": f"10.5555/stub.{pmid}",
+        }
+        values.update({key: value for key, value in override.items() if key in values})
+        return StubRecord(**values)
+
+    def _years(self) -> Dict[int, List[int]]:
+        with self._lock:
+            if self._year_index is None:
+                index: Dict[int, List[int]] = {}
+                for pmid in self.all_pmids():
+                    index.setdefault(self.year(pmid), []).append(pmid)
+                self._year_index = index
+            return self._year_index
+
+    def date_range(self, start: int, end: int) -> Set[int]:
+        """出版年が ``start`` 以上 ``end`` 以下のPMID集合"""
+        result: Set[int] = set()
+        for year, pmids in self._years().items():
+            if start <= year <= end:
+                result.update(pmids)
+        return result
+
+    def lookup(self, token: str) -> Optional[Set[int]]:
+        """
+        検索語1つに一致するPMID集合を返す
+
+        未知の検索語で ``auto_terms`` が False の場合は None を返す。
+        """
+        text, tag = split_term(token)
+        if tag in _UID_FIELDS:
+            try:
+                pmid = int(text)
+            except ValueError:
+                return set()
+            return {pmid} if pmid in self else set()
+        if tag in _DATE_FIELDS:
+            year = _year_of(text)
+            return self.date_range(year, year)
+
+        key = term_key(token)
+        if key in self._terms:
+            return self._terms[key]
+        if not self.auto_terms:
+            return None
+        with self._lock:
+            cached = self._auto_cache.get(key)
+            if cached is None:
+                rng = random.Random(f"{self.seed}:{key}")
+                density = rng.uniform(0.0005, 0.03)
+                k = min(self.size, int(self.size * density))
+                cached = {self.first_pmid + i for i in rng.sample(range(self.size), k)}
+                self._auto_cache[key] = cached
+            return cached
+
+
+class QueryError(ValueError):
+    """検索式を解釈できない"""
+
+
+class _QueryEvaluator:
+    """
+    PubMed検索式を ``parse()`` のASTとして評価する（PubMedと同じく演算子の優先順位なし）
+
+    対応: 括弧、AND / OR / NOT、暗黙のAND、``"a"[PDAT] : "b"[PDAT]`` と
+    ``2020:2024[dp]`` の日付範囲、``#n`` の履歴参照
+    """
+
+    def __init__(self, corpus: SyntheticCorpus, history: List[Set[int]]):
+        self.corpus = corpus
+        self.history = history
+        self.not_found: List[str] = []
+
+    def evaluate(self, query: str) -> Set[int]:
+        self.parsed = parse(query)
+        if self.parsed.root is None:
+            raise QueryError("Empty term and query_key - nothing todo")
+        if self.parsed.errors:
+            issue = self.parsed.errors[0]
+            raise QueryError(f"{issue.message} (position {issue.position})")
+        return self._node(self.parsed.root)
+
+    def _node(self, node: Node) -> Set[int]:
+        if isinstance(node, Group):
+            return set(self._node(node.child))
+        if isinstance(node, LineRef):
+            index = node.number - 1
+            if not 0 <= index < len(self.history):
+                raise QueryError(f"Unable to obtain query #{node.number}")
+            return set(self.history[index])
+        if isinstance(node, Term):
+            return self._term(node)
+        if isinstance(node, DateRange):
+            return self._date_span(self.parsed.text(node.start), self.parsed.text(node.end))
+        return self._combine(node.op, [self._node(operand) for operand in node.operands])
+
+    @staticmethod
+    def _combine(op: str, values: List[Set[int]]) -> Set[int]:
+        result = values[0]
+        for right in values[1:]:
+            if op == "AND":
+                result = result & right
+            elif op == "OR":
+                result = result | right
+            else:
+                result = result - right
+        return result
+
+    def _term(self, term: Term) -> Set[int]:
+        if not term.quoted and ":" in term.text and term.field is not None:
+            start, end = term.text.split(":", 1)
+            return self._date_span(start, end, f"[{term.field}]")
+        token = self.parsed.text(term)
+        found = self.corpus.lookup(token)
+        if found is None:
+            self.not_found.append(split_term(token)[0])
+            return set()
+        return set(found)
+
+    def _date_span(self, start: str, end: str, tag: str = "") -> Set[int]:
+        start_text, _ = split_term(start + tag)
+        end_text, _ = split_term(end if not tag else end + tag)
+        return self.corpus.date_range(_year_of(start_text), _year_of(end_text))
+
+
+@dataclass
+class FaultConfig:
+    """応答遅延とエラー注入の設定"""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate_429: float = 0.0
+    error_rate_5xx: float = 0.0
+    rate_limit: Optional[float] = None
+    seed: int = 0
+
+
+@dataclass
+class _History:
+    sets: List[Set[int]] = field(default_factory=list)
+
+
+class StubEutilsServer:
+    """
+    スタブサーバー本体
+
+    ``with`` で使うとバックグラウンドスレッドで起動し、終了時に停止する。
+    ``port=0`` で空いているポートを自動選択する。
+    """
+
+    def __init__(
+        self,
+        corpus: Optional[SyntheticCorpus] = None,
+        faults: Optional[FaultConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.corpus = corpus or SyntheticCorpus()
+        self.faults = faults or FaultConfig()
+        self._rng = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+        self._limiters: Dict[str, TokenBucket] = {}
+        self._histories: Dict[str, _History] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/entrez/eutils"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """エンドポイント・応答種別ごとのリクエスト数"""
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self) -> "StubEutilsServer":
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, name="eutils-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def __enter__(self) -> "StubEutilsServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    # ---- 障害注入 ----
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _fault_for(self, params: Mapping[str, str]) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        faults = self.faults
+        if faults.rate_limit:
+            client_key = params.get("api_key") or "anonymous"
+            with self._lock:
+                limiter = self._limiters.get(client_key)
+                if limiter is None:
+                    limiter = TokenBucket(faults.rate_limit, capacity=max(1.0, faults.rate_limit))
+                    self._limiters[client_key] = limiter
+            if not limiter.try_acquire():
+                body = json.dumps({"error": "API rate limit exceeded", "count": "", "limit": str(faults.rate_limit)})
+                return 429, {"Retry-After": "1", "Content-Type": "application/json"}, body.encode()
+        with self._lock:
+            roll_429 = self._rng.random()
+            roll_5xx = self._rng.random()
+            jitter = self._rng.uniform(0, faults.jitter) if faults.jitter else 0.0
+        delay = faults.latency + jitter
+        if delay > 0:
+            time.sleep(delay)
+        if roll_429 < faults.error_rate_429:
+            body = json.dumps({"error": "API rate limit exceeded"})
+            return 429, {"Retry-After": "0", "Content-Type": "application/json"}, body.encode()
+        if roll_5xx < faults.error_rate_5xx:
+            return 503, {"Content-Type": "text/plain"}, b"Service Temporarily Unavailable"
+        return None
+
+    # ---- 履歴サーバー ----
+
+    def expire_histories(self) -> None:
+        """すべての WebEnv を失効させる（期限切れの再現用）"""
+        with self._lock:
+            for history in self._histories.values():
+                history.sets.clear()
+
+    def _history(self, webenv: Optional[str]) -> Tuple[str, _History]:
+        with self._lock:
+            if webenv and webenv in self._histories:
+                return webenv, self._histories[webenv]
+            webenv = f"MCID_stub_{len(self._histories) + 1}"
+            history = _History()
+            self._histories[webenv] = history
+            return webenv, history
+
+    def _store(self, history: _History, pmids: Set[int]) -> str:
+        with self._lock:
+            history.sets.append(pmids)
+            return str(len(history.sets))
+
+    def _history_ids(self, params: Mapping[str, str]) -> Optional[List[int]]:
+        webenv, query_key = params.get("WebEnv"), params.get("query_key")
+        if not webenv or not query_key:
+            return None
+        with self._lock:
+            history = self._histories.get(webenv)
+            index = int(query_key) - 1
+            if history is None or not 0 <= index < len(history.sets):
+                raise QueryError("Unable to obtain query #" + query_key)
+            return sorted(history.sets[index], reverse=True)
+
+    def _ids(self, params: Mapping[str, str]) -> List[int]:
+        from_history = self._history_ids(params)
+        if from_history is not None:
+            start = int(params.get("retstart", 0) or 0)
+            retmax = int(params.get("retmax", MAX_RETMAX) or MAX_RETMAX)
+            return from_history[start:start + retmax]
+        raw = params.get("id", "")
+        return [int(pmid) for pmid in re.split(r"[,\s]+", raw) if pmid.strip().isdigit()]
+
+    # ---- エンドポイント ----
+
+    def handle(self, endpoint: str, params: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        self._count(endpoint)
+        fault = self._fault_for(params)
+        if fault is not None:
+            self._count(f"{endpoint}:{fault[0]}")
+            return fault
+        handler = {
+            "esearch": self.esearch,
+            "efetch": self.efetch,
+            "esummary": self.esummary,
+            "epost": self.epost,
+            "elink": self.elink,
+        }.get(endpoint)
+        if handler is None:
+            return 404, {"Content-Type": "text/plain"}, b"Unknown endpoint"
+        try:
+            return handler(params)
+        except QueryError as exc:
+            body = json.dumps({"esearchresult": {"ERROR": str(exc)}})
+            return 200, {"Content-Type": "application/json"}, body.encode()
+
+    def esearch(self, params: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        webenv, history = self._history(params.get("WebEnv"))
+        evaluator = _QueryEvaluator(self.corpus, history.sets)
+        pmids = evaluator.evaluate(params.get("term", ""))
+        ordered = sorted(pmids, reverse=True)
+        retstart = int(params.get("retstart", 0) or 0)
+        retmax = min(int(params.get("retmax", DEFAULT_RETMAX) or 0), MAX_RETMAX)
+        idlist = [str(pmid) for pmid in ordered[retstart:retstart + retmax]]
+
+        result: Dict[str, Any] = {
+            "count": str(len(ordered)),
+            "retmax": str(len(idlist)),
+            "retstart": str(retstart),
+            "idlist": idlist,
+            "translationset": [],
+            "querytranslation": params.get("term", ""),
+        }
+        if params.get("usehistory", "").lower() == "y":
+            result["querykey"] = self._store(history, pmids)
+            result["webenv"] = webenv
+        if evaluator.not_found:
+            result["errorlist"] = {"phrasesnotfound": evaluator.not_found, "fieldsnotfound": []}
+            result["warninglist"] = {"phrasesignored": [], "quotedphrasesnotfound": [], "outputmessages": ["No items found."]}
+
+        if params.get("retmode", "xml") == "json":
+            body = json.dumps({"header": {"type": "esearch", "version": "0.3"}, "esearchresult": result})
+            return 200, {"Content-Type": "application/json"}, body.encode()
+
+        root = ET.Element("eSearchResult")
+        for tag, key in (("Count", "count"), ("RetMax", "retmax"), ("RetStart", "retstart"),
+                         ("QueryKey", "querykey"), ("WebEnv", "webenv")):
+            if key in result:
+                ET.SubElement(root, tag).text = result[key]
+        id_list = ET.SubElement(root, "IdList")
+        for pmid in idlist:
+            ET.SubElement(id_list, "Id").text = pmid
+        ET.SubElement(root, "QueryTranslation").text = result["querytranslation"]
+        return 200, {"Content-Type": "text/xml"}, ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+    def efetch(self, params: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        pmids = [pmid for pmid in self._ids(params) if pmid in self.corpus]
+        rettype = params.get("rettype", "").lower()
+        retmode = params.get("retmode", "xml").lower()
+        if rettype == "uilist":
+            return 200, {"Content-Type": "text/plain"}, "".join(f"{pmid}\n" for pmid in pmids).encode()
+        if rettype == "medline":
+            text = "\n".join(_medline(self.corpus.record(pmid)) for pmid in pmids)
+            return 200, {"Content-Type": "text/plain; charset=UTF-8"}, text.encode("utf-8")
+        if retmode != "xml":
+            text = "\n\n".join(f"{pmid}. {self.corpus.record(pmid).title}" for pmid in pmids)
+            return 200, {"Content-Type": "text/plain; charset=UTF-8"}, text.encode("utf-8")
+        root = ET.Element("PubmedArticleSet")
+        for pmid in pmids:
+            root.append(_pubmed_article(self.corpus.record(pmid)))
+        return 200, {"Content-Type": "text/xml"}, ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+    def esummary(self, params: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        pmids = [pmid for pmid in self._ids(params) if pmid in self.corpus]
+        result: Dict[str, Any] = {"uids": [str(pmid) for pmid in pmids]}
+        for pmid in pmids:
+            record = self.corpus.record(pmid)
+            result[str(pmid)] = {
+                "uid": str(pmid),
+                "pubdate": str(record.year),
+                "epubdate": "",
+                "source": record.journal,
+                "fulljournalname": record.journal,
+                "authors": [{"name": name, "authtype": "Author"} for name in record.authors],
+                "title": record.title,
+                "volume": str(1 + record.year % 40),
+                "issue": "1",
+                "pages": f"{pmid % 900 + 1}-{pmid % 900 + 9}",
+                "lang": record.languages,
+                "pubtype": record.publication_types,
+                "elocationid": f"doi: {record.doi}",
+                "articleids": [
+                    {"idtype": "pubmed", "value": str(pmid)},
+                    {"idtype": "doi", "value": record.doi},
+                ],
+            }
+        body = json.dumps({"header": {"type": "esummary", "version": "0.3"}, "result": result})
+        return 200, {"Content-Type": "application/json"}, body.encode()
+
+    def epost(self, params: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        pmids = {pmid for pmid in self._ids({"id": params.get("id", "")}) if pmid in self.corpus}
+        webenv, history = self._history(params.get("WebEnv"))
+        root = ET.Element("ePostResult")
+        ET.SubElement(root, "QueryKey").text = self._store(history, pmids)
+        ET.SubElement(root, "WebEnv").text = webenv
+        return 200, {"Content-Type": "text/xml"}, ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+    def elink(self, params: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        pmids = self._ids(params)
+        linkname = params.get("linkname") or f"{params.get('dbfrom', 'pubmed')}_{params.get('db', 'pubmed')}"
+        linksets = []
+        for pmid in pmids:
+            rng = random.Random(f"{self.corpus.seed}:link:{pmid}")
+            links = sorted(
+                {self.corpus.first_pmid + rng.randrange(max(1, self.corpus.size)) for _ in range(5)} - {pmid},
+                reverse=True,
+            )
+            linksets.append({
+                "dbfrom": params.get("dbfrom", "pubmed"),
+                "ids": [str(pmid)],
+                "linksetdbs": [{"dbto": params.get("db", "pubmed"), "linkname": linkname, "links": [str(x) for x in links]}],
+            })
+        body = json.dumps({"header": {"type": "elink", "version": "0.3"}, "linksets": linksets})
+        return 200, {"Content-Type": "application/json"}, body.encode()
+
+
+def _medline(record: StubRecord) -> str:
+    """MEDLINE形式の1レコード"""
+    lines = [
+        f"PMID- {record.pmid}",
+        f"DP  - {record.year}",
+        f"TI  - {record.title}",
+        f"AB  - {record.abstract}",
+    ]
+    lines.extend(f"FAU - {name}" for name in record.authors)
+    lines.extend(f"AU  - {name}" for name in record.authors)
+    lines.extend(f"LA  - {lang}" for lang in record.languages)
+    lines.extend(f"PT  - {pt}" for pt in record.publication_types)
+    lines.append(f"TA  - {record.journal}")
+    lines.append(f"JT  - {record.journal}")
+    lines.extend(f"MH  - {term}" for term in record.mesh)
+    lines.append(f"AID - {record.doi} [doi]")
+    return "\n".join(lines) + "\n"
+
+
+def _pubmed_article(record: StubRecord) -> ET.Element:
+    """PubmedArticle 要素を組み立てる"""
+    article_el = ET.Element("PubmedArticle")
+    citation = ET.SubElement(article_el, "MedlineCitation", Status="MEDLINE", Owner="NLM")
+    ET.SubElement(citation, "PMID", Version="1").text = str(record.pmid)
+    article = ET.SubElement(citation, "Article", PubModel="Print")
+    journal = ET.SubElement(article, "Journal")
+    issue = ET.SubElement(journal, "JournalIssue", CitedMedium="Internet")
+    pub_date = ET.SubElement(issue, "PubDate")
+    ET.SubElement(pub_date, "Year").text = str(record.year)
+    ET.SubElement(journal, "Title").text = record.journal
+    ET.SubElement(journal, "ISOAbbreviation").text = record.journal
+    ET.SubElement(article, "ArticleTitle").text = record.title
+    abstract = ET.SubElement(article, "Abstract")
+    ET.SubElement(abstract, "AbstractText").text = record.abstract
+    authors = ET.SubElement(article, "AuthorList", CompleteYN="Y")
+    for name in record.authors:
+        last, _, fore = name.partition(" ")
+        author = ET.SubElement(authors, "Author", ValidYN="Y")
+        ET.SubElement(author, "LastName").text = last
+        ET.SubElement(author, "ForeName").text = fore
+        ET.SubElement(author, "Initials").text = fore[:1]
+    for lang in record.languages:
+        ET.SubElement(article, "Language").text = lang
+    ET.SubElement(article, "ELocationID", EIdType="doi", ValidYN="Y").text = record.doi
+    types = ET.SubElement(article, "PublicationTypeList")
+    for pt in record.publication_types:
+        ET.SubElement(types, "PublicationType", UI="").text = pt
+    if record.mesh:
+        headings = ET.SubElement(citation, "MeshHeadingList")
+        for index, term in enumerate(record.mesh):
+            heading = ET.SubElement(headings, "MeshHeading")
+            ET.SubElement(heading, "DescriptorName", UI=f"D{index:06d}", MajorTopicYN="N").text = term
+    pubmed_data = ET.SubElement(article_el, "PubmedData")
+    ids = ET.SubElement(pubmed_data, "ArticleIdList")
+    ET.SubElement(ids, "ArticleId", IdType="pubmed").text = str(record.pmid)
+    ET.SubElement(ids, "ArticleId", IdType="doi").text = record.doi
+    return article_el
+
+
+def _make_handler(stub: StubEutilsServer) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, params: Dict[str, str]) -> None:
+            endpoint = Path(urlparse(self.path).path).name.replace(".fcgi", "")
+            status, headers, body = stub.handle(endpoint, params)
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802
+            query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+            self._respond({key: values[-1] for key, values in query.items()})
+
+        def do_POST(self) -> None:  # noqa: N802
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode("utf-8") if length else ""
+            query = parse_qs(raw, keep_blank_values=True)
+            query.update(parse_qs(urlparse(self.path).query, keep_blank_values=True))
+            self._respond({key: values[-1] for key, values in query.items()})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="オフライン用 E-utilities スタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けポート（0で自動）")
+    parser.add_argument("--corpus", type=Path, help="コーパス定義のJSONファイル")
+    parser.add_argument("--size", type=int, default=DEFAULT_CORPUS_SIZE, help="自動生成するPMID数（--corpus 未指定時）")
+    parser.add_argument("--seed", type=int, default=0, help="擬似乱数のシード")
+    parser.add_argument("--no-auto-terms", action="store_true", help="未知の検索語を0件として扱う")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="応答遅延に加える最大ゆらぎ（秒）")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="429を返す割合（0-1）")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="503を返す割合（0-1）")
+    parser.add_argument("--rate-limit", type=float, help="APIキーごとの1秒あたりの上限（超過時は429）")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = SyntheticCorpus.from_file(args.corpus)
+    else:
+        corpus = SyntheticCorpus(size=args.size, seed=args.seed, auto_terms=not args.no_auto_terms)
+    faults = FaultConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+    server = StubEutilsServer(corpus, faults, host=args.host, port=args.port)
+    print(f"E-utilities stub: {len(corpus):,} records")
+    print(f"export NCBI_EUTILS_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        stats = server.stats
+        if stats:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+ブロックごとの出版年インデックス（期間別件数を手元で求める）
+
+「全期間／10年／5年／3年」の列を増やすたびに検索式へ ``[PDAT]`` の範囲を付けて
+再検索する代わりに、ブロックのPMID集合と各PMIDの出版年を1回だけ取得して保存し、
+任意の期間の件数をベクトル演算で求める。列を追加しても通信は発生しない。
+
+取得方法:
+    1. esearch（usehistory=y, retmax=0）で件数と WebEnv / query_key を取得
+    2. 同じ WebEnv から esummary（JSON）をページ単位に取得し、pubdate / epubdate の年を読む
+    3. 取得したPMIDの数が件数と一致しなければ失敗として扱う
+
+``[PDAT]`` は印刷版・電子版のどちらかの出版日が範囲に入ればヒットするため、
+両方の年を保持し「どちらかの年が範囲内」で数える。手元で答えられるのは年単位の
+範囲（"2021" 〜 "3000"、"2015/01/01" 〜 "2020/12/31" など）だけで、月日で区切る
+範囲は ``parse_pdat_window()`` が None を返す（呼び出し側で通常の検索に戻す）。
+
+保存したインデックスは件数キャッシュと同じ有効期限（``NCBI_COUNT_CACHE_TTL_HOURS``）を
+過ぎると取得し直す（新しく索引された論文を数え漏らさないため）。
+
+Usage:
+    from scripts.eutils.year_histogram import YearIndexStore
+
+    store = YearIndexStore()
+    index = store.get('("Physicians"[Mesh]) AND (ikigai[tiab])')
+    print(index.count(2021), index.count_clause('("2023"[PDAT] : "3000"[PDAT])'))
+"""
+
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .batch import resolve_max_in_flight
+from .client import EutilsClient, EutilsError, get_client
+from .compact_set import PmidSet
+from .count_cache import DEFAULT_TTL_HOURS, _env_float, normalize_query
+
+# esummary 1回あたりのPMID数（E-utilities の上限）
+DEFAULT_SUMMARY_PAGE_SIZE = 10000
+DEFAULT_YEAR_INDEX_DIR = Path(__file__).resolve().parents[2] / ".cache" / "eutils" / "year_index"
+
+_FETCHED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 出版年が読めないPMID（どの期間にも数えない）
+UNKNOWN_YEAR = 0
+YEAR_DTYPE = np.uint16
+
+# 上限側の "3000" など、事実上の上限なし
+_OPEN_END_YEAR = 3000
+
+_YEAR_RE = re.compile(r"\b(\d{4})\b")
+_DATE = r'"(\d{4})(?:/(\d{1,2})(?:/(\d{1,2}))?)?"\s*\[(?:PDAT|DP|Date - Publication)\]'
+_WINDOW_RE = re.compile(rf"^\(*\s*{_DATE}\s*(?::\s*{_DATE})?\s*\)*$", re.IGNORECASE)
+
+
+def parse_pdat_window(clause: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    ``[PDAT]`` の範囲を (開始年, 終了年) に変換する（None は上限・下限なし）
+
+    期間の指定がなければ (None, None)。年単位で区切れない範囲や、出版日以外の
+    条件を含む場合は None を返す。
+    """
+    if clause is None or not clause.strip():
+        return None, None
+    match = _WINDOW_RE.match(clause.strip())
+    if not match:
+        return None
+    start_year, start_month, start_day, end_year, end_month, end_day = match.groups()
+    if int(start_month or 1) != 1 or int(start_day or 1) != 1:
+        return None
+    if end_year is None:
+        # 単一の日付（"2021"[PDAT]）はその年だけ
+        if start_month or start_day:
+            return None
+        return int(start_year), int(start_year)
+    if int(end_month or 12) != 12 or int(end_day or 31) != 31:
+        return None
+    end = int(end_year)
+    return int(start_year), (None if end >= _OPEN_END_YEAR else end)
+
+
+def _year(text: str) -> int:
+    match = _YEAR_RE.search(text or "")
+    return int(match.group(1)) if match else UNKNOWN_YEAR
+
+
+@dataclass(frozen=True)
+class YearIndex:
+    """PMID集合と各PMIDの出版年（印刷版・電子版）"""
+
+    query: str
+    pmids: PmidSet
+    # pmids と同じ順序の出版年（不明は 0）
+    pub_years: np.ndarray
+    epub_years: np.ndarray
+    fetched_at: str = ""
+
+    def __post_init__(self):
+        if not len(self.pmids) == len(self.pub_years) == len(self.epub_years):
+            raise ValueError("pmids and year arrays must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.pmids)
+
+    def mask(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """出版年が [start, end] に入るPMIDの真偽配列（どちらかの年が入れば True）"""
+        if start is None and end is None:
+            return np.ones(len(self), dtype=bool)
+        result = np.zeros(len(self), dtype=bool)
+        for years in (self.pub_years, self.epub_years):
+            inside = years != UNKNOWN_YEAR
+            if start is not None:
+                inside &= years >= start
+            if end is not None:
+                inside &= years <= end
+            result |= inside
+        return result
+
+    def count(self, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        """出版年が [start, end] のPMID数（``"start"[PDAT] : "end"[PDAT]`` の件数）"""
+        if start is None and end is None:
+            return len(self)
+        return int(np.count_nonzero(self.mask(start, end)))
+
+    def count_clause(self, clause: Optional[str]) -> int:
+        """期間の検索式（``parse_pdat_window()`` の書式）の件数。年単位でなければ ValueError"""
+        window = parse_pdat_window(clause)
+        if window is None:
+            raise ValueError(f"Not a year-aligned [PDAT] window: {clause}")
+        return self.count(*window)
+
+    def select(self, start: Optional[int] = None, end: Optional[int] = None) -> PmidSet:
+        """出版年が [start, end] のPMID集合"""
+        return PmidSet.from_sorted(self.pmids.array[self.mask(start, end)])
+
+    def histogram(self) -> Dict[int, int]:
+        """出版年（印刷版、なければ電子版）ごとの件数。年が読めないPMIDは 0 に数える"""
+        years = np.where(self.pub_years != UNKNOWN_YEAR, self.pub_years, self.epub_years)
+        values, counts = np.unique(years, return_counts=True)
+        return {int(year): int(count) for year, count in zip(values, counts)}
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """.npz ファイルに保存する"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                pmids=self.pmids.array,
+                pub_years=self.pub_years,
+                epub_years=self.epub_years,
+                query=np.array(self.query),
+                fetched_at=np.array(self.fetched_at),
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "YearIndex":
+        with np.load(Path(path), allow_pickle=False) as data:
+            return cls(
+                query=str(data["query"]),
+                pmids=PmidSet.from_sorted(data["pmids"]),
+                pub_years=data["pub_years"].astype(YEAR_DTYPE, copy=False),
+                epub_years=data["epub_years"].astype(YEAR_DTYPE, copy=False),
+                fetched_at=str(data["fetched_at"]),
+            )
+
+
+def fetch_year_index(
+    query: str,
+    client: Optional[EutilsClient] = None,
+    db: str = "pubmed",
+    page_size: int = DEFAULT_SUMMARY_PAGE_SIZE,
+    strict: bool = True,
+) -> YearIndex:
+    """
+    検索式のPMID集合と出版年を取得する
+
+    Raises:
+        EutilsError: 検索に失敗した、または件数分の書誌情報を取得できなかった
+    """
+    client = client or get_client()
+    result = client.esearch(query, db=db, retmax=0, strict=strict, usehistory="y")
+    count = int(result["count"])
+
+    pmids: List[int] = []
+    pub_years: List[int] = []
+    epub_years: List[int] = []
+    retstart = 0
+    while retstart < count:
+        summary = client.esummary(
+            db=db,
+            WebEnv=result.get("webenv"),
+            query_key=result.get("querykey"),
+            retstart=str(retstart),
+            retmax=str(page_size),
+        )
+        uids = summary.get("uids", [])
+        if not uids:
+            break
+        for uid in uids:
+            record = summary.get(uid, {})
+            pmids.append(int(uid))
+            pub_years.append(_year(record.get("pubdate", "")))
+            epub_years.append(_year(record.get("epubdate", "")))
+        retstart += len(uids)
+
+    ids = np.asarray(pmids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    unique, first = np.unique(ids[order], return_index=True)
+    if len(unique) != count:
+        raise EutilsError(f"Retrieved {len(unique):,} of {count:,} summaries for query: {query[:100]}")
+    keep = order[first]
+    return YearIndex(
+        query=query,
+        pmids=PmidSet.from_sorted(unique),
+        pub_years=np.asarray(pub_years, dtype=YEAR_DTYPE)[keep],
+        epub_years=np.asarray(epub_years, dtype=YEAR_DTYPE)[keep],
+        fetched_at=time.strftime(_FETCHED_AT_FORMAT),
+    )
+
+
+class YearIndexStore:
+    """検索式ごとの出版年インデックスをディレクトリに保存し、再利用する"""
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = DEFAULT_YEAR_INDEX_DIR,
+        client: Optional[EutilsClient] = None,
+        refresh: bool = False,
+        max_age_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            directory: 保存先ディレクトリ
+            client: 使用するクライアント（省略時は共有クライアント）
+            refresh: 保存済みのインデックスを使わず取得し直す
+            max_age_seconds: 保存済みのインデックスを使う期間（秒）。省略時は件数キャッシュと同じ
+                ``NCBI_COUNT_CACHE_TTL_HOURS``（既定24時間）、0以下で無期限
+            clock: 現在時刻（エポック秒）を返す関数（テスト用に差し替え可能）
+        """
+        if max_age_seconds is None:
+            max_age_seconds = _env_float("NCBI_COUNT_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS) * 3600
+        self.directory = Path(directory)
+        self.client = client
+        self.refresh = refresh
+        self.max_age_seconds = max_age_seconds
+        self._clock = clock
+        # 今回の実行で取得した検索式の数（保存済みを使った分は数えない）
+        self.fetched = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, query: str) -> Path:
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.npz"
+
+    def is_fresh(self, index: YearIndex) -> bool:
+        """取得日時が ``max_age_seconds`` 以内か（取得日時が読めなければ False）"""
+        if self.max_age_seconds <= 0:
+            return True
+        try:
+            fetched_at = time.mktime(time.strptime(index.fetched_at, _FETCHED_AT_FORMAT))
+        except ValueError:
+            return False
+        return self._clock() - fetched_at < self.max_age_seconds
+
+    def get(self, query: str) -> YearIndex:
+        """保存済みで期限内ならそれを、なければ取得して保存したものを返す"""
+        path = self.path_for(query)
+        if not self.refresh and path.exists():
+            index = YearIndex.load(path)
+            if normalize_query(index.query) == normalize_query(query) and self.is_fresh(index):
+                return index
+        index = fetch_year_index(query, client=self.client)
+        index.save(path)
+        with self._lock:
+            self.fetched += 1
+        return index
+
+    def get_many(
+        self,
+        queries: Sequence[str],
+        max_in_flight: Optional[int] = None,
+    ) -> Dict[str, Union[YearIndex, EutilsError]]:
+        """複数の検索式のインデックスを並列に用意する（失敗した検索式は例外を値に入れる）"""
+
+        def run(query: str) -> Union[YearIndex, EutilsError]:
+            try:
+                return self.get(query)
+            except EutilsError as exc:
+                return exc
+
+        unique = list(dict.fromkeys(queries))
+        if not unique:
+            return {}
+        workers = min(resolve_max_in_flight(self.client or get_client(), max_in_flight), len(unique))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(unique, pool.map(run, unique)))
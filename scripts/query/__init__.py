@@ -0,0 +1,43 @@
+"""PubMed検索式の構文解析（検索式ツール・変換ツール・件数取得で共通のAST）."""
+
+from .pubmed_parser import (
+    DEFAULT_PARSE_CACHE_SIZE,
+    PRECEDENCE,
+    BoolOp,
+    DateRange,
+    Group,
+    LineRef,
+    Node,
+    ParsedQuery,
+    QuerySyntaxError,
+    SyntaxIssue,
+    Term,
+    Token,
+    iter_nodes,
+    parse,
+    split_boolean,
+    split_top_level,
+    tokenize,
+    unwrap,
+)
+
+__all__ = [
+    "DEFAULT_PARSE_CACHE_SIZE",
+    "PRECEDENCE",
+    "BoolOp",
+    "DateRange",
+    "Group",
+    "LineRef",
+    "Node",
+    "ParsedQuery",
+    "QuerySyntaxError",
+    "SyntaxIssue",
+    "Term",
+    "Token",
+    "iter_nodes",
+    "parse",
+    "split_boolean",
+    "split_top_level",
+    "tokenize",
+    "unwrap",
+]
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+PubMed検索式の字句解析と構文解析（共通のAST）
+
+検索式を1回だけトークンに分け、演算子の優先順位に従って不変のAST
+（``Term`` / ``LineRef`` / ``Group`` / ``BoolOp`` / ``DateRange``）を組み立てる。各ノードは
+元の文字列での位置（``span``）を持つため、検索語や OR 項の元の表記を
+文字列を走査し直さずに取り出せる。
+
+- PubMedは AND / OR / NOT を左から順に評価する（優先順位は同じ）ため、
+  ``PRECEDENCE`` はすべて同じ値で、左結合で組み立てる
+- 演算子は大文字・小文字を区別しない。引用符や ``[...]`` の中の語は演算子にならない
+- ``"2020"[PDAT] : "3000"[PDAT]`` は1つの ``DateRange``（両端の検索語を持つ）とする
+- 演算子のない隣り合う検索語（``"a"[tiab] b[tiab]`` など）は暗黙の AND とする
+  （引用符のない連続した語 ``heart failure[tiab]`` は1つの検索語）
+- 括弧の対応の誤りや演算子の欠落はその場で補って解析を続け、``ParsedQuery.errors`` に記録する
+
+``parse()`` は LRU キャッシュ付きで、同じ検索式を複数のツールが解析しても走査は1回で済む。
+
+Usage:
+    from scripts.query import parse
+
+    parsed = parse('("Physicians"[Mesh] OR physician*[tiab]) AND #2')
+    parsed.split("OR")                          # トップレベルの OR 項（外側の括弧は外す）
+    [term.value for term in parsed.terms()]     # ["Physicians", "physician*"]
+    [ref.number for ref in parsed.line_refs()]  # [2]
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple, Union
+
+# parse() が保持する検索式の数
+DEFAULT_PARSE_CACHE_SIZE = 4096
+
+# PubMedは左から順に評価する（AND / OR / NOT の間に優先順位はない）
+PRECEDENCE = {"AND": 1, "OR": 1, "NOT": 1}
+
+# 引用符・括弧・フィールドタグ以外で語を区切る文字
+_WORD_END = frozenset(' \t\r\n()"[')
+_LINE_REF_RE = re.compile(r"#(\d+)")
+# 日付の範囲の区切り（前後に空白を置いた ":"）
+_RANGE_SEPARATOR = ":"
+
+Span = Tuple[int, int]
+
+
+class QuerySyntaxError(ValueError):
+    """検索式の構文の誤り（``ParsedQuery.raise_for_errors()`` が送出）"""
+
+
+@dataclass(frozen=True)
+class Token:
+    """字句（kind は LPAREN / RPAREN / OPERATOR / PHRASE / WORD / TAG）"""
+
+    kind: str
+    text: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class SyntaxIssue:
+    """解析中に補った構文の誤り"""
+
+    message: str
+    position: int
+
+
+@dataclass(frozen=True)
+class Term:
+    """検索語（``"phrase"*[tiab]`` のフィールドタグまでを含む）"""
+
+    # フィールドタグを除いた元の表記（引用符・ワイルドカードを含む）
+    text: str
+    # フィールドタグの中身（``tiab`` / ``Mesh`` / ``tiab:~3``）。なければ None
+    field: Optional[str]
+    span: Span
+
+    @property
+    def quoted(self) -> bool:
+        return self.text.startswith('"')
+
+    @property
+    def wildcard(self) -> bool:
+        return self.text.endswith("*")
+
+    @property
+    def value(self) -> str:
+        """引用符とフレーズ後のワイルドカードを除いた語"""
+        text = self.text
+        if self.quoted:
+            text = text[:-1] if text.endswith('"*') else text
+            return text.strip('"')
+        return text
+
+    @property
+    def field_name(self) -> str:
+        """比較用のフィールド名（小文字、近接検索の ``:~n`` を除く）"""
+        return (self.field or "").split(":~")[0].strip().lower()
+
+
+@dataclass(frozen=True)
+class LineRef:
+    """検索行の参照（``#3``）"""
+
+    number: int
+    span: Span
+
+
+@dataclass(frozen=True)
+class Group:
+    """括弧で囲んだ式"""
+
+    child: "Node"
+    span: Span
+
+
+@dataclass(frozen=True)
+class BoolOp:
+    """同じ演算子で左から結合した式（``a OR b OR c`` は3項）"""
+
+    op: str
+    operands: Tuple["Node", ...]
+    span: Span
+    # 演算子を書かずに隣り合った検索語（暗黙の AND）
+    implicit: bool = False
+
+
+@dataclass(frozen=True)
+class DateRange:
+    """日付の範囲（``"2020"[PDAT] : "3000"[PDAT]``）"""
+
+    start: Term
+    end: Term
+    span: Span
+
+
+Node = Union[Term, LineRef, Group, BoolOp, DateRange]
+
+
+def iter_nodes(node: Optional[Node]) -> Iterator[Node]:
+    """ノードとその子孫を前順（左から）に返す"""
+    stack = [node] if node is not None else []
+    while stack:
+        current = stack.pop()
+        yield current
+        if isinstance(current, Group):
+            stack.append(current.child)
+        elif isinstance(current, DateRange):
+            stack.extend((current.end, current.start))
+        elif isinstance(current, BoolOp):
+            stack.extend(reversed(current.operands))
+
+
+def unwrap(node: Optional[Node]) -> Optional[Node]:
+    """外側の括弧を外したノード"""
+    while isinstance(node, Group):
+        node = node.child
+    return node
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    """検索式の解析結果（``parse()`` が返す）"""
+
+    source: str
+    root: Optional[Node]
+    errors: Tuple[SyntaxIssue, ...] = ()
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_for_errors(self) -> "ParsedQuery":
+        if self.errors:
+            issue = self.errors[0]
+            raise QuerySyntaxError(f"{issue.message} (position {issue.position})")
+        return self
+
+    def text(self, node: Node) -> str:
+        """ノードの元の表記"""
+        start, end = node.span
+        return self.source[start:end]
+
+    def walk(self) -> Iterator[Node]:
+        return iter_nodes(self.root)
+
+    def terms(self) -> List[Term]:
+        """検索語（出現順）"""
+        return [node for node in self.walk() if isinstance(node, Term)]
+
+    def line_refs(self) -> List[LineRef]:
+        """検索行の参照（出現順）"""
+        return [node for node in self.walk() if isinstance(node, LineRef)]
+
+    def operands(self, op: str = "OR") -> Tuple[Node, ...]:
+        """
+        外側の括弧を外したトップレベルの ``op`` の項
+
+        トップレベルが ``op`` でなければ式全体の1項。空の検索式は0項。
+        """
+        node = unwrap(self.root)
+        if node is None:
+            return ()
+        if isinstance(node, BoolOp) and node.op == op.upper() and not node.implicit:
+            return node.operands
+        return (node,)
+
+    def split(self, op: str = "OR") -> List[str]:
+        """
+        トップレベルの ``op`` の項を元の表記で返す
+
+        構文に誤りがある場合は分割せず、検索式全体を1項として返す。
+        """
+        if self.errors:
+            text = self.source.strip()
+            return [text] if text else []
+        return [self.text(node) for node in self.operands(op)]
+
+
+def tokenize(query: str) -> Tuple[Tuple[Token, ...], Tuple[SyntaxIssue, ...]]:
+    """検索式を字句に分ける（閉じていない引用符・タグは末尾までとして記録する）"""
+    tokens: List[Token] = []
+    issues: List[SyntaxIssue] = []
+    length = len(query)
+    i = 0
+    while i < length:
+        char = query[i]
+        if char.isspace():
+            i += 1
+            continue
+        start = i
+        if char == "(":
+            kind, i = "LPAREN", i + 1
+        elif char == ")":
+            kind, i = "RPAREN", i + 1
+        elif char == '"':
+            close = query.find('"', i + 1)
+            if close < 0:
+                issues.append(SyntaxIssue("unterminated quotation mark", start))
+                i = length
+            else:
+                i = close + 1
+                # フレーズ直後のワイルドカード（"phrase"*）はフレーズに含める
+                if i < length and query[i] == "*":
+                    i += 1
+            kind = "PHRASE"
+        elif char == "[":
+            close = query.find("]", i + 1)
+            if close < 0:
+                issues.append(SyntaxIssue("unterminated field tag", start))
+                i = length
+            else:
+                i = close + 1
+            kind = "TAG"
+        else:
+            while i < length and query[i] not in _WORD_END:
+                i += 1
+            kind = "OPERATOR" if query[start:i].upper() in PRECEDENCE else "WORD"
+        tokens.append(Token(kind, query[start:i], start, i))
+    return tuple(tokens), tuple(issues)
+
+
+class _Parser:
+    """優先順位法による構文解析（誤りは補って記録する）"""
+
+    def __init__(self, query: str, tokens: Tuple[Token, ...], issues: List[SyntaxIssue]):
+        self.query = query
+        self.tokens = tokens
+        self.issues = issues
+        self.index = 0
+
+    def _peek(self) -> Optional[Token]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def parse(self) -> Optional[Node]:
+        root = self._expression(0)
+        while self._peek() is not None:
+            token = self.tokens[self.index]
+            self.index += 1
+            # 対応しない ")" などは読み飛ばし、続きを暗黙の AND でつなぐ
+            self.issues.append(SyntaxIssue(f"unexpected {token.text!r}", token.start))
+            rest = self._expression(0)
+            if rest is not None:
+                root = rest if root is None else self._combine("AND", root, rest, implicit=True)
+        return root
+
+    def _expression(self, min_precedence: int) -> Optional[Node]:
+        left = self._operand()
+        while True:
+            token = self._peek()
+            if token is None or token.kind == "RPAREN":
+                return left
+            if token.kind == "OPERATOR":
+                op = token.text.upper()
+                precedence = PRECEDENCE[op]
+                if precedence < min_precedence:
+                    return left
+                self.index += 1
+                right = self._expression(precedence + 1)
+                if right is None:
+                    self.issues.append(SyntaxIssue(f"missing operand after {op}", token.start))
+                    continue
+                if left is None:
+                    self.issues.append(SyntaxIssue(f"missing operand before {op}", token.start))
+                    left = right
+                    continue
+                left = self._combine(op, left, right)
+            else:
+                # 演算子のない隣り合う検索語は暗黙の AND（明示した演算子と同じ優先順位）
+                if PRECEDENCE["AND"] < min_precedence:
+                    return left
+                right = self._expression(PRECEDENCE["AND"] + 1)
+                if right is None:
+                    # 空の括弧など（字句は読み進めている）
+                    continue
+                left = right if left is None else self._combine("AND", left, right, implicit=True)
+
+    def _combine(self, op: str, left: Node, right: Node, implicit: bool = False) -> BoolOp:
+        span = (left.span[0], right.span[1])
+        if isinstance(left, BoolOp) and left.op == op and left.implicit == implicit:
+            return BoolOp(op, left.operands + (right,), span, implicit)
+        return BoolOp(op, (left, right), span, implicit)
+
+    def _operand(self) -> Optional[Node]:
+        token = self._peek()
+        if token is None or token.kind in ("RPAREN", "OPERATOR"):
+            return None
+        if token.kind == "LPAREN":
+            self.index += 1
+            child = self._expression(0)
+            close = self._peek()
+            if close is not None and close.kind == "RPAREN":
+                self.index += 1
+                end = close.end
+            else:
+                self.issues.append(SyntaxIssue("unclosed parenthesis", token.start))
+                end = self.tokens[self.index - 1].end
+            if child is None:
+                self.issues.append(SyntaxIssue("empty parentheses", token.start))
+                return None
+            return Group(child, (token.start, end))
+        if token.kind == "TAG":
+            self.index += 1
+            self.issues.append(SyntaxIssue(f"field tag {token.text} without a term", token.start))
+            return self._operand()
+        return self._term()
+
+    def _term(self) -> Node:
+        first = self.tokens[self.index]
+        last = first
+        self.index += 1
+        if first.kind == "WORD":
+            # 引用符のない連続した語は1つの検索語（範囲の ":" の手前まで）
+            while True:
+                token = self._peek()
+                if token is None or token.kind != "WORD" or token.text == _RANGE_SEPARATOR:
+                    break
+                last = token
+                self.index += 1
+        text = self.query[first.start:last.end]
+        end = last.end
+        field = None
+        token = self._peek()
+        if token is not None and token.kind == "TAG":
+            field = token.text[1:-1] if token.text.endswith("]") else token.text[1:]
+            end = token.end
+            self.index += 1
+        if field is None:
+            match = _LINE_REF_RE.fullmatch(text)
+            if match:
+                return LineRef(int(match.group(1)), (first.start, end))
+        term = Term(text, field, (first.start, end))
+        separator = self._peek()
+        if separator is None or separator.kind != "WORD" or separator.text != _RANGE_SEPARATOR:
+            return term
+        self.index += 1
+        following = self._peek()
+        if following is None or following.kind not in ("WORD", "PHRASE"):
+            self.issues.append(SyntaxIssue("missing end of date range", separator.start))
+            return term
+        last = self._term()
+        if not isinstance(last, Term):
+            self.issues.append(SyntaxIssue("invalid end of date range", following.start))
+            return term
+        return DateRange(term, last, (first.start, last.span[1]))
+
+
+@lru_cache(maxsize=DEFAULT_PARSE_CACHE_SIZE)
+def parse(query: str) -> ParsedQuery:
+    """
+    検索式を解析する（結果は不変で、同じ検索式は LRU キャッシュから返す）
+
+    構文の誤りは例外にせず ``ParsedQuery.errors`` に記録する。
+    誤りを許さない場合は ``parse(query).raise_for_errors()``。
+    """
+    tokens, issues = tokenize(query)
+    errors = list(issues)
+    root = _Parser(query, tokens, errors).parse()
+    return ParsedQuery(query, root, tuple(errors))
+
+
+def split_top_level(query: str, op: str = "OR") -> List[str]:
+    """検索式をトップレベルの ``op`` で分割する（``parse(query).split(op)``）"""
+    return parse(query).split(op)
+
+
+def split_boolean(text: str) -> List[str]:
+    """
+    括弧の外の AND / OR / NOT で文字列を区切り、項と演算子を交互に返す
+
+    項は前後の空白を含む元の表記のままで、連結すると元の文字列になる。
+    検索語の形式を問わないため、Ovid など他のデータベースの検索式にも使える。
+    """
+    tokens, _ = tokenize(text)
+    parts: List[str] = []
+    depth = 0
+    start = 0
+    for token in tokens:
+        if token.kind == "LPAREN":
+            depth += 1
+        elif token.kind == "RPAREN":
+            depth -= 1
+        elif token.kind == "OPERATOR" and depth == 0:
+            if token.start > start:
+                parts.append(text[start:token.start])
+            parts.append(token.text)
+            start = token.end
+    if start < len(text):
+        parts.append(text[start:])
+    return parts
@@ -13,13 +13,21 @@ Usage:
     ris_data = client.download_results(results_id, mimetype="ris")
 """
 
-import requests
-from bs4 import BeautifulSoup
 import re
+import sys
 import time
+from pathlib import Path
 from typing import Optional, List, Tuple
 from urllib.parse import urljoin
 
+from bs4 import BeautifulSoup
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils.cassette import create_session, is_replaying  # noqa: E402
+
 BASE_URL = "https://aio.therai.org.uk/"
 
 # Rate limiting (respect free tier: ~100 searches/year)
@@ -34,7 +42,7 @@ class AIOClient:
         Args:
             delay_sec: リクエスト間の待機時間（秒）
         """
-        self.session = requests.Session()
+        self.session = create_session()
         self.session.headers.update({
             "User-Agent": "AIO-Research-Client/1.0 (Academic Research)"
         })
@@ -42,7 +50,9 @@ class AIOClient:
         self._last_request_time = 0.0
     
     def _wait_for_rate_limit(self):
-        """レート制限のための待機"""
+        """レート制限のための待機（記録の再生中は待たない）"""
+        if is_replaying():
+            return
         elapsed = time.time() - self._last_request_time
         if elapsed < self.delay_sec:
             time.sleep(self.delay_sec - elapsed)
@@ -26,6 +26,7 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(script_dir))))
 
 from scripts.search.aio.aio_client import AIOClient
+from scripts.eutils import add_cassette_arguments, apply_cassette_arguments
 
 
 def main():
@@ -77,7 +78,9 @@ def main():
         help="Delay between requests in seconds (default: 2.0)"
     )
     
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cassette_arguments(args)
     
     print("=" * 60)
     print("AIO (Anthropological Index Online) Search")
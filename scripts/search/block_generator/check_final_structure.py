@@ -1,37 +1,30 @@
-import requests
-import time
+import sys
+from pathlib import Path
 from typing import Dict
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import get_pubmed_count as _eutils_get_pubmed_count  # noqa: E402
+
 def get_pubmed_count(query: str) -> Dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数を取得する
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
-    try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'query': query,
-            'message': 'Success'
-        }
-        
-    except requests.exceptions.RequestException as e:
+    result = _eutils_get_pubmed_count(query)
+    if not result['success']:
         return {
             'count': 0,
             'query': query,
-            'message': f'Error: {str(e)}'
+            'message': f"Error: {result['message']}"
         }
+    return {
+        'count': result['count'],
+        'query': query,
+        'message': 'Success'
+    }
+
 
 def main():
     # 各ブロックの検索式
@@ -76,19 +69,16 @@ def main():
     
     # 1. AML/MDS OR 化学療法
     condition_query = f"({' OR '.join(aml_mds + chemo)})"
-    time.sleep(1)
     condition_result = get_pubmed_count(condition_query)
     print(f"1. AML/MDS OR 化学療法: {condition_result['count']:,}件")
     
     # 2. (AML/MDS OR 化学療法) AND 免疫不全
     immune_query = f"{condition_query} AND ({' OR '.join(immune)})"
-    time.sleep(1)
     immune_result = get_pubmed_count(immune_query)
     print(f"2. AND 免疫不全: {immune_result['count']:,}件")
     
     # 3. (AML/MDS OR 化学療法) AND 免疫不全 AND RCTフィルター
     final_query = f"{immune_query} AND ({' OR '.join(rct)})"
-    time.sleep(1)
     final_result = get_pubmed_count(final_query)
     print(f"3. AND RCTフィルター: {final_result['count']:,}件")
 
@@ -19,10 +19,18 @@ Usage:
 """
 
 import requests
+import sys
 import time
+from pathlib import Path
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils.cassette import create_session, is_replaying  # noqa: E402
+
 
 # ERIC API Configuration
 ERIC_API_BASE_URL = "https://api.ies.ed.gov/eric/"
@@ -30,6 +38,9 @@ DEFAULT_ROWS = 20
 MAX_ROWS = 2000
 DEFAULT_FORMAT = "json"
 
+# 記録・再生（--record / --replay）に対応した共通セッション
+_SESSION = create_session()
+
 
 @dataclass
 class ERICSearchResult:
@@ -334,7 +345,7 @@ def search_eric(
     last_error = None
     for attempt in range(retry_count):
         try:
-            response = requests.get(ERIC_API_BASE_URL, params=params, timeout=30)
+            response = _SESSION.get(ERIC_API_BASE_URL, params=params, timeout=30)
             response.raise_for_status()
             
             if format == 'json':
@@ -353,7 +364,7 @@ def search_eric(
                 
         except requests.exceptions.RequestException as e:
             last_error = e
-            if attempt < retry_count - 1:
+            if attempt < retry_count - 1 and not is_replaying():
                 time.sleep(1)  # Wait before retry
                 continue
     
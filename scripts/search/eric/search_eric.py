@@ -47,6 +47,7 @@ from scripts.search.eric.eric_api import (
     export_results_to_ris,
     format_record_for_display
 )
+from scripts.eutils import add_cassette_arguments, apply_cassette_arguments
 
 
 def main():
@@ -161,7 +162,9 @@ def main():
         help="最大出版年 (例: 2025)"
     )
     
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cassette_arguments(args)
     
     # Parse fields if provided
     fields = None
@@ -2,14 +2,46 @@
 # -*- coding: utf-8 -*-
 
 import requests
+import sys
 import time
 import json
 import os
 import re
 import argparse # 追加
 from datetime import datetime
-from typing import Dict, List, Set, Optional, Any
-from bs4 import BeautifulSoup
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, Optional, Any, Union
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import PubmedRecord, get_client, get_rate_limiter, iter_article_xml, parse_pubmed_record  # noqa: E402
+
+def iter_paper_details(pmids: List[str]) -> Iterator[Dict]:
+    """
+    複数の論文の詳細情報（書誌情報）を最大500件ずつまとめて取得し、1件ずつ返す
+
+    Args:
+        pmids: 論文のPMIDのリスト
+
+    Returns:
+        Iterator[Dict]: 論文ごとの詳細情報（``get_paper_details`` と同じ形式）
+    """
+    for article in iter_article_xml(pmids):
+        if article.ok:
+            yield {
+                'pmid': article.pmid,
+                'record': article.record,
+                'status': 'success'
+            }
+        else:
+            yield {
+                'pmid': article.pmid,
+                'record': None,
+                'status': 'error',
+                'message': article.error
+            }
 
 def get_paper_details(pmid: str) -> Dict:
     """
@@ -21,158 +53,58 @@ def get_paper_details(pmid: str) -> Dict:
     Returns:
         Dict: 論文の詳細情報
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    fetch_url = f"{base_url}/efetch.fcgi"
-    
-    api_key = os.getenv("NCBI_API_KEY")
-    params = {
-        'db': 'pubmed',
-        'id': pmid,
-        'retmode': 'xml'
-    }
-    if api_key:
-        params['api_key'] = api_key
-    
-    try:
-        response = requests.get(fetch_url, params=params)
-        response.raise_for_status()
-        return {
-            'pmid': pmid,
-            'xml': response.text,
-            'status': 'success'
-        }
-    except requests.exceptions.RequestException as e:
-        return {
-            'pmid': pmid,
-            'xml': None,
-            'status': 'error',
-            'message': str(e)
-        }
+    return next(iter_paper_details([pmid]))
+
+def _as_record(xml_data: Union[str, PubmedRecord, None]) -> Optional[PubmedRecord]:
+    """XMLなら解析し、解析済みの書誌情報ならそのまま返す"""
+    if isinstance(xml_data, PubmedRecord):
+        return xml_data
+    return parse_pubmed_record(xml_data)
 
-def extract_mesh_terms(xml_data: str) -> List[Dict]:
+def extract_mesh_terms(xml_data: Union[str, PubmedRecord, None]) -> List[Dict]:
     """
     XMLデータからMeSH用語を抽出する
     
     Args:
-        xml_data: PubMed論文のXMLデータ
+        xml_data: PubMed論文のXMLデータ（または ``parse_pubmed_record`` の結果）
         
     Returns:
         List[Dict]: MeSH用語のリスト
     """
-    mesh_terms = []
-    
-    if not xml_data:
-        return mesh_terms
-    
-    soup = BeautifulSoup(xml_data, 'lxml')
-    
-    # MeSH用語の抽出
-    mesh_headings = soup.find_all('meshheading')
-    
-    for heading in mesh_headings:
-        descriptor = heading.find('descriptorname')
-        
-        if descriptor:
-            # MeSH UIの取得
-            mesh_ui = descriptor.get('ui', '')
-            
-            # 修飾語の抽出
-            qualifiers = []
-            for qualifier in heading.find_all('qualifiername'):
-                qualifier_name = qualifier.text
-                qualifier_ui = qualifier.get('ui', '')
-                major_topic = qualifier.get('majortopicyn', 'N') == 'Y'
-                qualifiers.append({
-                    'name': qualifier_name,
-                    'ui': qualifier_ui,
-                    'major_topic': major_topic
-                })
-            
-            # 主要トピックかどうか
-            major_topic = descriptor.get('majortopicyn', 'N') == 'Y'
-            
-            mesh_terms.append({
-                'descriptor': descriptor.text,
-                'ui': mesh_ui,
-                'major_topic': major_topic,
-                'qualifiers': qualifiers
-            })
-    
-    return mesh_terms
+    record = _as_record(xml_data)
+    return record.mesh_terms if record else []
 
-def extract_title_abstract(xml_data: str) -> Dict:
+def extract_title_abstract(xml_data: Union[str, PubmedRecord, None]) -> Dict:
     """
     XMLデータからタイトルと抄録を抽出する
     
     Args:
-        xml_data: PubMed論文のXMLデータ
+        xml_data: PubMed論文のXMLデータ（または ``parse_pubmed_record`` の結果）
         
     Returns:
         Dict: タイトルと抄録
     """
-    if not xml_data:
-        return {'title': '', 'abstract': ''}
-    
-    soup = BeautifulSoup(xml_data, 'lxml')
-    
-    # タイトルの抽出
-    title_element = soup.find('articletitle')
-    title = title_element.text if title_element else ''
-    
-    # 抄録の抽出
-    abstract_texts = soup.find_all('abstracttext')
-    abstract = ' '.join([text.text for text in abstract_texts]) if abstract_texts else ''
-    
+    record = _as_record(xml_data)
     return {
-        'title': title,
-        'abstract': abstract
+        'title': record.title if record else '',
+        'abstract': record.abstract if record else ''
     }
 
-def extract_publication_info(xml_data: str) -> Dict:
+def extract_publication_info(xml_data: Union[str, PubmedRecord, None]) -> Dict:
     """
     XMLデータから出版情報を抽出する
     
     Args:
-        xml_data: PubMed論文のXMLデータ
+        xml_data: PubMed論文のXMLデータ（または ``parse_pubmed_record`` の結果）
         
     Returns:
         Dict: 出版情報
     """
-    if not xml_data:
-        return {
-            'journal': '',
-            'year': '',
-            'authors': []
-        }
-    
-    soup = BeautifulSoup(xml_data, 'lxml')
-    
-    # ジャーナル名の抽出
-    journal_element = soup.find('journal')
-    journal = journal_element.find('title').text if journal_element and journal_element.find('title') else ''
-    
-    # 出版年の抽出
-    pub_date = soup.find('pubdate')
-    year = pub_date.find('year').text if pub_date and pub_date.find('year') else ''
-    
-    # 著者の抽出
-    authors = []
-    author_list = soup.find('authorlist')
-    
-    if author_list:
-        for author in author_list.find_all('author'):
-            last_name = author.find('lastname')
-            fore_name = author.find('forename')
-            
-            if last_name and fore_name:
-                authors.append(f"{last_name.text} {fore_name.text}")
-            elif last_name:
-                authors.append(last_name.text)
-    
+    record = _as_record(xml_data)
     return {
-        'journal': journal,
-        'year': year,
-        'authors': authors
+        'journal': record.journal if record else '',
+        'year': record.year if record else '',
+        'authors': list(record.authors) if record else []
     }
 
 def get_mesh_hierarchy(mesh_ui: str, mesh_name: Optional[str] = None) -> List[str]:
@@ -191,7 +123,6 @@ def get_mesh_hierarchy(mesh_ui: str, mesh_name: Optional[str] = None) -> List[st
     Returns:
         List[str]: 取得したツリー番号のリスト。取得失敗時は ["Unknown.<UI>"]。
     """
-    import requests, re, time
     from bs4 import BeautifulSoup
 
     # --- 1. MeSH Browser を直接スクレイピング ---------------------------------
@@ -206,6 +137,8 @@ def get_mesh_hierarchy(mesh_ui: str, mesh_name: Optional[str] = None) -> List[st
     }
 
     try:
+        # MeSH Browser も NCBI 側のサービスなので E-utilities と同じリミッターで間隔を空ける
+        get_rate_limiter().acquire()
         resp = requests.get(browser_url, headers=headers, timeout=20)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, "html.parser")
@@ -248,13 +181,8 @@ def get_mesh_hierarchy(mesh_ui: str, mesh_name: Optional[str] = None) -> List[st
 
     # --- 2. efetch (db=mesh, retmode=xml) ----------------------------------------
     try:
-        efetch_response = requests.get( # Renamed efetch to efetch_response
-            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi",
-            params={"db": "mesh", "id": mesh_ui, "retmode": "xml"},
-            timeout=20,
-        )
-        efetch_response.raise_for_status()
-        soup = BeautifulSoup(efetch_response.text, "lxml")
+        efetch_text = get_client().efetch(db="mesh", ids=[mesh_ui], retmode="xml")
+        soup = BeautifulSoup(efetch_text, "lxml")
 
         # <TreeNumber> または <treenumber>
         numbers = [t.get_text() for t in soup.find_all(["TreeNumber", "treenumber"])]
@@ -666,16 +594,17 @@ def main() -> None:
     # ------------------------------------------------------------------
     # 1. 各 PMID → 論文詳細取得 → MeSH 用語抽出
     # ------------------------------------------------------------------
-    for pmid in pmids:
+    for paper in iter_paper_details(pmids):
+        pmid = paper["pmid"]
         print(f"\n[main] PMID {pmid} 処理開始")
-        paper = get_paper_details(pmid)
         if paper["status"] == "error":
             print(f"  ↳ 取得失敗: {paper['message']}")
             continue
 
-        mesh_list_for_paper = extract_mesh_terms(paper["xml"]) # Renamed to avoid conflict
-        meta      = extract_title_abstract(paper["xml"])
-        pubinfo   = extract_publication_info(paper["xml"])
+        record    = paper["record"] # 取得時に1回だけ解析した書誌情報から各項目を取り出す
+        mesh_list_for_paper = extract_mesh_terms(record) # Renamed to avoid conflict
+        meta      = extract_title_abstract(record)
+        pubinfo   = extract_publication_info(record)
 
         # ログ出力
         print(f"  タイトル : {meta['title'][:80]}…")
@@ -712,8 +641,6 @@ def main() -> None:
             if term["major_topic"]:
                 results["mesh_terms"][ui]["major_topic_count"] += 1
 
-        time.sleep(0.34)   # PubMed API レート制限 (adjust as needed)
-
     # ------------------------------------------------------------------
     # 2. 上位 MeSH 用語のツリー番号取得と全ツリー番号収集
     # ------------------------------------------------------------------
@@ -750,7 +677,6 @@ def main() -> None:
                 for i_part, part_val in enumerate(parts):
                     current_path = f"{current_path}.{part_val}" if i_part > 0 else part_val
                     all_tree_numbers_collected.add(current_path)
-        time.sleep(0.34)  # API rate limit
 
     # Fallback for basic hierarchy (might be less necessary now)
     # print("MeSH階層構造の取得に失敗しました。基本的な階層構造を手動で設定します。")
@@ -1,8 +1,14 @@
-import requests
-import time
+import sys
 import xml.etree.ElementTree as ET
+from pathlib import Path
 from typing import List, Dict, Optional
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client  # noqa: E402
+
 
 def fetch_mesh_descriptor_name(term: str) -> Optional[str]:
     """
@@ -17,45 +23,27 @@ def fetch_mesh_descriptor_name(term: str) -> Optional[str]:
     Returns:
         正式なDescriptorName。見つからない場合はNone。
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    fetch_url = f"{base_url}/efetch.fcgi"
-
-    # Step 1: MeSHデータベースでUIDを検索
-    search_params = {
-        'db': 'mesh',
-        'term': term,
-        'retmode': 'json'
-    }
+    client = get_client()
 
     try:
-        response = requests.get(search_url, params=search_params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        # Step 1: MeSHデータベースでUIDを検索
+        result = client.esearch(term, db='mesh', retmax=20, strict=False)
 
-        id_list = data.get('esearchresult', {}).get('idlist', [])
+        id_list = result.get('idlist', [])
         if not id_list:
             return None
 
         # Step 2: efetchでDescriptorレコードのXMLを取得
-        time.sleep(0.34)  # API rate limit
-        fetch_params = {
-            'db': 'mesh',
-            'id': id_list[0],
-            'retmode': 'xml'
-        }
-
-        fetch_resp = requests.get(fetch_url, params=fetch_params, timeout=30)
-        fetch_resp.raise_for_status()
+        content = client.efetch_bytes(db='mesh', ids=[id_list[0]], retmode='xml')
 
-        root = ET.fromstring(fetch_resp.content)
+        root = ET.fromstring(content)
         descriptor_name_elem = root.find('.//DescriptorName/String')
         if descriptor_name_elem is not None and descriptor_name_elem.text:
             return descriptor_name_elem.text
 
         return None
 
-    except (requests.exceptions.RequestException, ET.ParseError):
+    except (EutilsError, ET.ParseError):
         return None
 
 
@@ -81,22 +69,11 @@ def check_mesh_term(term: str) -> Dict:
             'message': str            # ステータスメッセージ
         }
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-
-    # MeSH用語の検索
-    search_url = f"{base_url}/esearch.fcgi"
-    params = {
-        'db': 'mesh',
-        'term': term,
-        'retmode': 'json'
-    }
+    client = get_client()
 
     try:
-        response = requests.get(search_url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-
-        count = int(data['esearchresult'].get('count', 0))
+        # MeSH用語の検索
+        count = client.count(term, db='mesh', strict=False)
         exists = count > 0
 
         # Exact match検証: DescriptorNameを取得して照合
@@ -110,16 +87,7 @@ def check_mesh_term(term: str) -> Dict:
                 is_preferred = (term.lower() == descriptor_name.lower())
 
         # PubMedでの文献数も確認（exact [Mesh] tagで検索）
-        time.sleep(0.34)  # API rate limit
-        pubmed_params = {
-            'db': 'pubmed',
-            'term': f'"{term}"[Mesh]',
-            'retmode': 'json'
-        }
-        pubmed_response = requests.get(search_url, params=pubmed_params, timeout=30)
-        pubmed_response.raise_for_status()
-        pubmed_data = pubmed_response.json()
-        pubmed_count = int(pubmed_data['esearchresult'].get('count', 0))
+        pubmed_count = client.count(f'"{term}"[Mesh]', strict=False)
 
         # メッセージの構築
         if not exists:
@@ -143,7 +111,7 @@ def check_mesh_term(term: str) -> Dict:
             'message': message
         }
 
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'exists': False,
             'is_preferred': False,
@@ -171,9 +139,6 @@ def main():
     print("MeSH用語の確認を開始します（exact match検証付き）...\n")
 
     for term in mesh_terms:
-        # APIの制限を考慮して少し待機
-        time.sleep(1)
-
         result = check_mesh_term(term)
 
         print(f"用語: {result['term']}")
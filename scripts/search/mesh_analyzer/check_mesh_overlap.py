@@ -2,13 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import re
-import requests
-import json
 import os
-import time
+import sys
 from datetime import datetime
-from typing import Dict, List, Set, Tuple
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    EutilsError,
+    OverlapMatrix,
+    fetch_pmid_sets,
+    get_client,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+)
 
 def parse_search_formula(file_path: str) -> Dict[str, List[str]]:
     """
@@ -42,23 +55,13 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
     Returns:
         Dict: MeSH用語の階層情報
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    fetch_url = f"{base_url}/efetch.fcgi"
-    
-    # まずMeSH用語のUIDを検索
-    search_params = {
-        'db': 'mesh',
-        'term': mesh_term,
-        'retmode': 'json'
-    }
+    client = get_client()
     
     try:
-        search_response = requests.get(search_url, params=search_params)
-        search_response.raise_for_status()
-        search_data = search_response.json()
+        # まずMeSH用語のUIDを検索
+        search_data = client.esearch(mesh_term, db='mesh', retmax=20, strict=False)
         
-        ids = search_data['esearchresult'].get('idlist', [])
+        ids = search_data.get('idlist', [])
         
         if not ids:
             return {
@@ -71,17 +74,10 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
             }
         
         # MeSH用語の詳細情報を取得
-        fetch_params = {
-            'db': 'mesh',
-            'id': ids[0],
-            'retmode': 'xml'
-        }
-        
-        fetch_response = requests.get(fetch_url, params=fetch_params)
-        fetch_response.raise_for_status()
+        fetch_text = client.efetch(db='mesh', ids=[ids[0]], retmode='xml')
         
         from bs4 import BeautifulSoup
-        soup = BeautifulSoup(fetch_response.text, 'lxml')
+        soup = BeautifulSoup(fetch_text, 'lxml')
         
         # Tree NumbersとDescriptorNameを抽出
         descriptor_name = soup.find('descriptorname').text if soup.find('descriptorname') else mesh_term
@@ -95,30 +91,17 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
                 parent_tn = tn.rsplit('.', 1)[0]
                 
                 # 親のTree Numberに対応するMeSH用語を検索
-                parent_search_params = {
-                    'db': 'mesh',
-                    'term': f"{parent_tn}[TreeNumber]",
-                    'retmode': 'json'
-                }
-                
-                parent_search_response = requests.get(search_url, params=parent_search_params)
-                parent_search_response.raise_for_status()
-                parent_search_data = parent_search_response.json()
+                parent_search_data = client.esearch(
+                    f"{parent_tn}[TreeNumber]", db='mesh', retmax=20, strict=False
+                )
                 
-                parent_ids = parent_search_data['esearchresult'].get('idlist', [])
+                parent_ids = parent_search_data.get('idlist', [])
                 
                 if parent_ids:
                     # 親のMeSH用語名を取得
-                    parent_fetch_params = {
-                        'db': 'mesh',
-                        'id': parent_ids[0],
-                        'retmode': 'xml'
-                    }
-                    
-                    parent_fetch_response = requests.get(fetch_url, params=parent_fetch_params)
-                    parent_fetch_response.raise_for_status()
+                    parent_fetch_text = client.efetch(db='mesh', ids=[parent_ids[0]], retmode='xml')
                     
-                    parent_soup = BeautifulSoup(parent_fetch_response.text, 'lxml')
+                    parent_soup = BeautifulSoup(parent_fetch_text, 'lxml')
                     parent_name = parent_soup.find('descriptorname').text if parent_soup.find('descriptorname') else ''
                     
                     if parent_name:
@@ -126,9 +109,6 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
                             'term': parent_name,
                             'tree_number': parent_tn
                         })
-                
-                # APIの制限を考慮して少し待機
-                time.sleep(1)
         
         # 子のMeSH用語を取得（各Tree Numberに対して直接の子を検索）
         children = []
@@ -137,26 +117,13 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
             child_pattern = f"{tn}.*"
             
             # 子のTree Numberに対応するMeSH用語を検索
-            child_search_params = {
-                'db': 'mesh',
-                'term': f"{child_pattern}[TreeNumber]",
-                'retmode': 'json'
-            }
-            
-            child_search_response = requests.get(search_url, params=child_search_params)
-            child_search_response.raise_for_status()
-            child_search_data = child_search_response.json()
-            
-            child_count = int(child_search_data['esearchresult'].get('count', 0))
+            child_count = client.count(f"{child_pattern}[TreeNumber]", db='mesh', strict=False)
             
             if child_count > 0:
                 children.append({
                     'count': child_count,
                     'tree_pattern': child_pattern
                 })
-            
-            # APIの制限を考慮して少し待機
-            time.sleep(1)
         
         return {
             'term': descriptor_name,
@@ -167,7 +134,7 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
             'message': 'Success'
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'term': mesh_term,
             'exists': False,
@@ -179,7 +146,9 @@ def check_mesh_hierarchy(mesh_term: str) -> Dict:
 
 def check_term_co_occurrence(term1: str, field1: str, term2: str, field2: str) -> Dict:
     """
-    二つの検索用語の共起関係を確認する
+    二つの検索用語の共起関係を確認する（1組あたり3リクエスト）
+
+    多数の組を調べる場合は ``analyze_term_group_overlap`` を使う
     
     Args:
         term1: 検索用語1
@@ -190,8 +159,7 @@ def check_term_co_occurrence(term1: str, field1: str, term2: str, field2: str) -
     Returns:
         Dict: 共起関係の結果
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
+    client = get_client()
     
     # 検索クエリの構築
     query1 = f'"{term1}"{field1}'
@@ -200,40 +168,13 @@ def check_term_co_occurrence(term1: str, field1: str, term2: str, field2: str) -
     
     try:
         # 用語1の検索結果
-        params1 = {
-            'db': 'pubmed',
-            'term': query1,
-            'retmode': 'json'
-        }
-        
-        response1 = requests.get(search_url, params=params1)
-        response1.raise_for_status()
-        data1 = response1.json()
-        count1 = int(data1['esearchresult'].get('count', 0))
+        count1 = client.count(query1)
         
         # 用語2の検索結果
-        params2 = {
-            'db': 'pubmed',
-            'term': query2,
-            'retmode': 'json'
-        }
-        
-        response2 = requests.get(search_url, params=params2)
-        response2.raise_for_status()
-        data2 = response2.json()
-        count2 = int(data2['esearchresult'].get('count', 0))
+        count2 = client.count(query2)
         
         # 二つの用語を組み合わせた検索結果
-        params_combined = {
-            'db': 'pubmed',
-            'term': combined_query,
-            'retmode': 'json'
-        }
-        
-        response_combined = requests.get(search_url, params=params_combined)
-        response_combined.raise_for_status()
-        data_combined = response_combined.json()
-        count_combined = int(data_combined['esearchresult'].get('count', 0))
+        count_combined = client.count(combined_query)
         
         # 包含率の計算
         inclusion_ratio1 = count_combined / count1 if count1 > 0 else 0
@@ -252,7 +193,7 @@ def check_term_co_occurrence(term1: str, field1: str, term2: str, field2: str) -
             'message': 'Success'
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'term1': term1,
             'field1': field1,
@@ -266,6 +207,82 @@ def check_term_co_occurrence(term1: str, field1: str, term2: str, field2: str) -
             'message': f'Error: {str(e)}'
         }
 
+def analyze_term_group_overlap(group_terms: List[str], field: str) -> Tuple[List[Dict], OverlapMatrix]:
+    """
+    用語グループ内の全組の共起関係をまとめて求める
+
+    各用語のPMID集合を1回ずつ取得し、積集合の件数を手元の重複行列で求める
+    （組ごとに ``check_term_co_occurrence`` を呼ぶと 組数 × 3リクエスト）。
+
+    Args:
+        group_terms: 用語のリスト
+        field: フィールドタグ（例: [Mesh], [tiab]）
+
+    Returns:
+        (check_term_co_occurrence と同じ形式の結果のリスト, 取得できた用語の重複行列)
+    """
+    queries = [f'"{term}"{field}' for term in group_terms]
+    fetched = fetch_pmid_sets(queries)
+    errors = {term: result.error for term, result in zip(group_terms, fetched) if not result.success}
+    ok_terms = [term for term, result in zip(group_terms, fetched) if result.success]
+    matrix = OverlapMatrix.build(ok_terms, [result.pmids for result in fetched if result.success])
+    position = {term: i for i, term in enumerate(ok_terms)}
+
+    overlaps = []
+    for i in range(len(group_terms)):
+        for j in range(i + 1, len(group_terms)):
+            term1, term2 = group_terms[i], group_terms[j]
+            if term1 in errors or term2 in errors:
+                overlaps.append({
+                    'term1': term1,
+                    'field1': field,
+                    'count1': 0,
+                    'term2': term2,
+                    'field2': field,
+                    'count2': 0,
+                    'combined_count': 0,
+                    'inclusion_ratio1': 0,
+                    'inclusion_ratio2': 0,
+                    'message': f'Error: {errors.get(term1) or errors.get(term2)}'
+                })
+                continue
+            a, b = position[term1], position[term2]
+            count1, count2 = int(matrix.sizes[a]), int(matrix.sizes[b])
+            count_combined = int(matrix.intersections[a, b])
+            overlaps.append({
+                'term1': term1,
+                'field1': field,
+                'count1': count1,
+                'term2': term2,
+                'field2': field,
+                'count2': count2,
+                'combined_count': count_combined,
+                'inclusion_ratio1': count_combined / count1 if count1 > 0 else 0,
+                'inclusion_ratio2': count_combined / count2 if count2 > 0 else 0,
+                'message': 'Success'
+            })
+    return overlaps, matrix
+
+def print_overlap(overlap: Dict) -> None:
+    """共起関係の結果を表示する"""
+    term1, term2 = overlap['term1'], overlap['term2']
+    field1, field2 = overlap['field1'], overlap['field2']
+    print(f"\n{term1} と {term2} の関係")
+    if overlap['message'] != 'Success':
+        print(f"  [ERROR] {overlap['message']}")
+        return
+    print(f"{term1}{field1}: {overlap['count1']:,}件")
+    print(f"{term2}{field2}: {overlap['count2']:,}件")
+    print(f"共通: {overlap['combined_count']:,}件")
+    print(f"{term1}に対する{term2}の包含率: {overlap['inclusion_ratio1']:.2f}")
+    print(f"{term2}に対する{term1}の包含率: {overlap['inclusion_ratio2']:.2f}")
+
+    # 重複の可能性の判定
+    if overlap['inclusion_ratio1'] > 0.9:
+        print(f"⚠️ {term1}は{term2}にほぼ包含されている可能性があります")
+    elif overlap['inclusion_ratio2'] > 0.9:
+        print(f"⚠️ {term2}は{term1}にほぼ包含されている可能性があります")
+
 def analyze_mesh_overlap(terms: Dict[str, List[str]]) -> Dict:
     """
     MeSH用語の重複関係を分析する
@@ -280,7 +297,9 @@ def analyze_mesh_overlap(terms: Dict[str, List[str]]) -> Dict:
         'mesh_p_hierarchy': [],
         'mesh_i_hierarchy': [],
         'mesh_term_overlap': [],
-        'keyword_overlap': []
+        'keyword_overlap': [],
+        # 用語グループごとの重複行列（OverlapMatrix）
+        'matrices': {}
     }
     
     # Population MeSH用語の階層関係
@@ -301,9 +320,6 @@ def analyze_mesh_overlap(terms: Dict[str, List[str]]) -> Dict:
             print("子用語:")
             for child in hierarchy['children']:
                 print(f"- {child['count']}個の子用語 ({child['tree_pattern']})")
-        
-        # APIの制限を考慮して少し待機
-        time.sleep(1)
     
     # Intervention MeSH用語の階層関係
     print("\n=== Intervention MeSH用語の階層関係分析... ===")
@@ -323,127 +339,23 @@ def analyze_mesh_overlap(terms: Dict[str, List[str]]) -> Dict:
             print("子用語:")
             for child in hierarchy['children']:
                 print(f"- {child['count']}個の子用語 ({child['tree_pattern']})")
-        
-        # APIの制限を考慮して少し待機
-        time.sleep(1)
-    
-    # Population MeSH用語間の重複関係
-    if len(terms['mesh_p']) > 1:
-        print("\n=== Population MeSH用語間の重複関係分析... ===")
-        for i in range(len(terms['mesh_p'])):
-            for j in range(i+1, len(terms['mesh_p'])):
-                term1 = terms['mesh_p'][i]
-                term2 = terms['mesh_p'][j]
-                
-                print(f"\n{term1} と {term2} の関係を分析中...")
-                overlap = check_term_co_occurrence(term1, "[Mesh]", term2, "[Mesh]")
-                results['mesh_term_overlap'].append(overlap)
-                
-                # 結果の表示
-                print(f"{term1}[Mesh]: {overlap['count1']:,}件")
-                print(f"{term2}[Mesh]: {overlap['count2']:,}件")
-                print(f"共通: {overlap['combined_count']:,}件")
-                print(f"{term1}に対する{term2}の包含率: {overlap['inclusion_ratio1']:.2f}")
-                print(f"{term2}に対する{term1}の包含率: {overlap['inclusion_ratio2']:.2f}")
-                
-                # 重複の可能性の判定
-                if overlap['inclusion_ratio1'] > 0.9:
-                    print(f"⚠️ {term1}は{term2}にほぼ包含されている可能性があります")
-                elif overlap['inclusion_ratio2'] > 0.9:
-                    print(f"⚠️ {term2}は{term1}にほぼ包含されている可能性があります")
-                
-                # APIの制限を考慮して少し待機
-                time.sleep(1)
-    
-    # Intervention MeSH用語間の重複関係
-    if len(terms['mesh_i']) > 1:
-        print("\n=== Intervention MeSH用語間の重複関係分析... ===")
-        for i in range(len(terms['mesh_i'])):
-            for j in range(i+1, len(terms['mesh_i'])):
-                term1 = terms['mesh_i'][i]
-                term2 = terms['mesh_i'][j]
-                
-                print(f"\n{term1} と {term2} の関係を分析中...")
-                overlap = check_term_co_occurrence(term1, "[Mesh]", term2, "[Mesh]")
-                results['mesh_term_overlap'].append(overlap)
-                
-                # 結果の表示
-                print(f"{term1}[Mesh]: {overlap['count1']:,}件")
-                print(f"{term2}[Mesh]: {overlap['count2']:,}件")
-                print(f"共通: {overlap['combined_count']:,}件")
-                print(f"{term1}に対する{term2}の包含率: {overlap['inclusion_ratio1']:.2f}")
-                print(f"{term2}に対する{term1}の包含率: {overlap['inclusion_ratio2']:.2f}")
-                
-                # 重複の可能性の判定
-                if overlap['inclusion_ratio1'] > 0.9:
-                    print(f"⚠️ {term1}は{term2}にほぼ包含されている可能性があります")
-                elif overlap['inclusion_ratio2'] > 0.9:
-                    print(f"⚠️ {term2}は{term1}にほぼ包含されている可能性があります")
-                
-                # APIの制限を考慮して少し待機
-                time.sleep(1)
-    
-    # Population キーワード間の重複関係（サンプルとして一部を分析）
-    if len(terms['keyword_p']) > 1:
-        print("\n=== Population キーワード間の重複関係分析（サンプル）... ===")
-        # 計算量が多くなるため、最初の5つの用語間で分析
-        max_terms = min(5, len(terms['keyword_p']))
-        
-        for i in range(max_terms):
-            for j in range(i+1, max_terms):
-                term1 = terms['keyword_p'][i]
-                term2 = terms['keyword_p'][j]
-                
-                print(f"\n{term1} と {term2} の関係を分析中...")
-                overlap = check_term_co_occurrence(term1, "[tiab]", term2, "[tiab]")
-                results['keyword_overlap'].append(overlap)
-                
-                # 結果の表示
-                print(f"{term1}[tiab]: {overlap['count1']:,}件")
-                print(f"{term2}[tiab]: {overlap['count2']:,}件")
-                print(f"共通: {overlap['combined_count']:,}件")
-                print(f"{term1}に対する{term2}の包含率: {overlap['inclusion_ratio1']:.2f}")
-                print(f"{term2}に対する{term1}の包含率: {overlap['inclusion_ratio2']:.2f}")
-                
-                # 重複の可能性の判定
-                if overlap['inclusion_ratio1'] > 0.9:
-                    print(f"⚠️ {term1}は{term2}にほぼ包含されている可能性があります")
-                elif overlap['inclusion_ratio2'] > 0.9:
-                    print(f"⚠️ {term2}は{term1}にほぼ包含されている可能性があります")
-                
-                # APIの制限を考慮して少し待機
-                time.sleep(1)
-    
-    # Intervention キーワード間の重複関係（サンプルとして一部を分析）
-    if len(terms['keyword_i']) > 1:
-        print("\n=== Intervention キーワード間の重複関係分析（サンプル）... ===")
-        # 計算量が多くなるため、最初の5つの用語間で分析
-        max_terms = min(5, len(terms['keyword_i']))
-        
-        for i in range(max_terms):
-            for j in range(i+1, max_terms):
-                term1 = terms['keyword_i'][i]
-                term2 = terms['keyword_i'][j]
-                
-                print(f"\n{term1} と {term2} の関係を分析中...")
-                overlap = check_term_co_occurrence(term1, "[tiab]", term2, "[tiab]")
-                results['keyword_overlap'].append(overlap)
-                
-                # 結果の表示
-                print(f"{term1}[tiab]: {overlap['count1']:,}件")
-                print(f"{term2}[tiab]: {overlap['count2']:,}件")
-                print(f"共通: {overlap['combined_count']:,}件")
-                print(f"{term1}に対する{term2}の包含率: {overlap['inclusion_ratio1']:.2f}")
-                print(f"{term2}に対する{term1}の包含率: {overlap['inclusion_ratio2']:.2f}")
-                
-                # 重複の可能性の判定
-                if overlap['inclusion_ratio1'] > 0.9:
-                    print(f"⚠️ {term1}は{term2}にほぼ包含されている可能性があります")
-                elif overlap['inclusion_ratio2'] > 0.9:
-                    print(f"⚠️ {term2}は{term1}にほぼ包含されている可能性があります")
-                
-                # APIの制限を考慮して少し待機
-                time.sleep(1)
+    
+    # 用語グループ内の重複関係（用語ごとのPMID集合を1回ずつ取得し、全組を手元で集計）
+    groups = [
+        ('mesh_p', "[Mesh]", 'mesh_term_overlap', "Population MeSH用語"),
+        ('mesh_i', "[Mesh]", 'mesh_term_overlap', "Intervention MeSH用語"),
+        ('keyword_p', "[tiab]", 'keyword_overlap', "Population キーワード"),
+        ('keyword_i', "[tiab]", 'keyword_overlap', "Intervention キーワード"),
+    ]
+    for key, field, result_key, label in groups:
+        if len(terms[key]) < 2:
+            continue
+        print(f"\n=== {label}間の重複関係分析... ===")
+        overlaps, matrix = analyze_term_group_overlap(terms[key], field)
+        results[result_key].extend(overlaps)
+        results['matrices'][key] = matrix
+        for overlap in overlaps:
+            print_overlap(overlap)
     
     return results
 
@@ -546,8 +458,13 @@ def main():
     parser = argparse.ArgumentParser(description='検索式の構造と重複を分析するスクリプト')
     parser.add_argument('--input', required=True, help='検索式ファイルのパス')
     parser.add_argument('--output', help='出力ファイルのパス（指定しない場合はlogs/validation/に保存）')
+    parser.add_argument('--csv-dir', help='用語グループごとの重複行列（Jaccard係数）と全組のCSVを保存するディレクトリ')
     
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
     input_file = args.input
     
     if args.output:
@@ -573,6 +490,12 @@ def main():
     print(f"\nMeSH用語の重複と階層関係を分析中...")
     mesh_analysis = analyze_mesh_overlap(terms)
     
+    if args.csv_dir:
+        for key, matrix in mesh_analysis['matrices'].items():
+            matrix.to_csv(Path(args.csv_dir) / f"{key}_jaccard.csv", metric='jaccard')
+            matrix.pairs_to_csv(Path(args.csv_dir) / f"{key}_pairs.csv")
+        print(f"重複行列を {args.csv_dir} に保存しました。")
+    
     # LLMによる分析と提案
     print(f"\n検索式の構造分析と最適化提案を生成中...")
     llm_analysis = generate_llm_analysis(terms, mesh_analysis)
@@ -3,7 +3,6 @@
 """
 Physicians階層下のMeSH term存在確認スクリプト
 """
-import time
 from typing import Dict, List, Tuple
 
 from scripts.search.mesh_analyzer.check_mesh import check_mesh_term  # noqa: F401
@@ -87,7 +86,6 @@ def main() -> Tuple[List, List]:
     print("-" * 70)
     
     for mesh_term in all_physician_mesh:
-        time.sleep(0.4)  # API制限対策
         result = check_mesh_term(mesh_term)
         results.append((mesh_term, result))
         
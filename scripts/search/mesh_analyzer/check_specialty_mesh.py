@@ -3,7 +3,6 @@
 """
 19の医療専門領域のMeSH term存在確認スクリプト
 """
-import time
 from typing import Dict, List
 
 from scripts.search.mesh_analyzer.check_mesh import check_mesh_term  # noqa: F401
@@ -56,7 +55,6 @@ def main():
     print("-" * 100)
     
     for text_term, mesh_term in specialty_terms:
-        time.sleep(0.5)  # API制限対策
         result = check_mesh_term(mesh_term)
         results.append((text_term, mesh_term, result))
         
@@ -70,7 +68,6 @@ def main():
     
     alt_results = []
     for text_term, mesh_term in alternative_terms:
-        time.sleep(0.5)
         result = check_mesh_term(mesh_term)
         alt_results.append((text_term, mesh_term, result))
         
@@ -5,184 +5,77 @@ PubMed検索結果ダウンロードスクリプト
 検索式を実行し、抄録を含む全文献をRIS形式でダウンロードします。
 ファイル名は「日付_件数_pubmed.ris」形式で保存されます。
 
+取得したバッチは --checkpoint-dir に保存され、中断した場合は同じコマンドを
+実行し直すと続きから取得します（失敗した範囲だけを再取得）。
+
 Usage:
     python scripts/search/pubmed/download_pubmed_results.py --formula-file projects/fd_review/search_formula.md --output-dir projects/fd_review/pubmed_results
 """
 
-import requests
-import time
 import argparse
 import os
 import re
+import sys
 from datetime import datetime
-from typing import Dict, List, Tuple, Any
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Any
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, search_pmids  # noqa: E402
+from scripts.eutils.medline_download import DEFAULT_BATCH_SIZE, MedlineDownload  # noqa: E402
+from scripts.eutils.medline_ris import write_ris  # noqa: E402
 
 
 def get_pubmed_results(query: str, retmax: int = 100000) -> Dict[str, Any]:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数とPMIDを取得する
+
+    esearch の上限（9,999件）を超える分は ``search_pmids`` が WebEnv から続けて取得する。
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmax': retmax,
-        'retmode': 'json',
-        'usehistory': 'y'
-    }
-    
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        result = data.get('esearchresult', {})
-        count = int(result.get('count', 0))
-        pmids = result.get('idlist', [])
-        webenv = result.get('webenv', '')
-        query_key = result.get('querykey', '')
-        
+        result = search_pmids(query, retmax=retmax, strict=False)
         return {
-            'count': count,
-            'pmids': pmids,
-            'webenv': webenv,
-            'query_key': query_key
+            'count': result.count,
+            'pmids': result.pmids,
+            'webenv': result.webenv,
+            'query_key': result.query_key
         }
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         print(f"Error: {str(e)}")
         return {'count': 0, 'pmids': [], 'webenv': '', 'query_key': ''}
 
 
-def fetch_pubmed_records(webenv: str, query_key: str, total: int, batch_size: int = 200) -> str:
+def fetch_pubmed_records(
+    query: str,
+    checkpoint_dir: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_in_flight: Optional[int] = None,
+) -> MedlineDownload:
     """
-    WebEnvとQueryKeyを使って全レコードをMEDLINE形式で取得する
-    """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    all_records = []
-    
-    for start in range(0, total, batch_size):
-        print(f"  Fetching records {start + 1} - {min(start + batch_size, total)} of {total}...")
-        
-        params = {
-            'db': 'pubmed',
-            'query_key': query_key,
-            'WebEnv': webenv,
-            'retstart': start,
-            'retmax': batch_size,
-            'rettype': 'medline',
-            'retmode': 'text'
-        }
-        
-        try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            all_records.append(response.text)
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching batch starting at {start}: {str(e)}")
-        
-        # API制限を考慮して待機
-        time.sleep(0.4)
-    
-    return '\n'.join(all_records)
+    全レコードをMEDLINE形式でバッチごとにチェックポイントへ保存しながら取得する
 
+    同じ検索を実行し直すと、取得済みのバッチを飛ばして続きから取得し、失敗した範囲だけを
+    再取得する。esearch の WebEnv は検索結果全体を保持するため、件数が 9,999 件を超えても
+    同じ WebEnv から retstart ごとに取得する。
 
-def convert_medline_to_ris(medline_data: str) -> str:
+    バッチは同じ WebEnv から並列に取得し（間隔はクライアントのレート制限に任せる）、
+    ファイルへの書き出しは常に retstart の順になる。
     """
-    MEDLINEフォーマットをRISフォーマットに変換する（抄録含む）
-    """
-    ris_output = []
-
-    # レコードを分割
-    records = re.split(r'\n(?=PMID-)', medline_data)
-
-    for record in records:
-        if not record.strip():
-            continue
-
-        ris_entry = ['TY  - JOUR']
+    download = MedlineDownload.for_query(checkpoint_dir, query, batch_size=batch_size)
+    if download.completed:
+        print(f"  Resuming: {download.records:,} records already downloaded in {download.directory}")
 
-        # フィールドをパース
-        current_field = None
-        current_value = []
+    def progress(done: int, count: int) -> None:
+        print(f"  Fetched {done:,} of {count:,} records...")
 
-        lines = record.split('\n')
-        for line in lines:
-            # 新しいフィールドの開始を検出（FIELD-形式も含む）
-            # MEDLINEフィールドは "XXXX- " または "XX  - " の形式
-            field_match = re.match(r'^([A-Z]{2,4})(\s*)-\s+(.*)$', line)
-            if field_match:
-                # 前のフィールドを処理
-                if current_field:
-                    value = ' '.join(current_value).strip()
-                    ris_line = convert_field_to_ris(current_field, value)
-                    if ris_line:
-                        ris_entry.extend(ris_line if isinstance(ris_line, list) else [ris_line])
-
-                current_field = field_match.group(1).strip()
-                current_value = [field_match.group(3)]
-            elif line.startswith('      ') and current_field:
-                # 継続行（6つのスペースで始まる）
-                current_value.append(line.strip())
-            elif line.strip() and current_field:
-                # その他の継続行
-                current_value.append(line.strip())
-        
-        # 最後のフィールドを処理
-        if current_field:
-            value = ' '.join(current_value).strip()
-            ris_line = convert_field_to_ris(current_field, value)
-            if ris_line:
-                ris_entry.extend(ris_line if isinstance(ris_line, list) else [ris_line])
-        
-        ris_entry.append('ER  -')
-        ris_entry.append('')
-        
-        ris_output.append('\n'.join(ris_entry))
-    
-    return '\n'.join(ris_output)
-
-
-def convert_field_to_ris(field: str, value: str) -> List[str] | str | None:
-    """
-    MEDLINEフィールドをRISフィールドに変換する
-    """
-    field_mapping = {
-        'PMID': 'ID',
-        'TI': 'T1',
-        'AB': 'AB',   # 抄録
-        'AU': 'AU',   # 著者
-        'FAU': 'A1',  # フル著者名
-        'JT': 'JF',   # ジャーナル名
-        'TA': 'JA',   # 略誌名
-        'DP': 'Y1',   # 発行日
-        'VI': 'VL',   # 巻
-        'IP': 'IS',   # 号
-        'PG': 'SP',   # ページ
-        'LID': 'DO',  # DOI (10.xxx形式のみ)
-        'MH': 'KW',   # MeSH用語
-        'OT': 'KW',   # その他のキーワード
-        'PT': 'M3',   # 出版タイプ
-        'LA': 'LA',   # 言語
-    }
-    
-    if field not in field_mapping:
-        return None
-    
-    ris_field = field_mapping[field]
-    
-    # DOIの場合は10.で始まるもののみ
-    if field == 'LID':
-        if '[doi]' in value:
-            doi = value.replace('[doi]', '').strip()
-            return f'{ris_field}  - {doi}'
-        return None
-    
-    # 著者フィールドは複数行になる可能性がある
-    if field in ['AU', 'FAU', 'MH', 'OT']:
-        return f'{ris_field}  - {value}'
-    
-    return f'{ris_field}  - {value}'
+    download.run(progress=progress, max_in_flight=max_in_flight)
+    for start, error in sorted(download.failed.items()):
+        end = min(start + download.batch_size, download.total)
+        print(f"Error fetching records {start + 1} - {end}: {error}")
+    return download
 
 
 def parse_search_formula_md(file_path: str) -> Tuple[Dict[str, str], str]:
@@ -263,6 +156,29 @@ def main():
         default="pubmed",
         help="データベース名（ファイル名に使用、デフォルト: pubmed）"
     )
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default=None,
+        help="取得したバッチとチェックポイントの保存先（デフォルト: <output-dir>/.medline_checkpoints）"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"efetch 1回あたりのレコード数（デフォルト: {DEFAULT_BATCH_SIZE}）"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="同時に取得するバッチ数（デフォルト: レート上限から決定、1 で順に取得）"
+    )
+    parser.add_argument(
+        "--keep-checkpoints",
+        action="store_true",
+        help="RISファイルを書き出した後もチェックポイントを残す"
+    )
     args = parser.parse_args()
 
     # 出力ディレクトリの確認・作成
@@ -297,38 +213,40 @@ def main():
         print("No results found.")
         return 0
     
-    # WebEnvを使って再検索（全件取得用）
+    # 全件取得（WebEnv から retstart ごとに取得する）
     print("\nRetrieving all records with abstracts...")
-    result = get_pubmed_results(final_query, retmax=total_count)
-    
-    if not result['webenv']:
-        print("Error: Could not obtain WebEnv for batch download.")
+    checkpoint_dir = args.checkpoint_dir or os.path.join(args.output_dir, '.medline_checkpoints')
+    try:
+        download = fetch_pubmed_records(
+            final_query, checkpoint_dir,
+            batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+        )
+    except EutilsError as e:
+        print(f"Error: {str(e)}")
         return 1
-    
-    # 全レコードを取得
-    medline_data = fetch_pubmed_records(
-        result['webenv'],
-        result['query_key'],
-        total_count
-    )
-    
-    # RIS形式に変換
-    print("\nConverting to RIS format...")
-    ris_data = convert_medline_to_ris(medline_data)
-    
-    # ファイル名を生成: 日付_件数_データベース.ris
+    if not download.complete:
+        print(f"\nError: {len(download.pending)} batches could not be downloaded.")
+        print(f"Run the same command again to resume from {download.directory}")
+        return 1
+
+    # ファイル名を生成: 日付_件数_データベース.ris（件数はダウンロード時の検索結果）
     date_str = datetime.now().strftime('%Y%m%d')
-    filename = f"{date_str}_{total_count}_{args.database_name}.ris"
+    filename = f"{date_str}_{download.total}_{args.database_name}.ris"
     filepath = os.path.join(args.output_dir, filename)
-    
-    # ファイルに保存
+
+    # バッチを読みながらレコードごとにRIS形式に変換して書き出す（全件をメモリに載せない）
+    print("\nConverting to RIS format...")
+    lines = (line for medline_data in download.iter_batches() for line in medline_data.splitlines())
     with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(ris_data)
-    
+        write_ris(lines, f)
+
+    if not args.keep_checkpoints:
+        download.cleanup()
+
     print(f"\n{'='*60}")
     print(f"✅ Download complete!")
     print(f"   File: {filepath}")
-    print(f"   Records: {total_count:,}")
+    print(f"   Records: {download.total:,}")
     print(f"{'='*60}")
     
     return 0
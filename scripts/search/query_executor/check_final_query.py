@@ -1,41 +1,35 @@
-import requests
-import time
-from typing import Dict, List, Tuple, Any
+import sys
+from typing import Dict, List, Tuple
 import argparse
 import os
 import re
-from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client, search_pmids  # noqa: E402
+from scripts.eutils.medline_ris import write_ris  # noqa: E402
 
 def get_pubmed_results(query: str, retmax: int = 100000) -> Dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数とPMIDを取得する
+
+    esearch の上限（9,999件）を超える分は ``search_pmids`` が WebEnv から続けて取得する。
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json',
-        'retmax': retmax,
-        'usehistory': 'y'
-    }
-    
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
+        result = search_pmids(query, retmax=retmax, strict=False)
         return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'ids': data['esearchresult'].get('idlist', []),
+            'count': result.count,
+            'ids': result.pmids,
             'query': query,
             'message': 'Success',
-            'webenv': data['esearchresult'].get('webenv', ''),
-            'querykey': data['esearchresult'].get('querykey', '')
+            'webenv': result.webenv,
+            'querykey': result.query_key
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'count': 0,
             'ids': [],
@@ -49,8 +43,6 @@ def export_to_ris(pmids: List[str], filename: str, output_dir: str) -> None:
     """
     PMIDのリストからRISファイルを作成する
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    
     # 出力ディレクトリが存在しない場合は作成
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
@@ -62,81 +54,16 @@ def export_to_ris(pmids: List[str], filename: str, output_dir: str) -> None:
     with open(filepath, 'w', encoding='utf-8') as f:
         for i in range(0, len(pmids), batch_size):
             batch_pmids = pmids[i:i + batch_size]
-            params = {
-                'db': 'pubmed',
-                'id': ','.join(batch_pmids),
-                'rettype': 'medline',
-                'retmode': 'text'
-            }
-            
             try:
-                response = requests.get(base_url, params=params)
-                response.raise_for_status()
-                medline_data = response.text
-                
-                # MEDLINEフォーマットをRISフォーマットに変換
-                entries = medline_data.split('\n\n')
-                for entry in entries:
-                    if not entry.strip():
-                        continue
-                    
-                    # RISエントリの開始
-                    f.write('TY  - JOUR\n')
-                    
-                    # アブストラクトを蓄積するための変数
-                    abstract = []
-                    current_field = None
-                    
-                    for line in entry.split('\n'):
-                        if not line.strip():
-                            continue
-                        
-                        # フィールドの開始行を検出
-                        if line[:4].strip():  # 新しいフィールドの開始
-                            if current_field == 'AB' and abstract:
-                                # アブストラクトの書き込み
-                                f.write(f'AB  - {" ".join(abstract)}\n')
-                                abstract = []
-                            current_field = line[:4].strip()
-                        
-                        # アブストラクトの続きの行を処理
-                        if current_field == 'AB':
-                            if line.startswith('AB  -'):
-                                abstract.append(line.split('- ')[1])
-                            else:
-                                abstract.append(line[6:])  # インデントを除去
-                            continue
-                        
-                        # その他のフィールドの処理
-                        if line.startswith('PMID-'):
-                            f.write(f'ID  - {line.split("- ")[1]}\n')
-                        elif line.startswith('TI  -'):
-                            f.write(f'T1  - {line.split("- ")[1]}\n')
-                        elif line.startswith('AU  -'):
-                            f.write(f'A1  - {line.split("- ")[1]}\n')
-                        elif line.startswith('JT  -'):
-                            f.write(f'JF  - {line.split("- ")[1]}\n')
-                        elif line.startswith('DP  -'):
-                            f.write(f'Y1  - {line.split("- ")[1]}\n')
-                        elif line.startswith('VI  -'):
-                            f.write(f'VL  - {line.split("- ")[1]}\n')
-                        elif line.startswith('IP  -'):
-                            f.write(f'IS  - {line.split("- ")[1]}\n')
-                        elif line.startswith('PG  -'):
-                            f.write(f'SP  - {line.split("- ")[1]}\n')
-                    
-                    # エントリの最後でアブストラクトが残っている場合に書き込み
-                    if abstract:
-                        f.write(f'AB  - {" ".join(abstract)}\n')
-                    
-                    # RISエントリの終了
-                    f.write('ER  -\n\n')
-            
-            except requests.exceptions.RequestException as e:
+                medline_data = get_client().efetch(
+                    db='pubmed', ids=batch_pmids, rettype='medline', retmode='text'
+                )
+            except EutilsError as e:
                 print(f"Error fetching batch {i//batch_size + 1}: {str(e)}")
-            
-            # API制限を考慮して待機
-            time.sleep(0.5)
+                continue
+
+            # MEDLINEフォーマットをRISフォーマットに変換
+            write_ris(medline_data, f)
 
 def parse_search_formula_md(file_path: str) -> Tuple[Dict[str, str], str]:
     """
@@ -267,8 +194,6 @@ def main():
             not_found_pmids.append(pmid)
             print(f"  ❌ PMID {pmid}: 捕捉されていません")
 
-        time.sleep(0.34)  # API rate limit対策
-
     print(f"\n捕捉されたPMID ({len(included_pmids)}/{len(pmids_to_check)}件): {', '.join(included_pmids) if included_pmids else 'なし'}")
     if not_found_pmids:
         print(f"捕捉されなかったPMID ({len(not_found_pmids)}件): {', '.join(not_found_pmids)}")
@@ -1,39 +1,35 @@
-import requests
-import time
-from typing import Dict, List, Tuple
+import sys
+from typing import Dict, List, Optional, Tuple
 import os
 from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client, search_pmids  # noqa: E402
+from scripts.eutils.medline_download import fetch_batches  # noqa: E402
+from scripts.eutils.medline_ris import write_ris  # noqa: E402
 
 def get_pubmed_results(query: str, retmax: int = 100000) -> Dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数とPMIDを取得する
-    """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json',
-        'retmax': retmax,
-        'usehistory': 'y'
-    }
 
+    esearch の上限（9,999件）を超える分は ``search_pmids`` が WebEnv から続けて取得する。
+    """
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
+        result = search_pmids(query, retmax=retmax, strict=False)
         return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'ids': data['esearchresult'].get('idlist', []),
+            'count': result.count,
+            'ids': result.pmids,
             'query': query,
             'message': 'Success',
-            'webenv': data['esearchresult'].get('webenv', ''),
-            'querykey': data['esearchresult'].get('querykey', '')
+            'webenv': result.webenv,
+            'querykey': result.query_key
         }
 
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'count': 0,
             'ids': [],
@@ -43,45 +39,43 @@ def get_pubmed_results(query: str, retmax: int = 100000) -> Dict:
             'querykey': ''
         }
 
-def fetch_all_records_medline(pmids: List[str]) -> List[str]:
+def fetch_all_records_medline(pmids: List[str], max_in_flight: Optional[int] = None) -> List[str]:
     """
     PMIDリストから全レコードをMEDLINE形式で取得
-    """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    all_records = []
 
-    # PMIDを100件ずつ処理
+    100件ずつのバッチを並列に取得し（間隔は共通クライアントのレート制限に任せる）、
+    PMIDリストの順に並べて返す。失敗したバッチは1回だけ取り直す。
+    """
+    client = get_client()
     batch_size = 100
     total_batches = (len(pmids) + batch_size - 1) // batch_size
 
-    for i in range(0, len(pmids), batch_size):
-        batch_num = i // batch_size + 1
-        batch_pmids = pmids[i:i + batch_size]
-        print(f"  Batch {batch_num}/{total_batches}: {len(batch_pmids)} records...")
-
-        params = {
-            'db': 'pubmed',
-            'id': ','.join(batch_pmids),
-            'rettype': 'medline',
-            'retmode': 'text'
-        }
-
-        try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            medline_data = response.text
-
-            # MEDLINEフォーマットを個別レコードに分割
-            entries = medline_data.split('\n\n')
-            for entry in entries:
-                if entry.strip() and 'PMID-' in entry:
-                    all_records.append(entry)
-
-        except requests.exceptions.RequestException as e:
-            print(f"    Error fetching batch {batch_num}: {str(e)}")
+    def fetch(start: int, retmax: int) -> str:
+        return client.efetch(db='pubmed', ids=pmids[start:start + retmax], rettype='medline', retmode='text')
+
+    batches: Dict[int, str] = {}
+    pending = list(range(0, len(pmids), batch_size))
+    for attempt in range(2):
+        failed = []
+        for start, medline_data in fetch_batches(fetch, pending, len(pmids), batch_size, max_in_flight, client):
+            batch_num = start // batch_size + 1
+            if isinstance(medline_data, EutilsError):
+                failed.append(start)
+                if attempt:
+                    print(f"    Error fetching batch {batch_num}: {str(medline_data)}")
+                continue
+            batches[start] = medline_data
+            print(f"  Batch {batch_num}/{total_batches}: {len(batches)}/{total_batches} done")
+        pending = sorted(failed)
+        if not pending:
+            break
 
-        # API制限を考慮して待機
-        time.sleep(0.4)
+    all_records = []
+    for start in sorted(batches):
+        # MEDLINEフォーマットを個別レコードに分割
+        for entry in batches[start].split('\n\n'):
+            if entry.strip() and 'PMID-' in entry:
+                all_records.append(entry)
 
     return all_records
 
@@ -94,94 +88,10 @@ def export_to_ris(records: List[str], filename: str, output_dir: str) -> None:
 
     filepath = os.path.join(output_dir, filename)
 
+    # レコードの間に空行を挟み、1レコードずつ変換して書き出す
+    lines = (line for entry in records for line in entry.splitlines() + [''])
     with open(filepath, 'w', encoding='utf-8') as f:
-        for entry in records:
-            if not entry.strip():
-                continue
-
-            # RISエントリの開始
-            f.write('TY  - JOUR\n')
-
-            # タイトルとアブストラクトを蓄積
-            title = []
-            in_title = False
-            abstract = []
-            in_abstract = False
-
-            for line in entry.split('\n'):
-                if not line.strip():
-                    continue
-
-                # タイトル開始
-                if line.startswith('TI  -'):
-                    # 前のタイトルがあれば出力
-                    if title:
-                        f.write(f'T1  - {" ".join(title)}\n')
-                        title = []
-                    in_title = True
-                    title.append(line.split('- ', 1)[1] if '- ' in line else '')
-                    continue
-
-                # タイトル継続行（先頭がスペースのみ）
-                if in_title:
-                    if line[:4].strip() and not line.startswith('TI'):
-                        # 新しいフィールド開始 = タイトル終了
-                        if title:
-                            f.write(f'T1  - {" ".join(title)}\n')
-                            title = []
-                        in_title = False
-                    else:
-                        # タイトル継続
-                        title.append(line.strip())
-                        continue
-
-                # アブストラクト開始
-                if line.startswith('AB  -'):
-                    in_abstract = True
-                    abstract.append(line.split('- ', 1)[1] if '- ' in line else '')
-                    continue
-
-                # アブストラクト継続行
-                if in_abstract:
-                    if line[:4].strip() and not line.startswith('AB'):
-                        # 新しいフィールド開始 = アブストラクト終了
-                        if abstract:
-                            f.write(f'AB  - {" ".join(abstract)}\n')
-                            abstract = []
-                        in_abstract = False
-                    else:
-                        # アブストラクト継続
-                        abstract.append(line.strip())
-                        continue
-
-                # その他のフィールド変換
-                if line.startswith('PMID-'):
-                    f.write(f'ID  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('AU  -'):
-                    f.write(f'A1  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('JT  -'):
-                    f.write(f'JF  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('DP  -'):
-                    f.write(f'Y1  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('VI  -'):
-                    f.write(f'VL  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('IP  -'):
-                    f.write(f'IS  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('PG  -'):
-                    f.write(f'SP  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('DOI -'):
-                    f.write(f'DO  - {line.split("- ", 1)[1]}\n')
-
-            # 残っているタイトルを書き込み
-            if title:
-                f.write(f'T1  - {" ".join(title)}\n')
-
-            # 残っているアブストラクトを書き込み
-            if abstract:
-                f.write(f'AB  - {" ".join(abstract)}\n')
-
-            # RISエントリの終了
-            f.write('ER  -\n\n')
+        write_ris(lines, f)
 
 def main():
     # PPS Project の最終検索式
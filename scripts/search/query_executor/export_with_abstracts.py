@@ -1,41 +1,36 @@
-import requests
-import time
+import sys
 from typing import Dict, List, Tuple
 import argparse
 import os
 import re
 from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client, search_pmids  # noqa: E402
+from scripts.eutils.medline_ris import write_ris  # noqa: E402
 
 def get_pubmed_results(query: str, retmax: int = 100000) -> Dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数とPMIDを取得する
-    """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json',
-        'retmax': retmax,
-        'usehistory': 'y'
-    }
 
+    esearch の上限（9,999件）を超える分は ``search_pmids`` が WebEnv から続けて取得する。
+    """
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
+        result = search_pmids(query, retmax=retmax, strict=False)
         return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'ids': data['esearchresult'].get('idlist', []),
+            'count': result.count,
+            'ids': result.pmids,
             'query': query,
             'message': 'Success',
-            'webenv': data['esearchresult'].get('webenv', ''),
-            'querykey': data['esearchresult'].get('querykey', '')
+            'webenv': result.webenv,
+            'querykey': result.query_key
         }
 
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'count': 0,
             'ids': [],
@@ -50,7 +45,6 @@ def fetch_all_records(pmids: List[str]) -> Tuple[List[Dict], List[Dict], List[st
     PMIDリストから全レコードを取得
     Returns: (all_records, records_with_abstract, records_without_abstract)
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
     all_records = []
     records_with_abstract = []
     records_without_abstract = []
@@ -59,17 +53,10 @@ def fetch_all_records(pmids: List[str]) -> Tuple[List[Dict], List[Dict], List[st
     batch_size = 100
     for i in range(0, len(pmids), batch_size):
         batch_pmids = pmids[i:i + batch_size]
-        params = {
-            'db': 'pubmed',
-            'id': ','.join(batch_pmids),
-            'rettype': 'medline',
-            'retmode': 'text'
-        }
-
         try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            medline_data = response.text
+            medline_data = get_client().efetch(
+                db='pubmed', ids=batch_pmids, rettype='medline', retmode='text'
+            )
 
             # MEDLINEフォーマットを個別レコードに分割
             entries = medline_data.split('\n\n')
@@ -96,12 +83,9 @@ def fetch_all_records(pmids: List[str]) -> Tuple[List[Dict], List[Dict], List[st
                     else:
                         records_without_abstract.append(record_data)
 
-        except requests.exceptions.RequestException as e:
+        except EutilsError as e:
             print(f"Error fetching batch {i//batch_size + 1}: {str(e)}")
 
-        # API制限を考慮して待機
-        time.sleep(0.4)
-
     return all_records, records_with_abstract, records_without_abstract
 
 def export_to_ris(records: List[Dict], filename: str, output_dir: str) -> None:
@@ -114,63 +98,10 @@ def export_to_ris(records: List[Dict], filename: str, output_dir: str) -> None:
 
     filepath = os.path.join(output_dir, filename)
 
+    # レコードの間に空行を挟み、1レコードずつ変換して書き出す
+    lines = (line for record in records for line in record['medline'].splitlines() + [''])
     with open(filepath, 'w', encoding='utf-8') as f:
-        for record in records:
-            entry = record['medline']
-
-            # RISエントリの開始
-            f.write('TY  - JOUR\n')
-
-            # アブストラクトを蓄積するための変数
-            abstract = []
-            current_field = None
-
-            for line in entry.split('\n'):
-                if not line.strip():
-                    continue
-
-                # フィールドの開始行を検出
-                if line[:4].strip():  # 新しいフィールドの開始
-                    if current_field == 'AB' and abstract:
-                        # アブストラクトの書き込み
-                        f.write(f'AB  - {" ".join(abstract)}\n')
-                        abstract = []
-                    current_field = line[:4].strip()
-
-                # アブストラクトの続きの行を処理
-                if current_field == 'AB':
-                    if line.startswith('AB  -'):
-                        abstract.append(line.split('- ', 1)[1] if '- ' in line else '')
-                    else:
-                        abstract.append(line[6:])  # インデントを除去
-                    continue
-
-                # その他のフィールドの処理
-                if line.startswith('PMID-'):
-                    f.write(f'ID  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('TI  -'):
-                    f.write(f'T1  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('AU  -'):
-                    f.write(f'A1  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('JT  -'):
-                    f.write(f'JF  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('DP  -'):
-                    f.write(f'Y1  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('VI  -'):
-                    f.write(f'VL  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('IP  -'):
-                    f.write(f'IS  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('PG  -'):
-                    f.write(f'SP  - {line.split("- ", 1)[1]}\n')
-                elif line.startswith('DOI -'):
-                    f.write(f'DO  - {line.split("- ", 1)[1]}\n')
-
-            # エントリの最後でアブストラクトが残っている場合に書き込み
-            if abstract:
-                f.write(f'AB  - {" ".join(abstract)}\n')
-
-            # RISエントリの終了
-            f.write('ER  -\n\n')
+        write_ris(lines, f)
 
 def parse_search_formula_md(file_path: str) -> Tuple[Dict[str, str], str]:
     """
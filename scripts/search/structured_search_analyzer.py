@@ -1,14 +1,28 @@
 import re
 import os
 import sys
-import requests
-import time
 import argparse
 from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    get_pubmed_count as _eutils_get_pubmed_count,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+)
+
 
 def get_pubmed_count(query: str) -> dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数を取得する
+
+    レート制御とリトライは共通クライアント（scripts.eutils）が行う。
     
     Args:
         query: PubMed検索クエリ
@@ -20,32 +34,19 @@ def get_pubmed_count(query: str) -> dict:
             'message': str
         }
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
-    try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'query': query,
-            'message': 'Success'
-        }
-        
-    except requests.exceptions.RequestException as e:
+    result = _eutils_get_pubmed_count(query)
+    if not result['success']:
         return {
             'count': 0,
             'query': query,
-            'message': f'Error: {str(e)}'
+            'message': f"Error: {result['message']}"
         }
+    return {
+        'count': result['count'],
+        'query': query,
+        'message': 'Success'
+    }
+
 
 def parse_search_formula(text: str) -> dict:
     """
@@ -178,7 +179,11 @@ def main():
     parser.add_argument('input', nargs='?', help='検索式のテキストファイル（指定がなければ標準入力から読み込み）')
     parser.add_argument('--project', '-p', default=None, help='プロジェクト名（search_formula/配下のディレクトリ名）')
     parser.add_argument('--output', '-o', default=None, help='出力ファイル名（デフォルト: structured_search.md）')
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
 
     # テキスト入力の取得
     if args.input:
@@ -236,7 +241,6 @@ def main():
                 result = get_pubmed_count(line)
                 counts_results[line] = result
                 print(f"  ヒット数: {result['count']:,}")
-                time.sleep(1)  # API制限を考慮
         
         # ブロック全体の検索結果件数（OR結合）
         if lines:
@@ -245,7 +249,6 @@ def main():
             block_result = get_pubmed_count(block_query)
             counts_results[block_name] = block_result
             print(f"  ブロック全体のヒット数: {block_result['count']:,}")
-            time.sleep(1)  # API制限を考慮
     
     # 最終検索式の検索結果件数
     if formula_dict['blocks']:
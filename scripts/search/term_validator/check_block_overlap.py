@@ -1,75 +1,34 @@
 import argparse
 import os
-import re
+import sys
 import time
-from typing import Any, Dict, List, Tuple
-
-import random
-import requests
-
-try:
-    from dotenv import load_dotenv
-except ImportError:  # Optional dependency
-    load_dotenv = None
-
-if load_dotenv:
-    load_dotenv()
-
-NCBI_API_KEY = os.getenv("NCBI_API_KEY") or None
-NCBI_TOOL = os.getenv("NCBI_TOOL") or None
-NCBI_EMAIL = os.getenv("NCBI_EMAIL") or None
-
-def _determine_request_interval(default_interval: float = 5.0) -> float:
-    """Return waiting time between API calls derived from env rate limit."""
-    raw_rate = os.getenv("NCBI_RATE_LIMIT_RPS")
-    if not raw_rate:
-        return default_interval
-    try:
-        rate = float(raw_rate)
-        if rate > 0:
-            return max(1.0 / rate, 0.1)
-    except ValueError:
-        pass
-    return default_interval
-
-REQUEST_INTERVAL = _determine_request_interval()
-REQUEST_TIMEOUT = 30
-MAX_RETRIES = 5
-RETRY_BACKOFF_SECONDS = 2.0
-
-_LAST_REQUEST_TS = 0.0
-
-COMMON_EUTILS_PARAMS: Dict[str, str] = {}
-if NCBI_API_KEY:
-    COMMON_EUTILS_PARAMS["api_key"] = NCBI_API_KEY
-if NCBI_TOOL:
-    COMMON_EUTILS_PARAMS["tool"] = NCBI_TOOL
-if NCBI_EMAIL:
-    COMMON_EUTILS_PARAMS["email"] = NCBI_EMAIL
-
-def _respect_rate_limit() -> None:
-    """Wait until the next API call is allowed based on REQUEST_INTERVAL."""
-    global _LAST_REQUEST_TS
-    if REQUEST_INTERVAL <= 0:
-        return
-
-    now = time.monotonic()
-    elapsed = now - _LAST_REQUEST_TS
-    if elapsed < REQUEST_INTERVAL:
-        time.sleep(REQUEST_INTERVAL - elapsed)
-    _LAST_REQUEST_TS = time.monotonic()
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    get_pubmed_count as _eutils_get_pubmed_count,
+    HistoryEngine,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    PmidSet,
+    count_many,
+    fetch_pmid_sets,
+    CoverageIndex,
+    DEFAULT_TARGET_RECALL,
+    TermRecommendation,
+    leave_one_out,
+    recommend_terms,
+    removable_together,
+)
+from scripts.query import parse  # noqa: E402
 
 
-def _build_request_params(query: str) -> Dict[str, str]:
-    params: Dict[str, str] = {
-        "db": "pubmed",
-        "term": query,
-        "retmode": "json",
-        "retmax": "0",
-    }
-    params.update(COMMON_EUTILS_PARAMS)
-    return params
-
 def format_count(value: Any) -> str:
     """Return thousands-separated count or NA when unavailable."""
     if isinstance(value, int):
@@ -82,98 +41,13 @@ def _format_count_for_log(value: Any) -> str:
     return format_count(value)
 
 
-def _should_use_post(search_url: str, params: Dict[str, str]) -> bool:
-    """Return True when the GET URL would exceed common length limits."""
-    prepared = requests.Request("GET", search_url, params=params).prepare()
-    # E-utilities starts rejecting >~2000 char URLs with HTTP 414
-    return len(prepared.url) >= 1900
-
-
 def get_pubmed_count(query: str) -> Dict[str, Any]:
-    """Call PubMed E-utilities and return the hit count with retry logic."""
-
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    params = _build_request_params(query)
-    last_error = None
-
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            _respect_rate_limit()
-            use_post = _should_use_post(search_url, params)
-            if use_post:
-                response = requests.post(
-                    search_url,
-                    data=params,
-                    timeout=REQUEST_TIMEOUT,
-                )
-            else:
-                response = requests.get(
-                    search_url,
-                    params=params,
-                    timeout=REQUEST_TIMEOUT,
-                )
-            if response.status_code == 429:
-                last_error = "HTTP 429: API rate limit exceeded"
-                backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-                time.sleep(backoff + random.uniform(0, 0.5))
-                continue
-
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, dict) and data.get("error"):
-                last_error = f"API error: {data['error']}"
-                backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-                time.sleep(backoff + random.uniform(0, 0.5))
-                continue
-            result = data.get("esearchresult", {})
-
-            error_list = result.get("errorlist") or {}
-            if error_list:
-                last_error = f"API error: {error_list}"
-                backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-                time.sleep(backoff + random.uniform(0, 0.5))
-                continue
-
-            if isinstance(result, dict) and result.get("ERROR"):
-                last_error = f"API error: {result['ERROR']}"
-                backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-                time.sleep(backoff + random.uniform(0, 0.5))
-                continue
-
-            count_str = result.get("count")
-            if count_str is None:
-                last_error = "API response missing 'count'"
-                backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-                time.sleep(backoff + random.uniform(0, 0.5))
-                continue
-
-            try:
-                count = int(count_str)
-            except (TypeError, ValueError):
-                last_error = f"Invalid count value: {count_str}"
-                backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-                time.sleep(backoff + random.uniform(0, 0.5))
-                continue
-
-            return {
-                "count": count,
-                "query": query,
-                "message": "Success",
-                "success": True,
-            }
-
-        except (requests.exceptions.RequestException, ValueError) as exc:
-            last_error = str(exc)
-            backoff = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
-            time.sleep(backoff + random.uniform(0, 0.5))
+    """Call PubMed E-utilities and return the hit count with retry logic.
 
-    return {
-        "count": None,
-        "query": query,
-        "message": f"Error after {MAX_RETRIES} attempts: {last_error or 'Unknown error'}",
-        "success": False,
-    }
+    Rate limiting, retries and POST fallback are handled by the shared
+    ``scripts.eutils`` client.
+    """
+    return _eutils_get_pubmed_count(query)
 
 def parse_block_from_text(block_text: str) -> List[str]:
     """
@@ -191,38 +65,166 @@ def parse_block_from_text(block_text: str) -> List[str]:
         # コメント行やヘッダー行をスキップ
         if not line or line.startswith('#') or line.startswith('```'):
             continue
-        # ORやAND演算子だけの行をスキップ
-        if line in ['OR', 'AND']:
-            continue
-        # 末尾のORを削除
-        line = re.sub(r'\s+OR\s*$', '', line)
-        if line:
-            lines.append(line)
+        # 行頭・行末のORなど、項のない演算子を除いた検索式（演算子だけの行は空）
+        parsed = parse(line)
+        if parsed.root is not None:
+            lines.append(parsed.text(parsed.root))
 
     return lines
 
-def analyze_block_overlap(search_terms: List[str], block_name: str = "Block") -> Tuple[List[Dict], str]:
+def _count_with_history(
+    search_terms: List[str],
+    cumulative_queries: List[str],
+) -> Tuple[List[Dict], List[Dict]]:
+    """各行と累積ORの件数を履歴参照で数え、``get_pubmed_count`` 形式の辞書で返す"""
+    engine = HistoryEngine()
+    individual_results = []
+    cumulative_results = []
+    cumulative = None
+    failure = None
+    for term, cumulative_query in zip(search_terms, cumulative_queries):
+        node = engine.term(term)
+        individual_results.append(engine.count_result(node, query=term).to_dict())
+
+        # 累積が一度失敗すると以降の累積も求められない（全文で検索した場合と同じ）
+        if failure is None:
+            cumulative = node if cumulative is None else cumulative | node
+            result = engine.count_result(cumulative, query=cumulative_query).to_dict()
+            if not result["success"]:
+                failure = result["message"]
+        else:
+            result = {
+                "count": None,
+                "query": cumulative_query,
+                "message": f"Previous cumulative query failed: {failure}",
+                "success": False,
+            }
+        cumulative_results.append(result)
+    return individual_results, cumulative_results
+
+
+def _count_with_sets(
+    search_terms: List[str],
+    cumulative_queries: List[str],
+    max_in_flight: Optional[int] = None,
+) -> Tuple[List[Dict], List[Dict], Optional[List[PmidSet]]]:
+    """
+    各行のPMID集合を1回ずつ取得し、累積ORを手元の集合演算で求める
+
+    Returns:
+        (個別結果, 累積結果, 各行のPMID集合（取得できなかった行があれば None）)
+    """
+    sets = fetch_pmid_sets(search_terms, max_in_flight=max_in_flight)
+    individual_results = []
+    cumulative_results = []
+    union = PmidSet()
+    failure = None
+    for result, cumulative_query in zip(sets, cumulative_queries):
+        individual_results.append({
+            "count": result.count,
+            "query": result.query,
+            "message": "Success" if result.success else result.error,
+            "success": result.success,
+        })
+        # 行が失敗した時点で以降の累積も求められない（全文で検索した場合と同じ）
+        if failure is None and not result.success:
+            failure = result.error
+        if failure is None:
+            union = union | result.pmids
+            cumulative_results.append({
+                "count": len(union),
+                "query": cumulative_query,
+                "message": "Success",
+                "success": True,
+            })
+        else:
+            cumulative_results.append({
+                "count": None,
+                "query": cumulative_query,
+                "message": f"Cumulative set unavailable: {failure}",
+                "success": False,
+            })
+
+    pmid_sets = [result.pmids for result in sets] if failure is None else None
+    return individual_results, cumulative_results, pmid_sets
+
+
+def analyze_block_overlap(
+    search_terms: List[str],
+    block_name: str = "Block",
+    max_in_flight: Optional[int] = None,
+    use_history: bool = False,
+    local_sets: bool = False,
+    seeds: Optional[List[str]] = None,
+    target_recall: float = DEFAULT_TARGET_RECALL,
+) -> Tuple[List[Dict], str]:
     """
     ブロック内の検索行の重複を分析する
 
+    既定では個別検索と累積検索の全文をまとめて並列実行する（件数キャッシュを使う）。
+    use_history=True では各行を履歴サーバーに1回だけ登録し、累積（OR）は
+    ``#1 OR #2 ...`` の履歴参照で数える。履歴の登録は順に実行され、件数キャッシュは使わない。
+    local_sets=True では各行のPMID集合を1回ずつ取得し、累積・追加・固有件数を
+    手元の集合演算で求める（累積ORの検索は行わない）。このときレポートには
+    leave-one-out と、貪欲法による並べ替え・推奨する検索語の組が付く。
+
     Args:
         search_terms: 検索クエリのリスト
         block_name: ブロック名（出力用）
+        max_in_flight: 同時に実行するリクエスト数（use_history=True のときは使用しない）
+        use_history: 履歴サーバー（WebEnv / query_key）で累積を数えるか
+        local_sets: 各行のPMID集合から手元で集計するか（use_history より優先）
+        seeds: 推奨する検索語の組が必ず捕捉するシード論文のPMID（local_sets=True のとき使用）
+        target_recall: 推奨する検索語の組がブロック全体に対して届くべき割合（0〜1）
 
     Returns:
         結果のリストとMarkdown形式のレポート
     """
     results = []
-    cumulative_query_parts = []
 
     print(f"\n{block_name}の分析を開始します...")
     print(f"検索行数: {len(search_terms)}")
 
+    # 個別クエリと累積クエリを構築
+    cumulative_queries = []
+    cumulative_query_parts = []
+    for term in search_terms:
+        cumulative_query_parts.append(f"({term})")
+        cumulative_queries.append(" OR ".join(cumulative_query_parts))
+    cumulative_query = cumulative_queries[-1] if cumulative_queries else ""
+
+    unique_counts = None
+    removable_flags = None
+    recommendation = None
+    if local_sets:
+        print(f"{len(search_terms)}行のPMID集合を取得し、累積・固有件数を手元で集計します...")
+        individual_results, cumulative_results, pmid_sets = _count_with_sets(
+            search_terms, cumulative_queries, max_in_flight=max_in_flight
+        )
+        # leave-one-out と推奨する組（すべての行が取得できた場合のみ）
+        if pmid_sets is not None:
+            index = CoverageIndex.build(pmid_sets)
+            unique_counts = [int(lost) for lost in leave_one_out(pmid_sets, index=index)]
+            removable = set(removable_together(pmid_sets, index=index))
+            removable_flags = [i in removable for i in range(len(pmid_sets))]
+            recommendation = recommend_terms(search_terms, pmid_sets, target_recall=target_recall, seeds=seeds)
+        else:
+            unique_counts = [None] * len(search_terms)
+            removable_flags = [None] * len(search_terms)
+    elif use_history:
+        print("履歴サーバー（WebEnv）で各行を1回ずつ検索し、累積は履歴参照で数えます...")
+        individual_results, cumulative_results = _count_with_history(search_terms, cumulative_queries)
+    else:
+        print(f"{len(search_terms) * 2}件のクエリを並列実行します...")
+        batch = count_many(list(search_terms) + cumulative_queries, max_in_flight=max_in_flight)
+        individual_results = [r.to_dict() for r in batch[:len(search_terms)]]
+        cumulative_results = [r.to_dict() for r in batch[len(search_terms):]]
+
     for idx, term in enumerate(search_terms, 1):
-        print(f"\n[{idx}/{len(search_terms)}] 検索中: {term[:60]}...")
+        print(f"\n[{idx}/{len(search_terms)}] {term[:60]}...")
 
-        # 個別のヒット件数を取得
-        individual_result = get_pubmed_count(term)
+        # 個別のヒット件数
+        individual_result = individual_results[idx - 1]
         if not individual_result.get('success'):
             print(f"  [ERROR] 個別検索でエラー: {individual_result['message']}")
             print(f"  このエラーは致命的です。処理を継続できません。")
@@ -231,12 +233,8 @@ def analyze_block_overlap(search_terms: List[str], block_name: str = "Block") ->
         else:
             individual_count = individual_result['count']
 
-        # 累積クエリを構築
-        cumulative_query_parts.append(f"({term})")
-        cumulative_query = " OR ".join(cumulative_query_parts)
-
-        # 累積ヒット件数を取得
-        cumulative_result = get_pubmed_count(cumulative_query)
+        # 累積ヒット件数
+        cumulative_result = cumulative_results[idx - 1]
         previous_cumulative = results[-1]['cumulative_count'] if results else 0
 
         # *** バグ修正: エラー時に前の値を使わない ***
@@ -246,6 +244,10 @@ def analyze_block_overlap(search_terms: List[str], block_name: str = "Block") ->
             # エラー時はNoneを記録（デフォルト値を使わない）
             cumulative_count = None
             added_count = None
+        elif previous_cumulative is None:
+            # 直前の累積が失敗している場合は差分を計算できない
+            cumulative_count = cumulative_result['count']
+            added_count = None
         else:
             cumulative_count = cumulative_result['count']
             # 追加された件数を計算
@@ -272,6 +274,9 @@ def analyze_block_overlap(search_terms: List[str], block_name: str = "Block") ->
             'individual_error': not individual_result.get('success'),
             'cumulative_error': not cumulative_result.get('success'),
         })
+        if unique_counts is not None:
+            results[-1]['unique_count'] = unique_counts[idx - 1]
+            results[-1]['removable_together'] = removable_flags[idx - 1]
 
         individual_display = _format_count_for_log(individual_count)
         cumulative_display = f"{cumulative_count:,}" if cumulative_count is not None else "ERROR"
@@ -279,11 +284,16 @@ def analyze_block_overlap(search_terms: List[str], block_name: str = "Block") ->
         print(f"  個別: {individual_display} | 累積: {cumulative_display} | 追加: {added_display}")
 
     # Markdownレポートを生成
-    report = generate_markdown_report(results, block_name, cumulative_query)
+    report = generate_markdown_report(results, block_name, cumulative_query, recommendation)
 
     return results, report
 
-def generate_markdown_report(results: List[Dict], block_name: str, final_query: str) -> str:
+def generate_markdown_report(
+    results: List[Dict],
+    block_name: str,
+    final_query: str,
+    recommendation: Optional[TermRecommendation] = None,
+) -> str:
     """
     分析結果からMarkdownレポートを生成する
     """
@@ -294,9 +304,14 @@ def generate_markdown_report(results: List[Dict], block_name: str, final_query:
     if has_errors:
         report += "⚠️ **WARNING**: Some queries encountered errors during execution. See details below.\n\n"
 
-    # テーブルヘッダー
-    report += "| Line | Term | Individual Count | Cumulative (OR) | Added | % of Total |\n"
-    report += "|------|------|------------------|-----------------|-------|------------|\n"
+    # テーブルヘッダー（PMID集合から集計した場合は固有件数の列を加える）
+    show_unique = any('unique_count' in r for r in results)
+    if show_unique:
+        report += "| Line | Term | Individual Count | Cumulative (OR) | Added | Unique | % of Total |\n"
+        report += "|------|------|------------------|-----------------|-------|--------|------------|\n"
+    else:
+        report += "| Line | Term | Individual Count | Cumulative (OR) | Added | % of Total |\n"
+        report += "|------|------|------------------|-----------------|-------|------------|\n"
 
     # 最後の有効な累積カウントを取得
     total_count = None
@@ -331,7 +346,11 @@ def generate_markdown_report(results: List[Dict], block_name: str, final_query:
         cumulative_display = f"{cumulative:,}" if cumulative is not None else "ERROR"
         added_display = f"**+{added:,}**" if added is not None else "**ERROR**"
 
-        report += f"| {result['line']} | `{term_display}` | {individual_display} | {cumulative_display} | {added_display} | {pct_display}{error_marker} |\n"
+        if show_unique:
+            unique_display = format_count(result.get('unique_count'))
+            report += f"| {result['line']} | `{term_display}` | {individual_display} | {cumulative_display} | {added_display} | {unique_display} | {pct_display}{error_marker} |\n"
+        else:
+            report += f"| {result['line']} | `{term_display}` | {individual_display} | {cumulative_display} | {added_display} | {pct_display}{error_marker} |\n"
 
     # サマリー
     report += f"\n### Summary\n\n"
@@ -371,12 +390,49 @@ def generate_markdown_report(results: List[Dict], block_name: str, final_query:
             report += ", ".join([str(r['line']) for r in high_overlap_terms])
             report += "\n"
 
+    if show_unique:
+        report += generate_leave_one_out_section(results, total_count)
+    if recommendation is not None:
+        report += "\n### Greedy Term Order\n\n"
+        report += recommendation.to_markdown()
+
     # 最終クエリ
     report += f"\n### Final Combined Query\n\n"
     report += f"```\n{final_query}\n```\n"
 
     return report
 
+
+def generate_leave_one_out_section(results: List[Dict], total_count: Optional[int]) -> str:
+    """
+    leave-one-out の冗長性セクション（PMID集合から集計した場合のみ）
+
+    各行を単独で外したときに失われる件数の少ない順に並べる。0件の行でも
+    互いに補い合っている場合があるため、同時に外せる行の組を別に示す。
+    """
+    section = "\n### Leave-one-out Redundancy\n\n"
+    valid = [r for r in results if r.get('unique_count') is not None]
+    if not valid:
+        section += "Not available (some lines could not be retrieved).\n"
+        return section
+
+    section += "| Line | Term | Lost if removed | % of Total | Removable together |\n"
+    section += "|------|------|-----------------|------------|--------------------|\n"
+    for result in sorted(valid, key=lambda r: (r['unique_count'], r['line'])):
+        term_display = result['term'][:80] + "..." if len(result['term']) > 80 else result['term']
+        lost = result['unique_count']
+        pct_display = f"{lost / total_count * 100:.2f}%" if total_count else "N/A"
+        removable_display = "yes" if result.get('removable_together') else ""
+        section += f"| {result['line']} | `{term_display}` | {lost:,} | {pct_display} | {removable_display} |\n"
+
+    redundant = [r['line'] for r in valid if r['unique_count'] == 0]
+    removable = [r['line'] for r in valid if r.get('removable_together')]
+    section += "\n"
+    section += f"- **Fully redundant lines** (0 lost if removed alone): {', '.join(map(str, redundant)) or 'none'}\n"
+    section += f"- **Removable together without losing any record**: {', '.join(map(str, removable)) or 'none'}\n"
+    return section
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="検索ブロック内の各行のヒット件数と累積OR結果を分析します。",
@@ -408,7 +464,39 @@ def main():
         help="ブロック名（レポート表示用）"
     )
 
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="同時に実行するリクエスト数（既定: レート上限に合わせて自動）"
+    )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="各行を履歴サーバーに1回だけ登録し、累積ORを履歴参照で数える（順に実行し、--cache は効かない）"
+    )
+    parser.add_argument(
+        "--sets",
+        action="store_true",
+        help="各行のPMID集合を1回ずつ取得し、累積・追加件数と leave-one-out（各行を外すと失われる件数）を手元で集計する"
+    )
+    parser.add_argument(
+        "--seeds",
+        type=str,
+        help="推奨する検索語の組が必ず捕捉するシード論文のPMID（カンマ区切り、--sets と併用）"
+    )
+    parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=DEFAULT_TARGET_RECALL,
+        help=f"推奨する検索語の組がブロック全体に対して届くべき割合（既定: {DEFAULT_TARGET_RECALL}、--sets と併用）"
+    )
+
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
 
     # 出力ディレクトリが存在しない場合は作成
     output_dir = os.path.dirname(args.output)
@@ -423,7 +511,6 @@ def main():
     else:
         # 標準入力から読み込み
         print(f"検索ブロックの内容を入力してください（入力終了はCtrl+Z (Windows) または Ctrl+D (Unix)）:")
-        import sys
         block_text = sys.stdin.read()
 
     # ブロックを解析
@@ -438,7 +525,15 @@ def main():
         print(f"  {idx}. {term}")
 
     # 分析を実行
-    results, report = analyze_block_overlap(search_terms, args.block_name)
+    results, report = analyze_block_overlap(
+        search_terms,
+        args.block_name,
+        max_in_flight=args.max_in_flight,
+        use_history=args.history,
+        local_sets=args.sets,
+        seeds=[pmid.strip() for pmid in args.seeds.split(',') if pmid.strip()] if args.seeds else None,
+        target_recall=args.target_recall,
+    )
 
     # レポートを保存
     with open(args.output, 'w', encoding='utf-8') as f:
@@ -452,6 +547,14 @@ def main():
             cmd_parts.append(f"-i {args.input}")
         cmd_parts.append(f"-o {args.output}")
         cmd_parts.append(f'--block-name "{args.block_name}"')
+        if args.history:
+            cmd_parts.append("--history")
+        if args.sets:
+            cmd_parts.append("--sets")
+        if args.seeds:
+            cmd_parts.append(f"--seeds {args.seeds}")
+        if args.target_recall != DEFAULT_TARGET_RECALL:
+            cmd_parts.append(f"--target-recall {args.target_recall}")
         f.write(f"Command: {' '.join(cmd_parts)}\n")
 
         if args.input:
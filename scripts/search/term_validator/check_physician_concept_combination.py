@@ -1,9 +1,22 @@
-import requests
+import sys
+from pathlib import Path
 import time
 from typing import Dict, List
 import argparse
 import os
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    get_pubmed_count as _eutils_get_pubmed_count,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+)
+
 def get_pubmed_count(query: str) -> Dict[str, any]:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数を取得する
@@ -18,32 +31,19 @@ def get_pubmed_count(query: str) -> Dict[str, any]:
             'message': str
         }
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-
-    try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'query': query,
-            'message': 'Success'
-        }
-
-    except requests.exceptions.RequestException as e:
+    result = _eutils_get_pubmed_count(query)
+    if not result['success']:
         return {
             'count': 0,
             'query': query,
-            'message': f'Error: {str(e)}'
+            'message': f"Error: {result['message']}"
         }
+    return {
+        'count': result['count'],
+        'query': query,
+        'message': 'Success'
+    }
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -61,7 +61,11 @@ def main():
         help="最適化版の検索式を使用する"
     )
 
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
 
     # 出力ディレクトリが存在しない場合は作成
     output_dir = os.path.dirname(args.output)
@@ -107,7 +111,6 @@ def main():
 
     # 医師ブロック単独のヒット件数
     print(f"[0/11] #1 Population (医師) 単独のヒット件数を取得中...")
-    time.sleep(0.4)
     physician_only_result = get_pubmed_count(physician_block)
     physician_only_count = physician_only_result['count']
     print(f"  #1のみ: {physician_only_count:,} 件\n")
@@ -119,7 +122,6 @@ def main():
 
         # #1 AND #2X の件数を取得
         combined_query = f"{physician_block} AND {concept_query}"
-        time.sleep(0.4)
         combined_result = get_pubmed_count(combined_query)
         individual_count = combined_result['count']
 
@@ -1,13 +1,29 @@
-import requests
-import time
+import sys
+from pathlib import Path
 from typing import Dict, List, Tuple, Any
 import argparse
 import os
 import re
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.query import parse  # noqa: E402
+from scripts.eutils import (  # noqa: E402
+    get_pubmed_count as _eutils_get_pubmed_count,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+)
+
+
 def get_pubmed_count(query: str) -> Dict[str, Any]:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数を取得する
+
+    レート制御とリトライは共通クライアント（scripts.eutils）が行う。
     
     Args:
         query: PubMed検索クエリ
@@ -19,32 +35,19 @@ def get_pubmed_count(query: str) -> Dict[str, Any]:
             'message': str
         }
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
-    try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'query': query,
-            'message': 'Success'
-        }
-        
-    except requests.exceptions.RequestException as e:
+    result = _eutils_get_pubmed_count(query)
+    if not result['success']:
         return {
             'count': 0,
             'query': query,
-            'message': f'Error: {str(e)}'
+            'message': f"Error: {result['message']}"
         }
+    return {
+        'count': result['count'],
+        'query': query,
+        'message': 'Success'
+    }
+
 
 def parse_search_formula_md(file_path: str) -> Tuple[Dict[str, str], str, Dict[str, str], Dict[str, List[str]]]:
     """
@@ -89,51 +92,18 @@ def parse_search_formula_md(file_path: str) -> Tuple[Dict[str, str], str, Dict[s
                     individual_terms[line_num] = processed_terms
                 elif " OR " in query_part:
                     line_queries[line_num] = query_part # <--- この行を追加して、行全体のクエリを保存
-                    # OR演算子で分割して個別のキーワードを取得
-                    if query_part.count('(') > query_part.count(')'):
-                        # 括弧が閉じていない場合は、全体を1つのキーワードとして扱う
-                        individual_terms[line_num] = [query_part]
-                    else:
-                        try:
-                            # 単純なOR条件を分割
-                            terms = []
-                            # 括弧のネストを考慮した分割が必要
-                            term_start = 0
-                            bracket_count = 0
-                            in_quotes = False
-                            for i, char in enumerate(query_part):
-                                if char == '"':
-                                    in_quotes = not in_quotes
-                                elif not in_quotes:
-                                    if char == '(':
-                                        bracket_count += 1
-                                    elif char == ')':
-                                        bracket_count -= 1
-                                    # " OR "の検出 (前後に空白があるORのみ)
-                                    elif (char == 'O' and i + 3 < len(query_part) and 
-                                          query_part[i:i+3] == 'OR ' and
-                                          i > 0 and query_part[i-1] == ' ' and 
-                                          bracket_count == 0):
-                                        terms.append(query_part[term_start:i-1].strip())
-                                        term_start = i + 3
-                            
-                            # 最後のタームを追加
-                            if term_start < len(query_part):
-                                terms.append(query_part[term_start:].strip())
-                            
-                            individual_terms[line_num] = terms
-                        except Exception as e:
-                            # 解析エラーの場合は、全体を1つのキーワードとして扱う
-                            individual_terms[line_num] = [query_part]
+                    # トップレベルのORで分割して個別のキーワードを取得
+                    # （括弧が閉じていないなど構文に誤りがある場合は、全体を1つのキーワードとして扱う）
+                    individual_terms[line_num] = parse(query_part).split("OR")
                 else:
                     line_queries[line_num] = query_part
                     individual_terms[line_num] = [query_part]
             
             # 最終行の構造を取得 (例: #5 (#1 OR #2) AND (#3 OR #4))
-            if re.match(r"#(\d+)\s+(.*#\d+.*)", line):
-                line_num = re.match(r"#(\d+)\s+(.*)", line).group(1)
+            if match and parse(match.group(2).strip()).line_refs():
+                line_num = match.group(1)
                 if line_num not in line_queries or line_num == max(line_queries.keys(), key=int):  # この行番号が最後の行番号または処理されていない場合
-                    final_query_structure = re.match(r"#\d+\s+(.*)", line).group(1).strip()
+                    final_query_structure = match.group(2).strip()
 
     return line_queries, final_query_structure, raw_line_queries, individual_terms
 
@@ -153,13 +123,14 @@ def expand_references(query: str, line_queries: Dict[str, str], max_depth: int =
     expanded = query
     
     while depth < max_depth:
-        original = expanded
-        # #数字 を対応するクエリで置換
-        expanded = re.sub(r"#(\d+)", lambda m: f"({line_queries.get(m.group(1), '')})", expanded)
-        
-        # 変化がなければ終了
-        if original == expanded:
+        # #数字 を対応するクエリで置換（引用符の中の # は参照ではない）
+        refs = parse(expanded).line_refs()
+        # 参照がなければ終了
+        if not refs:
             break
+        for ref in reversed(refs):
+            start, end = ref.span
+            expanded = f"{expanded[:start]}({line_queries.get(str(ref.number), '')}){expanded[end:]}"
             
         depth += 1
         
@@ -189,7 +160,11 @@ def main():
         required=True,
         help="結果を保存するMarkdownファイルのパス (例: search_formula/ujihara/search_lines_results.md)"
     )
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
 
     # 出力ディレクトリが存在しない場合は作成
     output_dir = os.path.dirname(args.output)
@@ -217,41 +192,35 @@ def main():
             terms = individual_terms.get(line_num, [])
             
             # 行番号の参照を含むか確認（#1、#2などの形式）
-            contains_line_reference = bool(re.search(r"#\d+", original_query))
+            contains_line_reference = bool(parse(original_query).line_refs())
             
             # 行番号参照を含む場合は、展開してから結果を取得
             if contains_line_reference:
                 # 行番号を実際のクエリに展開
                 fully_expanded_query = expand_references(original_query, line_queries)
-                time.sleep(1)  # API制限を考慮
                 expanded_result = get_pubmed_count(fully_expanded_query)
                 f.write(f"\n| | | `{fully_expanded_query}` | {expanded_result['count']:,} |")
             # 行番号参照を含まない場合は通常の処理
             elif len(terms) == 1:
-                time.sleep(1)  # API制限を考慮
                 term_result = get_pubmed_count(terms[0])
                 f.write(f"\n| | | `{terms[0]}` | {term_result['count']:,} |")
             # 複数のキーワードがある場合は個別に表示
             elif len(terms) > 1:
                 for term in terms:
-                    time.sleep(1)  # API制限を考慮
                     term_result = get_pubmed_count(term)
                     f.write(f"\n| | | `{term}` | {term_result['count']:,} |")
                 
                 # 全体のOR結果
-                time.sleep(1)  # API制限を考慮
                 result = get_pubmed_count(expanded_query)
                 f.write(f"\n| | | **全体OR結果** | **{result['count']:,}** |")
             # 個別キーワードがない場合（通常はあり得ない）
             else:
-                time.sleep(1)  # API制限を考慮
                 result = get_pubmed_count(expanded_query)
                 f.write(f"\n| | | `{expanded_query}` | {result['count']:,} |")
 
         if final_query_structure:
             f.write("\n\n=== 最終的な組み合わせ検索結果 ===\n")
             final_query = build_final_query(final_query_structure, line_queries)
-            time.sleep(1)
             final_result = get_pubmed_count(final_query)
             f.write(f"最終検索構造: `{final_query_structure}`\n\n")
             f.write(f"展開後の最終検索式: `{final_query}`\n\n")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+ブロック内の検索語どうしの重複行列
+
+各検索語のPMID集合を1回ずつ取得し、全組の積集合の件数・Jaccard係数・包含率を
+手元で求めてCSVに保存する。40語のブロック（780組）でも通信は40語分の取得だけで済む
+（組ごとに件数を数える方法では 780組 × 3リクエスト）。
+
+Usage:
+    python scripts/search/term_validator/check_term_overlap_matrix.py \
+        -i block.txt -o overlap_jaccard.csv --pairs overlap_pairs.csv --metric jaccard
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    OVERLAP_METRICS,
+    OverlapMatrix,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    fetch_pmid_sets,
+)
+from scripts.search.term_validator.check_block_overlap import parse_block_from_text  # noqa: E402
+
+# この包含率以上の組をレポートに挙げる
+DEFAULT_CONTAINMENT_THRESHOLD = 0.9
+
+
+def build_overlap_matrix(
+    search_terms: List[str],
+    max_in_flight: Optional[int] = None,
+) -> Tuple[OverlapMatrix, List[Tuple[str, str]]]:
+    """
+    検索語の重複行列を作る
+
+    Returns:
+        (取得できた検索語の重複行列, 取得できなかった検索語とエラーメッセージ)
+    """
+    results = fetch_pmid_sets(search_terms, max_in_flight=max_in_flight)
+    fetched = [result for result in results if result.success]
+    errors = [(result.query, result.error) for result in results if not result.success]
+    matrix = OverlapMatrix.build([r.query for r in fetched], [r.pmids for r in fetched])
+    return matrix, errors
+
+
+def generate_markdown_report(
+    matrix: OverlapMatrix,
+    errors: List[Tuple[str, str]],
+    threshold: float = DEFAULT_CONTAINMENT_THRESHOLD,
+) -> str:
+    """包含関係の強い組をまとめたMarkdownレポート"""
+    report = "## Term Overlap Matrix\n\n"
+    report += f"- **Terms**: {len(matrix.terms)}\n"
+    report += f"- **Pairs**: {len(matrix.terms) * (len(matrix.terms) - 1) // 2:,}\n"
+    if errors:
+        report += "- **Failed terms** (excluded from the matrix):\n"
+        for term, error in errors:
+            report += f"  - `{term}`: {error}\n"
+
+    contained = matrix.contained_pairs(threshold)
+    report += f"\n### Nearly contained pairs (containment ≥ {threshold:.0%})\n\n"
+    if not contained:
+        report += "None.\n"
+        return report
+    report += "| Term A | Term B | Count A | Count B | A∩B | Jaccard | A in B | B in A |\n"
+    report += "|--------|--------|---------|---------|-----|---------|--------|--------|\n"
+    for row in contained:
+        report += (
+            f"| `{row['term_a']}` | `{row['term_b']}` | {row['count_a']:,} | {row['count_b']:,} | "
+            f"{row['intersection']:,} | {row['jaccard']:.2f} | {row['a_in_b']:.2f} | {row['b_in_a']:.2f} |\n"
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="検索ブロック内の検索語どうしの積集合・Jaccard係数・包含率の行列をCSVに出力します。"
+    )
+    parser.add_argument("-i", "--input", required=True, help="検索ブロックが記述されたテキストファイルのパス")
+    parser.add_argument("-o", "--output", required=True, help="検索語 × 検索語の行列を保存するCSVのパス")
+    parser.add_argument(
+        "--metric",
+        choices=OVERLAP_METRICS,
+        default="jaccard",
+        help="行列に出力する指標（containment は行の検索語が列の検索語に含まれる割合）",
+    )
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="同時に取得する検索語の数（既定: レート上限に合わせて自動）")
+    parser.add_argument("--pairs", help="全組の件数・指標を縦長に保存するCSVのパス")
+    parser.add_argument("--report", help="包含関係の強い組をまとめたMarkdownのパス")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_CONTAINMENT_THRESHOLD,
+        help=f"レポートに挙げる包含率の下限（既定: {DEFAULT_CONTAINMENT_THRESHOLD}）",
+    )
+
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        search_terms = parse_block_from_text(f.read())
+    if not search_terms:
+        print("エラー: 有効な検索行が見つかりませんでした。")
+        return
+
+    print(f"{len(search_terms)}語のPMID集合を取得します...")
+    matrix, errors = build_overlap_matrix(search_terms, max_in_flight=args.max_in_flight)
+    for term, error in errors:
+        print(f"  [ERROR] {term}: {error}")
+
+    print(f"行列を保存しました: {matrix.to_csv(args.output, metric=args.metric)}")
+    if args.pairs:
+        print(f"全組を保存しました: {matrix.pairs_to_csv(args.pairs)}")
+    report = generate_markdown_report(matrix, errors, threshold=args.threshold)
+    if args.report:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.report).write_text(report, encoding="utf-8")
+        print(f"レポートを保存しました: {args.report}")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
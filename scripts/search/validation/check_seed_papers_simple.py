@@ -1,37 +1,41 @@
-import requests
+import sys
 import time
-from typing import List, Dict
+from pathlib import Path
+from typing import List, Dict, Optional
 import argparse
 import os
 
-def get_pubmed_details(pmid: str) -> Dict:
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    EutilsError,
+    PubmedRecord,
+    check_seed_inclusion,
+    fetch_article_xml,
+)
+
+def get_pubmed_details(pmid: str, record: Optional[PubmedRecord] = None) -> Dict:
     """
     PubMed APIから論文の詳細を取得
-    """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    fetch_url = f"{base_url}/efetch.fcgi"
-
-    params = {
-        'db': 'pubmed',
-        'id': pmid,
-        'retmode': 'xml'
-    }
 
+    ``record`` に取得済みの書誌情報（``fetch_article_xml`` の結果）を渡すと通信しない。
+    """
     try:
-        response = requests.get(fetch_url, params=params)
-        response.raise_for_status()
-
-        # 簡易的なタイトル抽出
-        if '<ArticleTitle>' in response.text:
-            title_start = response.text.find('<ArticleTitle>') + 14
-            title_end = response.text.find('</ArticleTitle>')
-            title = response.text[title_start:title_end]
-        else:
-            title = "N/A"
+        if record is None:
+            article = fetch_article_xml([pmid])[pmid]
+            if not article.ok:
+                raise EutilsError(article.error)
+            record = article.record
 
         return {
             'pmid': pmid,
-            'title': title,
+            'title': record.title or "N/A",
             'found': True
         }
     except Exception as e:
@@ -44,30 +48,13 @@ def get_pubmed_details(pmid: str) -> Dict:
 def check_pmid_in_query(pmid: str, query: str) -> bool:
     """
     指定されたPMIDがクエリの結果に含まれているかチェック
-    """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-
-    # クエリにPMIDフィルターを追加
-    filtered_query = f"({query}) AND {pmid}[PMID]"
-
-    params = {
-        'db': 'pubmed',
-        'term': filtered_query,
-        'retmode': 'json'
-    }
 
-    try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        count = int(data['esearchresult'].get('count', 0))
-        return count > 0
-
-    except Exception as e:
-        print(f"  Error checking PMID {pmid}: {str(e)}")
-        return False
+    複数のPMIDを確認する場合は ``check_seed_inclusion`` でまとめて検索する。
+    """
+    inclusion = check_seed_inclusion(query, [pmid])
+    if pmid in inclusion.errors:
+        print(f"  Error checking PMID {pmid}: {inclusion.errors[pmid]}")
+    return inclusion.included.get(pmid, False)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -86,7 +73,11 @@ def main():
         help="結果を保存するMarkdownファイルのパス"
     )
 
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
 
     # PMIDリストを読み込む
     pmids = []
@@ -120,16 +111,23 @@ def main():
 
     results = []
 
+    # 検索式で見つかるかを全PMIDまとめてチェック
+    inclusion = check_seed_inclusion(full_query, pmids)
+    for pmid, error in inclusion.errors.items():
+        print(f"  Error checking PMID {pmid}: {error}")
+    included = inclusion.included
+
+    # 論文の詳細（書誌情報）を全PMIDまとめて取得（最大500件ずつ）
+    articles = fetch_article_xml(pmids)
+
     for idx, pmid in enumerate(pmids, 1):
         print(f"[{idx}/{len(pmids)}] PMID {pmid} をチェック中...")
 
         # 論文の詳細を取得
-        time.sleep(0.4)
-        details = get_pubmed_details(pmid)
+        article = articles.get(pmid)
+        details = get_pubmed_details(pmid, record=article.record if article is not None else None)
 
-        # 検索式で見つかるかチェック
-        time.sleep(0.4)
-        found_in_query = check_pmid_in_query(pmid, full_query)
+        found_in_query = included.get(pmid, False)
 
         results.append({
             'pmid': pmid,
@@ -1,21 +1,17 @@
 #!/usr/bin/env python3
 """現在の検索式の件数を測定"""
-import requests
-import time
-import xml.etree.ElementTree as ET
-import os
+import sys
+from pathlib import Path
 
-api_key = os.environ.get('NCBI_API_KEY')
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import get_client  # noqa: E402
 
 def get_count(query):
-    params = {'db': 'pubmed', 'term': query, 'retmode': 'xml', 'retmax': 0}
-    if api_key:
-        params['api_key'] = api_key
-    time.sleep(0.4)
-    r = requests.get('https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi', params=params, timeout=30)
-    root = ET.fromstring(r.content)
-    count = root.find('.//Count')
-    return int(count.text) if count is not None else 0
+    return get_client().count(query)
+
 
 # 現在の検索式 (v2: Majr + Program Development維持)
 block1 = '"Faculty, Medical"[Majr] OR medical faculty[tiab] OR clinical educator*[tiab] OR clinician educator*[tiab] OR medical educator*[tiab] OR clinical teacher*[tiab] OR clinical teaching[tiab]'
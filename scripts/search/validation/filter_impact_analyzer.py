@@ -3,62 +3,137 @@
 フィルター効果分析スクリプト
 
 各検索ブロックに対して、段階的にフィルターを適用し、件数の変化を測定する。
+
+同じ行列は設定ファイルから集計できる（新しい分析は設定ファイルを追加する）:
+    python scripts/search/validation/run_filter_matrix.py --spec scripts/search/validation/specs/filter_impact.yaml -o <出力先>
+
+--local-filters を付けると、各ブロックのPMID集合とメタデータ（出版年・言語・出版タイプ・
+Humans / Animals）を一度だけ取得してストアに保存し、フィルターの段階を手元で評価する。
+--cross-check で指定した数のセルは実際の件数と照合する。
 """
 
-import requests
+import argparse
+import sys
 import time
-import xml.etree.ElementTree as ET
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import os
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    DEFAULT_CROSS_CHECK_SAMPLE,
+    DEFAULT_METADATA_DIR,
+    CrossCheck,
+    EutilsClient,
+    EutilsError,
+    PmidMetadataStore,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    count_mapping,
+    cross_check_counts,
+    get_client,
+    get_count_cache,
+)
+
+
+# (ステージ名, 表示ラベル) — 適用順
+FILTER_STAGES: List[Tuple[str, str]] = [
+    ('base', 'Base query (no filters)'),
+    ('10years', '+ Past 10 years filter'),
+    ('no_animal', '+ Animal exclusion'),
+    ('10y_no_animal', '+ Both (10y + animal)'),
+    ('with_humans', '+ Humans[Mesh]'),
+    ('with_lang', '+ Language (EN/JA)'),
+    ('with_pubtype', '+ Pub Type exclusion'),
+]
+
+# 各段階で Base の検索式に続ける条件
+_FILTER_10Y = 'AND ("2015/01/01"[PDAT] : "3000"[PDAT])'
+_FILTER_ANIMAL = 'NOT (animals[Mesh] NOT humans[Mesh])'
+_FILTER_HUMANS = 'AND Humans[Mesh]'
+_FILTER_LANG = 'AND (English[lang] OR Japanese[lang])'
+_FILTER_PUBTYPE = 'NOT (Editorial[PT] OR Letter[PT] OR Comment[PT])'
+FILTER_CLAUSES: Dict[str, Tuple[str, ...]] = {
+    'base': (),
+    '10years': (_FILTER_10Y,),
+    'no_animal': (_FILTER_ANIMAL,),
+    '10y_no_animal': (_FILTER_10Y, _FILTER_ANIMAL),
+    'with_humans': (_FILTER_10Y, _FILTER_ANIMAL, _FILTER_HUMANS),
+    'with_lang': (_FILTER_10Y, _FILTER_ANIMAL, _FILTER_HUMANS, _FILTER_LANG),
+    'with_pubtype': (_FILTER_10Y, _FILTER_ANIMAL, _FILTER_HUMANS, _FILTER_LANG, _FILTER_PUBTYPE),
+}
+
+# 削減率の比較対象（10年・動物・両方は Base から、以降は直前の段階から）
+_STAGE_REFERENCE = {
+    '10years': 'base',
+    'no_animal': 'base',
+    '10y_no_animal': 'base',
+    'with_humans': '10y_no_animal',
+    'with_lang': 'with_humans',
+    'with_pubtype': 'with_lang',
+}
 
 
 class FilterImpactAnalyzer:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, max_in_flight: Optional[int] = None):
         self.api_key = api_key or os.environ.get('NCBI_API_KEY')
-        self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        self.delay = 0.34 if self.api_key else 0.5  # API rate limit
-
-    def get_count(self, query: str, retries: int = 3) -> int:
-        """PubMed検索のヒット件数を取得"""
-        params = {
-            'db': 'pubmed',
-            'term': query,
-            'retmode': 'xml',
-            'retmax': 0  # 件数のみ取得
-        }
-
-        if self.api_key:
-            params['api_key'] = self.api_key
-
-        for attempt in range(retries):
-            try:
-                time.sleep(self.delay)
-                response = requests.get(self.base_url, params=params, timeout=30)
-                response.raise_for_status()
+        self.max_in_flight = max_in_flight
+        # レート制御とリトライは共通クライアントが行う
+        self.client = get_client() if api_key is None else EutilsClient(api_key=api_key, count_cache=get_count_cache())
+
+    def get_count(self, query: str) -> int:
+        """PubMed検索のヒット件数を取得（失敗時は -1）"""
+        try:
+            return self.client.count(query)
+        except EutilsError as e:
+            print(f"Failed to get count for query: {query[:80]}... ({e})")
+            return -1
+
+    def get_counts(self, queries: Dict[Any, str]) -> Dict[Any, int]:
+        """
+        複数の検索式の件数を並列に取得（失敗したものは -1）
 
-                root = ET.fromstring(response.content)
-                count_elem = root.find('.//Count')
+        Args:
+            queries: キー → 検索式 の辞書
 
-                if count_elem is not None:
-                    return int(count_elem.text)
-                else:
-                    print(f"Warning: No count found for query: {query[:100]}...")
-                    return 0
+        Returns:
+            キー → 件数 の辞書
+        """
+        results = count_mapping(queries, max_in_flight=self.max_in_flight, client=self.client)
+        counts = {}
+        for key, result in results.items():
+            if result.success:
+                counts[key] = result.count
+            else:
+                print(f"Failed to get count for query: {result.query[:80]}... ({result.error})")
+                counts[key] = -1
+        return counts
 
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{retries} failed: {e}")
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    print(f"Failed to get count for query: {query[:100]}...")
-                    return -1
+    @staticmethod
+    def build_filter_queries(population: str, block_query: str) -> Dict[str, str]:
+        """
+        1つのブロックに段階的にフィルターを適用した検索式を組み立てる
 
-        return -1
+        Returns:
+            ステージ名 → 検索式 の辞書（FILTER_STAGES の順）
+        """
+        base_query = f"({population}) AND ({block_query})"
+        return {
+            stage: " ".join((base_query,) + FILTER_CLAUSES[stage])
+            for stage, _ in FILTER_STAGES
+        }
 
     def analyze_block_with_filters(self, population: str, block_query: str, block_name: str) -> Dict[str, int]:
         """
         1つのブロックに対して、段階的にフィルターを適用して件数を測定
 
+        各フィルター段階の検索式は互いに独立しているため並列に実行する。
+
         Args:
             population: #1 Population query
             block_query: 個別ブロックのクエリ (e.g., #2A, #2B, etc.)
@@ -67,70 +142,102 @@ class FilterImpactAnalyzer:
         Returns:
             各フィルター適用時の件数を含む辞書
         """
+        results = self.get_counts(self.build_filter_queries(population, block_query))
+        self.print_block_results(block_name, results)
+        return results
+
+    def analyze_blocks_with_filters(self, population: str, blocks: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+        """
+        全ブロック × 全フィルター段階の件数を1回のバッチでまとめて測定
+
+        Args:
+            population: #1 Population query
+            blocks: ブロック名 → ブロッククエリ
+
+        Returns:
+            ブロック名 → 各フィルター適用時の件数
+        """
+        queries = {}
+        for block_name, block_query in blocks.items():
+            for stage, query in self.build_filter_queries(population, block_query).items():
+                queries[(block_name, stage)] = query
+
+        print(f"Running {len(queries)} queries ({len(blocks)} blocks × {len(FILTER_STAGES)} stages)...")
+        counts = self.get_counts(queries)
+
+        all_results = {}
+        for block_name in blocks:
+            results = {stage: counts[(block_name, stage)] for stage, _ in FILTER_STAGES}
+            self.print_block_results(block_name, results)
+            all_results[block_name] = results
+        return all_results
+
+    def analyze_blocks_locally(
+        self,
+        population: str,
+        blocks: Dict[str, str],
+        store: PmidMetadataStore,
+        cross_check: int = DEFAULT_CROSS_CHECK_SAMPLE,
+        refresh_sets: bool = False,
+    ) -> Tuple[Dict[str, Dict[str, int]], List[CrossCheck]]:
+        """
+        全ブロック × 全フィルター段階の件数を、メタデータストアで手元で数える
+
+        各ブロックは Base の検索式のPMID集合だけを取得し（保存済みなら再利用）、
+        ストアにないPMIDのメタデータを取得してから、各段階の条件をマスクで評価する。
+
+        Args:
+            population: #1 Population query
+            blocks: ブロック名 → ブロッククエリ
+            store: メタデータストア
+            cross_check: 実際の件数と照合するセルの数
+            refresh_sets: 保存済みのPMID集合を使わず取得し直す
+
+        Returns:
+            (ブロック名 → 各フィルター適用時の件数, 照合結果)
+        """
+        all_results = {}
+        cells = {}
+        for block_name, block_query in blocks.items():
+            queries = self.build_filter_queries(population, block_query)
+            try:
+                pmids = store.cached_set(queries['base'], refresh=refresh_sets)
+                fetched = store.populate(pmids)
+            except EutilsError as e:
+                print(f"Failed to build local sets for {block_name}: {e}")
+                all_results[block_name] = {stage: -1 for stage, _ in FILTER_STAGES}
+                continue
+            print(f"{block_name}: {len(pmids):,} PMIDs ({fetched:,} new metadata records)")
+            results = {stage: store.count(pmids, FILTER_CLAUSES[stage]) for stage, _ in FILTER_STAGES}
+            for stage, count in results.items():
+                cells[(block_name, stage)] = (queries[stage], count)
+            self.print_block_results(block_name, results)
+            all_results[block_name] = results
+
+        checks = cross_check_counts(cells, sample=cross_check, client=self.client, max_in_flight=self.max_in_flight)
+        for check in checks:
+            status = "OK" if check.matches else f"MISMATCH (live {check.live})" if check.error is None else f"ERROR ({check.error})"
+            print(f"Cross-check {check.key[0]} / {check.key[1]}: local {check.local:,} → {status}")
+        return all_results, checks
+
+    @staticmethod
+    def print_block_results(block_name: str, results: Dict[str, int]) -> None:
+        """1ブロック分のフィルター段階ごとの件数と削減率を表示"""
         print(f"\n{'='*60}")
         print(f"Analyzing: {block_name}")
         print(f"{'='*60}")
 
-        results = {}
-
-        # Base query (no filters)
-        base_query = f"({population}) AND ({block_query})"
         print(f"\n[1/7] Base query (no filters)...")
-        results['base'] = self.get_count(base_query)
         print(f"  → {results['base']:,} hits")
 
-        # Filter 1: Past 10 years
-        filter_10y = '("2015/01/01"[PDAT] : "3000"[PDAT])'
-        query_10y = f"{base_query} AND {filter_10y}"
-        print(f"\n[2/7] + Past 10 years filter...")
-        results['10years'] = self.get_count(query_10y)
-        reduction_10y = results['base'] - results['10years']
-        pct_10y = (reduction_10y / results['base'] * 100) if results['base'] > 0 else 0
-        print(f"  → {results['10years']:,} hits (-{reduction_10y:,}, -{pct_10y:.1f}%)")
-
-        # Filter 2: Animal exclusion
-        filter_animal = 'NOT (animals[Mesh] NOT humans[Mesh])'
-        query_animal = f"{base_query} {filter_animal}"
-        print(f"\n[3/7] + Animal exclusion...")
-        results['no_animal'] = self.get_count(query_animal)
-        reduction_animal = results['base'] - results['no_animal']
-        pct_animal = (reduction_animal / results['base'] * 100) if results['base'] > 0 else 0
-        print(f"  → {results['no_animal']:,} hits (-{reduction_animal:,}, -{pct_animal:.1f}%)")
-
-        # Filter 3: Both (10y + animal)
-        query_both = f"{base_query} AND {filter_10y} {filter_animal}"
-        print(f"\n[4/7] + Both (10y + animal)...")
-        results['10y_no_animal'] = self.get_count(query_both)
-        reduction_both = results['base'] - results['10y_no_animal']
-        pct_both = (reduction_both / results['base'] * 100) if results['base'] > 0 else 0
-        print(f"  → {results['10y_no_animal']:,} hits (-{reduction_both:,}, -{pct_both:.1f}%)")
-
-        # Filter 4: + Humans
-        filter_humans = 'AND Humans[Mesh]'
-        query_humans = f"{query_both} {filter_humans}"
-        print(f"\n[5/7] + Humans[Mesh]...")
-        results['with_humans'] = self.get_count(query_humans)
-        reduction_humans = results['10y_no_animal'] - results['with_humans']
-        pct_humans = (reduction_humans / results['10y_no_animal'] * 100) if results['10y_no_animal'] > 0 else 0
-        print(f"  → {results['with_humans']:,} hits (-{reduction_humans:,}, -{pct_humans:.1f}%)")
-
-        # Filter 5: + Language
-        filter_lang = 'AND (English[lang] OR Japanese[lang])'
-        query_lang = f"{query_humans} {filter_lang}"
-        print(f"\n[6/7] + Language (EN/JA)...")
-        results['with_lang'] = self.get_count(query_lang)
-        reduction_lang = results['with_humans'] - results['with_lang']
-        pct_lang = (reduction_lang / results['with_humans'] * 100) if results['with_humans'] > 0 else 0
-        print(f"  → {results['with_lang']:,} hits (-{reduction_lang:,}, -{pct_lang:.1f}%)")
-
-        # Filter 6: + Publication Type exclusion
-        filter_pubtype = 'NOT (Editorial[PT] OR Letter[PT] OR Comment[PT])'
-        query_pubtype = f"{query_lang} {filter_pubtype}"
-        print(f"\n[7/7] + Pub Type exclusion...")
-        results['with_pubtype'] = self.get_count(query_pubtype)
-        reduction_pubtype = results['with_lang'] - results['with_pubtype']
-        pct_pubtype = (reduction_pubtype / results['with_lang'] * 100) if results['with_lang'] > 0 else 0
-        print(f"  → {results['with_pubtype']:,} hits (-{reduction_pubtype:,}, -{pct_pubtype:.1f}%)")
+        # 各段階の削減率は FILTER_STAGES で定義した比較対象からの差分
+        total = len(FILTER_STAGES)
+        for step, (stage, label) in enumerate(FILTER_STAGES[1:], 2):
+            reference = results[_STAGE_REFERENCE[stage]]
+            reduction = reference - results[stage]
+            pct = (reduction / reference * 100) if reference > 0 else 0
+            print(f"\n[{step}/{total}] {label}...")
+            print(f"  → {results[stage]:,} hits (-{reduction:,}, -{pct:.1f}%)")
 
         # Summary
         total_reduction = results['base'] - results['with_pubtype']
@@ -140,12 +247,26 @@ class FilterImpactAnalyzer:
         print(f"                 (-{total_reduction:,}, -{total_pct:.1f}%)")
         print(f"{'─'*60}")
 
-        return results
-
-
 def main():
     """メイン処理"""
 
+    parser = argparse.ArgumentParser(description="各ブロックに対するフィルターの影響を分析します。")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='同時に実行するリクエスト数（既定: レート上限に合わせて自動）')
+    parser.add_argument('--local-filters', action='store_true',
+                        help='各ブロックのPMID集合とメタデータを取得して、フィルターを手元で評価する')
+    parser.add_argument('--metadata-dir', default=str(DEFAULT_METADATA_DIR),
+                        help=f'メタデータストアの保存先（既定: {DEFAULT_METADATA_DIR}）')
+    parser.add_argument('--cross-check', type=int, default=DEFAULT_CROSS_CHECK_SAMPLE,
+                        help=f'--local-filters のとき実際の件数と照合するセルの数（既定: {DEFAULT_CROSS_CHECK_SAMPLE}）')
+    parser.add_argument('--refresh-sets', action='store_true',
+                        help='--local-filters のとき保存済みのPMID集合を使わず取得し直す')
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
+
     # Population query (#1)
     population = '"Physicians"[Mesh] OR physician*[tiab] OR doctor*[tiab] OR "general practitioner*"[tiab] OR clinician*[tiab]'
 
@@ -172,22 +293,24 @@ def main():
         '#2J Task Significance': '"task significance"[tiab] OR "meaningful task*"[tiab] OR "work significance"[tiab]'
     }
 
-    analyzer = FilterImpactAnalyzer()
+    analyzer = FilterImpactAnalyzer(max_in_flight=args.max_in_flight)
 
-    all_results = {}
-
-    # 各ブロックを分析
-    for block_name, block_query in blocks.items():
-        results = analyzer.analyze_block_with_filters(population, block_query, block_name)
-        all_results[block_name] = results
-        time.sleep(1)  # ブロック間で少し待つ
+    cross_checks = None
+    if args.local_filters:
+        store = PmidMetadataStore.load(args.metadata_dir)
+        all_results, cross_checks = analyzer.analyze_blocks_locally(
+            population, blocks, store, cross_check=args.cross_check, refresh_sets=args.refresh_sets
+        )
+    else:
+        # 全ブロック × 全フィルターを並列に分析
+        all_results = analyzer.analyze_blocks_with_filters(population, blocks)
 
     # マークダウンレポート生成
     print("\n\n" + "="*80)
     print("GENERATING MARKDOWN REPORT")
     print("="*80)
 
-    report = generate_markdown_report(all_results, blocks)
+    report = generate_markdown_report(all_results, blocks, cross_checks=cross_checks)
 
     # 出力
     output_dir = r'c:\Users\youki\codes\search-formula-developper\search_formula\yarigai_scoping_review'
@@ -199,8 +322,12 @@ def main():
     print(f"\nReport saved to: {output_file}")
 
 
-def generate_markdown_report(all_results: Dict[str, Dict[str, int]], blocks: Dict[str, str]) -> str:
-    """マークダウンレポートを生成"""
+def generate_markdown_report(
+    all_results: Dict[str, Dict[str, int]],
+    blocks: Dict[str, str],
+    cross_checks: Optional[List[CrossCheck]] = None,
+) -> str:
+    """マークダウンレポートを生成（cross_checks があれば手元の件数と実際の件数の照合を加える）"""
 
     lines = []
     lines.append("# フィルター効果分析レポート")
@@ -325,6 +452,19 @@ def generate_markdown_report(all_results: Dict[str, Dict[str, int]], blocks: Dic
     lines.append("- **Aggressive (積極的)**: 上記 + PubType除外 → 約Z%削減")
     lines.append("")
 
+    if cross_checks is not None:
+        lines.append("## 件数の照合（メタデータストア vs PubMed）")
+        lines.append("")
+        lines.append("件数はメタデータストアで手元で数えた値。一部のセルを実際の検索件数と照合した結果:")
+        lines.append("")
+        lines.append("| Block | Stage | Local | PubMed | Result |")
+        lines.append("|-------|-------|-------|--------|--------|")
+        for check in cross_checks:
+            live = f"{check.live:,}" if check.live is not None else "ERROR"
+            result = "✓" if check.matches else (check.error or f"{check.local - check.live:+,}")
+            lines.append(f"| {check.key[0]} | {check.key[1]} | {check.local:,} | {live} | {result} |")
+        lines.append("")
+
     return "\n".join(lines)
 
 
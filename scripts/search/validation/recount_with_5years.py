@@ -1,62 +1,60 @@
 #!/usr/bin/env python3
 """
 過去5年フィルターでの件数を再測定
+
+同じ行列は設定ファイルから集計できる（新しい分析は設定ファイルを追加する）:
+    python scripts/search/validation/run_filter_matrix.py --spec scripts/search/validation/specs/five_years.yaml -o <出力先>
+（--local-periods を付けると期間の列はブロックごとの出版年インデックスから手元で数える）
 """
 
-import requests
+import argparse
+import sys
 import time
-import xml.etree.ElementTree as ET
 from typing import Dict
 import os
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    EutilsClient,
+    EutilsError,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    get_client,
+    get_count_cache,
+)
 
 
 class RecountAnalyzer:
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.environ.get('NCBI_API_KEY')
-        self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        self.delay = 0.34 if self.api_key else 0.5
-
-    def get_count(self, query: str, retries: int = 3) -> int:
-        """PubMed検索のヒット件数を取得"""
-        params = {
-            'db': 'pubmed',
-            'term': query,
-            'retmode': 'xml',
-            'retmax': 0
-        }
-
-        if self.api_key:
-            params['api_key'] = self.api_key
-
-        for attempt in range(retries):
-            try:
-                time.sleep(self.delay)
-                response = requests.get(self.base_url, params=params, timeout=30)
-                response.raise_for_status()
+        # レート制御とリトライは共通クライアントが行う
+        self.client = get_client() if api_key is None else EutilsClient(api_key=api_key, count_cache=get_count_cache())
 
-                root = ET.fromstring(response.content)
-                count_elem = root.find('.//Count')
-
-                if count_elem is not None:
-                    return int(count_elem.text)
-                else:
-                    print(f"Warning: No count found for query: {query[:100]}...")
-                    return 0
-
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{retries} failed: {e}")
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    print(f"Failed to get count for query: {query[:100]}...")
-                    return -1
-
-        return -1
+    def get_count(self, query: str) -> int:
+        """PubMed検索のヒット件数を取得（失敗時は -1）"""
+        try:
+            return self.client.count(query)
+        except EutilsError as e:
+            print(f"Failed to get count for query: {query[:100]}... ({e})")
+            return -1
 
 
 def main():
     """メイン処理"""
 
+    parser = argparse.ArgumentParser(description="10年/5年フィルターで各ブロックの件数を再集計します。")
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
+
     # 修正した#1 (医師のみ)
     population = (
         '"Physicians"[Mesh] OR physician*[tiab] OR doctor*[tiab] OR '
@@ -155,8 +153,6 @@ def main():
             'pct': pct
         }
 
-        time.sleep(0.5)
-
     # レポート生成
     print("\n\n" + "="*80)
     print("GENERATING MARKDOWN REPORT")
@@ -1,62 +1,80 @@
 #!/usr/bin/env python3
 """
 修正した#1（医師のみ）で各#2ブロックの件数を再測定
+
+同じ行列は設定ファイルから集計できる（新しい分析は設定ファイルを追加する）:
+    python scripts/search/validation/run_filter_matrix.py --spec scripts/search/validation/specs/narrow_population.yaml -o <出力先>
 """
 
-import requests
+import argparse
+import sys
 import time
-import xml.etree.ElementTree as ET
 from typing import Dict
 import os
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    EutilsClient,
+    EutilsError,
+    HistoryEngine,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    combine,
+    get_client,
+    get_count_cache,
+)
 
 
 class RecountAnalyzer:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, use_history: bool = False):
         self.api_key = api_key or os.environ.get('NCBI_API_KEY')
-        self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        self.delay = 0.34 if self.api_key else 0.5
-
-    def get_count(self, query: str, retries: int = 3) -> int:
-        """PubMed検索のヒット件数を取得"""
-        params = {
-            'db': 'pubmed',
-            'term': query,
-            'retmode': 'xml',
-            'retmax': 0
-        }
-
-        if self.api_key:
-            params['api_key'] = self.api_key
-
-        for attempt in range(retries):
-            try:
-                time.sleep(self.delay)
-                response = requests.get(self.base_url, params=params, timeout=30)
-                response.raise_for_status()
-
-                root = ET.fromstring(response.content)
-                count_elem = root.find('.//Count')
-
-                if count_elem is not None:
-                    return int(count_elem.text)
-                else:
-                    print(f"Warning: No count found for query: {query[:100]}...")
-                    return 0
-
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{retries} failed: {e}")
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    print(f"Failed to get count for query: {query[:100]}...")
-                    return -1
-
-        return -1
+        # レート制御とリトライは共通クライアントが行う
+        self.client = get_client() if api_key is None else EutilsClient(api_key=api_key, count_cache=get_count_cache())
+        # use_history=True では #1・フィルター・各ブロックを履歴に1回ずつ登録し、組み合わせは #n AND #m で数える
+        # （履歴の登録は件数キャッシュを通らない）
+        self.history = HistoryEngine(self.client) if use_history else None
+
+    def get_count(self, query: str) -> int:
+        """PubMed検索のヒット件数を取得（失敗時は -1）"""
+        try:
+            return self.client.count(query)
+        except EutilsError as e:
+            print(f"Failed to get count for query: {query[:100]}... ({e})")
+            return -1
+
+    def count_and(self, *queries: str) -> int:
+        """検索式をすべてANDした件数を取得（失敗時は -1）"""
+        if self.history is None:
+            return self.get_count(" AND ".join(f"({query})" for query in queries))
+        node = combine("AND", [self.history.term(query) for query in queries])
+        try:
+            return self.history.count(node)
+        except (EutilsError, ValueError) as e:
+            print(f"Failed to get count for combination: {self.history.expression(node)[:100]}... ({e})")
+            return -1
 
 
 def main():
     """メイン処理"""
 
+    parser = argparse.ArgumentParser(description="狭めた#1（医師のみ）で各ブロックの件数を再集計します。")
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="組み合わせを履歴参照（#n AND #m）で数える（既定は全文を検索し、件数キャッシュを使う）",
+    )
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
+
     # 修正した#1 (医師のみ)
     population_new = '"Physicians"[Mesh] OR physician*[tiab]'
 
@@ -89,7 +107,7 @@ def main():
         '#2J Task Significance': '"task significance"[tiab] OR "meaningful task*"[tiab] OR "work significance"[tiab]'
     }
 
-    analyzer = RecountAnalyzer()
+    analyzer = RecountAnalyzer(use_history=args.history)
 
     results = {}
 
@@ -101,15 +119,13 @@ def main():
     print("\n")
 
     # まず修正後の#1単独の件数
-    query_pop_new = f"({population_new}) AND {filters}"
     print(f"修正後の#1単独の件数を測定中...")
-    count_pop_new = analyzer.get_count(query_pop_new)
+    count_pop_new = analyzer.count_and(population_new, filters)
     print(f"  → {count_pop_new:,} hits\n")
 
     # 比較用：元の#1単独の件数
-    query_pop_old = f"({population_old}) AND {filters}"
     print(f"元の#1単独の件数を測定中...")
-    count_pop_old = analyzer.get_count(query_pop_old)
+    count_pop_old = analyzer.count_and(population_old, filters)
     print(f"  → {count_pop_old:,} hits")
 
     reduction_pop = count_pop_old - count_pop_new
@@ -125,13 +141,11 @@ def main():
         print("-" * 60)
 
         # 修正後の#1 AND ブロック
-        query_new = f"({population_new}) AND {filters} AND ({block_query})"
-        count_new = analyzer.get_count(query_new)
+        count_new = analyzer.count_and(population_new, filters, block_query)
         print(f"  修正後: {count_new:,} hits")
 
         # 元の#1 AND ブロック（比較用）
-        query_old = f"({population_old}) AND {filters} AND ({block_query})"
-        count_old = analyzer.get_count(query_old)
+        count_old = analyzer.count_and(population_old, filters, block_query)
         print(f"  元の値: {count_old:,} hits")
 
         # 削減
@@ -146,8 +160,6 @@ def main():
             'pct': pct
         }
 
-        time.sleep(0.5)
-
     # レポート生成
     print("\n\n" + "="*80)
     print("GENERATING MARKDOWN REPORT")
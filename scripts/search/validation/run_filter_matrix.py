@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+設定ファイルで定義したフィルター行列（Population × ブロック × フィルター × 期間）の件数を集計する
+
+前回の出力（<output>.json）があれば、同じ検索式のセルは再検索しない（--force で全セルを再検索）。
+--local-periods を付けると、年単位の期間（"2021"[PDAT] : "3000"[PDAT] など）のセルは
+(Population) AND (ブロック) ごとにPMIDと出版年を1回だけ取得して保存し、手元で数える。
+期間の列を追加しても、保存済みのインデックスから数えるため通信は発生しない。
+条件のあるフィルター段階は --local-filters を併用するとメタデータストアで手元で評価し、
+併用しなければ通常の検索になる。
+設定ファイルの書式は scripts/eutils/filter_matrix.py、例は scripts/search/validation/specs/ を参照。
+
+Usage:
+    python scripts/search/validation/run_filter_matrix.py \
+        --spec scripts/search/validation/specs/filter_impact.yaml \
+        -o search_formula/yarigai_scoping_review/filter_impact_analysis
+
+    python scripts/search/validation/run_filter_matrix.py --local-periods \
+        --spec scripts/search/validation/specs/block_totals_by_period.yaml -o tests/block_totals_by_period
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    DEFAULT_METADATA_DIR,
+    DEFAULT_YEAR_INDEX_DIR,
+    FilterMatrixSpec,
+    PmidMetadataStore,
+    YearIndexStore,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    load_previous_counts,
+    run_filter_matrix,
+)
+
+
+def main():
+    """メイン処理"""
+
+    parser = argparse.ArgumentParser(description="設定ファイルで定義したフィルター行列の件数を集計します。")
+    parser.add_argument('--spec', required=True, help='行列の設定ファイル（.yaml / .yml / .json）')
+    parser.add_argument('-o', '--output', required=True,
+                        help='出力先（拡張子なし。<output>.md と <output>.json を保存）')
+    parser.add_argument('--force', action='store_true', help='前回の結果を使わず、すべてのセルを再検索する')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='同時に実行するリクエスト数（既定: レート上限に合わせて自動）')
+    parser.add_argument('--local-periods', action='store_true',
+                        help='年単位の期間はブロックごとの出版年インデックスから手元で数える')
+    parser.add_argument('--year-index-dir', default=str(DEFAULT_YEAR_INDEX_DIR),
+                        help=f'出版年インデックスの保存先（既定: {DEFAULT_YEAR_INDEX_DIR}）')
+    parser.add_argument('--local-filters', action='store_true',
+                        help='--local-periods のセルのフィルター段階もメタデータストアで手元で評価する'
+                             '（指定しなければ条件のある段階は通常の検索）')
+    parser.add_argument('--metadata-dir', default=str(DEFAULT_METADATA_DIR),
+                        help=f'メタデータストアの保存先（既定: {DEFAULT_METADATA_DIR}）')
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
+
+    spec = FilterMatrixSpec.load(args.spec)
+    output = Path(args.output)
+    if output.suffix in ('.md', '.json'):
+        output = output.with_suffix('')
+    previous = {} if args.force else load_previous_counts(output.with_name(output.name + '.json'))
+
+    cells = spec.cells()
+    print(f"{spec.name}: {len(cells)} cells "
+          f"({len(spec.populations)} populations × {len(spec.periods)} periods × "
+          f"{len(spec.row_blocks)} blocks × {len(spec.filters)} filters)")
+
+    def progress(done: int, total: int, result) -> None:
+        status = f"{result.count:,}" if result.success else f"ERROR ({result.error})"
+        print(f"  [{done}/{total}] {status}")
+
+    year_store = YearIndexStore(args.year_index_dir, refresh=args.force) if args.local_periods else None
+    metadata_store = PmidMetadataStore.load(args.metadata_dir) if args.local_periods and args.local_filters else None
+    result = run_filter_matrix(spec, previous=previous, max_in_flight=args.max_in_flight,
+                               progress=progress, year_store=year_store, metadata_store=metadata_store)
+    print(f"Reused {result.reused} cells from the previous run, searched {len(cells) - result.reused - result.local}.")
+    if year_store is not None:
+        print(f"Counted {result.local} cells from year indexes ({year_store.fetched} fetched, "
+              f"saved in {year_store.directory}).")
+
+    markdown_path, json_path = result.save(output)
+    print(f"\nReport saved to: {markdown_path}")
+    print(f"Counts saved to: {json_path}")
+    if result.errors:
+        print(f"[WARN] {len(result.errors)} cells failed (rerun to retry only those cells).")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,22 @@
 #!/usr/bin/env python3
 """Majr限定テスト - シンプル版"""
-import requests
-import time
-import xml.etree.ElementTree as ET
-import os
+import sys
+from pathlib import Path
 
-api_key = os.environ.get('NCBI_API_KEY')
-base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client  # noqa: E402
 
 def get_count(query):
-    params = {'db': 'pubmed', 'term': query, 'retmode': 'xml', 'retmax': 0}
-    if api_key:
-        params['api_key'] = api_key
-    time.sleep(0.4)
     try:
-        r = requests.get(base_url, params=params, timeout=30)
-        root = ET.fromstring(r.content)
-        count = root.find('.//Count')
-        return int(count.text) if count is not None else 0
-    except Exception as e:
+        return get_client().count(query)
+    except EutilsError as e:
         print(f"Error: {e}")
         return -1
 
+
 # 検索式
 block1_mesh = '"Faculty, Medical"[Mesh] OR medical faculty[tiab] OR clinical educator*[tiab] OR clinician educator*[tiab] OR medical educator*[tiab] OR clinical teacher*[tiab] OR clinical teaching[tiab]'
 block1_majr = '"Faculty, Medical"[Majr] OR medical faculty[tiab] OR clinical educator*[tiab] OR clinician educator*[tiab] OR medical educator*[tiab] OR clinical teacher*[tiab] OR clinical teaching[tiab]'
@@ -6,14 +6,32 @@ PubMed検索式 #2ブロック（Intervention）の各要素を検証するス
 - #2の各要素のヒット数を測定
 - シード論文がどの要素でマッチするか確認
 - 削除可能な要素を特定
+
+件数の部分（単独・#1 AND 要素・要素を除いた#3）は設定ファイルから集計できる:
+    python scripts/search/validation/run_filter_matrix.py --spec scripts/search/validation/specs/block2_elements.yaml -o <出力先>
 """
 
-import requests
-import time
-import xml.etree.ElementTree as ET
+import argparse
+import sys
 from typing import Dict, List, Tuple
 import os
 from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    EutilsClient,
+    EutilsError,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    get_client,
+    get_count_cache,
+)
 
 
 class PubMedAnalyzer:
@@ -21,49 +39,16 @@ class PubMedAnalyzer:
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.environ.get('NCBI_API_KEY')
-        self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-        self.delay = 0.34 if self.api_key else 0.5
-
-    def get_count(self, query: str, retries: int = 3) -> int:
-        """PubMed検索のヒット件数を取得"""
-        params = {
-            'db': 'pubmed',
-            'term': query,
-            'retmode': 'xml',
-            'retmax': 0
-        }
-
-        if self.api_key:
-            params['api_key'] = self.api_key
-
-        for attempt in range(retries):
-            try:
-                time.sleep(self.delay)
-                response = requests.get(
-                    f"{self.base_url}/esearch.fcgi",
-                    params=params,
-                    timeout=30
-                )
-                response.raise_for_status()
-
-                root = ET.fromstring(response.content)
-                count_elem = root.find('.//Count')
-
-                if count_elem is not None:
-                    return int(count_elem.text)
-                else:
-                    print(f"Warning: No count found for query: {query[:80]}...")
-                    return 0
-
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{retries} failed: {e}")
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    print(f"Failed to get count for query: {query[:80]}...")
-                    return -1
-
-        return -1
+        # レート制御とリトライは共通クライアントが行う
+        self.client = get_client() if api_key is None else EutilsClient(api_key=api_key, count_cache=get_count_cache())
+
+    def get_count(self, query: str) -> int:
+        """PubMed検索のヒット件数を取得（失敗時は -1）"""
+        try:
+            return self.client.count(query)
+        except EutilsError as e:
+            print(f"Failed to get count for query: {query[:80]}... ({e})")
+            return -1
 
     def check_pmid_match(self, query: str, pmid: str) -> bool:
         """指定したPMIDが検索式にマッチするか確認"""
@@ -75,6 +60,13 @@ class PubMedAnalyzer:
 def main():
     """メイン処理"""
 
+    parser = argparse.ArgumentParser(description="#2ブロックの各要素の件数とシード論文の捕捉状況を確認します。")
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
+    args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
+
     # #1ブロック（Population - 対象者）
     block1 = (
         '"Faculty, Medical"[Mesh] OR medical faculty[tiab] OR '
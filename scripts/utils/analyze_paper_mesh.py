@@ -2,12 +2,43 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import requests
-import time
 import json
 import os
+import sys
 from datetime import datetime
-from typing import Dict, List, Set, Optional
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, Optional, Union
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import PubmedRecord, iter_article_xml, parse_pubmed_record  # noqa: E402
+
+def iter_paper_details(pmids: List[str]) -> Iterator[Dict]:
+    """
+    複数の論文の詳細情報（書誌情報）を最大500件ずつまとめて取得し、1件ずつ返す
+
+    Args:
+        pmids: 論文のPMIDのリスト
+
+    Returns:
+        Iterator[Dict]: 論文ごとの詳細情報（``get_paper_details`` と同じ形式）
+    """
+    for article in iter_article_xml(pmids):
+        if article.ok:
+            yield {
+                'pmid': article.pmid,
+                'record': article.record,
+                'status': 'success'
+            }
+        else:
+            yield {
+                'pmid': article.pmid,
+                'record': None,
+                'status': 'error',
+                'message': article.error
+            }
 
 def get_paper_details(pmid: str) -> Dict:
     """
@@ -19,155 +50,58 @@ def get_paper_details(pmid: str) -> Dict:
     Returns:
         Dict: 論文の詳細情報
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    fetch_url = f"{base_url}/efetch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'id': pmid,
-        'retmode': 'xml'
-    }
-    
-    try:
-        response = requests.get(fetch_url, params=params)
-        response.raise_for_status()
-        return {
-            'pmid': pmid,
-            'xml': response.text,
-            'status': 'success'
-        }
-    except requests.exceptions.RequestException as e:
-        return {
-            'pmid': pmid,
-            'xml': None,
-            'status': 'error',
-            'message': str(e)
-        }
+    return next(iter_paper_details([pmid]))
 
-def extract_mesh_terms(xml_data: str) -> List[Dict]:
+def _as_record(xml_data: Union[str, PubmedRecord, None]) -> Optional[PubmedRecord]:
+    """XMLなら解析し、解析済みの書誌情報ならそのまま返す"""
+    if isinstance(xml_data, PubmedRecord):
+        return xml_data
+    return parse_pubmed_record(xml_data)
+
+def extract_mesh_terms(xml_data: Union[str, PubmedRecord, None]) -> List[Dict]:
     """
     XMLデータからMeSH用語を抽出する
     
     Args:
-        xml_data: PubMed論文のXMLデータ
+        xml_data: PubMed論文のXMLデータ（または ``parse_pubmed_record`` の結果）
         
     Returns:
         List[Dict]: MeSH用語のリスト
     """
-    from bs4 import BeautifulSoup
-    
-    mesh_terms = []
-    
-    if not xml_data:
-        return mesh_terms
-    
-    soup = BeautifulSoup(xml_data, 'lxml')
-    
-    # MeSH用語の抽出
-    mesh_headings = soup.find_all('meshheading')
-    
-    for heading in mesh_headings:
-        descriptor = heading.find('descriptorname')
-        
-        if descriptor:
-            # 修飾語の抽出
-            qualifiers = []
-            for qualifier in heading.find_all('qualifiername'):
-                qualifier_name = qualifier.text
-                major_topic = qualifier.get('majortopicyn', 'N') == 'Y'
-                qualifiers.append({
-                    'name': qualifier_name,
-                    'major_topic': major_topic
-                })
-            
-            # 主要トピックかどうか
-            major_topic = descriptor.get('majortopicyn', 'N') == 'Y'
-            
-            mesh_terms.append({
-                'descriptor': descriptor.text,
-                'major_topic': major_topic,
-                'qualifiers': qualifiers
-            })
-    
-    return mesh_terms
+    record = _as_record(xml_data)
+    return record.mesh_terms if record else []
 
-def extract_title_abstract(xml_data: str) -> Dict:
+def extract_title_abstract(xml_data: Union[str, PubmedRecord, None]) -> Dict:
     """
     XMLデータからタイトルと抄録を抽出する
     
     Args:
-        xml_data: PubMed論文のXMLデータ
+        xml_data: PubMed論文のXMLデータ（または ``parse_pubmed_record`` の結果）
         
     Returns:
         Dict: タイトルと抄録
     """
-    from bs4 import BeautifulSoup
-    
-    if not xml_data:
-        return {'title': '', 'abstract': ''}
-    
-    soup = BeautifulSoup(xml_data, 'lxml')
-    
-    # タイトルの抽出
-    title_element = soup.find('articletitle')
-    title = title_element.text if title_element else ''
-    
-    # 抄録の抽出
-    abstract_texts = soup.find_all('abstracttext')
-    abstract = ' '.join([text.text for text in abstract_texts]) if abstract_texts else ''
-    
+    record = _as_record(xml_data)
     return {
-        'title': title,
-        'abstract': abstract
+        'title': record.title if record else '',
+        'abstract': record.abstract if record else ''
     }
 
-def extract_publication_info(xml_data: str) -> Dict:
+def extract_publication_info(xml_data: Union[str, PubmedRecord, None]) -> Dict:
     """
     XMLデータから出版情報を抽出する
     
     Args:
-        xml_data: PubMed論文のXMLデータ
+        xml_data: PubMed論文のXMLデータ（または ``parse_pubmed_record`` の結果）
         
     Returns:
         Dict: 出版情報
     """
-    from bs4 import BeautifulSoup
-    
-    if not xml_data:
-        return {
-            'journal': '',
-            'year': '',
-            'authors': []
-        }
-    
-    soup = BeautifulSoup(xml_data, 'lxml')
-    
-    # ジャーナル名の抽出
-    journal_element = soup.find('journal')
-    journal = journal_element.find('title').text if journal_element and journal_element.find('title') else ''
-    
-    # 出版年の抽出
-    pub_date = soup.find('pubdate')
-    year = pub_date.find('year').text if pub_date and pub_date.find('year') else ''
-    
-    # 著者の抽出
-    authors = []
-    author_list = soup.find('authorlist')
-    
-    if author_list:
-        for author in author_list.find_all('author'):
-            last_name = author.find('lastname')
-            fore_name = author.find('forename')
-            
-            if last_name and fore_name:
-                authors.append(f"{last_name.text} {fore_name.text}")
-            elif last_name:
-                authors.append(last_name.text)
-    
+    record = _as_record(xml_data)
     return {
-        'journal': journal,
-        'year': year,
-        'authors': authors
+        'journal': record.journal if record else '',
+        'year': record.year if record else '',
+        'authors': list(record.authors) if record else []
     }
 
 def analyze_mesh_coverage(paper_mesh_terms: List[Dict], search_mesh_terms: List[str]) -> Dict:
@@ -254,24 +188,26 @@ def main():
     # 論文の分析
     print(f"\n=== {len(pmids)}件の組入論文のMeSH用語分析を開始... ===")
     
-    for pmid in pmids:
+    # 論文の詳細情報はまとめて取得する
+    for paper_details in iter_paper_details(pmids):
+        pmid = paper_details['pmid']
         print(f"\nPMID: {pmid}の分析中...")
         
-        # 論文の詳細情報を取得
-        paper_details = get_paper_details(pmid)
-        
         if paper_details['status'] == 'error':
             print(f"エラー: {paper_details['message']}")
             continue
         
+        # 取得時に1回だけ解析した書誌情報を使う
+        record = paper_details['record']
+        
         # MeSH用語の抽出
-        mesh_terms = extract_mesh_terms(paper_details['xml'])
+        mesh_terms = extract_mesh_terms(record)
         
         # タイトルと抄録の抽出
-        title_abstract = extract_title_abstract(paper_details['xml'])
+        title_abstract = extract_title_abstract(record)
         
         # 出版情報の抽出
-        pub_info = extract_publication_info(paper_details['xml'])
+        pub_info = extract_publication_info(record)
         
         # MeSHカバレッジの分析
         coverage = analyze_mesh_coverage(mesh_terms, all_search_mesh_terms)
@@ -312,9 +248,6 @@ def main():
             results['summary']['papers_with_matching_mesh'] += 1
         else:
             results['summary']['papers_without_matching_mesh'] += 1
-        
-        # API制限を考慮して少し待機
-        time.sleep(1)
     
     # 追加検討候補のMeSH用語の集計
     all_missing_terms = []
@@ -1,33 +1,28 @@
-import requests
-import time
+import sys
+from pathlib import Path
 from typing import Dict, List
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client  # noqa: E402
+
 def get_pubmed_count(query: str) -> Dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数を取得する
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        result = get_client().esearch(query, retmax=20)
         
         return {
-            'count': int(data['esearchresult'].get('count', 0)),
-            'ids': data['esearchresult'].get('idlist', []),
+            'count': int(result['count']),
+            'ids': result.get('idlist', []),
             'query': query,
             'message': 'Success'
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'count': 0,
             'ids': [],
@@ -35,6 +30,7 @@ def get_pubmed_count(query: str) -> Dict:
             'message': f'Error: {str(e)}'
         }
 
+
 def analyze_paper(pmid: str) -> None:
     """
     論文の各検索条件への合致を分析する
@@ -95,7 +91,6 @@ def analyze_paper(pmid: str) -> None:
     for block_name, terms in blocks.items():
         print(f"\n{block_name}ブロック:")
         for term in terms:
-            time.sleep(1)  # API制限を考慮
             query = f"{pmid}[uid] AND ({term})"
             result = get_pubmed_count(query)
             match = "○" if result['count'] > 0 else "×"
@@ -9,36 +9,30 @@ DOIまたはタイトルからPMIDを検索するスクリプト
     python scripts/utils/find_pmid_from_doi.py --author "Steger MF" --title "meaningful work"
 """
 
-import requests
-import time
 import argparse
 import sys
+from pathlib import Path
 from typing import Optional, Dict, List
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import get_client  # noqa: E402
+
 # Windows環境での文字化け対策
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
 def search_by_doi(doi: str) -> Optional[str]:
     """DOIからPMIDを検索"""
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-
     # DOIの正規化（https://doi.org/ を除去）
     clean_doi = doi.replace("https://doi.org/", "").replace("http://doi.org/", "")
 
-    params = {
-        "db": "pubmed",
-        "term": f"{clean_doi}[DOI]",
-        "retmode": "json",
-        "retmax": 1
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().esearch(f"{clean_doi}[DOI]", retmax=1, strict=False)
 
-        id_list = data.get("esearchresult", {}).get("idlist", [])
+        id_list = data.get("idlist", [])
         if id_list:
             return id_list[0]
         return None
@@ -48,8 +42,6 @@ def search_by_doi(doi: str) -> Optional[str]:
 
 def search_by_title_author(title: Optional[str] = None, author: Optional[str] = None, year: Optional[str] = None) -> List[Dict]:
     """タイトルと著者からPMIDを検索"""
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-
     # 検索クエリの構築
     query_parts = []
     if title:
@@ -64,24 +56,14 @@ def search_by_title_author(title: Optional[str] = None, author: Optional[str] =
 
     query = " AND ".join(query_parts)
 
-    params = {
-        "db": "pubmed",
-        "term": query,
-        "retmode": "json",
-        "retmax": 5  # 上位5件を取得
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().esearch(query, retmax=5, strict=False)  # 上位5件を取得
 
-        id_list = data.get("esearchresult", {}).get("idlist", [])
+        id_list = data.get("idlist", [])
         if not id_list:
             return []
 
         # PMIDの詳細情報を取得
-        time.sleep(0.34)  # API rate limit
         return get_paper_details(id_list)
     except Exception as e:
         print(f"Error searching by title/author: {e}")
@@ -89,23 +71,13 @@ def search_by_title_author(title: Optional[str] = None, author: Optional[str] =
 
 def get_paper_details(pmids: List[str]) -> List[Dict]:
     """PMIDから論文の詳細情報を取得"""
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
-
-    params = {
-        "db": "pubmed",
-        "id": ",".join(pmids),
-        "retmode": "json"
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        summaries = get_client().esummary(db="pubmed", ids=pmids)
 
         results = []
         for pmid in pmids:
-            if pmid in data.get("result", {}):
-                paper = data["result"][pmid]
+            if pmid in summaries:
+                paper = summaries[pmid]
                 results.append({
                     "pmid": pmid,
                     "title": paper.get("title", ""),
@@ -138,7 +110,6 @@ def main():
         if pmid:
             print(f"✓ PMID見つかりました: {pmid}")
             # 詳細情報を取得
-            time.sleep(0.34)
             details = get_paper_details([pmid])
             if details:
                 paper = details[0]
@@ -16,13 +16,28 @@ Biopythonを使用した検索式検証ツール
 import os
 import re
 import sys
-import time
 import json
 import argparse
 import logging
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Set, Tuple, Any, Optional
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    add_cassette_arguments,
+    apply_cassette_arguments,
+    build_capture_matrix,
+    check_seed_inclusion,
+    format_capture_summary,
+    get_client,
+    get_coalescer,
+    iter_pubmed_records,
+)
+
 try:
     from Bio import Entrez
 except ImportError:
@@ -38,9 +53,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("biopython_validator")
 
-# NCBIのAPIリクエスト間の待機時間（秒）
-API_DELAY = 0.34  # NCBIの制限：3リクエスト/秒
-
 class SearchFormulaParser:
     """検索式ファイル（MDファイル）からMeSH用語、キーワード、PMIDを抽出するパーサー"""
     
@@ -176,17 +188,15 @@ class PubMedQueryExecutor:
             email: Entrez APIに提供するemail
         """
         Entrez.email = email
-        self.last_request_time = 0
+        api_key = os.getenv("NCBI_API_KEY")
+        if api_key:
+            Entrez.api_key = api_key
+        self.client = get_client()
+        self.rate_limiter = self.client.rate_limiter
     
     def _wait_for_api_limit(self):
-        """API制限を考慮して待機"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < API_DELAY:
-            time.sleep(API_DELAY - time_since_last_request)
-        
-        self.last_request_time = time.time()
+        """プロセス共通のレートリミッターでAPI制限を守る"""
+        self.rate_limiter.acquire()
     
     def execute_query(self, query: str) -> Dict[str, Any]:
         """
@@ -198,24 +208,14 @@ class PubMedQueryExecutor:
         Returns:
             Dict: 検索結果
         """
-        self._wait_for_api_limit()
-        
         try:
-            # Entrez.esearchを使用してクエリを実行
-            handle = Entrez.esearch(db="pubmed", term=query, retmax=0)
-            record = Entrez.read(handle)
-            handle.close()
+            # 件数とIDを1回のesearchで取得する。同じ検索式は共有クライアントで合流されるため、
+            # validate_terms / validate_papers / 非包含分析の重複クエリはHTTP呼び出し1回で済む
+            record = self.client.esearch(query, retmax=10000, strict=False)
+            count = int(record["count"])
             
-            count = int(record["Count"])
-            
-            # IDリストが必要な場合は別のリクエストで取得（大量の場合は分割取得）
-            ids = []
-            if count > 0 and count <= 10000:  # 10000件を超える場合は処理が重くなるため制限
-                self._wait_for_api_limit()
-                handle = Entrez.esearch(db="pubmed", term=query, retmax=min(count, 10000))
-                record = Entrez.read(handle)
-                ids = record["IdList"]
-                handle.close()
+            # 10000件を超える場合は処理が重くなるためIDは返さない
+            ids = list(record.get("idlist", [])) if 0 < count <= 10000 else []
             
             return {
                 'count': count,
@@ -244,74 +244,9 @@ class PubMedQueryExecutor:
         Returns:
             Dict: 論文の詳細情報
         """
-        self._wait_for_api_limit()
-        
         try:
-            handle = Entrez.efetch(db="pubmed", id=pmid, retmode="xml")
-            records = Entrez.read(handle)
-            handle.close()
-            
-            # 必要な情報を抽出
-            article = records['PubmedArticle'][0]
-            
-            # MeSH用語の抽出
-            mesh_terms = []
-            if 'MeshHeadingList' in article['MedlineCitation']:
-                for mesh_heading in article['MedlineCitation']['MeshHeadingList']:
-                    descriptor = mesh_heading['DescriptorName']
-                    term = descriptor.attributes['UI'] + ': ' + descriptor
-                    
-                    # MajorTopicYNの取得
-                    is_major = descriptor.attributes.get('MajorTopicYN', 'N') == 'Y'
-                    
-                    # 修飾語（Qualifier）の取得
-                    qualifiers = []
-                    if 'QualifierName' in mesh_heading:
-                        for qualifier in mesh_heading['QualifierName']:
-                            qualifier_text = qualifier.attributes['UI'] + ': ' + qualifier
-                            qualifier_major = qualifier.attributes.get('MajorTopicYN', 'N') == 'Y'
-                            qualifiers.append({
-                                'name': qualifier_text,
-                                'major_topic': qualifier_major
-                            })
-                    
-                    mesh_terms.append({
-                        'descriptor': term,
-                        'major_topic': is_major,
-                        'qualifiers': qualifiers
-                    })
-            
-            # 基本情報の抽出
-            article_title = article['MedlineCitation']['Article'].get('ArticleTitle', '')
-            
-            # 著者の抽出
-            authors = []
-            if 'AuthorList' in article['MedlineCitation']['Article']:
-                for author in article['MedlineCitation']['Article']['AuthorList']:
-                    if 'LastName' in author and 'ForeName' in author:
-                        authors.append(f"{author['LastName']} {author['ForeName']}")
-                    elif 'LastName' in author:
-                        authors.append(author['LastName'])
-                    elif 'CollectiveName' in author:
-                        authors.append(author['CollectiveName'])
-            
-            # ジャーナル情報
-            journal = article['MedlineCitation']['Article']['Journal'].get('Title', '')
-            
-            # 出版年
-            pub_date = article['MedlineCitation']['Article']['Journal']['JournalIssue']['PubDate']
-            year = pub_date.get('Year', '')
-            
-            return {
-                'pmid': pmid,
-                'title': article_title,
-                'authors': authors,
-                'journal': journal,
-                'year': year,
-                'mesh_terms': mesh_terms,
-                'status': 'success'
-            }
-            
+            coalescer = self.client.coalescer or get_coalescer()
+            return coalescer.run(("entrez.efetch", "pubmed", pmid), lambda: self._fetch_paper_details(pmid))
         except Exception as e:
             logger.error(f"論文詳細取得エラー: {str(e)}")
             return {
@@ -319,6 +254,39 @@ class PubMedQueryExecutor:
                 'status': 'error',
                 'message': str(e)
             }
+    
+    def _fetch_paper_details(self, pmid: str) -> Dict[str, Any]:
+        """efetch（XML）で論文情報を取得し、1回の走査で整形する（失敗時は例外を送出）"""
+        xml_data = self.client.efetch_bytes(db="pubmed", ids=[pmid], retmode="xml")
+        record = next(iter_pubmed_records(xml_data), None)
+        if record is None:
+            raise ValueError(f"PMID {pmid} の論文情報が返されませんでした")
+        
+        # MeSH用語は "UI: 名前" の形式で記録する
+        mesh_terms = [
+            {
+                'descriptor': f"{heading.ui}: {heading.descriptor}",
+                'major_topic': heading.major_topic,
+                'qualifiers': [
+                    {
+                        'name': f"{qualifier.ui}: {qualifier.name}",
+                        'major_topic': qualifier.major_topic
+                    }
+                    for qualifier in heading.qualifiers
+                ]
+            }
+            for heading in record.mesh
+        ]
+        
+        return {
+            'pmid': pmid,
+            'title': record.title,
+            'authors': list(record.authors),
+            'journal': record.journal,
+            'year': record.year,
+            'mesh_terms': mesh_terms,
+            'status': 'success'
+        }
 
 
 class SearchFormulaValidator:
@@ -334,6 +302,7 @@ class SearchFormulaValidator:
         """
         self.search_data = search_data
         self.executor = executor
+        self._capture = None
         self.validation_results = {
             'term_validation': {
                 'mesh_p': [],
@@ -437,32 +406,46 @@ class SearchFormulaValidator:
         
         included_count = 0
         
+        # 存在確認と包含確認を全PMIDまとめて行う（PMIDごとのesearchは行わない）
+        inclusion = check_seed_inclusion(
+            formula,
+            self.search_data['pmids'],
+            client=self.executor.client,
+            check_existence=True,
+            strict=False,
+        )
+        for pmid, error in inclusion.errors.items():
+            logger.error(f"PMID: {pmid} の包含確認エラー: {error}")
+        
+        # 非包含の論文があれば、OR項 × 論文 の捕捉行列で原因を調べる（OR項ごとに1回のesearch）
+        existing_pmids = inclusion.captured + inclusion.missed
+        if inclusion.missed:
+            logger.info("各OR項が捕捉する組入論文を確認中...")
+            self._capture = build_capture_matrix(
+                self._capture_blocks(), existing_pmids, client=self.executor.client, strict=False
+            )
+            self.validation_results['capture_matrix'] = self._capture.summary()
+        
         for pmid in self.search_data['pmids']:
             logger.info(f"PMID: {pmid} の検証中...")
             
             # 論文の存在確認
-            pmid_query = f"{pmid}[uid]"
-            pmid_result = self.executor.execute_query(pmid_query)
-            
-            if pmid_result['count'] == 0:
-                logger.warning(f"PMID: {pmid} の論文がPubMedに存在しません")
+            if pmid in inclusion.not_found or pmid in inclusion.errors:
+                if pmid in inclusion.not_found:
+                    logger.warning(f"PMID: {pmid} の論文がPubMedに存在しません")
                 
                 paper_validation = {
                     'pmid': pmid,
                     'exists': False,
                     'included': False,
-                    'message': 'PMIDが存在しません'
+                    'message': inclusion.errors.get(pmid, 'PMIDが存在しません')
                 }
                 
                 self.validation_results['paper_validation']['papers'].append(paper_validation)
                 continue
             
-            # 検索式と組み合わせて検索
-            combined_query = f"({formula}) AND {pmid}[uid]"
-            combined_result = self.executor.execute_query(combined_query)
-            
             # 包含状態の確認
-            included = combined_result['count'] > 0
+            included = pmid in inclusion.captured
             
             if included:
                 included_count += 1
@@ -495,46 +478,27 @@ class SearchFormulaValidator:
         
         logger.info(f"組入論文の検証が完了しました（包含率: {inclusion_rate:.2f}）")
     
+    def _capture_blocks(self) -> Dict[str, List[str]]:
+        """捕捉行列に使うブロックごとのOR項"""
+        blocks = {
+            'Population': [f'"{term}"[Mesh]' for term in self.search_data['mesh_p']]
+            + [f'"{term}"[tiab]' for term in self.search_data['keyword_p']],
+            'Intervention': [f'"{term}"[Mesh]' for term in self.search_data['mesh_i']]
+            + [f'"{term}"[tiab]' for term in self.search_data['keyword_i']],
+        }
+        return {name: terms for name, terms in blocks.items() if terms}
+    
     def _analyze_non_inclusion(self, formula: str, pmid: str) -> Dict[str, Any]:
-        """検索式に含まれない論文の原因を分析"""
-        # 構造化された検索式の各ブロックを分析
-        mesh_p_terms = [f'"{term}"[Mesh]' for term in self.search_data['mesh_p']]
-        mesh_i_terms = [f'"{term}"[Mesh]' for term in self.search_data['mesh_i']]
-        keyword_p_terms = [f'"{term}"[tiab]' for term in self.search_data['keyword_p']]
-        keyword_i_terms = [f'"{term}"[tiab]' for term in self.search_data['keyword_i']]
-        
-        p_mesh_block = f"({' OR '.join(mesh_p_terms)})" if mesh_p_terms else ""
-        p_keyword_block = f"({' OR '.join(keyword_p_terms)})" if keyword_p_terms else ""
-        i_mesh_block = f"({' OR '.join(mesh_i_terms)})" if mesh_i_terms else ""
-        i_keyword_block = f"({' OR '.join(keyword_i_terms)})" if keyword_i_terms else ""
-        
-        # Population ブロック全体
-        p_blocks = []
-        if p_mesh_block:
-            p_blocks.append(p_mesh_block)
-        if p_keyword_block:
-            p_blocks.append(p_keyword_block)
+        """検索式に含まれない論文の原因を捕捉行列から分析"""
+        capture = self._capture
+        if capture is None or pmid not in capture.seeds:
+            capture = build_capture_matrix(self._capture_blocks(), [pmid], client=self.executor.client, strict=False)
+        column = capture.seeds.index(pmid)
+        block_hits = dict(zip(capture.blocks, capture.block_matrix()[:, column]))
         
-        p_block = f"({' OR '.join(p_blocks)})" if p_blocks else ""
-        
-        # Intervention ブロック全体
-        i_blocks = []
-        if i_mesh_block:
-            i_blocks.append(i_mesh_block)
-        if i_keyword_block:
-            i_blocks.append(i_keyword_block)
-        
-        i_block = f"({' OR '.join(i_blocks)})" if i_blocks else ""
-        
-        # 各ブロックのマッチング確認
-        p_query = f"{p_block} AND {pmid}[uid]" if p_block else ""
-        i_query = f"{i_block} AND {pmid}[uid]" if i_block else ""
-        
-        p_result = self.executor.execute_query(p_query) if p_query else {'count': 0}
-        i_result = self.executor.execute_query(i_query) if i_query else {'count': 0}
-        
-        p_match = p_result['count'] > 0
-        i_match = i_result['count'] > 0
+        # ブロックのOR項が1つもない場合は一致しない扱い（従来どおり）
+        p_match = bool(block_hits.get('Population', False))
+        i_match = bool(block_hits.get('Intervention', False))
         
         # 非包含の原因を特定
         if not p_match and not i_match:
@@ -549,12 +513,13 @@ class SearchFormulaValidator:
         return {
             'p_block': {
                 'match': p_match,
-                'count': p_result.get('count', 0)
+                'count': int(p_match)
             },
             'i_block': {
                 'match': i_match,
-                'count': i_result.get('count', 0)
+                'count': int(i_match)
             },
+            'matching_terms': capture.seed_terms(pmid),
             'exclusion_reason': reason
         }
     
@@ -797,6 +762,9 @@ class ReportGenerator:
                         i_status = "満たしている" if analysis['i_block'].get('match', False) else "満たしていない"
                         report += f"- Intervention条件: {i_status}\n"
                     
+                    if analysis.get('matching_terms'):
+                        report += f"- 一致するOR項: {', '.join(analysis['matching_terms'])}\n"
+                    
                     report += "\n"
             else:
                 report += f"### PMID: {pmid} - ⚠️ エラー\n\n"
@@ -804,6 +772,11 @@ class ReportGenerator:
             
             report += "---\n\n"
         
+        # OR項 × 組入論文の捕捉行列
+        if self.validation_results.get('capture_matrix'):
+            report += format_capture_summary(self.validation_results['capture_matrix'])
+            report += "\n"
+        
         # MeSH用語分析
         mesh_analysis = self.validation_results.get('mesh_analysis', {})
         summary = mesh_analysis.get('summary', {})
@@ -894,8 +867,10 @@ def main():
     parser.add_argument('--output', help='出力ディレクトリ（指定しない場合は検索式と同じフォルダ）')
     parser.add_argument('--email', default='example@example.com', help='Entrez APIに提供するemail')
     parser.add_argument('--steps', default='all', help='実行するステップ（カンマ区切り: term,formula,papers,mesh,all）')
+    add_cassette_arguments(parser)
     
     args = parser.parse_args()
+    apply_cassette_arguments(args)
     
     # 入力ファイルのパス
     input_file = args.input
@@ -3,14 +3,27 @@
 
 import os
 import json
-import time
 import argparse
-import requests
 import re
+import sys
 from datetime import datetime
+from pathlib import Path
 from dotenv import load_dotenv
 from google import genai
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    check_seed_inclusion,
+    get_client,
+)
+
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
@@ -229,28 +242,13 @@ def count_pubmed_results(terms, field_tag):
 
     try:
         # 全体クエリの検索数を取得
-        search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        params = {
-            'db': 'pubmed',
-            'term': combined_query,
-            'retmode': 'json'
-        }
-        response = requests.get(search_url, params=params)
-        data = response.json()
-        total_count = int(data['esearchresult'].get('count', 0))
+        client = get_client()
+        total_count = client.count(combined_query)
 
         # 個別の検索キーの検索数を取得
         for term in terms:
-            time.sleep(0.34)  # APIレート制限に配慮 (3リクエスト/秒)
             query = f'"{term}"{field_tag}'
-            params = {
-                'db': 'pubmed',
-                'term': query,
-                'retmode': 'json'
-            }
-            response = requests.get(search_url, params=params)
-            data = response.json()
-            count = int(data['esearchresult'].get('count', 0))
+            count = client.count(query)
             results[term] = count
             print(f"Term: {term}{field_tag} - Count: {count}")
 
@@ -260,29 +258,17 @@ def count_pubmed_results(terms, field_tag):
     return {"terms": results, "total": total_count}
 
 def check_included_papers(pmids, search_formula):
-    """組入論文が検索式にマッチするか確認する関数"""
-    results = {}
-    search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+    """組入論文が検索式にマッチするか確認する関数（全PMIDをまとめて検索）"""
+    inclusion = check_seed_inclusion(search_formula, pmids)
+    results = inclusion.included
 
     for pmid in pmids:
-        time.sleep(0.34)  # APIレート制限に配慮
-        query = f"{search_formula} AND {pmid}[uid]"
-        params = {
-            'db': 'pubmed',
-            'term': query,
-            'retmode': 'json'
-        }
-        
-        try:
-            response = requests.get(search_url, params=params)
-            data = response.json()
-            count = int(data['esearchresult'].get('count', 0))
-            results[pmid] = count > 0
-            match_status = "✓" if count > 0 else "✗"
-            print(f"PMID {pmid}: {match_status}")
-        except Exception as e:
-            print(f"Error checking PMID {pmid}: {e}")
-            results[pmid] = False
+        pmid = str(pmid).strip()
+        if pmid in inclusion.errors:
+            print(f"Error checking PMID {pmid}: {inclusion.errors[pmid]}")
+            continue
+        match_status = "✓" if results.get(pmid) else "✗"
+        print(f"PMID {pmid}: {match_status}")
 
     return results
 
@@ -415,7 +401,11 @@ def main():
     parser.add_argument('--input', required=True, help='検索式ファイルのパス')
     parser.add_argument('--api-key', help='Gemini APIキー (未指定の場合は環境変数GEMINI_API_KEYを使用)')
     
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
     input_file = args.input
     api_key = args.api_key or os.getenv("GEMINI_API_KEY")
     
@@ -496,15 +486,7 @@ def main():
     # Population全体の検索数
     print("\n=== Population全体 (MeSH OR フリーワード) の検索件数確認中... ===")
     try:
-        search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        params = {
-            'db': 'pubmed',
-            'term': p_formula,
-            'retmode': 'json'
-        }
-        response = requests.get(search_url, params=params)
-        data = response.json()
-        p_total = int(data['esearchresult'].get('count', 0))
+        p_total = get_client().count(p_formula)
         search_data['p_combined'] = {"total": p_total}
         print(f"Population全体: {p_total:,}件")
     except Exception as e:
@@ -514,15 +496,7 @@ def main():
     # Intervention全体の検索数
     print("\n=== Intervention全体 (MeSH OR フリーワード) の検索件数確認中... ===")
     try:
-        search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        params = {
-            'db': 'pubmed',
-            'term': i_formula,
-            'retmode': 'json'
-        }
-        response = requests.get(search_url, params=params)
-        data = response.json()
-        i_total = int(data['esearchresult'].get('count', 0))
+        i_total = get_client().count(i_formula)
         search_data['i_combined'] = {"total": i_total}
         print(f"Intervention全体: {i_total:,}件")
     except Exception as e:
@@ -533,15 +507,7 @@ def main():
     print("\n=== 完全な検索式 (P AND I) の検索件数確認中... ===")
     full_formula = f"({p_formula}) AND ({i_formula})"
     try:
-        search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        params = {
-            'db': 'pubmed',
-            'term': full_formula,
-            'retmode': 'json'
-        }
-        response = requests.get(search_url, params=params)
-        data = response.json()
-        full_total = int(data['esearchresult'].get('count', 0))
+        full_total = get_client().count(full_formula)
         search_data['full_formula'] = {"total": full_total}
         print(f"完全な検索式 (P AND I): {full_total:,}件")
     except Exception as e:
@@ -7,6 +7,10 @@ PubMed検索式の構文チェックとリンティングを行うモジュー
 1. ワイルドカード検出: フレーズ検索後のワイルドカード（"phrase"*）を検出し警告
 2. 冗長性検出: PubMedが同一視する用語（ハイフン付きバリエーションなど）の重複を検出
 
+3. 構文の誤り: 括弧の対応や項のない演算子を検出し警告
+
+検索式は scripts.query の共通パーサーで1回だけ解析し、各チェックはASTの検索語を走査する。
+
 PubMedの動作仕様:
 - ハイフンはスペースと同等に扱われる（"high-flow" = "high flow"）
 - フレーズ検索後のワイルドカード（*）は無視される
@@ -14,15 +18,22 @@ PubMedの動作仕様:
 """
 
 import re
-import time
+import sys
 import xml.etree.ElementTree as ET
+from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.query import Term, parse  # noqa: E402
+
 try:
-    import requests
+    from scripts.eutils import EutilsError, get_client
     HAS_REQUESTS = True
-except ImportError:
+except ImportError:  # requests が未インストールの場合
     HAS_REQUESTS = False
 
 
@@ -61,7 +72,12 @@ def normalize_term_for_comparison(term: str) -> str:
     return normalized
 
 
-def extract_search_terms(query: str) -> List[Tuple[str, str]]:
+def _tagged_phrases(query: str) -> List[Term]:
+    """フィールドタグ付きのフレーズ検索（"term"[field]、"term"*[field]）"""
+    return [term for term in parse(query).terms() if term.quoted and term.field]
+
+
+def extract_search_terms(query: str) -> List[Tuple[str, str, bool]]:
     """
     検索式から検索用語とフィールドタグを抽出する
 
@@ -69,31 +85,15 @@ def extract_search_terms(query: str) -> List[Tuple[str, str]]:
         query: PubMed検索式
 
     Returns:
-        List of (term, field_tag) tuples
+        List of (term, field_tag, has_wildcard) tuples（フィールドタグ付きの用語のみ、出現順）
     """
     terms = []
-
-    # フレーズ検索（引用符付き）のパターン
-    # "term"[field] または "term"*[field] または "term" [field]
-    phrase_pattern = re.compile(r'"([^"]+)"(\*?)\s*\[([^\]]+)\]')
-    for match in phrase_pattern.finditer(query):
-        term = match.group(1)
-        has_wildcard = match.group(2) == '*'
-        field = match.group(3)
-        terms.append((term, field, has_wildcard))
-
-    # 単一語検索のパターン: term[field] または term*[field]
-    single_pattern = re.compile(
-        r'(?<!["\w])([a-zA-Z][a-zA-Z0-9]*)(\*?)\[([^\]]+)\]'
-    )
-    for match in single_pattern.finditer(query):
-        term = match.group(1)
-        has_wildcard = match.group(2) == '*'
-        field = match.group(3)
-        # フレーズ検索で既に抽出されていないか確認
-        if not any(t[0] == term for t in terms):
-            terms.append((term, field, has_wildcard))
-
+    seen = set()
+    for term in parse(query).terms():
+        if not term.field or term.value in seen:
+            continue
+        seen.add(term.value)
+        terms.append((term.value, term.field, term.wildcard))
     return terms
 
 
@@ -111,14 +111,15 @@ def check_phrase_wildcard(query: str) -> List[LintWarning]:
         検出された警告のリスト
     """
     warnings = []
+    parsed = parse(query)
 
-    # "phrase"*[field] または "phrase"* [field] のパターンを検出
-    pattern = re.compile(r'"([^"]+)"\*\s*\[([^\]]+)\]')
-
-    for match in pattern.finditer(query):
-        phrase = match.group(1)
-        field = match.group(2)
-        original = match.group(0)
+    # "phrase"*[field] または "phrase"* [field] の検索語を検出
+    for term in _tagged_phrases(query):
+        if not term.wildcard:
+            continue
+        phrase = term.value
+        field = term.field
+        original = parsed.text(term)
 
         warning = LintWarning(
             rule_id="PHRASE_WILDCARD",
@@ -154,21 +155,17 @@ def check_redundant_hyphen_variants(query: str) -> List[LintWarning]:
     """
     warnings = []
 
-    # フレーズ検索のパターンを抽出（ワイルドカード付きも含む）
+    # フレーズ検索の検索語を抽出（ワイルドカード付きも含む）
     # "term"[field] または "term"*[field] または "term" [field] または "term"* [field]
-    phrase_pattern = re.compile(r'"([^"]+)"\*?\s*\[([^\]]+)\]')
+    parsed = parse(query)
     phrases = []
 
-    for match in phrase_pattern.finditer(query):
-        term = match.group(1)
-        field = match.group(2)
-        original = match.group(0)
-        normalized = normalize_term_for_comparison(term)
+    for term in _tagged_phrases(query):
         phrases.append({
-            'original': original,
-            'term': term,
-            'field': field,
-            'normalized': normalized
+            'original': parsed.text(term),
+            'term': term.value,
+            'field': term.field,
+            'normalized': normalize_term_for_comparison(term.value)
         })
 
     # 正規化後の用語でグループ化
@@ -210,6 +207,31 @@ def check_redundant_hyphen_variants(query: str) -> List[LintWarning]:
     return warnings
 
 
+def check_syntax(query: str) -> List[LintWarning]:
+    """
+    括弧の対応・引用符の閉じ忘れ・項のない演算子を検出する
+
+    PubMedは誤りのある検索式も補って検索するため、意図しない検索になることがある。
+
+    Args:
+        query: PubMed検索式
+
+    Returns:
+        検出された警告のリスト
+    """
+    warnings = []
+    for issue in parse(query).errors:
+        context = query[max(0, issue.position - 20):issue.position + 20].strip()
+        warnings.append(LintWarning(
+            rule_id="SYNTAX_ERROR",
+            message=f'検索式の構文に誤りがあります: {issue.message}（{issue.position + 1}文字目）',
+            original_term=context,
+            suggestion='括弧・引用符の対応と、AND / OR / NOT の前後に検索語があることを確認してください。',
+            severity="warning"
+        ))
+    return warnings
+
+
 def extract_mesh_terms_from_query(query: str) -> List[str]:
     """
     検索式から[Mesh]タグ付きの用語を抽出する
@@ -220,8 +242,7 @@ def extract_mesh_terms_from_query(query: str) -> List[str]:
     Returns:
         MeSH用語のリスト
     """
-    pattern = re.compile(r'"([^"]+)"\s*\[Mesh\]', re.IGNORECASE)
-    return [m.group(1) for m in pattern.finditer(query)]
+    return [term.value for term in _tagged_phrases(query) if term.field_name == 'mesh']
 
 
 def fetch_mesh_preferred_name(term: str) -> Optional[str]:
@@ -240,43 +261,27 @@ def fetch_mesh_preferred_name(term: str) -> Optional[str]:
     if not HAS_REQUESTS:
         return None
 
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    fetch_url = f"{base_url}/efetch.fcgi"
+    client = get_client()
 
     try:
         # Step 1: MeSHデータベースでUIDを検索
-        search_params = {
-            'db': 'mesh',
-            'term': term,
-            'retmode': 'json'
-        }
-        response = requests.get(search_url, params=search_params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        result = client.esearch(term, db='mesh', retmax=20, strict=False)
 
-        id_list = data.get('esearchresult', {}).get('idlist', [])
+        id_list = result.get('idlist', [])
         if not id_list:
             return None
 
         # Step 2: efetchでDescriptorレコードのXMLを取得
-        time.sleep(0.34)  # API rate limit
-        fetch_params = {
-            'db': 'mesh',
-            'id': id_list[0],
-            'retmode': 'xml'
-        }
-        fetch_resp = requests.get(fetch_url, params=fetch_params, timeout=30)
-        fetch_resp.raise_for_status()
+        content = client.efetch_bytes(db='mesh', ids=[id_list[0]], retmode='xml')
 
-        root = ET.fromstring(fetch_resp.content)
+        root = ET.fromstring(content)
         descriptor_name_elem = root.find('.//DescriptorName/String')
         if descriptor_name_elem is not None and descriptor_name_elem.text:
             return descriptor_name_elem.text
 
         return None
 
-    except Exception:
+    except (EutilsError, ET.ParseError):
         return None
 
 
@@ -328,8 +333,6 @@ def check_mesh_exact_match(query: str) -> List[LintWarning]:
             ))
         # else: 正式なDescriptorNameと一致 → 問題なし
 
-        time.sleep(0.34)  # API rate limit between terms
-
     return warnings
 
 
@@ -346,6 +349,9 @@ def lint_pubmed_query(query: str, check_mesh: bool = False) -> List[LintWarning]
     """
     warnings = []
 
+    # 0. 構文チェック
+    warnings.extend(check_syntax(query))
+
     # 1. フレーズ検索後のワイルドカードチェック
     warnings.extend(check_phrase_wildcard(query))
 
@@ -1,53 +1,51 @@
-import requests
-import time
-from typing import Dict
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import iter_summaries  # noqa: E402
+
+def _paper_details(paper_data: Dict) -> Dict:
+    """esummary の要約から表示する項目を取り出す"""
+    if 'error' in paper_data:
+        return {
+            'error': f"Error: {paper_data['error']}"
+        }
+    return {
+        'title': paper_data.get('title', ''),
+        'pubdate': paper_data.get('pubdate', ''),
+        'source': paper_data.get('source', ''),
+        'authors': [author.get('name', '') for author in paper_data.get('authors', [])],
+        'mesh_terms': [mesh.get('name', '') for mesh in paper_data.get('mesh', [])],
+        'keywords': paper_data.get('keywords', []),
+        'abstract': paper_data.get('abstract', '')
+    }
+
+def get_papers_details(pmids: List[str]) -> Iterator[Tuple[str, Dict]]:
+    """
+    複数の論文の詳細情報を最大500件ずつまとめて取得し、(PMID, 詳細情報) を1件ずつ返す
+    """
+    for pmid, paper_data in iter_summaries(pmids):
+        yield pmid, _paper_details(paper_data)
 
 def get_paper_details(pmid: str) -> Dict:
     """
     PubMed E-utilities APIを使用して論文の詳細情報を取得する
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    summary_url = f"{base_url}/esummary.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'id': pmid,
-        'retmode': 'json'
-    }
-    
-    try:
-        response = requests.get(summary_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        paper_data = data['result'][pmid]
-        
-        return {
-            'title': paper_data.get('title', ''),
-            'pubdate': paper_data.get('pubdate', ''),
-            'source': paper_data.get('source', ''),
-            'authors': [author.get('name', '') for author in paper_data.get('authors', [])],
-            'mesh_terms': [mesh.get('name', '') for mesh in paper_data.get('mesh', [])],
-            'keywords': paper_data.get('keywords', []),
-            'abstract': paper_data.get('abstract', '')
-        }
-        
-    except requests.exceptions.RequestException as e:
-        return {
-            'error': f'Error: {str(e)}'
-        }
+    return next(get_papers_details([pmid]))[1]
 
 def main():
     pmids = ["21258094", "35803707"]
     
     print("論文の詳細情報を取得します...\n")
     
-    for pmid in pmids:
+    for pmid, details in get_papers_details(pmids):
         print(f"PMID: {pmid}")
         print("-" * 50)
         
-        details = get_paper_details(pmid)
-        
         if 'error' in details:
             print(f"エラー: {details['error']}")
             continue
@@ -71,8 +69,6 @@ def main():
         print("\n要約:")
         print(details['abstract'])
         print("\n" + "=" * 80 + "\n")
-        
-        time.sleep(1)  # API制限を考慮
 
 if __name__ == "__main__":
     main()
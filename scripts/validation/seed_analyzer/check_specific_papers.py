@@ -2,13 +2,31 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import requests
 import json
 import os
-import time
 import sys
 from datetime import datetime
-from typing import Dict, List, Tuple, Set
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Set
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    CaptureMatrix,
+    EutilsError,
+    get_client,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+    blocks_from_formulas,
+    build_capture_matrix,
+    check_seed_inclusion,
+    PubmedRecord,
+    fetch_article_xml,
+)
 
 def parse_search_formula(file_path: str) -> Dict:
     """
@@ -100,28 +118,14 @@ def get_pubmed_count(query: str) -> Dict:
     Returns:
         Dict: 検索結果の情報
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json',
-        'retmax': 0  # 結果の件数のみ取得
-    }
-    
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
         return {
-            'count': int(data['esearchresult'].get('count', 0)),
+            'count': get_client().count(query),
             'query': query,
             'status': 'success'
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'count': 0,
             'query': query,
@@ -129,6 +133,7 @@ def get_pubmed_count(query: str) -> Dict:
             'message': str(e)
         }
 
+
 def check_pmid_inclusion(search_formula: str, pmid: str) -> Dict:
     """
     特定のPMIDの論文が検索式の結果に含まれるか確認する
@@ -140,204 +145,170 @@ def check_pmid_inclusion(search_formula: str, pmid: str) -> Dict:
     Returns:
         Dict: 検証結果
     """
-    # PMIDが存在するか確認
-    pmid_check = get_pubmed_count(f"{pmid}[uid]")
+    return check_pmids_inclusion(search_formula, [pmid])[pmid]
+
+def check_pmids_inclusion(search_formula: str, pmids: List[str]) -> Dict[str, Dict]:
+    """
+    複数のPMIDの包含状況をまとめて確認する（PMID数によらず2回程度のesearch）
     
-    if pmid_check['count'] == 0:
-        return {
+    Args:
+        search_formula: 検索式
+        pmids: 確認するPMIDのリスト
+        
+    Returns:
+        Dict[str, Dict]: PMID → ``check_pmid_inclusion`` と同じ形式の検証結果
+    """
+    inclusion = check_seed_inclusion(search_formula, pmids, check_existence=True)
+    results = {}
+    for pmid in inclusion.not_found:
+        results[pmid] = {
             'pmid': pmid,
             'exists': False,
             'included': False,
             'message': 'PMIDが存在しません'
         }
+    for pmid, error in inclusion.errors.items():
+        results[pmid] = {
+            'pmid': pmid,
+            'exists': False,
+            'included': False,
+            'message': error
+        }
+    for pmid in inclusion.captured + inclusion.missed:
+        results[pmid] = {
+            'pmid': pmid,
+            'exists': True,
+            'included': pmid in inclusion.captured,
+            'message': 'Success'
+        }
+    return results
+
+def split_formula_blocks(search_formula: str) -> Dict[str, str]:
+    """
+    検索式 ``((P_Block)) AND ((I_Block))`` をブロックごとに分ける
     
-    # 検索式とPMIDを組み合わせて検索
-    combined_query = f"({search_formula}) AND {pmid}[uid]"
-    combined_result = get_pubmed_count(combined_query)
-    
-    included = combined_result['count'] > 0
-    
+    Args:
+        search_formula: 検索式
+        
+    Returns:
+        Dict: {'Population': P_Block, 'Intervention': I_Block}
+    """
+    import re
+    p_block_match = re.search(r'\(\((.*?)\)\)', search_formula)
+    i_block_match = re.search(r'\)\s+AND\s+\(\((.*?)\)\)', search_formula)
     return {
-        'pmid': pmid,
-        'exists': True,
-        'included': included,
-        'message': 'Success'
+        'Population': p_block_match.group(1) if p_block_match else "",
+        'Intervention': i_block_match.group(1) if i_block_match else "",
     }
 
-def analyze_non_inclusion(search_formula: str, pmid: str) -> Dict:
+def build_seed_capture(search_formula: str, pmids: List[str]) -> CaptureMatrix:
+    """
+    各ブロックのOR項 × 組入論文の捕捉行列を作る（OR項ごとに1回のesearch）
+    
+    Args:
+        search_formula: 検索式
+        pmids: 組入論文のPMIDリスト
+        
+    Returns:
+        CaptureMatrix: 捕捉行列
+    """
+    return build_capture_matrix(blocks_from_formulas(split_formula_blocks(search_formula)), pmids)
+
+def _article_record(pmid: str, record: Optional[PubmedRecord]) -> PubmedRecord:
+    """取得済みの書誌情報がなければこのPMIDだけ取得する"""
+    if record is not None:
+        return record
+    article = fetch_article_xml([pmid])[pmid]
+    if not article.ok:
+        raise EutilsError(article.error)
+    return article.record
+
+def analyze_non_inclusion(
+    search_formula: str,
+    pmid: str,
+    capture: Optional[CaptureMatrix] = None,
+    record: Optional[PubmedRecord] = None,
+) -> Dict:
     """
     検索式に含まれない論文の原因を分析する
     
     Args:
         search_formula: 検索式
         pmid: 分析するPMID
+        capture: 捕捉行列（省略時はこのPMIDだけで作成）
+        record: 取得済みの論文の書誌情報（省略時はこのPMIDだけ取得）
         
     Returns:
         Dict: 分析結果
     """
-    # パーツに分解して分析
     # 検索式の構造: (P_Block) AND (I_Block)
     parts = {}
     
     # 論文の情報を取得
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    fetch_url = f"{base_url}/efetch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'id': pmid,
-        'retmode': 'xml'
-    }
-    
     try:
-        response = requests.get(fetch_url, params=params)
-        response.raise_for_status()
-        xml_data = response.text
-        
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(xml_data, 'lxml')
-        
-        # 基本情報の抽出
-        title_element = soup.find('articletitle')
-        title = title_element.text if title_element else 'タイトル不明'
-        
-        # MeSH用語の抽出
-        mesh_headings = []
-        for heading in soup.find_all('meshheading'):
-            descriptor = heading.find('descriptorname')
-            if descriptor:
-                mesh_headings.append(descriptor.text)
+        record = _article_record(pmid, record)
         
         # 論文の基本情報を格納
         parts['paper_info'] = {
-            'title': title,
-            'mesh_terms': mesh_headings
-        }
-        
-        # Population部分の分析
-        import re
-        p_block_match = re.search(r'\(\((.*?)\)\)', search_formula)
-        p_block = p_block_match.group(1) if p_block_match else ""
-        
-        p_query = f"({p_block}) AND {pmid}[uid]"
-        p_result = get_pubmed_count(p_query)
-        parts['p_block'] = {
-            'match': p_result['count'] > 0,
-            'count': p_result['count']
+            'title': record.title or 'タイトル不明',
+            'mesh_terms': [heading.descriptor for heading in record.mesh]
         }
-        
-        # Intervention部分の分析
-        i_block_match = re.search(r'\)\s+AND\s+\(\((.*?)\)\)', search_formula)
-        i_block = i_block_match.group(1) if i_block_match else ""
-        
-        i_query = f"({i_block}) AND {pmid}[uid]"
-        i_result = get_pubmed_count(i_query)
-        parts['i_block'] = {
-            'match': i_result['count'] > 0,
-            'count': i_result['count']
-        }
-        
-        # 各部分のマッチ状態から非包含の原因を特定
-        if not parts['p_block']['match'] and not parts['i_block']['match']:
-            reason = "論文はPopulationとIntervention両方の条件を満たしていません"
-        elif not parts['p_block']['match']:
-            reason = "論文はPopulation条件を満たしていません"
-        elif not parts['i_block']['match']:
-            reason = "論文はIntervention条件を満たしていません"
-        else:
-            reason = "不明な理由で検索結果に含まれていません"
-        
-        parts['exclusion_reason'] = reason
-        
-        return parts
-        
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'error': str(e),
             'exclusion_reason': "論文の詳細情報を取得できませんでした"
         }
+    
+    # 各ブロックのマッチ状態は捕捉行列から求める（ブロック内のOR項のどれかが捕捉していれば一致）
+    if capture is None or pmid not in capture.seeds:
+        capture = build_seed_capture(search_formula, [pmid])
+    column = capture.seeds.index(pmid)
+    block_hits = dict(zip(capture.blocks, capture.block_matrix()[:, column]))
+    
+    p_match = bool(block_hits.get('Population', False))
+    i_match = bool(block_hits.get('Intervention', False))
+    parts['p_block'] = {
+        'match': p_match,
+        'count': int(p_match)
+    }
+    parts['i_block'] = {
+        'match': i_match,
+        'count': int(i_match)
+    }
+    parts['matching_terms'] = capture.seed_terms(pmid)
+    
+    # 各部分のマッチ状態から非包含の原因を特定
+    if not p_match and not i_match:
+        reason = "論文はPopulationとIntervention両方の条件を満たしていません"
+    elif not p_match:
+        reason = "論文はPopulation条件を満たしていません"
+    elif not i_match:
+        reason = "論文はIntervention条件を満たしていません"
+    else:
+        reason = "不明な理由で検索結果に含まれていません"
+    
+    parts['exclusion_reason'] = reason
+    
+    return parts
 
-def get_paper_citation(pmid: str) -> str:
+def get_paper_citation(pmid: str, record: Optional[PubmedRecord] = None) -> str:
     """
     PMIDから論文の引用情報を取得する
     
     Args:
         pmid: 論文のPMID
+        record: 取得済みの論文の書誌情報（省略時はこのPMIDだけ取得）
         
     Returns:
         str: 論文の引用情報
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    fetch_url = f"{base_url}/efetch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'id': pmid,
-        'retmode': 'xml'
-    }
-    
     try:
-        response = requests.get(fetch_url, params=params)
-        response.raise_for_status()
-        xml_data = response.text
-        
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(xml_data, 'lxml')
-        
-        # タイトル
-        title_element = soup.find('articletitle')
-        title = title_element.text if title_element else 'タイトル不明'
-        
-        # 著者情報
-        authors = []
-        author_list = soup.find('authorlist')
-        if author_list:
-            for author in author_list.find_all('author'):
-                last_name = author.find('lastname')
-                fore_name = author.find('forename')
-                
-                if last_name and fore_name:
-                    authors.append(f"{last_name.text} {fore_name.text}")
-                elif last_name:
-                    authors.append(last_name.text)
-        
-        authors_text = ", ".join(authors) if authors else "著者不明"
-        
-        # ジャーナル情報
-        journal_element = soup.find('journal')
-        journal = journal_element.find('title').text if journal_element and journal_element.find('title') else 'ジャーナル不明'
-        
-        # 出版年
-        pub_date = soup.find('pubdate')
-        year = pub_date.find('year').text if pub_date and pub_date.find('year') else '年不明'
-        
-        # 巻号ページ
-        volume = soup.find('volume')
-        volume_text = volume.text if volume else ""
-        
-        issue = soup.find('issue')
-        issue_text = issue.text if issue else ""
-        
-        pagination = soup.find('pagination')
-        pages = pagination.text if pagination else ""
+        record = _article_record(pmid, record)
         
-        # 引用情報の組み立て
-        citation = f"{authors_text}. {title}. {journal}. {year}"
+        # 著者. タイトル. ジャーナル. 年;巻(号):ページ. PMID
+        return record.citation()
         
-        if volume_text:
-            citation += f";{volume_text}"
-        
-        if issue_text:
-            citation += f"({issue_text})"
-        
-        if pages:
-            citation += f":{pages}"
-        
-        citation += f". PMID: {pmid}"
-        
-        return citation
-        
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return f"引用情報の取得に失敗しました（PMID: {pmid}）: {str(e)}"
 
 def ensure_directory_exists(path: str) -> None:
@@ -352,7 +323,11 @@ def main():
     parser.add_argument('--pmids', help='検証するPMIDのカンマ区切りリスト（指定しない場合は検索式ファイルから抽出）')
     parser.add_argument('--output', help='出力ファイルのパス（指定しない場合はlogs/validation/に保存）')
     
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
     input_file = args.input
     
     if args.output:
@@ -396,17 +371,30 @@ def main():
     print("\n各論文の包含状況を確認中...")
     inclusion_results = []
     non_included_papers = []
+    inclusion_by_pmid = check_pmids_inclusion(search_formula, pmids)
+    
+    # 存在するPMID全体で OR項 × 論文 の捕捉行列を作る（OR項ごとに1回のesearch）
+    existing_pmids = [pmid for pmid, result in inclusion_by_pmid.items() if result['exists']]
+    capture = None
+    if existing_pmids and not all(inclusion_by_pmid[pmid]['included'] for pmid in existing_pmids):
+        print("\n各OR項が捕捉する組入論文を確認中...")
+        capture = build_seed_capture(search_formula, existing_pmids)
+    
+    # 引用情報・分析に使う論文の書誌情報をまとめて取得する（最大500件ずつ）
+    articles = fetch_article_xml(existing_pmids)
     
     for pmid in pmids:
         print(f"\nPMID: {pmid} の確認中...")
-        inclusion = check_pmid_inclusion(search_formula, pmid)
+        inclusion = inclusion_by_pmid[pmid.strip()]
         
         if inclusion['exists']:
             status = "包含" if inclusion['included'] else "非包含"
             print(f"ステータス: {status}")
             
             # 引用情報の取得
-            citation = get_paper_citation(pmid)
+            article = articles.get(pmid.strip())
+            record = article.record if article is not None else None
+            citation = get_paper_citation(pmid, record=record)
             print(f"論文: {citation}")
             
             inclusion['citation'] = citation
@@ -415,7 +403,7 @@ def main():
             # 非包含の場合は原因を分析
             if not inclusion['included']:
                 print("非包含の原因を分析中...")
-                analysis = analyze_non_inclusion(search_formula, pmid)
+                analysis = analyze_non_inclusion(search_formula, pmid, capture=capture, record=record)
                 inclusion['analysis'] = analysis
                 non_included_papers.append((pmid, citation, analysis))
                 
@@ -432,9 +420,6 @@ def main():
         else:
             print(f"エラー: {inclusion['message']}")
             inclusion_results.append(inclusion)
-        
-        # API制限を考慮して少し待機
-        time.sleep(1)
     
     # 包含率の計算
     included_count = sum(1 for r in inclusion_results if r.get('included', False))
@@ -490,6 +475,9 @@ def main():
                     if 'i_block' in analysis:
                         i_status = "満たしている" if analysis['i_block'].get('match', False) else "満たしていない"
                         f.write(f"Intervention条件: {i_status}\n")
+                    
+                    if analysis.get('matching_terms'):
+                        f.write(f"一致するOR項: {', '.join(analysis['matching_terms'])}\n")
                 
                 f.write("\n---\n\n")
             else:
@@ -507,6 +495,11 @@ def main():
                 f.write(f"  - 論文: {citation}\n")
                 f.write(f"  - 原因: {reason}\n\n")
         
+        # OR項 × 組入論文の捕捉行列（感度・最小の検索語の組）
+        if capture is not None:
+            f.write(capture.to_markdown())
+            f.write("\n")
+        
         # 推奨される対応
         f.write("## 推奨される対応\n\n")
         
@@ -1,35 +1,29 @@
-import requests
-import time
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client  # noqa: E402
 
 def get_pubmed_count(query: str) -> dict:
     """
     PubMed E-utilities APIを使用して検索クエリの結果件数を取得する
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
         return {
-            'count': int(data['esearchresult'].get('count', 0)),
+            'count': get_client().count(query),
             'query': query
         }
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'count': 0,
             'query': query,
             'error': str(e)
         }
 
+
 def check_search_terms():
     """
     PubMed Search History Formatの各要素を検証
@@ -73,7 +67,6 @@ def check_search_terms():
     
     print("各検索用語の検索結果件数を確認します...\n")
     for term in terms:
-        time.sleep(1)  # API制限を考慮
         result = get_pubmed_count(term)
         print(f"{term}: {result['count']:,}件")
 
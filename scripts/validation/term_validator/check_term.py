@@ -3,13 +3,26 @@
 
 import argparse
 import re
-import requests
-import time
+import sys
 import json
 import os
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import (  # noqa: E402
+    EutilsError,
+    get_client,
+    add_cache_argument,
+    add_cassette_arguments,
+    apply_cache_argument,
+    apply_cassette_arguments,
+)
+
 def parse_search_formula(file_path: str) -> Dict[str, List[str]]:
     """
     検索式ファイル（MD形式）からMeSH用語とキーワードを抽出する
@@ -104,24 +117,11 @@ def check_pubmed_term(term: str, field: str) -> Dict:
             'message': str
         }
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
     # 検索クエリの構築
     query = f'"{term}"{field}'
     
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        count = int(data['esearchresult'].get('count', 0))
+        count = get_client().count(query)
         
         return {
             'term': term,
@@ -131,7 +131,7 @@ def check_pubmed_term(term: str, field: str) -> Dict:
             'message': 'Success'
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'term': term,
             'field': field,
@@ -158,24 +158,11 @@ def check_pmid_with_term(pmid: str, term: str, field: str) -> Dict:
             'message': str
         }
     """
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-    search_url = f"{base_url}/esearch.fcgi"
-    
     # 検索クエリの構築
     query = f'{pmid}[uid] AND "{term}"{field}'
     
-    params = {
-        'db': 'pubmed',
-        'term': query,
-        'retmode': 'json'
-    }
-    
     try:
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        count = int(data['esearchresult'].get('count', 0))
+        count = get_client().count(query)
         matches = count > 0
         
         return {
@@ -187,7 +174,7 @@ def check_pmid_with_term(pmid: str, term: str, field: str) -> Dict:
             'message': 'Success'
         }
         
-    except requests.exceptions.RequestException as e:
+    except EutilsError as e:
         return {
             'pmid': pmid,
             'term': term,
@@ -208,7 +195,11 @@ def main():
     parser.add_argument('--input', required=True, help='検索式ファイルのパス')
     parser.add_argument('--output', help='出力ファイルのパス（指定しない場合はlogs/validation/に保存）')
     
+    add_cache_argument(parser)
+    add_cassette_arguments(parser)
     args = parser.parse_args()
+    apply_cache_argument(args)
+    apply_cassette_arguments(args)
     input_file = args.input
     
     if args.output:
@@ -239,7 +230,6 @@ def main():
     print("\n=== Population MeSH用語の検索件数確認中... ===")
     for term in terms['mesh_p']:
         print(f"\n用語: {term}[Mesh]")
-        time.sleep(1)  # API制限を考慮
         result = check_pubmed_term(term, "[Mesh]")
         print(f"検索結果: {result['count']:,}件")
         results['mesh_p'].append(result)
@@ -248,7 +238,6 @@ def main():
     print("\n=== Intervention MeSH用語の検索件数確認中... ===")
     for term in terms['mesh_i']:
         print(f"\n用語: {term}[Mesh]")
-        time.sleep(1)
         result = check_pubmed_term(term, "[Mesh]")
         print(f"検索結果: {result['count']:,}件")
         results['mesh_i'].append(result)
@@ -257,7 +246,6 @@ def main():
     print("\n=== Population キーワードの検索件数確認中... ===")
     for term in terms['keyword_p']:
         print(f"\n用語: {term}[tiab]")
-        time.sleep(1)
         result = check_pubmed_term(term, "[tiab]")
         print(f"検索結果: {result['count']:,}件")
         results['keyword_p'].append(result)
@@ -266,7 +254,6 @@ def main():
     print("\n=== Intervention キーワードの検索件数確認中... ===")
     for term in terms['keyword_i']:
         print(f"\n用語: {term}[tiab]")
-        time.sleep(1)
         result = check_pubmed_term(term, "[tiab]")
         print(f"検索結果: {result['count']:,}件")
         results['keyword_i'].append(result)
@@ -286,7 +273,6 @@ def main():
             
             # MeSH用語（P）とのマッチング
             for term in terms['mesh_p']:
-                time.sleep(1)
                 result = check_pmid_with_term(pmid, term, "[Mesh]")
                 match_status = "○" if result['matches'] else "×"
                 print(f"{match_status} {term}[Mesh]")
@@ -294,7 +280,6 @@ def main():
             
             # MeSH用語（I）とのマッチング
             for term in terms['mesh_i']:
-                time.sleep(1)
                 result = check_pmid_with_term(pmid, term, "[Mesh]")
                 match_status = "○" if result['matches'] else "×"
                 print(f"{match_status} {term}[Mesh]")
@@ -302,7 +287,6 @@ def main():
             
             # キーワード（P）とのマッチング
             for term in terms['keyword_p']:
-                time.sleep(1)
                 result = check_pmid_with_term(pmid, term, "[tiab]")
                 match_status = "○" if result['matches'] else "×"
                 print(f"{match_status} {term}[tiab]")
@@ -310,7 +294,6 @@ def main():
             
             # キーワード（I）とのマッチング
             for term in terms['keyword_i']:
-                time.sleep(1)
                 result = check_pmid_with_term(pmid, term, "[tiab]")
                 match_status = "○" if result['matches'] else "×"
                 print(f"{match_status} {term}[tiab]")
@@ -3,30 +3,25 @@
 Verify potentially misspelled search terms by checking PubMed hit counts.
 """
 
-import time
-import requests
+import sys
+from pathlib import Path
 from typing import List, Tuple
-from urllib.parse import quote
 
-ENTREZ_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils import EutilsError, get_client  # noqa: E402
 
 def count_pubmed_hits(term: str) -> int:
     """Query PubMed and return hit count for a given term."""
     try:
-        params = {
-            "db": "pubmed",
-            "term": term,
-            "retmax": 0,
-            "retmode": "json"
-        }
-        response = requests.get(ENTREZ_BASE_URL, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        return int(data["esearchresult"]["count"])
-    except Exception as e:
+        return get_client().count(term)
+    except EutilsError as e:
         print(f"Error querying '{term}': {e}")
         return -1
 
+
 def verify_terms(term_pairs: List[Tuple[str, str]]):
     """
     Verify original vs corrected spellings.
@@ -43,10 +38,8 @@ def verify_terms(term_pairs: List[Tuple[str, str]]):
         corrected_query = f'"{corrected}"[tiab]'
 
         count_original = count_pubmed_hits(original_query)
-        time.sleep(0.34)  # Rate limiting
 
         count_corrected = count_pubmed_hits(corrected_query)
-        time.sleep(0.34)
 
         if count_corrected > 0:
             ratio = f"{count_corrected / max(count_original, 1):.1f}x"
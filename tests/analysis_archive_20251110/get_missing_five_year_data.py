@@ -82,11 +82,6 @@ def main():
             })
         else:
             print(f"  ✗ 取得失敗")
-
-        # API rate limit対策
-        if i < len(MISSING_QUERIES):
-            print(f"  待機中（1秒）...")
-            time.sleep(1)
         print()
 
     # 結果をファイルに保存
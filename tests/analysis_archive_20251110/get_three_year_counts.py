@@ -10,7 +10,6 @@
 import json
 import os
 import sys
-import time
 from datetime import datetime
 from typing import Dict, List
 
@@ -198,9 +197,6 @@ def main() -> None:
                 }
             )
 
-            # API礼儀上の軽い待機
-            time.sleep(0.5)
-
         print()
 
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
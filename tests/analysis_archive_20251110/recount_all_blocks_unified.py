@@ -11,7 +11,6 @@
 
 import sys
 import os
-import time
 from datetime import datetime
 
 # Add scripts directory to path
@@ -364,11 +363,6 @@ def main():
             else:
                 print(f"  ⚠️ エラーあり")
 
-        # API rate limit対策
-        if i < len(BLOCKS):
-            print(f"  待機中（5秒）...")
-            time.sleep(5)
-
         print()
 
     # 統合レポート生成
@@ -6,15 +6,29 @@ Purpose: Test if complex queries cause timeouts or failures
 Hypothesis: Complex queries (with population AND conditions) are more likely to timeout
 """
 
+import argparse
 import json
 import os
 import statistics
+import sys
 import time
 from datetime import datetime
+from pathlib import Path
 from typing import Any, Dict, List
 
 import requests
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.eutils.cassette import (  # noqa: E402
+    add_cassette_arguments,
+    apply_cassette_arguments,
+    create_session,
+    is_replaying,
+)
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -29,6 +43,9 @@ REQUEST_INTERVAL = 0.5
 REQUEST_TIMEOUT = 30
 NUM_REPETITIONS = 3  # Test each query 3 times for reliability
 
+# Session with --record / --replay support (raw HTTP behaviour is what this experiment measures)
+SESSION = create_session()
+
 # Test queries with varying complexity levels
 TEST_QUERIES = [
     # Level 1: Simple single-term queries
@@ -150,7 +167,7 @@ def call_pubmed_api(query: str, timeout: int) -> Dict[str, Any]:
 
     try:
         start_time = time.time()
-        response = requests.get(base_url, params=params, timeout=timeout)
+        response = SESSION.get(base_url, params=params, timeout=timeout)
         end_time = time.time()
 
         result["status_code"] = response.status_code
@@ -219,7 +236,7 @@ def run_experiment() -> List[Dict[str, Any]]:
 
         repetition_results = []
         for rep in range(NUM_REPETITIONS):
-            if idx > 1 or rep > 0:
+            if (idx > 1 or rep > 0) and not is_replaying():
                 time.sleep(REQUEST_INTERVAL)
 
             result = call_pubmed_api(test_case['query'], REQUEST_TIMEOUT)
@@ -399,6 +416,10 @@ def analyze_results(results: List[Dict[str, Any]]) -> str:
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Experiment 1A: query complexity vs success rate")
+    add_cassette_arguments(parser)
+    apply_cassette_arguments(parser.parse_args())
+
     # Create output directory
     output_dir = "tests/api_instability_investigation_20251110/results"
     os.makedirs(output_dir, exist_ok=True)
@@ -3,7 +3,35 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 # Ensure the repository root is importable when running tests directly.
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+from scripts.eutils import EutilsClient, TokenBucket  # noqa: E402
+from scripts.eutils.stub_server import StubEutilsServer  # noqa: E402
+
+
+def _stub_client(server):
+    return EutilsClient(base_url=server.base_url, rate_limiter=TokenBucket(rate=1000.0), backoff_seconds=0)
+
+
+@pytest.fixture
+def make_client():
+    """Build a client without rate-limit waits or backoff for a stub server started in the test."""
+    return _stub_client
+
+
+@pytest.fixture
+def stub(corpus):
+    """Serve the test module's ``corpus`` fixture from a local E-utilities stub."""
+    with StubEutilsServer(corpus) as server:
+        yield server
+
+
+@pytest.fixture
+def client(stub):
+    """Client bound to the ``stub`` server."""
+    return _stub_client(stub)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PMIDリストの書誌情報の一括取得のテスト
+
+テスト対象:
+1. efetch（XML）をチャンク単位で取得し、PMIDごとに入力の順で返すこと
+2. 取得できないPMIDやチャンクの失敗、XMLとして読めない応答をPMIDごとのエラーとして返すこと
+3. esummary の一括取得と、それを使うスクリプトの関数
+"""
+
+import pytest
+
+from scripts.eutils import (
+    EutilsClient,
+    TokenBucket,
+    fetch_article_xml,
+    iter_article_xml,
+    iter_summaries,
+    set_client,
+)
+from scripts.eutils.stub_server import FaultConfig, StubEutilsServer, SyntheticCorpus
+from scripts.search.validation import check_seed_papers_simple
+from scripts.validation.result_validator import check_paper_details
+
+PMIDS = [str(pmid) for pmid in range(1001, 1301)]
+
+
+@pytest.fixture
+def corpus():
+    terms = {
+        "x[tiab]": [int(pmid) for pmid in PMIDS],
+        '"Physicians"[Mesh]': [int(pmid) for pmid in PMIDS[::3]],
+    }
+    return SyntheticCorpus(terms=terms, size=0, auto_terms=False)
+
+
+def test_bulk_article_xml_in_input_order(stub, client):
+    requested = list(reversed(PMIDS)) + ["999999", PMIDS[0]]
+    articles = list(iter_article_xml(requested, client=client))
+    # 300件 + 存在しない1件を500件ずつ → 1回の efetch（長いIDリストはPOST）
+    assert stub.stats["efetch"] == 1
+    assert [article.pmid for article in articles] == list(reversed(PMIDS)) + ["999999"]
+    assert all(article.ok for article in articles[:-1])
+    assert articles[-1].error == "PMID not returned by efetch" and articles[-1].record is None
+
+    article = articles[-2]
+    assert article.record.pmid == PMIDS[0]
+    assert any(
+        heading.descriptor == "Physicians" for heading in article.record.mesh
+    ) == (PMIDS.index(article.pmid) % 3 == 0)
+
+    small = fetch_article_xml(PMIDS[:7], client=client, chunk_size=3)
+    assert list(small) == PMIDS[:7] and stub.stats["efetch"] == 4
+
+
+def test_chunk_errors_and_parsing(corpus):
+    with StubEutilsServer(corpus, faults=FaultConfig(error_rate_5xx=1.0)) as stub:
+        client = EutilsClient(base_url=stub.base_url, rate_limiter=TokenBucket(rate=1000.0),
+                              backoff_seconds=0, max_retries=1)
+        articles = list(iter_article_xml(PMIDS[:3], client=client))
+        assert [article.pmid for article in articles] == PMIDS[:3]
+        assert all(not article.ok and "HTTP 503" in article.error for article in articles)
+
+    class TruncatedClient:
+        def efetch_bytes(self, **params):
+            return b"<PubmedArticleSet><PubmedArticle><MedlineCitation>"
+
+    articles = list(iter_article_xml(PMIDS[:2], client=TruncatedClient()))
+    assert all(article.error.startswith("Invalid XML") for article in articles)
+
+
+def test_bulk_summaries_and_scripts(stub, client):
+    summaries = dict(iter_summaries(PMIDS + ["999999"], client=client, chunk_size=200))
+    assert stub.stats["esummary"] == 2
+    assert summaries[PMIDS[5]]["uid"] == PMIDS[5]
+    assert "error" in summaries["999999"]
+
+    set_client(client)
+    try:
+        details = dict(check_paper_details.get_papers_details(PMIDS[:4] + ["999999"]))
+        assert stub.stats["esummary"] == 3
+        assert details[PMIDS[0]]["title"] and details["999999"]["error"].startswith("Error:")
+
+        articles = fetch_article_xml(PMIDS[:2])
+        fetched = stub.stats["efetch"]
+        paper = check_seed_papers_simple.get_pubmed_details(PMIDS[1], record=articles[PMIDS[1]].record)
+        assert paper["found"] and paper["title"] != "N/A" and stub.stats["efetch"] == fetched
+        assert not check_seed_papers_simple.get_pubmed_details("999999")["found"]
+    finally:
+        set_client(None)
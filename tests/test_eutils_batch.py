@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+件数の並列バッチ実行のテスト
+
+テスト対象:
+1. 結果の順序とクエリごとのエラー保持
+2. 同時実行数の上限
+3. analyze_block_overlap / FilterImpactAnalyzer への組み込み
+"""
+
+import threading
+import time
+
+import pytest
+
+from scripts.eutils import EutilsError, TokenBucket, count_many, count_mapping, set_client
+
+
+class FakeClient:
+    """件数を辞書から返し、同時実行数を記録するクライアント"""
+
+    def __init__(self, counts, delay=0.0):
+        self.counts = counts
+        self.delay = delay
+        self.rate_limiter = TokenBucket(rate=1000.0)
+        self.calls = []
+        self.in_flight = 0
+        self.max_seen = 0
+        self._lock = threading.Lock()
+
+    def count(self, term, db="pubmed", strict=True):
+        with self._lock:
+            self.calls.append(term)
+            self.in_flight += 1
+            self.max_seen = max(self.max_seen, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            value = self.counts.get(term)
+            if value is None:
+                raise EutilsError(f"no count for {term}")
+            return value
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def shared_client():
+    def install(client):
+        set_client(client)
+        return client
+
+    yield install
+    set_client(None)
+
+
+class TestCountMany:
+    """count_many のテスト"""
+
+    def test_preserves_order_and_errors(self):
+        client = FakeClient({"a": 1, "c": 3})
+        results = count_many(["a", "b", "c"], client=client, max_in_flight=3)
+
+        assert [r.query for r in results] == ["a", "b", "c"]
+        assert [r.count for r in results] == [1, None, 3]
+        assert results[1].success is False
+        assert "no count for b" in results[1].error
+        assert results[1].to_dict()["success"] is False
+
+    def test_bounded_in_flight(self):
+        client = FakeClient({str(i): i for i in range(12)}, delay=0.02)
+        results = count_many([str(i) for i in range(12)], client=client, max_in_flight=3)
+
+        assert all(r.success for r in results)
+        assert 1 < client.max_seen <= 3
+
+    def test_progress_callback(self):
+        client = FakeClient({"a": 1, "b": 2})
+        seen = []
+        count_many(["a", "b"], client=client, progress=lambda done, total, r: seen.append((done, total)))
+        assert sorted(seen) == [(1, 2), (2, 2)]
+
+    def test_count_mapping_keys(self):
+        client = FakeClient({"q1": 10, "q2": 20})
+        results = count_mapping({("X", "base"): "q1", ("X", "10y"): "q2"}, client=client)
+        assert results[("X", "base")].count == 10
+        assert results[("X", "10y")].count == 20
+
+
+def test_analyze_block_overlap_uses_batch(shared_client):
+    from scripts.search.term_validator.check_block_overlap import analyze_block_overlap
+
+    client = shared_client(FakeClient({
+        "a[tiab]": 10,
+        "b[tiab]": 8,
+        "(a[tiab])": 10,
+        "(a[tiab]) OR (b[tiab])": 15,
+    }))
+
+    results, report = analyze_block_overlap(
+        ["a[tiab]", "b[tiab]"], block_name="Test", max_in_flight=2, use_history=False
+    )
+
+    assert [r["individual_count"] for r in results] == [10, 8]
+    assert [r["cumulative_count"] for r in results] == [10, 15]
+    assert [r["added_count"] for r in results] == [10, 5]
+    assert len(client.calls) == 4
+    assert "Total unique papers**: 15" in report
+
+
+def test_analyze_block_overlap_keeps_failed_lines(shared_client):
+    from scripts.search.term_validator.check_block_overlap import analyze_block_overlap
+
+    shared_client(FakeClient({
+        "a[tiab]": 10,
+        "(a[tiab])": 10,
+        "(a[tiab]) OR (b[tiab])": 15,
+    }))
+
+    results, _ = analyze_block_overlap(["a[tiab]", "b[tiab]"], block_name="Test")
+
+    assert results[1]["individual_error"] is True
+    assert results[1]["individual_count"] is None
+    assert results[1]["cumulative_count"] == 15
+
+
+def test_filter_impact_analyzer_matrix():
+    from scripts.search.validation.filter_impact_analyzer import FILTER_STAGES, FilterImpactAnalyzer
+
+    analyzer = FilterImpactAnalyzer(max_in_flight=4)
+    queries = {}
+    for block in ("A", "B"):
+        queries.update({q: 100 - i for i, q in enumerate(analyzer.build_filter_queries("P", block).values())})
+    analyzer.client = FakeClient(queries)
+
+    results = analyzer.analyze_blocks_with_filters("P", {"#A": "A", "#B": "B"})
+
+    assert set(results) == {"#A", "#B"}
+    assert [results["#A"][stage] for stage, _ in FILTER_STAGES] == [100, 99, 98, 97, 96, 95, 94]
+    assert len(analyzer.client.calls) == 2 * len(FILTER_STAGES)
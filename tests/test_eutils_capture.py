@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+検索語 × シード論文の捕捉行列のテスト
+
+テスト対象:
+1. OR項の分割（括弧・引用符の中は分割しない）
+2. 検索語ごとに1回の esearch で行列が作られること
+3. 非包含の原因・ブロック感度・最小の検索語の組
+"""
+
+import numpy as np
+import pytest
+
+from scripts.eutils import build_capture_matrix, split_or_terms
+from scripts.eutils.stub_server import SyntheticCorpus
+
+TERMS = {
+    '"Physicians"[Mesh]': [1, 2, 3],
+    "physician*[tiab]": [2, 3],
+    "doctor*[tiab]": [4],
+    "ikigai[tiab]": [1, 3, 4],
+    '"work engagement"[tiab]': [2],
+}
+RECORDS = {pmid: {"year": 2020} for pmid in range(1, 6)}
+BLOCKS = {
+    "Population": ['"Physicians"[Mesh]', "physician*[tiab]", "doctor*[tiab]"],
+    "Concept": ["ikigai[tiab]", '"work engagement"[tiab]'],
+}
+
+
+@pytest.fixture
+def corpus():
+    return SyntheticCorpus(terms=TERMS, records=RECORDS, size=0, auto_terms=False)
+
+
+def test_split_or_terms():
+    block = '(("Physicians"[Mesh] OR physician*[tiab]) OR "doctor OR nurse"[tiab] OR (a AND b))'
+    assert split_or_terms(block) == [
+        '("Physicians"[Mesh] OR physician*[tiab])',
+        '"doctor OR nurse"[tiab]',
+        "(a AND b)",
+    ]
+    assert split_or_terms("(a) AND (b)") == ["(a) AND (b)"]
+
+
+def test_matrix_analysis(stub, client):
+    matrix = build_capture_matrix(BLOCKS, ["1", "2", "3", "4", "5"], client=client, max_in_flight=2)
+
+    assert stub.stats["esearch"] == 5
+    assert matrix.matrix.dtype == np.bool_
+    assert matrix.matrix.shape == (5, 5)
+    assert matrix.captured_seeds() == ["1", "2", "3", "4"]
+    assert matrix.miss_analysis() == {"5": ["Population", "Concept"]}
+    assert matrix.block_sensitivity() == {"Population": 0.8, "Concept": 0.8}
+    assert matrix.minimal_terms("Population") == ['"Physicians"[Mesh]', "doctor*[tiab]"]
+    assert matrix.seed_terms("2") == ['"Physicians"[Mesh]', "physician*[tiab]", '"work engagement"[tiab]']
+
+    summary = matrix.summary()
+    assert [row["unique"] for row in summary["terms"]] == [1, 0, 1, 3, 1]
+    assert "PMID 5: not matched by Population, Concept" in matrix.to_markdown()
+
+
+def test_failed_term_is_reported(client):
+    blocks = {"Population": ['"Physicians"[Mesh]', "zzz[tiab]"]}
+    matrix = build_capture_matrix(blocks, ["1", "4"], client=client)
+
+    assert "zzz[tiab]" in matrix.errors
+    assert not matrix.matrix[1].any()
+    assert matrix.missed_seeds() == ["4"]
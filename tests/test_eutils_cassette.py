@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTTP通信の記録・再生（カセット）のテスト
+
+テスト対象:
+1. スタブサーバーへの通信を記録し、サーバー停止後に同じ結果を再生できること
+2. api_key などの揮発パラメータがキーに影響しないこと
+3. 本文のコンテンツアドレス保存（同一本文は1ファイル）と未記録リクエストのエラー
+"""
+
+import argparse
+
+import pytest
+
+from scripts.eutils import (
+    Cassette,
+    CassetteMissError,
+    EutilsClient,
+    TokenBucket,
+    add_cassette_arguments,
+    apply_cassette_arguments,
+    create_session,
+    set_cassette,
+)
+from scripts.eutils.stub_server import StubEutilsServer, SyntheticCorpus
+
+TERMS = {"ikigai[tiab]": [1, 2, 3], '"Physicians"[Mesh]': [2, 3, 4]}
+
+
+@pytest.fixture(autouse=True)
+def reset_cassette():
+    yield
+    set_cassette(None)
+
+
+def make_client(base_url, api_key=None):
+    return EutilsClient(
+        api_key=api_key,
+        base_url=base_url,
+        rate_limiter=TokenBucket(rate=1000.0),
+        backoff_seconds=0,
+        max_retries=1,
+    )
+
+
+def test_record_then_replay_offline(tmp_path):
+    directory = tmp_path / "cassette"
+    with StubEutilsServer(SyntheticCorpus(terms=TERMS, size=0)) as stub:
+        base_url = stub.base_url
+        set_cassette(Cassette(directory, "record"))
+        client = make_client(base_url, api_key="recording-key")
+        recorded_count = client.count("ikigai[tiab]")
+        recorded_xml = client.efetch_bytes(ids=["2"], retmode="xml")
+        medline = client.efetch(ids=["2", "3"], rettype="medline", retmode="text")
+
+    cassette = Cassette(directory, "replay")
+    set_cassette(cassette)
+    client = make_client(base_url)  # APIキーなしでも同じ記録を再生できる
+    assert client.count("ikigai[tiab]") == recorded_count == 3
+    assert client.efetch_bytes(ids=["2"], retmode="xml") == recorded_xml
+    assert client.efetch(ids=["2", "3"], rettype="medline", retmode="text") == medline
+    assert cassette.hits == 3
+
+    with pytest.raises(CassetteMissError):
+        client.count('"Physicians"[Mesh]')
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    cassette = Cassette(tmp_path, "record")
+    set_cassette(cassette)
+    with StubEutilsServer(SyntheticCorpus(terms=TERMS, size=0)) as stub:
+        session = create_session()
+        session.get(f"{stub.base_url}/esearch.fcgi", params={"term": "1[uid] OR 2[uid] OR 3[uid]", "retmode": "json"})
+        session.get(f"{stub.base_url}/esearch.fcgi", params={"term": "1[uid] OR 2[uid] OR 3[uid]", "retmode": "json", "tool": "x"})
+        session.post(f"{stub.base_url}/esearch.fcgi", data={"term": "ikigai[tiab]", "retmode": "json"})
+
+    assert cassette.recorded == 3
+    assert len(cassette) == 2  # tool はキーに含まれない
+    assert len(list((tmp_path / "bodies").glob("*/*.gz"))) == 2
+
+
+def test_cli_arguments(tmp_path):
+    parser = argparse.ArgumentParser()
+    add_cassette_arguments(parser)
+    args = parser.parse_args(["--replay", str(tmp_path)])
+    cassette = apply_cassette_arguments(args)
+    assert cassette.mode == "replay"
+    assert cassette.directory == tmp_path
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--record", "a", "--replay", "b"])
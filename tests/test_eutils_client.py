@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+E-utilities共通クライアントのテスト
+
+テスト対象:
+1. トークンバケットの待機時間計算
+2. AIMD によるレートの自動調整
+3. 環境変数からのレート決定
+4. クライアントのリトライ・POST切り替え・エラー判定
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from scripts.eutils import (
+    AdaptiveTokenBucket,
+    EutilsClient,
+    EutilsError,
+    TokenBucket,
+    get_rate_limiter,
+    resolve_rate_limit,
+    set_rate_limiter,
+)
+
+
+class FakeClock:
+    """テスト用の手動で進める時計"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_response(status=200, json_data=None, text="", headers=None):
+    response = MagicMock(spec=requests.Response)
+    response.status_code = status
+    response.headers = headers or {}
+    response.text = text
+    response.content = text.encode("utf-8")
+    response.json.return_value = json_data
+    if status >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(f"HTTP {status}")
+    else:
+        response.raise_for_status.return_value = None
+    return response
+
+
+def esearch_json(count, **extra):
+    result = {"count": str(count), "idlist": []}
+    result.update(extra)
+    return {"esearchresult": result}
+
+
+def make_client(session, **kwargs):
+    limiter = TokenBucket(rate=1000.0)
+    return EutilsClient(
+        api_key=kwargs.pop("api_key", "dummy-key"),
+        session=session,
+        rate_limiter=limiter,
+        backoff_seconds=0,
+        **kwargs,
+    )
+
+
+class TestTokenBucket:
+    """トークンバケットのテスト"""
+
+    def test_first_request_is_immediate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=3.0, clock=clock, sleep=clock.sleep)
+        assert bucket.acquire() == 0.0
+        assert clock.sleeps == []
+
+    def test_requests_are_spaced_by_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=4.0, clock=clock, sleep=clock.sleep)
+        for _ in range(5):
+            bucket.acquire()
+        assert clock.sleeps == pytest.approx([0.25, 0.25, 0.25, 0.25])
+        assert clock.now == pytest.approx(1.0)
+
+    def test_idle_time_refills_up_to_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        clock.now += 10.0
+        # 容量2なので2回は待たずに通り、3回目で待機が発生する
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == pytest.approx(0.5)
+
+    def test_set_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        bucket.set_rate(10.0)
+        assert bucket.rate == 10.0
+        assert bucket.acquire() == pytest.approx(0.1)
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestAdaptiveTokenBucket:
+    """AIMD リミッターのテスト"""
+
+    def make_bucket(self, clock, **kwargs):
+        kwargs.setdefault("max_rate", 10.0)
+        return AdaptiveTokenBucket(rate=4.0, clock=clock, sleep=clock.sleep, **kwargs)
+
+    def test_additive_increase_up_to_max(self):
+        clock = FakeClock()
+        bucket = self.make_bucket(clock, increase=1.0)
+        bucket.on_success()
+        assert bucket.rate == pytest.approx(4.25)
+        for _ in range(500):
+            bucket.on_success()
+        assert bucket.rate == 10.0
+
+    def test_multiplicative_decrease_with_cooldown(self):
+        clock = FakeClock()
+        bucket = self.make_bucket(clock, cooldown=1.0)
+        bucket.on_throttle()
+        bucket.on_throttle()  # 同じバーストの429では下げない
+        assert bucket.rate == pytest.approx(2.0)
+        clock.now += 1.0
+        bucket.on_throttle()
+        assert bucket.rate == pytest.approx(1.0)
+        for _ in range(10):
+            clock.now += 1.0
+            bucket.on_throttle()
+        assert bucket.rate == pytest.approx(0.5)
+        assert bucket.snapshot()["throttles"] == 13
+
+    def test_retry_after_pauses_all_callers(self):
+        clock = FakeClock()
+        bucket = self.make_bucket(clock)
+        bucket.on_throttle(retry_after=3.0)
+        assert bucket.acquire() == pytest.approx(3.0 + 1 / bucket.rate)
+
+    def test_max_defaults_to_initial_rate(self):
+        bucket = AdaptiveTokenBucket(rate=3.0)
+        bucket.on_success()
+        assert bucket.rate == 3.0
+
+    def test_client_reports_outcomes(self):
+        limiter = AdaptiveTokenBucket(rate=1000.0, max_rate=2000.0, cooldown=0)
+        session = MagicMock()
+        session.get.side_effect = [
+            make_response(429, headers={"Retry-After": "0"}),
+            make_response(200, json_data=esearch_json(5)),
+        ]
+        client = EutilsClient(api_key="k", session=session, rate_limiter=limiter, backoff_seconds=0)
+
+        assert client.count("q") == 5
+        snapshot = limiter.snapshot()
+        assert snapshot["throttles"] == 1
+        assert snapshot["successes"] == 1
+        assert snapshot["rate"] == pytest.approx(500.0 + 0.5 / 500.0)
+
+    def test_shared_limiter_is_adaptive_by_default(self, monkeypatch):
+        monkeypatch.delenv("NCBI_RATE_LIMIT_RPS", raising=False)
+        monkeypatch.delenv("NCBI_ADAPTIVE_RATE", raising=False)
+        monkeypatch.setenv("NCBI_API_KEY", "abc")
+        monkeypatch.setenv("NCBI_RATE_LIMIT_MAX_RPS", "12")
+        set_rate_limiter(None)
+        try:
+            limiter = get_rate_limiter()
+            assert isinstance(limiter, AdaptiveTokenBucket)
+            assert (limiter.rate, limiter.max_rate) == (10.0, 12.0)
+
+            monkeypatch.setenv("NCBI_ADAPTIVE_RATE", "off")
+            set_rate_limiter(None)
+            assert not isinstance(get_rate_limiter(), AdaptiveTokenBucket)
+        finally:
+            set_rate_limiter(None)
+
+
+class TestResolveRateLimit:
+    """レート決定のテスト"""
+
+    def test_anonymous(self, monkeypatch):
+        monkeypatch.delenv("NCBI_RATE_LIMIT_RPS", raising=False)
+        monkeypatch.delenv("NCBI_API_KEY", raising=False)
+        assert resolve_rate_limit() == 3.0
+
+    def test_api_key(self, monkeypatch):
+        monkeypatch.delenv("NCBI_RATE_LIMIT_RPS", raising=False)
+        monkeypatch.setenv("NCBI_API_KEY", "abc")
+        assert resolve_rate_limit() == 10.0
+
+    def test_override(self, monkeypatch):
+        monkeypatch.setenv("NCBI_RATE_LIMIT_RPS", "5.5")
+        monkeypatch.setenv("NCBI_API_KEY", "abc")
+        assert resolve_rate_limit() == 5.5
+
+    def test_invalid_override_is_ignored(self, monkeypatch):
+        monkeypatch.setenv("NCBI_RATE_LIMIT_RPS", "fast")
+        monkeypatch.delenv("NCBI_API_KEY", raising=False)
+        assert resolve_rate_limit() == 3.0
+
+
+class TestEutilsClient:
+    """クライアントのテスト"""
+
+    def test_count_success(self):
+        session = MagicMock()
+        session.get.return_value = make_response(json_data=esearch_json(42))
+        client = make_client(session)
+
+        assert client.count("ikigai[tiab]") == 42
+        params = session.get.call_args.kwargs["params"]
+        assert params["term"] == "ikigai[tiab]"
+        assert params["api_key"] == "dummy-key"
+
+    @patch("scripts.eutils.client.time.sleep")
+    def test_retry_on_429(self, _sleep):
+        session = MagicMock()
+        session.get.side_effect = [
+            make_response(status=429, headers={"Retry-After": "1"}),
+            make_response(json_data=esearch_json(7)),
+        ]
+        client = make_client(session)
+
+        assert client.count("test") == 7
+        assert session.get.call_count == 2
+
+    @patch("scripts.eutils.client.time.sleep")
+    def test_retry_on_missing_count(self, _sleep):
+        session = MagicMock()
+        session.get.side_effect = [
+            make_response(json_data={"esearchresult": {"ERROR": "backend"}}),
+            make_response(json_data=esearch_json(3)),
+        ]
+        client = make_client(session)
+
+        assert client.count("test") == 3
+
+    @patch("scripts.eutils.client.time.sleep")
+    def test_gives_up_after_max_retries(self, _sleep):
+        session = MagicMock()
+        session.get.return_value = make_response(status=503)
+        client = make_client(session, max_retries=3)
+
+        with pytest.raises(EutilsError, match="after 3 attempts"):
+            client.count("test")
+        assert session.get.call_count == 3
+
+    def test_errorlist_is_not_retried(self):
+        session = MagicMock()
+        session.get.return_value = make_response(
+            json_data=esearch_json(0, errorlist={"phrasesnotfound": ["zzzz"]})
+        )
+        client = make_client(session)
+
+        with pytest.raises(EutilsError):
+            client.count("zzzz[tiab]")
+        assert session.get.call_count == 1
+        # strict=False なら errorlist があっても件数を返す
+        assert client.count("zzzz[tiab]", strict=False) == 0
+
+    def test_long_query_uses_post(self):
+        session = MagicMock()
+        session.post.return_value = make_response(json_data=esearch_json(1))
+        client = make_client(session)
+
+        long_query = " OR ".join(f"term{i}[tiab]" for i in range(300))
+        assert client.count(long_query) == 1
+        session.get.assert_not_called()
+        assert session.post.call_args.kwargs["data"]["term"] == long_query
+
+    def test_efetch_returns_text(self):
+        session = MagicMock()
+        session.get.return_value = make_response(text="PMID- 1\nTI  - Title")
+        client = make_client(session)
+
+        text = client.efetch(db="pubmed", ids=["1", "2"], rettype="medline", retmode="text")
+        assert text.startswith("PMID- 1")
+        params = session.get.call_args.kwargs["params"]
+        assert params["id"] == "1,2"
+        assert params["rettype"] == "medline"
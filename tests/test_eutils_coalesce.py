@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+同一リクエストの合流のテスト
+
+テスト対象:
+1. 同時実行中の同一キーが1回の実行を共有すること
+2. 完了結果の保持期間とコピー
+3. クライアントへの組み込み（検索式の正規化・解析種別の区別）
+"""
+
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from scripts.eutils import EutilsClient, EutilsError, RequestCoalescer, TokenBucket
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def esearch_response(count, idlist=()):
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {}
+    response.json.return_value = {"esearchresult": {"count": str(count), "idlist": list(idlist)}}
+    return response
+
+
+class TestRequestCoalescer:
+    """RequestCoalescer 単体のテスト"""
+
+    def test_concurrent_callers_share_one_call(self):
+        coalescer = RequestCoalescer(ttl_seconds=0)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"count": 7}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(coalescer.run("q", slow)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(coalescer.run("q", slow))) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == [{"count": 7}] * 5
+        assert coalescer.calls == 1
+        assert coalescer.shared == 4
+
+    def test_completed_results_expire(self):
+        clock = FakeClock()
+        coalescer = RequestCoalescer(ttl_seconds=10, clock=clock)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return len(calls)
+
+        assert coalescer.run("q", fetch) == 1
+        clock.now += 9
+        assert coalescer.run("q", fetch) == 1
+        clock.now += 2
+        assert coalescer.run("q", fetch) == 2
+
+    def test_results_are_copied(self):
+        coalescer = RequestCoalescer(ttl_seconds=60)
+        first = coalescer.run("q", lambda: {"ids": ["1"]})
+        first["ids"].append("2")
+        first["term"] = "mutated"
+        assert coalescer.run("q", lambda: None) == {"ids": ["1"]}
+
+    def test_errors_are_not_kept(self):
+        coalescer = RequestCoalescer(ttl_seconds=60)
+
+        def fail():
+            raise EutilsError("boom")
+
+        with pytest.raises(EutilsError):
+            coalescer.run("q", fail)
+        assert coalescer.run("q", lambda: 3) == 3
+
+    def test_unretained_results_are_not_kept(self):
+        coalescer = RequestCoalescer(ttl_seconds=60)
+        assert coalescer.run("q", lambda: b"body", retain=False) == b"body"
+        assert coalescer.run("q", lambda: b"fresh", retain=False) == b"fresh"
+        assert coalescer.calls == 2
+        assert not coalescer._completed
+
+    def test_max_entries(self):
+        coalescer = RequestCoalescer(ttl_seconds=60, max_entries=2)
+        for key in ("a", "b", "c"):
+            coalescer.run(key, lambda: key)
+        assert coalescer.run("a", lambda: "fresh") == "fresh"
+
+
+class TestClientCoalescing:
+    """クライアントからの利用のテスト"""
+
+    def make_client(self, session, coalescer):
+        return EutilsClient(
+            api_key="dummy",
+            session=session,
+            rate_limiter=TokenBucket(rate=1000.0),
+            backoff_seconds=0,
+            coalescer=coalescer,
+        )
+
+    def test_equivalent_queries_share_http_call(self):
+        session = MagicMock()
+        session.get.return_value = esearch_response(42)
+        client = self.make_client(session, RequestCoalescer(ttl_seconds=60))
+
+        assert client.count("a[tiab]  OR b[tiab]") == 42
+        assert client.count("a[tiab] OR b[tiab]") == 42
+        assert session.get.call_count == 1
+
+    def test_strict_and_lenient_are_separate(self):
+        session = MagicMock()
+        session.get.return_value = esearch_response(1)
+        client = self.make_client(session, RequestCoalescer(ttl_seconds=60))
+
+        client.esearch("a[tiab]")
+        client.esearch("a[tiab]", strict=False)
+        client.esearch("a[tiab]", retmax=10)
+        assert session.get.call_count == 3
+
+    def test_without_coalescer_every_call_hits_http(self):
+        session = MagicMock()
+        session.get.return_value = esearch_response(1)
+        client = self.make_client(session, None)
+
+        client.count("a[tiab]")
+        client.count("a[tiab]")
+        assert session.get.call_count == 2
+
+    def test_efetch_bodies_are_not_retained(self):
+        session = MagicMock()
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        response.text = "PMID- 1"
+        response.content = b"<PubmedArticleSet/>"
+        session.get.return_value = response
+        coalescer = RequestCoalescer(ttl_seconds=60)
+        client = self.make_client(session, coalescer)
+
+        client.efetch(ids=["1"], rettype="medline", retmode="text")
+        client.efetch(ids=["1"], rettype="medline", retmode="text")
+        client.efetch_bytes(ids=["1"], retmode="xml")
+        assert session.get.call_count == 3
+        assert not coalescer._completed
+
+    def test_epost_is_never_coalesced(self):
+        session = MagicMock()
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        response.content = b"<ePostResult><QueryKey>1</QueryKey><WebEnv>W</WebEnv></ePostResult>"
+        session.post.return_value = response
+        client = self.make_client(session, RequestCoalescer(ttl_seconds=60))
+
+        client.epost(["1", "2"])
+        client.epost(["1", "2"])
+        assert session.post.call_count == 2
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+省メモリのPMID集合（PmidSet）のテスト
+
+テスト対象:
+1. 入力の正規化（順序・重複・文字列）と集合演算が Python の set と一致すること
+2. 所属判定・積集合の件数・被覆数
+3. .npy への保存とメモリマップでの読み込み
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from scripts.eutils import PmidSet
+
+
+def test_normalization_and_memory():
+    pmids = PmidSet(["30", "10", 20, 10, np.uint32(30)])
+    assert pmids.to_strings() == ["10", "20", "30"]
+    assert pmids.array.dtype == np.uint32
+    assert pmids.nbytes == 12
+    with pytest.raises(ValueError):
+        pmids.array[0] = 1  # 読み取り専用
+    with pytest.raises(ValueError):
+        PmidSet([-1])
+
+
+def test_operations_match_python_sets():
+    rng = random.Random(7)
+    left = {rng.randrange(1, 5000) for _ in range(800)}
+    right = {rng.randrange(1, 5000) for _ in range(600)}
+    a, b = PmidSet(left), PmidSet(right)
+
+    assert list(a | b) == sorted(left | right)
+    assert list(a & b) == sorted(left & right)
+    assert list(a - b) == sorted(left - right)
+    assert list(a ^ b) == sorted(left ^ right)
+    assert a.intersection_size(b) == len(left & right)
+    assert PmidSet.union_all([a, b, PmidSet()]) == a | b
+    assert (a & b).issubset(a)
+
+
+def test_membership_and_coverage():
+    a, b, c = PmidSet([1, 2, 3]), PmidSet([3, 4]), PmidSet([4, 5])
+    assert 3 in a and "2" in a and 9 not in a and "x" not in a
+    assert a.contains_many(["1", 4, 3]).tolist() == [True, False, True]
+
+    covered, counts = PmidSet.coverage([a, b, c])
+    assert covered.to_strings() == ["1", "2", "3", "4", "5"]
+    assert counts.tolist() == [1, 1, 2, 2, 1]
+
+
+def test_save_and_mmap_load(tmp_path):
+    original = PmidSet(range(10, 100000, 7))
+    path = original.save(tmp_path / "block")
+    assert path.name == "block.npy"
+
+    loaded = PmidSet.load(path)
+    assert isinstance(loaded.array, np.memmap)
+    assert loaded == original
+    assert len(loaded & PmidSet([17, 18])) == 1
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+esearch件数キャッシュのテスト
+
+テスト対象:
+1. 検索式の正規化と日付バケット
+2. TTL・件数上限による削除
+3. off / read / refresh モードとクライアントへの組み込み
+"""
+
+import argparse
+from unittest.mock import MagicMock
+
+import pytest
+
+from scripts.eutils import CountCache, EutilsClient, TokenBucket, add_cache_argument
+from scripts.eutils.client import EUTILS_BASE_URL
+from scripts.eutils.count_cache import date_bucket, normalize_query
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = CountCache(
+        path=tmp_path / "counts.sqlite3",
+        mode="read",
+        ttl_seconds=3600,
+        max_entries=1000,
+        bucket="none",
+        clock=clock,
+    )
+    yield cache
+    cache.close()
+
+
+def esearch_response(count, errorlist=None):
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {}
+    result = {"count": str(count), "idlist": []}
+    if errorlist:
+        result["errorlist"] = errorlist
+    response.json.return_value = {"esearchresult": result}
+    return response
+
+
+class TestNormalizeQuery:
+    """検索式正規化のテスト"""
+
+    def test_collapses_whitespace(self):
+        assert normalize_query('  "a"[tiab]\n  OR\tb[tiab] ') == '"a"[tiab] OR b[tiab]'
+
+    def test_trims_inside_parentheses(self):
+        assert normalize_query("( a[tiab] OR b[tiab] )") == "(a[tiab] OR b[tiab])"
+
+
+class TestDateBucket:
+    """日付バケットのテスト"""
+
+    def test_granularities(self):
+        now = 1_700_000_000.0  # 2023-11-14 UTC
+        assert date_bucket("day", now) == "2023-11-14"
+        assert date_bucket("week", now) == "2023-W46"
+        assert date_bucket("month", now) == "2023-11"
+        assert date_bucket("none", now) == "-"
+
+    def test_unknown_granularity(self):
+        with pytest.raises(ValueError):
+            date_bucket("year")
+
+
+class TestCountCache:
+    """キャッシュ本体のテスト"""
+
+    def test_roundtrip_uses_normalized_key(self, cache):
+        cache.put("pubmed", "a[tiab]  OR b[tiab]", 10)
+        assert cache.get("pubmed", "a[tiab] OR b[tiab]") == 10
+        assert cache.get("mesh", "a[tiab] OR b[tiab]") is None
+
+    def test_ttl_expiry(self, cache, clock):
+        cache.put("pubmed", "q", 5)
+        clock.now += 3599
+        assert cache.get("pubmed", "q") == 5
+        clock.now += 2
+        assert cache.get("pubmed", "q") is None
+
+    def test_day_bucket_rollover(self, tmp_path, clock):
+        cache = CountCache(path=tmp_path / "c.sqlite3", mode="read", ttl_seconds=0, bucket="day", clock=clock)
+        cache.put("pubmed", "q", 5)
+        clock.now += 86400
+        assert cache.get("pubmed", "q") is None
+        cache.close()
+
+    def test_size_eviction_keeps_recently_used(self, tmp_path, clock):
+        cache = CountCache(path=tmp_path / "c.sqlite3", mode="read", ttl_seconds=0, max_entries=10, bucket="none", clock=clock)
+        for i in range(10):
+            clock.now += 1
+            cache.put("pubmed", f"q{i}", i)
+        clock.now += 1
+        assert cache.get("pubmed", "q0") == 0  # 参照して最近使ったことにする
+        clock.now += 1
+        cache.put("pubmed", "q10", 10)
+
+        cache.evict()
+        assert len(cache) == 9
+        assert cache.get("pubmed", "q0") == 0
+        assert cache.get("pubmed", "q1") is None
+        cache.close()
+
+    def test_off_mode_does_not_touch_disk(self, tmp_path):
+        path = tmp_path / "off.sqlite3"
+        cache = CountCache(path=path, mode="off")
+        cache.put("pubmed", "q", 1)
+        assert cache.get("pubmed", "q") is None
+        assert not path.exists()
+
+    def test_refresh_mode_ignores_but_overwrites(self, cache):
+        cache.put("pubmed", "q", 1)
+        cache.set_mode("refresh")
+        assert cache.get("pubmed", "q") is None
+        cache.put("pubmed", "q", 2)
+        cache.set_mode("read")
+        assert cache.get("pubmed", "q") == 2
+
+    def test_invalid_mode(self, cache):
+        with pytest.raises(ValueError):
+            cache.set_mode("write")
+
+
+class TestClientIntegration:
+    """クライアントからの利用のテスト"""
+
+    def make_client(self, session, cache, base_url=EUTILS_BASE_URL):
+        return EutilsClient(
+            api_key="dummy",
+            session=session,
+            base_url=base_url,
+            rate_limiter=TokenBucket(rate=1000.0),
+            backoff_seconds=0,
+            count_cache=cache,
+        )
+
+    def test_second_count_is_served_from_cache(self, cache):
+        session = MagicMock()
+        session.get.return_value = esearch_response(42)
+        client = self.make_client(session, cache)
+
+        assert client.count("ikigai[tiab]") == 42
+        assert client.count(" ikigai[tiab] ") == 42
+        assert session.get.call_count == 1
+        assert cache.hits == 1
+
+    def test_counts_are_kept_per_server(self, cache):
+        session = MagicMock()
+        session.get.return_value = esearch_response(7)
+        stub = self.make_client(session, cache, base_url="http://127.0.0.1:8000/")
+        assert stub.count("ikigai[tiab]") == 7
+
+        # スタブの件数をNCBIの件数として読まない
+        session.get.return_value = esearch_response(42)
+        assert self.make_client(session, cache).count("ikigai[tiab]") == 42
+        assert stub.count("ikigai[tiab]") == 7
+        assert session.get.call_count == 2
+        assert cache.get("pubmed", "ikigai[tiab]") == 42
+
+    def test_errorlist_results_are_not_cached(self, cache):
+        session = MagicMock()
+        session.get.return_value = esearch_response(0, errorlist={"phrasesnotfound": ["zzz"]})
+        client = self.make_client(session, cache)
+
+        assert client.count("zzz[tiab]", strict=False) == 0
+        assert client.count("zzz[tiab]", strict=False) == 0
+        assert session.get.call_count == 2
+
+
+def test_add_cache_argument():
+    parser = argparse.ArgumentParser()
+    add_cache_argument(parser)
+    assert parser.parse_args([]).cache is None
+    assert parser.parse_args(["--cache=refresh"]).cache == "refresh"
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--cache=write"])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+設定ファイルで定義するフィルター行列のテスト
+
+テスト対象:
+1. 設定（辞書 / YAML / JSON）から組み立てる検索式とセルの並び
+2. 全セルの件数取得と、前回の結果（JSON）にあるセルの再利用
+3. 不正な設定の検出
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from scripts.eutils import (
+    POPULATION_ONLY,
+    FilterMatrixSpec,
+    load_previous_counts,
+    run_filter_matrix,
+)
+from scripts.eutils.stub_server import SyntheticCorpus
+
+SPEC = {
+    "name": "Test matrix",
+    "population": "p[tiab]",
+    "include_population_only": True,
+    "blocks": {"A": "a[tiab]", "B": "b[tiab]"},
+    "clauses": {"not_x": "NOT x[tiab]"},
+    "filters": [
+        {"name": "base"},
+        {"name": "no_x", "apply": ["not_x"]},
+        {"name": "no_x_y", "extends": "no_x", "apply": ["y[tiab]"], "reference": "base"},
+    ],
+    "periods": {"all": None, "recent": {"from": "2020"}},
+}
+
+
+@pytest.fixture
+def corpus():
+    records = {pmid: {"year": 2015 if pmid <= 10 else 2022} for pmid in range(1, 21)}
+    terms = {
+        "p[tiab]": list(range(1, 21)),
+        "a[tiab]": list(range(1, 16)),
+        "b[tiab]": [3, 4, 18],
+        "x[tiab]": [1, 2, 3, 11],
+        "y[tiab]": list(range(1, 21, 2)),
+    }
+    return SyntheticCorpus(terms=terms, records=records, size=0, auto_terms=False)
+
+
+def test_spec_builds_queries():
+    spec = FilterMatrixSpec.from_dict(SPEC)
+    cells = spec.cells()
+
+    assert len(cells) == 2 * 3 * 3  # periods × (population only + 2 blocks) × filters
+    assert cells[0].block == POPULATION_ONLY and cells[0].query == "(p[tiab])"
+    last = cells[-1]
+    assert (last.block, last.filter, last.period) == ("B", "no_x_y", "recent")
+    assert last.query == '(p[tiab]) AND (b[tiab]) AND ("2020"[PDAT] : "3000"[PDAT]) NOT x[tiab] AND (y[tiab])'
+    assert [stage.reference for stage in spec.filters] == [None, "base", "base"]
+
+
+def test_run_and_reuse_previous(tmp_path, stub, client):
+    spec = FilterMatrixSpec.from_dict(SPEC)
+    result = run_filter_matrix(spec, client=client, max_in_flight=4)
+    assert stub.stats["esearch"] == 18
+    assert result.reused == 0
+    assert result.count("A", "base") == 15
+    assert result.count("A", "no_x") == 11
+    assert result.count("A", "no_x_y", period="recent") == 2  # 11〜15 から x と偶数を除いた 13, 15
+    assert result.count(POPULATION_ONLY, "base", period="recent") == 10
+
+    markdown_path, json_path = result.save(tmp_path / "matrix")
+    assert "| A | 15 | 11 (-26.7%) |" in markdown_path.read_text(encoding="utf-8")
+
+    # 前回の結果にある検索式は再検索しない（ブロックを1つ変えた分だけ検索する）
+    changed = FilterMatrixSpec.from_dict({**SPEC, "blocks": {"A": "a[tiab]", "B": "b[tiab] OR y[tiab]"}})
+    rerun = run_filter_matrix(changed, previous=load_previous_counts(json_path), client=client, max_in_flight=4)
+    assert stub.stats["esearch"] == 18 + 6
+    assert rerun.reused == 12
+
+
+def test_yaml_and_json_specs(tmp_path):
+    yaml = pytest.importorskip("yaml")
+    (tmp_path / "spec.yaml").write_text(yaml.safe_dump(SPEC, allow_unicode=True), encoding="utf-8")
+    (tmp_path / "spec.json").write_text(json.dumps(SPEC), encoding="utf-8")
+    assert FilterMatrixSpec.load(tmp_path / "spec.yaml").cells() == FilterMatrixSpec.load(tmp_path / "spec.json").cells()
+
+    specs = Path(__file__).resolve().parents[1] / "scripts" / "search" / "validation" / "specs"
+    for path in specs.glob("*.yaml"):
+        assert FilterMatrixSpec.load(path).cells()
+
+
+def test_invalid_specs():
+    with pytest.raises(ValueError):
+        FilterMatrixSpec.from_dict({"population": "p"})
+    with pytest.raises(ValueError):
+        FilterMatrixSpec.from_dict({**SPEC, "filters": [{"name": "a", "extends": "missing"}]})
+    with pytest.raises(ValueError):
+        FilterMatrixSpec.from_dict({**SPEC, "filters": ["base", "base"]})
+    with pytest.raises(ValueError):
+        FilterMatrixSpec.from_dict({**SPEC, "periods": {"bad": {"to": "2020"}}})
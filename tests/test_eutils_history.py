@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+履歴サーバー（WebEnv / query_key）による組み合わせのテスト
+
+テスト対象:
+1. 検索行は1回だけ検索され、組み合わせは #n 参照で数えられること
+2. query_key の上限に達したら WebEnv を作り直すこと
+3. WebEnv の失効（HistoryExpiredError）から自動で復旧すること
+4. analyze_block_overlap の累積ORが履歴参照で数えられること
+"""
+
+import pytest
+
+from scripts.eutils import HistoryEngine, set_client
+from scripts.eutils.stub_server import SyntheticCorpus
+
+TERMS = {
+    '"Physicians"[Mesh]': [1, 2, 3, 4],
+    "ikigai[tiab]": [3, 4, 5],
+    '"work engagement"[tiab]': [5, 6],
+    "burnout[tiab]": [1, 6, 7],
+}
+
+
+@pytest.fixture
+def corpus():
+    return SyntheticCorpus(terms=TERMS, size=0, auto_terms=False)
+
+
+def test_combinations_use_history_references(stub, client):
+    engine = HistoryEngine(client)
+    physicians = engine.term('"Physicians"[Mesh]')
+    ikigai = engine.term("ikigai[tiab]")
+    engagement = engine.term('"work engagement"[tiab]')
+
+    assert engine.count(physicians & ikigai) == 2
+    assert engine.count((physicians | engagement) - ikigai) == 3
+    assert engine.count(physicians) == 4  # 登録済みの件数を再利用
+    assert engine.requests == 6
+    assert stub.stats["esearch"] == 6
+    assert engine.expression(physicians & ikigai) == '("Physicians"[Mesh]) AND (ikigai[tiab])'
+
+
+def test_key_cap_starts_new_webenv(client):
+    engine = HistoryEngine(client, max_keys=3)
+    nodes = [engine.term(term) for term in TERMS]
+
+    assert engine.count(nodes[0] | nodes[1]) == 5
+    first_webenv, first_generation = engine.webenv, engine.generation
+    assert engine.count(nodes[2] | nodes[3]) == 4
+    assert engine.webenv != first_webenv
+    assert engine.generation == first_generation + 1
+
+    with pytest.raises(ValueError):
+        engine.key(nodes[0] | nodes[1] | nodes[2])
+
+
+def test_expired_history_is_rebuilt(stub, client):
+    engine = HistoryEngine(client)
+    physicians = engine.term('"Physicians"[Mesh]')
+    burnout = engine.term("burnout[tiab]")
+    engine.count(physicians)
+    engine.count(burnout)
+
+    stub.expire_histories()
+    assert engine.count(physicians & burnout) == 1
+    assert engine.generation == 1
+
+
+def test_analyze_block_overlap_with_history(client):
+    from scripts.search.term_validator.check_block_overlap import analyze_block_overlap
+
+    set_client(client)
+    try:
+        results, report = analyze_block_overlap(
+            ["ikigai[tiab]", '"work engagement"[tiab]', "zzz[tiab]"], use_history=True
+        )
+    finally:
+        set_client(None)
+
+    assert [r["individual_count"] for r in results] == [3, 2, None]
+    assert [r["cumulative_count"] for r in results] == [3, 4, None]
+    assert [r["added_count"] for r in results] == [3, 1, None]
+    assert results[2]["cumulative_error"] is True
+    assert "Total unique papers**: 4" in report
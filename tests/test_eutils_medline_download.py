@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+再開できる MEDLINE ダウンロードのテスト
+
+テスト対象:
+1. バッチごとの保存と、中断後に取得済みのバッチを飛ばして再開すること
+2. 失敗した範囲の再取得、WebEnv 失効時の再検索、範囲が変わったときの取り直し
+3. 範囲を並列に取得しても retstart の順に読み出せること、同時に投入する範囲が max_in_flight 程度に収まること
+4. download_pubmed_results.py がチェックポイントからRISを書き出すこと
+"""
+
+import sys
+import threading
+import time
+
+import pytest
+
+from scripts.eutils import (
+    EutilsClient,
+    EutilsError,
+    MedlineDownload,
+    TokenBucket,
+    count_medline_records,
+    fetch_batches,
+    set_client,
+)
+from scripts.eutils.stub_server import FaultConfig, StubEutilsServer, SyntheticCorpus
+from scripts.search.pubmed import download_pubmed_results
+
+
+@pytest.fixture
+def corpus():
+    return SyntheticCorpus(terms={"a[tiab]": list(range(1, 51))}, size=0, auto_terms=False)
+
+
+def test_resume_after_interruption(tmp_path, stub, client):
+    download = MedlineDownload.for_query(tmp_path, "a[tiab]", client=client, batch_size=7)
+    fetch = download.fetch
+    calls = []
+
+    def flaky(retstart, retmax):
+        calls.append(retstart)
+        if retstart == 21:
+            raise EutilsError("connection reset")
+        return fetch(retstart, retmax)
+
+    download.fetch = flaky
+    assert not download.run(max_attempts=2)
+    assert calls.count(21) == 2 and set(download.failed) == {21}
+    assert download.records == 43 and (download.directory / "manifest.json").exists()
+
+    # 別の実行（新しい WebEnv）から再開すると、失敗したバッチだけを取得する
+    fetched = stub.stats["efetch"]
+    resumed = MedlineDownload.for_query(tmp_path, " a[tiab] ", client=client, batch_size=7)
+    assert resumed.directory == download.directory and resumed.pending == [21]
+    assert resumed.run() and not resumed.failed
+    assert stub.stats["efetch"] - fetched == 1
+
+    pmids = [line.split()[-1] for text in resumed.iter_batches() for line in text.splitlines()
+             if line.startswith("PMID- ")]
+    assert pmids == [str(pmid) for pmid in range(50, 0, -1)]
+    written = resumed.write_medline(tmp_path / "all.txt")
+    assert count_medline_records(written.read_text(encoding="utf-8")) == 50
+
+    # バッチサイズが変わると範囲が合わないので最初から
+    assert MedlineDownload.for_query(tmp_path, "a[tiab]", client=client, batch_size=10).pending == [0, 10, 20, 30, 40]
+
+
+def test_expired_history_and_pmid_lists(tmp_path, stub, client):
+    download = MedlineDownload.for_query(tmp_path, "a[tiab]", client=client, batch_size=20)
+    stub.expire_histories()
+    assert download.run()
+    assert stub.stats["esearch"] == 2 and download.records == 50
+
+    by_ids = MedlineDownload.for_pmids(tmp_path, [str(pmid) for pmid in range(1, 26)], client=client, batch_size=10)
+    assert by_ids.run() and by_ids.records == 25 and by_ids.directory != download.directory
+    by_ids.cleanup()
+    assert not by_ids.directory.exists()
+
+
+def test_truncated_batches_are_fetched_again(tmp_path, stub, client):
+    download = MedlineDownload.for_query(tmp_path, "a[tiab]", client=client, batch_size=10)
+    fetch = download.fetch
+    truncated = []
+
+    def truncate_once(retstart, retmax):
+        text = fetch(retstart, retmax)
+        if retstart == 20 and not truncated:
+            truncated.append(retstart)
+            return text[:text.index("PMID- ", text.index("PMID- ") + 1)]  # 1件だけ
+        return text
+
+    download.fetch = truncate_once
+    assert download.run() and download.records == 50 and download.completed[20] == 10
+    assert stub.stats["efetch"] == 6
+
+    # PMIDリストでは存在しないPMIDの分だけ少なくても取得済みとする
+    by_ids = MedlineDownload.for_pmids(tmp_path, ["1", "2", "999999"], client=client, batch_size=3)
+    assert by_ids.run() and by_ids.records == 2
+
+
+def test_parallel_ranges_keep_order(tmp_path, corpus, make_client):
+    faults = FaultConfig(jitter=0.02, error_rate_5xx=0.2, seed=3)
+    with StubEutilsServer(corpus, faults=faults) as stub:
+        client = make_client(stub)
+        download = MedlineDownload.for_query(tmp_path, "a[tiab]", client=client, batch_size=5)
+        stub.expire_histories()
+        assert download.run(max_in_flight=6)
+        assert stub.stats["esearch"] == 2  # 失効を並列に検知しても検索し直すのは1回
+        text = "".join(download.iter_batches())
+        assert [int(line[6:]) for line in text.splitlines() if line.startswith("PMID- ")] == list(range(50, 0, -1))
+
+        def fetch(retstart, retmax):
+            if retstart == 10:
+                raise EutilsError("boom")
+            return "" if retstart == 20 else "".join(f"PMID- {retstart + i}\n" for i in range(min(retmax, 3)))
+
+        results = dict(fetch_batches(fetch, [0, 10, 20, 30], total=33, batch_size=10, max_in_flight=3, client=client))
+        assert results[30] == "PMID- 30\nPMID- 31\nPMID- 32\n"
+        assert all(isinstance(results[start], EutilsError) for start in (0, 10, 20))  # 0 は3件で途中切れ
+        partial = dict(fetch_batches(fetch, [0, 20], total=33, batch_size=10, client=client, require_full=False))
+        assert partial[0].count("PMID- ") == 3 and isinstance(partial[20], EutilsError)
+
+
+def test_fetch_batches_submits_a_bounded_window():
+    client = EutilsClient(rate_limiter=TokenBucket(rate=1000.0), backoff_seconds=0)
+    release = threading.Event()
+    calls = []
+
+    def fetch(retstart, retmax):
+        calls.append(retstart)
+        if retstart == 0:
+            release.wait(5)
+        return f"PMID- {retstart}\n"
+
+    batches = fetch_batches(fetch, list(range(0, 1000, 10)), total=1000, batch_size=10, max_in_flight=2, client=client)
+    try:
+        next(batches)
+        time.sleep(0.1)
+        # 先頭の範囲が終わらなくても、受け取り側が進めない限り次の範囲は投入されない
+        assert len(calls) <= 3
+    finally:
+        release.set()
+        batches.close()
+
+
+def test_download_script_writes_ris(tmp_path, monkeypatch, client):
+    formula = tmp_path / "search_formula.md"
+    formula.write_text("## PubMed/MEDLINE\n\n```\n#1 a[tiab]\n#2 a[tiab]\n#3 #1 AND #2\n```\n", encoding="utf-8")
+    output = tmp_path / "out"
+    set_client(client)
+    try:
+        monkeypatch.setattr(sys, "argv", [
+            "download_pubmed_results.py", "--formula-file", str(formula), "--output-dir", str(output),
+            "--batch-size", "15", "--max-in-flight", "3",
+        ])
+        assert download_pubmed_results.main() == 0
+    finally:
+        set_client(None)
+    (ris,) = output.glob("*_50_pubmed.ris")
+    text = ris.read_text(encoding="utf-8")
+    assert text.count("TY  - JOUR") == 50 and text.count("ER  -") == 50
+    assert not (output / ".medline_checkpoints").exists() or not any((output / ".medline_checkpoints").iterdir())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+MEDLINE → RIS 逐次変換のテスト
+
+テスト対象:
+1. 継続行・DOI・対応表にないタグの扱いと、レコードの区切り
+2. ファイルから1レコードずつ読み、一定のメモリでRISを書き出すこと
+3. efetch の応答を変換するスクリプトの関数
+"""
+
+import tracemalloc
+
+from scripts.eutils import (
+    convert_medline_file,
+    convert_medline_to_ris,
+    iter_medline_records,
+    iter_ris_entries,
+)
+from scripts.eutils.medline_ris import benchmark, write_synthetic_medline
+from scripts.search.query_executor import execute_pps_search
+
+MEDLINE = """PMID- 31000001
+OWN - NLM
+TI  - Ikigai in general
+      practice.
+LID - 10.1000/main [doi]
+LID - e101 [pii]
+AB  - Meaning matters.
+      It does.
+FAU - Sato, Hana
+AU  - Sato H
+FAU - Suzuki, Ken
+AU  - Suzuki K
+MH  - Physicians/psychology
+AID - 10.1000/main [doi]
+PMID- 31000002
+TI  - Second record.
+"""
+
+
+def test_records_and_fields():
+    first, second = list(iter_medline_records(MEDLINE))
+    assert first[2] == ("TI", "Ikigai in general practice.")
+    assert ("AB", "Meaning matters. It does.") in first
+    assert second == [("PMID", "31000002"), ("TI", "Second record.")]
+
+    entry = next(iter_ris_entries(MEDLINE.splitlines(keepends=True)))
+    assert entry == (
+        "TY  - JOUR\n"
+        "ID  - 31000001\n"
+        "T1  - Ikigai in general practice.\n"
+        "DO  - 10.1000/main\n"
+        "AB  - Meaning matters. It does.\n"
+        "A1  - Sato H\n"
+        "A1  - Suzuki K\n"
+        "KW  - Physicians/psychology\n"
+        "ER  -\n\n"
+    )
+    # 著者1人につき著者のタグは1行
+    assert [line for line in entry.splitlines() if line[:2] in ("A1", "AU")] == ["A1  - Sato H", "A1  - Suzuki K"]
+    assert convert_medline_to_ris(MEDLINE + "\n\n").count("TY  - JOUR") == 2
+    assert list(iter_ris_entries("")) == []
+
+
+def test_file_conversion_in_bounded_memory(tmp_path):
+    source = tmp_path / "dump.medline"
+    size = write_synthetic_medline(source, 3000)
+
+    tracemalloc.start()
+    try:
+        count = convert_medline_file(str(source), tmp_path / "dump.ris")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == 3000 and peak < size / 20
+    text = (tmp_path / "dump.ris").read_text(encoding="utf-8")
+    assert text.count("ER  -\n") == 3000 and text.count("DO  - ") == 3000
+
+    result = benchmark(200, directory=tmp_path)
+    assert result["records"] == 200 and result["records_per_second"] > 0
+
+
+def test_script_export(tmp_path):
+    records = [MEDLINE.split("PMID- 31000002")[0], "PMID- 31000002\nTI  - Second record.\n"]
+    execute_pps_search.export_to_ris(records, "out.ris", str(tmp_path))
+    text = (tmp_path / "out.ris").read_text(encoding="utf-8")
+    assert text.count("TY  - JOUR") == 2 and "T1  - Second record.\n" in text
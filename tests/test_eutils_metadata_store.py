@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PMIDメタデータストア（フィルターを手元で評価する）のテスト
+
+テスト対象:
+1. efetch（XML）からの一括取得、不足分だけの追加取得、保存とメモリマップでの読み込み
+2. フィルター段階（年・Animals/Humans・言語・出版タイプ）の件数が esearch の件数と一致すること
+3. 手元で評価できない条件の検出と、実際の件数との照合
+"""
+
+import numpy as np
+import pytest
+
+from scripts.eutils import (
+    PmidMetadataStore,
+    PmidSet,
+    UnsupportedFilterError,
+    cross_check_counts,
+)
+from scripts.eutils.stub_server import SyntheticCorpus
+from scripts.search.validation.filter_impact_analyzer import (
+    FILTER_CLAUSES,
+    FilterImpactAnalyzer,
+    generate_markdown_report,
+)
+
+LANGUAGES = (["eng"], ["jpn"], ["fre"], ["eng", "ger"])
+TYPES = (["Journal Article"], ["Journal Article", "Editorial"], ["Letter"], ["Comment", "Journal Article"],
+         ["Journal Article", "Review"])
+
+
+@pytest.fixture
+def corpus():
+    records = {
+        pmid: {
+            "year": 2005 + pmid % 17,
+            "languages": LANGUAGES[pmid % 4],
+            "publication_types": TYPES[pmid % 5],
+        }
+        for pmid in range(1, 121)
+    }
+    terms = {
+        "p[tiab]": list(range(1, 121)),
+        "a[tiab]": list(range(1, 81)),
+        "b[tiab]": list(range(60, 121, 2)),
+        "Humans[Mesh]": [pmid for pmid in range(1, 121) if pmid % 3],
+        "Animals[Mesh]": [pmid for pmid in range(1, 121) if pmid % 3 != 1],
+    }
+    for name, code in (("english", "eng"), ("japanese", "jpn"), ("french", "fre")):
+        terms[f"{name}[lang]"] = [pmid for pmid, record in records.items() if code in record["languages"]]
+    for pt in ("Editorial", "Letter", "Comment", "Review"):
+        terms[f"{pt}[pt]"] = [pmid for pmid, record in records.items() if pt in record["publication_types"]]
+    return SyntheticCorpus(terms=terms, records=records, size=0, auto_terms=False)
+
+
+def test_populate_incrementally_and_reload(tmp_path, stub, client):
+    store = PmidMetadataStore.load(tmp_path, client=client)
+    assert len(store) == 0
+
+    first = PmidSet(range(1, 61))
+    assert store.populate(first, page_size=25) == 60
+    assert (stub.stats["epost"], stub.stats["efetch"]) == (1, 3)
+
+    second = PmidSet(range(41, 101))
+    assert store.populate(second, page_size=25) == 40  # 41〜60 は取得済み
+    assert store.populate(second) == 0
+    assert (stub.stats["epost"], stub.stats["efetch"]) == (2, 5)
+
+    loaded = PmidMetadataStore.load(tmp_path)
+    assert isinstance(loaded.pmids, np.memmap)
+    assert loaded.pmids.tolist() == list(range(1, 101))
+    assert loaded.pub_year[9] == 2005 + 10 % 17
+    rows = loaded.rows(PmidSet([8, 12, 13]))
+    assert loaded.count(PmidSet([8, 12, 13]), ['AND English[lang]']) == 2  # 13 は jpn
+    assert set(loaded.select(PmidSet(range(1, 101)), ['AND ger[la]'])) == {p for p in range(1, 101) if p % 4 == 3}
+    assert rows.tolist() == [7, 11, 12]
+    with pytest.raises(KeyError):
+        loaded.rows(PmidSet([101]))
+
+
+@pytest.mark.parametrize("block", ["a[tiab]", "b[tiab]"])
+def test_filter_stages_match_live_counts(tmp_path, block, stub, client):
+    store = PmidMetadataStore(tmp_path, client=client)
+    queries = FilterImpactAnalyzer.build_filter_queries("p[tiab]", block)
+    pmids = store.cached_set(queries["base"])
+    store.populate(pmids)
+
+    for stage, clauses in FILTER_CLAUSES.items():
+        assert store.count(pmids, clauses) == client.count(queries[stage]), stage
+    extra = ['AND ("2010"[PDAT] : "2015/12/31"[PDAT])', 'NOT Review[Publication Type]',
+             'AND (Animals[Mesh:noexp] OR "Letter"[PT])', 'AND "2008"[PDAT] : "3000"[PDAT]']
+    assert store.count(pmids, extra) == client.count(" ".join([queries["base"]] + extra))
+
+    searched = stub.stats["esearch"]
+    assert store.cached_set(queries["base"]) == pmids
+    assert stub.stats["esearch"] == searched
+
+
+def test_unsupported_filters_and_cross_check(tmp_path, client):
+    store = PmidMetadataStore(tmp_path, client=client)
+    pmids = PmidSet(range(1, 21))
+    store.populate(pmids)
+    for clause in ('AND x[tiab]', 'AND "Physicians"[Mesh]', 'AND ("2020/06/01"[PDAT] : "3000"[PDAT])',
+                   'AND Klingon[lang]', 'AND humans', 'OR Letter[PT]', 'AND #1', 'AND (English[lang]'):
+        with pytest.raises(UnsupportedFilterError):
+            store.count(pmids, [clause])
+
+    analyzer = FilterImpactAnalyzer(max_in_flight=4)
+    analyzer.client = client
+    results, checks = analyzer.analyze_blocks_locally(
+        "p[tiab]", {"A": "a[tiab]", "B": "b[tiab]"}, store, cross_check=4
+    )
+    assert len(checks) == 4 and all(check.matches for check in checks)
+    assert results["B"]["base"] == 31
+
+    cells = {("A", "wrong"): ("a[tiab]", 1)}
+    (check,) = cross_check_counts(cells, sample=5, client=client)
+    assert not check.matches and check.live == 80
+    report = generate_markdown_report(results, {"A": "a[tiab]", "B": "b[tiab]"}, cross_checks=checks + [check])
+    assert "## 件数の照合" in report and "| A | wrong | 1 | 80 | -79 |" in report
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PMID集合の取得と集合演算によるブロック重複分析のテスト
+
+テスト対象:
+1. esearch + efetch(uilist) のページ取得で全PMIDが揃うこと
+2. 失敗した検索式がエラーとして記録されること
+3. analyze_block_overlap(local_sets=True) の累積・追加・固有件数とリクエスト数
+4. 用語グループの共起関係を、用語ごとに1回の取得で求めること
+5. 取得上限を超える検索式を [PDAT] の期間で分割して全PMIDを取得すること
+6. search_pmids が上限を超える分を WebEnv から取得し、履歴が失効した場合だけ期間で分割すること
+"""
+
+from datetime import date
+
+import pytest
+
+from scripts.eutils import (
+    EutilsError,
+    PmidSet,
+    fetch_pmid_set,
+    fetch_pmid_set_partitioned,
+    fetch_pmid_sets,
+    search_pmids,
+    set_client,
+)
+from scripts.eutils.stub_server import StubEutilsServer, SyntheticCorpus
+
+TERMS = {
+    "a[tiab]": list(range(1, 26)),
+    "b[tiab]": list(range(20, 31)),
+    "c[tiab]": [5, 6, 40],
+}
+
+
+@pytest.fixture
+def corpus():
+    return SyntheticCorpus(terms=TERMS, size=0, auto_terms=False)
+
+
+def test_paged_retrieval(stub, client):
+    pmids = fetch_pmid_set("a[tiab]", client=client, page_size=10)
+
+    assert pmids == PmidSet(range(1, 26))
+    assert stub.stats["esearch"] == 1
+    assert stub.stats["efetch"] == 2
+
+
+def test_errors_are_kept_per_query(client):
+    results = fetch_pmid_sets(["c[tiab]", "zzz[tiab]"], client=client, max_in_flight=2)
+
+    assert results[0].pmids.to_strings() == ["5", "6", "40"]
+    assert results[1].success is False
+    assert "phrasesnotfound" in results[1].error
+
+
+def test_efetch_error_body_fails_only_its_query(client):
+    efetch = client.efetch
+
+    def backend_failure(**params):
+        if params.get("retstart") == "10":
+            return "<ERROR>Search Backend failed</ERROR>"
+        return efetch(**params)
+
+    client.efetch = backend_failure
+    results = fetch_pmid_sets(["a[tiab]", "c[tiab]"], client=client, max_in_flight=2, page_size=10)
+
+    assert "Search Backend failed" in results[0].error
+    assert results[1].pmids.to_strings() == ["5", "6", "40"]
+
+
+def test_analyze_block_overlap_with_local_sets(stub, client):
+    from scripts.search.term_validator.check_block_overlap import analyze_block_overlap
+
+    set_client(client)
+    try:
+        results, report = analyze_block_overlap(["a[tiab]", "b[tiab]", "c[tiab]"], block_name="Test", local_sets=True)
+    finally:
+        set_client(None)
+
+    assert [r["individual_count"] for r in results] == [25, 11, 3]
+    assert [r["cumulative_count"] for r in results] == [25, 30, 31]
+    assert [r["added_count"] for r in results] == [25, 5, 1]
+    assert [r["unique_count"] for r in results] == [17, 5, 1]
+    assert stub.stats["esearch"] == 3
+    assert "| Unique |" in report
+    assert "Total unique papers**: 31" in report
+    assert "### Leave-one-out Redundancy" in report
+    assert "### Greedy Term Order" in report
+
+
+def test_term_group_overlap_fetches_each_term_once(make_client):
+    from scripts.search.mesh_analyzer.check_mesh_overlap import analyze_term_group_overlap
+
+    corpus = SyntheticCorpus(terms={'"a"[tiab]': TERMS["a[tiab]"], '"b"[tiab]': TERMS["b[tiab]"]}, size=0, auto_terms=False)
+    with StubEutilsServer(corpus) as server:
+        set_client(make_client(server))
+        try:
+            overlaps, matrix = analyze_term_group_overlap(["a", "b", "zzz"], "[tiab]")
+        finally:
+            set_client(None)
+        assert server.stats["esearch"] == 3
+
+    assert [(o["term1"], o["term2"], o["combined_count"]) for o in overlaps] == [("a", "b", 6), ("a", "zzz", 0), ("b", "zzz", 0)]
+    assert overlaps[0]["inclusion_ratio2"] == 6 / 11
+    assert overlaps[1]["message"].startswith("Error")
+    assert matrix.terms == ["a", "b"]
+
+
+def test_partitioned_retrieval_beyond_cap(make_client):
+    # 1990〜2024年に毎年 4〜9 件
+    records, pmid = {}, 0
+    for year in range(1990, 2025):
+        for _ in range(4 + year % 6):
+            pmid += 1
+            records[pmid] = {"year": year}
+    corpus = SyntheticCorpus(terms={"big[tiab]": list(records)}, records=records, size=0, auto_terms=False)
+    with StubEutilsServer(corpus) as stub:
+        client = make_client(stub)
+        result = fetch_pmid_set_partitioned("big[tiab]", client=client, max_in_flight=4, cap=20)
+
+        assert result.complete and result.pmids == PmidSet(records)
+        assert result.count == len(records)
+        assert all(0 < piece.count <= 20 for piece in result.slices)
+        assert sum(piece.count for piece in result.slices) == len(records)
+        assert all(a.end < b.start for a, b in zip(result.slices, result.slices[1:]))
+
+        small = fetch_pmid_set_partitioned("big[tiab] AND 2000[PDAT]", client=client, cap=20)
+        assert small.slices == () and len(small.pmids) == 4 + 2000 % 6
+
+        with pytest.raises(EutilsError, match="cannot partition"):
+            fetch_pmid_set_partitioned(
+                "big[tiab]", client=client, max_in_flight=4, cap=5, start=date(2000, 1, 1), end=date(2000, 1, 4)
+            )
+
+
+def test_search_pmids_continues_from_webenv(make_client):
+    records = {pmid: {"year": 1990 + pmid % 30} for pmid in range(1, 61)}
+    corpus = SyntheticCorpus(terms={"big[tiab]": list(records)}, records=records, size=0, auto_terms=False)
+    with StubEutilsServer(corpus) as stub:
+        client = make_client(stub)
+        result = search_pmids("big[tiab]", retmax=100, client=client, page_size=15, cap=20)
+        assert result.count == 60 and result.webenv and result.query_key == "1"
+        assert result.pmids == [str(pmid) for pmid in range(60, 0, -1)]
+        assert stub.stats["esearch"] == 1 and stub.stats["efetch"] == 3
+
+        assert search_pmids("big[tiab]", retmax=25, client=client, cap=20).pmids == [
+            str(pmid) for pmid in range(60, 35, -1)
+        ]
+        counted = search_pmids("big[tiab]", retmax=0, client=client)
+        assert counted.count == 60 and counted.pmids == []
+
+        # 履歴が失効していれば期間で分割して取得する
+        searches = stub.stats["esearch"]
+        stub_esearch = client.esearch
+
+        def esearch_then_expire(*args, **kwargs):
+            result = stub_esearch(*args, **kwargs)
+            stub.expire_histories()
+            return result
+
+        client.esearch = esearch_then_expire
+        result = search_pmids("big[tiab]", retmax=100, client=client, cap=20)
+        assert sorted(result.pmids, key=int) == [str(pmid) for pmid in range(1, 61)]
+        assert stub.stats["esearch"] > searches + 1
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PubMed XML 逐次パーサーのテスト
+
+テスト対象:
+1. MeSH、タイトル・抄録、出版情報、DOI、出版タイプを1回の走査で取り出すこと
+2. 大きな efetch の出力を一定のメモリで読めること
+3. 既存の抽出関数・引用情報の組み立てが解析結果を使うこと
+"""
+
+import tracemalloc
+
+from scripts.eutils import (
+    PubmedRecord,
+    fetch_article_xml,
+    iter_pubmed_records,
+    parse_pubmed_record,
+)
+from scripts.eutils.stub_server import StubEutilsServer, SyntheticCorpus
+from scripts.search import extract_mesh
+from scripts.validation.seed_analyzer import check_specific_papers
+
+SAMPLE = b"""<?xml version="1.0" ?>
+<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2024//EN"
+  "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">
+<PubmedArticleSet>
+<PubmedArticle>
+  <MedlineCitation Status="MEDLINE" Owner="NLM">
+    <PMID Version="1">31000001</PMID>
+    <Article PubModel="Print">
+      <Journal>
+        <JournalIssue CitedMedium="Internet">
+          <Volume>12</Volume><Issue>3</Issue>
+          <PubDate><MedlineDate>2019 Nov-Dec</MedlineDate></PubDate>
+        </JournalIssue>
+        <Title>Journal of Tests</Title>
+        <ISOAbbreviation>J Tests</ISOAbbreviation>
+      </Journal>
+      <ArticleTitle>Ikigai in <i>general</i> practice.</ArticleTitle>
+      <Pagination><MedlinePgn>101-9</MedlinePgn></Pagination>
+      <ELocationID EIdType="doi" ValidYN="Y">10.1000/eloc</ELocationID>
+      <Abstract>
+        <AbstractText Label="BACKGROUND">Meaning matters.</AbstractText>
+        <AbstractText Label="RESULTS">It does.</AbstractText>
+      </Abstract>
+      <AuthorList CompleteYN="Y">
+        <Author ValidYN="Y"><LastName>Sato</LastName><ForeName>Hana</ForeName></Author>
+        <Author ValidYN="Y"><LastName>Ito</LastName></Author>
+        <Author ValidYN="Y"><CollectiveName>SRWS Group</CollectiveName></Author>
+      </AuthorList>
+      <Language>eng</Language>
+      <PublicationTypeList>
+        <PublicationType UI="D016428">Journal Article</PublicationType>
+        <PublicationType UI="D016454">Review</PublicationType>
+      </PublicationTypeList>
+    </Article>
+    <MeshHeadingList>
+      <MeshHeading>
+        <DescriptorName UI="D010820" MajorTopicYN="Y">Physicians</DescriptorName>
+        <QualifierName UI="Q000523" MajorTopicYN="N">psychology</QualifierName>
+      </MeshHeading>
+      <MeshHeading><DescriptorName UI="D006801" MajorTopicYN="N">Humans</DescriptorName></MeshHeading>
+    </MeshHeadingList>
+    <KeywordList Owner="NOTNLM"><Keyword>ikigai</Keyword></KeywordList>
+  </MedlineCitation>
+  <PubmedData>
+    <ArticleIdList>
+      <ArticleId IdType="pubmed">31000001</ArticleId>
+      <ArticleId IdType="doi">10.1000/main</ArticleId>
+    </ArticleIdList>
+    <ReferenceList>
+      <Reference><ArticleIdList><ArticleId IdType="doi">10.1000/reference</ArticleId></ArticleIdList></Reference>
+    </ReferenceList>
+  </PubmedData>
+</PubmedArticle>
+<PubmedBookArticle>
+  <BookDocument>
+    <PMID Version="1">31000002</PMID>
+    <Book><BookTitle>Handbook of Tests</BookTitle><PubDate><Year>2020</Year></PubDate></Book>
+    <Abstract><AbstractText>Chapter summary.</AbstractText></Abstract>
+  </BookDocument>
+</PubmedBookArticle>
+</PubmedArticleSet>
+"""
+
+
+def test_single_pass_fields():
+    article, book = list(iter_pubmed_records(SAMPLE))
+    assert article.pmid == "31000001"
+    assert article.title == "Ikigai in general practice."
+    assert article.abstract == "Meaning matters. It does."
+    assert (article.journal, article.journal_abbreviation, article.year) == ("Journal of Tests", "J Tests", "2019")
+    assert (article.volume, article.issue, article.pages) == ("12", "3", "101-9")
+    assert article.authors == ("Sato Hana", "Ito", "SRWS Group")
+    assert article.doi == "10.1000/main"
+    assert article.publication_types == ("Journal Article", "Review") and article.languages == ("eng",)
+    assert article.keywords == ("ikigai",)
+    assert article.mesh_terms[0] == {
+        "descriptor": "Physicians",
+        "ui": "D010820",
+        "major_topic": True,
+        "qualifiers": [{"name": "psychology", "ui": "Q000523", "major_topic": False}],
+    }
+    assert article.citation() == (
+        "Sato Hana, Ito, SRWS Group. Ikigai in general practice.. Journal of Tests. 2019;12(3):101-9. PMID: 31000001"
+    )
+    assert (book.pmid, book.title, book.year, book.abstract) == ("31000002", "Handbook of Tests", "2020", "Chapter summary.")
+
+    assert parse_pubmed_record(SAMPLE.decode("utf-8")) == article
+    assert parse_pubmed_record("") is None and parse_pubmed_record("<PubmedArticleSet>") is None
+
+
+def test_large_dump_in_bounded_memory(tmp_path):
+    body = SAMPLE.split(b"<PubmedArticleSet>")[1].split(b"<PubmedBookArticle>")[0]
+    path = tmp_path / "dump.xml"
+    with open(path, "wb") as f:
+        f.write(b"<PubmedArticleSet>\n")
+        for index in range(2000):
+            f.write(body.replace(b"31000001", str(40000000 + index).encode()))
+        f.write(b"</PubmedArticleSet>\n")
+
+    tracemalloc.start()
+    try:
+        count = 0
+        for record in iter_pubmed_records(str(path)):
+            count += 1
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == 2000 and record.pmid == "40001999"
+    assert peak < path.stat().st_size / 10
+
+
+def test_scripts_use_parsed_records(make_client):
+    corpus = SyntheticCorpus(terms={'"Physicians"[Mesh]': [5, 6]}, size=0, auto_terms=False)
+    with StubEutilsServer(corpus) as stub:
+        record = fetch_article_xml(["5"], client=make_client(stub))["5"].record
+
+    assert isinstance(record, PubmedRecord) and record.pmid == "5"
+    assert [term["descriptor"] for term in extract_mesh.extract_mesh_terms(record)] == ["Physicians"]
+    assert extract_mesh.extract_title_abstract(record)["title"] == record.title
+    assert extract_mesh.extract_publication_info(record)["authors"] == list(record.authors)
+    assert extract_mesh.extract_mesh_terms(SAMPLE.decode("utf-8"))[0]["descriptor"] == "Physicians"
+    assert extract_mesh.extract_mesh_terms(None) == []
+    assert check_specific_papers.get_paper_citation("5", record=record) == record.citation()
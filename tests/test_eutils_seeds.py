@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+シード論文の一括包含確認のテスト
+
+テスト対象:
+1. 検索される / されない / 存在しないPMIDの振り分けと入力順の保持
+2. チャンク分割時のリクエスト数
+3. チャンク単位の失敗が errors に記録されること
+"""
+
+import pytest
+
+from scripts.eutils import check_seed_inclusion
+from scripts.eutils.stub_server import SyntheticCorpus
+
+TERMS = {
+    '"Physicians"[Mesh]': [1, 2, 3, 4],
+    "ikigai[tiab]": [3, 4, 5],
+}
+RECORDS = {pmid: {"year": 2020} for pmid in range(1, 8)}
+
+
+@pytest.fixture
+def corpus():
+    return SyntheticCorpus(terms=TERMS, records=RECORDS, size=0, auto_terms=False)
+
+
+def test_captured_and_missed_in_one_request(stub, client):
+    inclusion = check_seed_inclusion('"Physicians"[Mesh]', ["4", "5", " 1", "4", "6"], client=client)
+
+    assert inclusion.captured == ["4", "1"]
+    assert inclusion.missed == ["5", "6"]
+    assert inclusion.included == {"4": True, "1": True, "5": False, "6": False}
+    assert inclusion.recall == 0.5
+    assert inclusion.requests == 1
+    assert stub.stats["esearch"] == 1
+
+
+def test_existence_check_and_chunks(client):
+    inclusion = check_seed_inclusion(
+        "ikigai[tiab]",
+        ["1", "3", "99", "5", "7"],
+        client=client,
+        chunk_size=2,
+        check_existence=True,
+    )
+
+    assert inclusion.captured == ["3", "5"]
+    assert inclusion.missed == ["1", "7"]
+    assert inclusion.not_found == ["99"]
+    assert inclusion.requests == 6
+
+
+def test_errors_are_recorded_per_pmid(client):
+    inclusion = check_seed_inclusion("zzz[tiab]", ["1", "abc"], client=client)
+
+    assert inclusion.captured == inclusion.missed == []
+    assert "phrasesnotfound" in inclusion.errors["1"]
+    assert inclusion.errors["abc"] == "Invalid PMID: abc"
+    assert inclusion.included == {"1": False, "abc": False}
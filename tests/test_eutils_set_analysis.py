@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+検索語のPMID集合に対する分析のテスト
+
+テスト対象:
+1. leave-one-out の損失件数と、同時に外せる検索語の組
+2. 遅延評価の貪欲法が、毎回すべての語を再計算する貪欲法と同じ順序になること
+3. 目標の割合とシードの条件を満たす推奨する組
+4. 200語以上のブロックでも即座に終わること
+5. 重複行列（積集合・Jaccard係数・包含率）が Python の set と一致し、CSVに保存できること
+"""
+
+import csv
+import random
+import time
+
+import numpy as np
+
+from scripts.eutils import (
+    OverlapMatrix,
+    PmidSet,
+    greedy_order,
+    leave_one_out,
+    recommend_terms,
+    removable_together,
+)
+
+
+def naive_order(sets):
+    """毎回すべての語の追加件数を数える貪欲法（比較用）"""
+    covered = set()
+    remaining = list(range(len(sets)))
+    order = []
+    while remaining:
+        best = max(remaining, key=lambda i: (len(set(sets[i]) - covered), -i))
+        if not set(sets[best]) - covered:
+            break
+        order.append(best)
+        covered |= set(sets[best])
+        remaining.remove(best)
+    return order
+
+
+def random_sets(rng, count, universe):
+    return [PmidSet(rng.sample(range(1, universe), rng.randrange(0, universe // 4))) for _ in range(count)]
+
+
+def test_leave_one_out_and_joint_removal():
+    # b と c は互いに補い合っている: 単独ではどちらも0件だが、両方外すと {3, 4} を失う
+    a, b, c, d = PmidSet([1, 2]), PmidSet([3, 4]), PmidSet([3, 4]), PmidSet([2, 5])
+    sets = [a, b, c, d]
+
+    assert leave_one_out(sets).tolist() == [1, 0, 0, 1]
+    assert removable_together(sets) == [1]
+    assert removable_together(sets, order=[2, 1, 0, 3]) == [2]
+    for i, lost in enumerate(leave_one_out(sets)):
+        rest = PmidSet.union_all(s for j, s in enumerate(sets) if j != i)
+        assert len(PmidSet.union_all(sets) - rest) == lost
+
+
+def test_lazy_greedy_matches_naive_greedy():
+    rng = random.Random(3)
+    for _ in range(20):
+        sets = random_sets(rng, 12, 400)
+        order = greedy_order(sets)
+        positive = [step.index for step in order if step.gain]
+        assert positive == naive_order(sets)
+        assert sorted(step.index for step in order) == list(range(len(sets)))
+        assert order[-1].cumulative == len(PmidSet.union_all(sets))
+        assert all(a.gain >= b.gain for a, b in zip(order, order[1:]))
+
+
+def test_recommendation_keeps_seeds():
+    terms = ["big[tiab]", "mid[tiab]", "seed[tiab]", "dup[tiab]"]
+    sets = [PmidSet(range(1, 91)), PmidSet(range(85, 101)), PmidSet([101]), PmidSet(range(1, 10))]
+
+    plain = recommend_terms(terms, sets, target_recall=0.9)
+    assert plain.selected_terms == ["big[tiab]", "mid[tiab]"]
+    assert plain.dropped_terms == ["seed[tiab]", "dup[tiab]"]
+
+    with_seeds = recommend_terms(terms, sets, target_recall=0.8, seeds=["101", "5"])
+    assert with_seeds.seeds_covered == 2
+    assert set(with_seeds.selected_terms) == {"big[tiab]", "seed[tiab]"}
+    assert with_seeds.selected_recall == 91 / 101
+    assert "| 1 | `big[tiab]` | 90 |" in with_seeds.to_markdown()
+    assert with_seeds.summary()["dropped"] == ["mid[tiab]", "dup[tiab]"]
+
+
+def test_large_block_is_fast():
+    rng = np.random.default_rng(0)
+    sets = [PmidSet(rng.integers(1, 2_000_000, size=int(rng.integers(10, 20000)))) for _ in range(250)]
+    seed_matrix = rng.random((250, 30)) < 0.05
+
+    started = time.perf_counter()
+    result = recommend_terms([f"t{i}" for i in range(250)], sets, target_recall=0.99, seed_matrix=seed_matrix)
+    assert time.perf_counter() - started < 5
+    assert result.selected_recall >= 0.99
+    captured = seed_matrix[result.selected].any(axis=0).sum()
+    assert captured == seed_matrix.any(axis=0).sum()
+
+
+def test_overlap_matrix_matches_python_sets(tmp_path):
+    rng = random.Random(11)
+    sets = random_sets(rng, 9, 3000)
+    terms = [f"t{i}[tiab]" for i in range(9)]
+    matrix = OverlapMatrix.build(terms, sets)
+
+    for i in range(9):
+        for j in range(9):
+            common = len(set(sets[i]) & set(sets[j]))
+            assert matrix.intersections[i, j] == common
+            union = len(set(sets[i]) | set(sets[j]))
+            assert matrix.jaccard[i, j] == (common / union if union else 0.0)
+            assert matrix.containment[i, j] == (common / len(sets[i]) if len(sets[i]) else 0.0)
+
+    path = matrix.to_csv(tmp_path / "jaccard.csv")
+    rows = list(csv.reader(open(path, encoding="utf-8")))
+    assert rows[0] == ["term"] + terms
+    assert rows[1][1] == ("1.0000" if len(sets[0]) else "0.0000")
+    pairs = list(csv.DictReader(open(matrix.pairs_to_csv(tmp_path / "pairs.csv"), encoding="utf-8")))
+    assert len(pairs) == 36
+
+
+def test_contained_pairs():
+    terms = ["broad", "narrow", "other"]
+    matrix = OverlapMatrix.build(terms, [PmidSet(range(100)), PmidSet(range(5, 15)), PmidSet(range(200, 210))])
+    contained = matrix.contained_pairs(0.9)
+    assert [(row["term_a"], row["term_b"], row["b_in_a"]) for row in contained] == [("broad", "narrow", 1.0)]
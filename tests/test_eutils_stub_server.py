@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+オフライン用 E-utilities スタブサーバーのテスト
+
+テスト対象:
+1. 合成コーパスに対する検索式の評価（左から順の演算、日付範囲、履歴参照）
+2. 共通クライアントからの esearch / efetch / esummary / epost / elink
+3. 429 注入・サーバー側レート制限とクライアントのリトライ
+"""
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from scripts.eutils import EutilsClient, EutilsError, TokenBucket
+from scripts.eutils.stub_server import FaultConfig, StubEutilsServer, SyntheticCorpus, term_key
+
+TERMS = {
+    '"Physicians"[Mesh]': [1, 2, 3, 4],
+    "ikigai[tiab]": [3, 4, 5],
+    '"work engagement"[tiab]': [5, 6],
+}
+RECORDS = {1: {"year": 2019}, 2: {"year": 2020}, 3: {"year": 2021}, 4: {"year": 2022}, 5: {"year": 2023}, 6: {"year": 2024}}
+
+
+@pytest.fixture
+def server():
+    corpus = SyntheticCorpus(terms=TERMS, records=RECORDS, size=0, auto_terms=False)
+    with StubEutilsServer(corpus) as stub:
+        yield stub
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("max_retries", 3)
+    return EutilsClient(
+        base_url=server.base_url,
+        rate_limiter=TokenBucket(rate=1000.0),
+        backoff_seconds=0,
+        **kwargs,
+    )
+
+
+class TestSyntheticCorpus:
+    """コーパスのテスト"""
+
+    def test_term_key_normalization(self):
+        assert term_key('"Physicians"[MeSH Terms]') == "physicians[mesh]"
+        assert term_key('"Physicians"[Mesh:NoExp]') == "physicians[mesh]"
+        assert term_key("ikigai[Title/Abstract]") == "ikigai[tiab]"
+
+    def test_auto_terms_are_deterministic(self):
+        first = SyntheticCorpus(size=5000, seed=1).lookup("burnout[tiab]")
+        second = SyntheticCorpus(size=5000, seed=1).lookup("Burnout[tiab]")
+        assert first == second
+        assert 0 < len(first) < 5000
+
+
+class TestEndpoints:
+    """各エンドポイントのテスト"""
+
+    @pytest.mark.parametrize("query, expected", [
+        ('"Physicians"[Mesh]', 4),
+        ('"physicians"[mh] AND ikigai[tiab]', 2),
+        ('ikigai[tiab] OR "work engagement"[tiab]', 4),
+        ('"Physicians"[Mesh] NOT ikigai[tiab]', 2),
+        ('("Physicians"[Mesh] OR "work engagement"[tiab]) AND "2021/01/01"[PDAT] : "3000"[PDAT]', 4),
+        ("ikigai[tiab] AND 2022:2023[dp]", 2),
+        ("3[uid] OR 6[pmid]", 2),
+    ])
+    def test_esearch_counts(self, server, query, expected):
+        assert make_client(server).count(query) == expected
+
+    def test_unknown_phrase_is_reported(self, server):
+        client = make_client(server)
+        with pytest.raises(EutilsError, match="phrasesnotfound"):
+            client.count("zzz[tiab]")
+        assert client.count("zzz[tiab] OR ikigai[tiab]", strict=False) == 3
+
+    def test_history_and_references(self, server):
+        client = make_client(server)
+        first = client.esearch('"Physicians"[Mesh]', usehistory="y")
+        second = client.esearch("ikigai[tiab]", usehistory="y", WebEnv=first["webenv"])
+        combined = client.esearch("#1 AND #2", WebEnv=first["webenv"], retmax=10)
+
+        assert second["querykey"] == "2"
+        assert sorted(combined["idlist"]) == ["3", "4"]
+
+    def test_efetch_formats(self, server):
+        client = make_client(server)
+        medline = client.efetch(ids=["1", "3"], rettype="medline", retmode="text")
+        assert "PMID- 1\n" in medline and "MH  - Physicians" in medline
+
+        root = ET.fromstring(client.efetch_bytes(ids=["5"], retmode="xml"))
+        assert root.findtext(".//PMID") == "5"
+        assert root.findtext(".//PubDate/Year") == "2023"
+
+    def test_epost_then_efetch(self, server):
+        client = make_client(server)
+        webenv, query_key = client.epost(["2", "4", "999"])
+        text = client.efetch(WebEnv=webenv, query_key=query_key, rettype="uilist", retmode="text")
+        assert text.split() == ["4", "2"]
+
+    def test_esummary_and_elink(self, server):
+        client = make_client(server)
+        summary = client.esummary(ids=["1"])
+        assert summary["uids"] == ["1"]
+        assert summary["1"]["pubdate"] == "2019"
+        links = client.elink(["1"])
+        assert links["linksets"][0]["ids"] == ["1"]
+
+
+class TestFaults:
+    """障害注入のテスト"""
+
+    def test_injected_429_is_retried_until_limit(self):
+        corpus = SyntheticCorpus(terms=TERMS, size=0)
+        with StubEutilsServer(corpus, FaultConfig(error_rate_429=1.0)) as stub:
+            with pytest.raises(EutilsError, match="429"):
+                make_client(stub).count("ikigai[tiab]")
+            assert stub.stats["esearch"] == 3
+            assert stub.stats["esearch:429"] == 3
+
+    def test_partial_faults_recover(self):
+        corpus = SyntheticCorpus(terms=TERMS, size=0)
+        with StubEutilsServer(corpus, FaultConfig(error_rate_5xx=0.5, seed=3)) as stub:
+            client = make_client(stub, max_retries=20)
+            assert [client.count("ikigai[tiab]") for _ in range(5)] == [3] * 5
+            assert stub.stats["esearch"] >= 5
+
+    def test_server_rate_limit(self):
+        corpus = SyntheticCorpus(terms=TERMS, size=0)
+        with StubEutilsServer(corpus, FaultConfig(rate_limit=2)) as stub:
+            client = make_client(stub, max_retries=1)
+            client.count("ikigai[tiab]")
+            client.count("ikigai[tiab]")
+            with pytest.raises(EutilsError, match="429"):
+                client.count("ikigai[tiab]")
+
+
+def test_base_url_from_environment(server, monkeypatch):
+    monkeypatch.setenv("NCBI_EUTILS_BASE_URL", server.base_url + "/")
+    client = EutilsClient(rate_limiter=TokenBucket(rate=1000.0))
+    assert client.base_url == server.base_url
+    assert client.count("ikigai[tiab]") == 3
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+出版年インデックス（期間別件数を手元で求める）のテスト
+
+テスト対象:
+1. [PDAT] の範囲から年の範囲への変換（年単位で区切れない範囲は None）
+2. 取得したインデックスの期間別件数が esearch の件数と一致すること、保存と再利用
+3. 保存したインデックスの有効期限
+4. フィルター行列の期間の列と絞り込み段階を手元で数えること
+"""
+
+import time
+
+import pytest
+
+from scripts.eutils import (
+    FilterMatrixSpec,
+    PmidMetadataStore,
+    YearIndex,
+    YearIndexStore,
+    fetch_year_index,
+    parse_pdat_window,
+    run_filter_matrix,
+)
+from scripts.eutils.stub_server import SyntheticCorpus
+
+
+@pytest.fixture
+def corpus():
+    records = {
+        pmid: {"year": 2010 + pmid % 15, "languages": ["jpn"] if pmid % 4 == 0 else ["eng"]}
+        for pmid in range(1, 61)
+    }
+    terms = {
+        "p[tiab]": list(range(1, 61)),
+        "a[tiab]": list(range(1, 41)),
+        "x[tiab]": list(range(1, 61, 3)),
+        "english[lang]": [pmid for pmid in range(1, 61) if pmid % 4],
+    }
+    return SyntheticCorpus(terms=terms, records=records, size=0, auto_terms=False)
+
+
+@pytest.mark.parametrize("clause, expected", [
+    (None, (None, None)),
+    ('("2021"[PDAT] : "3000"[PDAT])', (2021, None)),
+    ('("2015/01/01"[PDAT] : "3000"[PDAT])', (2015, None)),
+    ('("2023"[Date - Publication] : "3000"[Date - Publication])', (2023, None)),
+    ('"2015/01/01"[dp] : "2019/12/31"[dp]', (2015, 2019)),
+    ('"2020"[PDAT]', (2020, 2020)),
+    ('("2020/06/01"[PDAT] : "3000"[PDAT])', None),
+    ('("2015"[PDAT] : "2019/06/30"[PDAT])', None),
+    ('("2015"[EDAT] : "3000"[EDAT])', None),
+    ('("2015"[PDAT] : "3000"[PDAT]) AND humans[Mesh]', None),
+])
+def test_parse_pdat_window(clause, expected):
+    assert parse_pdat_window(clause) == expected
+
+
+def test_year_index_matches_live_counts(tmp_path, stub, client):
+    windows = [(None, None), (2020, None), (2015, 2019), (2024, 2024)]
+    index = fetch_year_index("a[tiab] NOT x[tiab]", client=client, page_size=7)
+    assert stub.stats["esearch"] == 1
+    assert stub.stats["esummary"] == 4  # 26件を7件ずつ
+
+    for start, end in windows:
+        clause = f'("{start or 1800}"[PDAT] : "{end or 3000}"[PDAT])'
+        assert index.count(start, end) == client.count(f"a[tiab] NOT x[tiab] AND {clause}")
+    assert sum(index.histogram().values()) == len(index) == 26
+    assert set(index.select(2020)) == {pmid for pmid in index.pmids if 2010 + pmid % 15 >= 2020}
+
+    loaded = YearIndex.load(index.save(tmp_path / "a.npz"))
+    assert loaded.pmids == index.pmids and loaded.count(2020) == index.count(2020)
+    assert loaded.query == index.query
+
+    store = YearIndexStore(tmp_path / "store", client=client)
+    store.get("a[tiab]")
+    requests = dict(stub.stats)
+    assert YearIndexStore(tmp_path / "store", client=client).get(" a[tiab] ").count(2020) == 11
+    assert stub.stats == requests
+
+
+def test_year_index_store_refetches_stale_index(tmp_path, stub, client):
+    now = [time.time()]
+    store = YearIndexStore(tmp_path, client=client, max_age_seconds=3600, clock=lambda: now[0])
+    store.get("a[tiab]")
+    now[0] += 1800
+    assert YearIndexStore(tmp_path, client=client, max_age_seconds=3600, clock=lambda: now[0]).get("a[tiab]")
+    assert stub.stats["esearch"] == 1
+
+    # 期限切れは取り直す。0 以下なら期限なし
+    now[0] += 3600
+    stale = YearIndexStore(tmp_path, client=client, max_age_seconds=3600, clock=lambda: now[0])
+    stale.get("a[tiab]")
+    assert stale.fetched == 1 and stub.stats["esearch"] == 2
+    forever = YearIndexStore(tmp_path, client=client, max_age_seconds=0, clock=lambda: now[0] + 10 ** 9)
+    forever.get("a[tiab]")
+    assert forever.fetched == 0
+
+
+def test_filter_matrix_periods_from_year_index(tmp_path, stub, client):
+    spec = {
+        "name": "Periods",
+        "population": "p[tiab]",
+        "blocks": {"A": "a[tiab]"},
+        "filters": [{"name": "base"}, {"name": "no_x", "apply": ["NOT x[tiab]"]}],
+        "periods": {"all": None, "5y": {"from": "2020"}, "mid": '("2020/06/01"[PDAT] : "3000"[PDAT])'},
+    }
+    live = run_filter_matrix(FilterMatrixSpec.from_dict(spec), client=client, max_in_flight=4)
+    searched = stub.stats["esearch"]
+
+    store = YearIndexStore(tmp_path, client=client)
+    local = run_filter_matrix(FilterMatrixSpec.from_dict(spec), client=client, max_in_flight=4, year_store=store)
+    # インデックスは (Population) AND (ブロック) の1つだけ。絞り込み段階と月で区切る期間は通常の検索
+    assert local.local == 2 and store.fetched == 1
+    assert stub.stats["esearch"] - searched == 1 + 4
+    for cell in local.cells:
+        assert local.results[cell].count == live.results[cell].count
+
+    spec["periods"]["3y"] = '("2022"[Date - Publication] : "3000"[Date - Publication])'
+    searched = stub.stats["esearch"]
+    added = run_filter_matrix(
+        FilterMatrixSpec.from_dict(spec), client=client, max_in_flight=4,
+        previous={cell.query: local.results[cell].count for cell in local.cells},
+        year_store=YearIndexStore(tmp_path, client=client),
+    )
+    assert stub.stats["esearch"] - searched == 1  # no_x/3y だけ
+    assert added.count("A", "base", period="3y") == client.count(
+        '(p[tiab]) AND (a[tiab]) AND ("2022"[PDAT] : "3000"[PDAT])'
+    )
+
+
+def test_filter_matrix_stages_from_metadata_store(tmp_path, stub, client):
+    spec = {
+        "name": "Stages",
+        "population": "p[tiab]",
+        "blocks": {"A": "a[tiab]"},
+        "filters": [
+            {"name": "base"},
+            {"name": "eng", "apply": ["AND English[lang]"]},
+            {"name": "no_x", "apply": ["NOT x[tiab]"]},
+        ],
+        "periods": {"all": None, "5y": {"from": "2020"}},
+    }
+    live = run_filter_matrix(FilterMatrixSpec.from_dict(spec), client=client, max_in_flight=4)
+    searched = stub.stats["esearch"]
+
+    store = YearIndexStore(tmp_path / "years", client=client)
+    local = run_filter_matrix(
+        FilterMatrixSpec.from_dict(spec), client=client, max_in_flight=4, year_store=store,
+        metadata_store=PmidMetadataStore(tmp_path / "meta", client=client),
+    )
+    # base と eng は手元で、書誌情報で判定できない no_x だけ通常の検索
+    assert local.local == 4 and store.fetched == 1
+    assert stub.stats["esearch"] - searched == 1 + 2
+    for cell in local.cells:
+        assert local.results[cell].count == live.results[cell].count
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PubMed検索式の共通パーサーのテスト
+
+テスト対象:
+1. 字句解析と、左から順に評価する構文木（元の位置つき）
+2. 構文の誤りを補って記録すること、解析結果のキャッシュと不変性
+3. パーサーを使う分割・展開・リントの関数
+"""
+
+import dataclasses
+
+import pytest
+
+from scripts.query import (
+    BoolOp,
+    DateRange,
+    Group,
+    LineRef,
+    QuerySyntaxError,
+    Term,
+    parse,
+    split_boolean,
+    tokenize,
+)
+from scripts.search.term_validator.check_block_overlap import parse_block_from_text
+from scripts.search.term_validator.check_search_lines import expand_references
+from scripts.validation.pubmed_syntax_linter import lint_pubmed_query
+
+
+def test_tree_and_spans():
+    query = '("high flow"*[tiab] OR hfnc[tiab]) AND heart failure[tiab] NOT #2'
+    parsed = parse(query)
+    assert parsed.ok
+    root = parsed.root
+    # PubMedは左から順に評価する: ((A AND B) NOT #2)
+    assert isinstance(root, BoolOp) and root.op == "NOT"
+    left, ref = root.operands
+    assert isinstance(left, BoolOp) and left.op == "AND" and isinstance(left.operands[0], Group)
+    assert ref == LineRef(2, (len(query) - 2, len(query)))
+
+    phrase, hfnc, heart = parsed.terms()
+    assert (phrase.value, phrase.field, phrase.quoted, phrase.wildcard) == ("high flow", "tiab", True, True)
+    assert parsed.text(phrase) == '"high flow"*[tiab]'
+    start = query.index("heart")
+    assert heart == Term("heart failure", "tiab", (start, start + len("heart failure[tiab]")))
+    assert parsed.text(left.operands[0]) == '("high flow"*[tiab] OR hfnc[tiab])'
+
+    assert parse("a OR b OR c").root.operands == tuple(parse("a OR b OR c").terms())
+    assert parse('a or b "c or d"[tiab]').split() == ['a or b "c or d"[tiab]']  # 暗黙の AND
+    assert [token.kind for token in tokenize('x[ti] AND (y)')[0]] == ["WORD", "TAG", "OPERATOR", "LPAREN", "WORD", "RPAREN"]
+
+
+def test_errors_cache_and_immutability():
+    parsed = parse("(a[tiab] OR b[tiab]")
+    assert not parsed.ok and parsed.errors[0].message == "unclosed parenthesis"
+    assert parsed.split() == ["(a[tiab] OR b[tiab]"] and len(parsed.terms()) == 2
+    with pytest.raises(QuerySyntaxError):
+        parsed.raise_for_errors()
+    assert [issue.message for issue in parse('a AND "b').errors] == ["unterminated quotation mark"]
+    assert parse("a[tiab] OR").root == Term("a", "tiab", (0, 7))
+    assert parse("").root is None and parse("").split() == []
+
+    assert parse("x[tiab] OR y[tiab]") is parse("x[tiab] OR y[tiab]")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        parsed.root.span = (0, 0)
+
+
+def test_date_range_nodes():
+    parsed = parse('a AND "2020"[PDAT] : "2021"[PDAT]')
+    assert parsed.root == BoolOp("AND", (
+        Term("a", None, (0, 1)),
+        DateRange(Term('"2020"', "PDAT", (6, 18)), Term('"2021"', "PDAT", (21, 33)), (6, 33)),
+    ), (0, 33)) and parsed.ok
+    # 演算子で始まる絞り込み条件（括弧なし）も範囲だけが1つのノードになる
+    clause = parse('#0 AND "2008"[PDAT] : "3000"[PDAT]')
+    (_, date_range) = clause.operands("AND")
+    assert isinstance(date_range, DateRange) and clause.text(date_range) == '"2008"[PDAT] : "3000"[PDAT]'
+    assert [term.text for term in clause.terms()] == ['"2008"', '"3000"']
+    assert parse('("2015"[dp]:"2019"[dp]) OR b').split() == ['("2015"[dp]:"2019"[dp])', "b"]
+    assert [issue.message for issue in parse('"2020"[PDAT] :').errors] == ["missing end of date range"]
+
+
+def test_downstream_helpers():
+    assert split_boolean('heart or (cardiac and x) NOT "a or b"') == ["heart ", "or", " (cardiac and x) ", "NOT", ' "a or b"']
+    assert parse_block_from_text('```\n# Block\n"a"[tiab] OR\nOR\n(b[tiab] OR c[tiab]) OR\nd[tiab]\n```') == [
+        '"a"[tiab]', "(b[tiab] OR c[tiab])", "d[tiab]",
+    ]
+    lines = {"1": "a OR b", "2": "c", "3": "#1 AND #2"}
+    assert expand_references('#3 NOT "#1"[tiab]', lines) == '((a OR b) AND (c)) NOT "#1"[tiab]'
+    assert {w.rule_id for w in lint_pubmed_query('("a"[tiab] OR b[tiab]')} == {"SYNTAX_ERROR"}